@@ -9,17 +9,32 @@ Common functions and utilities
 import os
 import io
 import sys
+import time
+import json
+import shlex
+import argparse
+import multiprocessing
 import re
 import math
 import shutil
+import tempfile
 import fnmatch
 import datetime
 import glob
-import maya.cmds as Cmds
-import maya.mel as Mel
+import warnings
 import xml.dom.minidom as Dom
-import maya.OpenMaya as OpenMaya
-import maya.OpenMayaAnim as OpenMayaAnim
+
+# Outside Maya, FakeMaya.py points Cmds and Mel at an in-memory stand-in
+try:
+    import maya.cmds as Cmds
+    import maya.mel as Mel
+    import maya.OpenMaya as OpenMaya
+    import maya.OpenMayaAnim as OpenMayaAnim
+except ImportError:
+    Cmds = None
+    Mel = None
+    OpenMaya = None
+    OpenMayaAnim = None
 
 global InfiniteLoopCounter
 
@@ -32,7 +47,7 @@ def CheckInfinity(infinity=1000):
     InfiniteLoopCounter = InfiniteLoopCounter + 1
     
     if InfiniteLoopCounter >= infinity:
-        print 'Loop overboard!'
+        print('Loop overboard!')
         return True
     
     return False
@@ -120,15 +135,10 @@ class XmlWriter:
         self.WriteElementEnd(True)
 
 def PrintXYZ(xyz):
-    print "X", str(xyz[0]),
-    print "Y", str(xyz[1]),
-    print "Z", str(xyz[2])
+    print("X %s Y %s Z %s" % (xyz[0], xyz[1], xyz[2]))
 
 def PrintXYZW(xyzw):
-    print "X", str(xyzw[0]),
-    print "Y", str(xyzw[1]),
-    print "Z", str(xyzw[2]),
-    print "W", str(xyzw[3])
+    print("X %s Y %s Z %s W %s" % (xyzw[0], xyzw[1], xyzw[2], xyzw[3]))
 
 def CreateXYZKey(xyz):
     key = "X" + str(xyz[0])
@@ -178,16 +188,20 @@ def VectorDegreesToRadians(vector):
 def VectorRadiansToDegrees(vector):
     return OpenMaya.MVector(OpenMaya.MAngle(vector[0], OpenMaya.MAngle.kRadians).asDegrees(), OpenMaya.MAngle(vector[1], OpenMaya.MAngle.kRadians).asDegrees(), OpenMaya.MAngle(vector[2], OpenMaya.MAngle.kRadians).asDegrees())
 
-def CreateTransformNodes(nodeName, xmlNode):
+def CreateTransformNodes(nodeName, xmlNode, pose=None):
     '''
     Creates position, rotation and scale nodes for the node nodeName
-    and attaches them to xmlNode
+    and attaches them to xmlNode; pose is its row of a PoseSampler sample,
+    queried at the current time if not given
     '''
-    print "Getting transform for", nodeName, Cmds.nodeType(nodeName)
+    print("Getting transform for %s %s" % (nodeName, Cmds.nodeType(nodeName)))
     
-    position = Cmds.xform(nodeName, q=True, t=True);
-    rotation = Cmds.xform(nodeName, q=True, ro=True);
-    scale = Cmds.xform(nodeName, q=True, s=True);
+    if pose is None:
+        position = Cmds.xform(nodeName, q=True, t=True)
+        rotation = Cmds.xform(nodeName, q=True, ro=True)
+        scale = Cmds.xform(nodeName, q=True, s=True)
+    else:
+        position, rotation, scale = list(pose[0:3]), list(pose[3:6]), list(pose[6:9])
     
     if not IsZero(position):
         positionNode = xmlDocument.createElement("Position")
@@ -219,6 +233,37 @@ def GetParentName(fullNodePath):
 def Bake(minFrame, maxFrame):
     Cmds.bakeResults(sm=True, t=(minFrame, maxFrame), hi="below", sb=1, dic=True, pok=False, sac=False, ral=False, cp=False, shape=False)
 
+# Frame rates of the named time units; the others are spelled like '120fps'
+TimeUnitFramesPerSecond = {'game': 15, 'film': 24, 'pal': 25, 'ntsc': 30, 'show': 48, 'palf': 50, 'ntscf': 60}
+
+def GetFramesPerSecond():
+    '''
+    Returns the frame rate of the current time unit
+    '''
+    timeUnit = Cmds.currentUnit(query=True, time=True)
+    
+    if timeUnit in TimeUnitFramesPerSecond:
+        return TimeUnitFramesPerSecond[timeUnit]
+    
+    if timeUnit.endswith('fps'):
+        return float(timeUnit[:-3])
+    
+    return 24
+
+SceneFilePatterns = ["*.ma", "*.mb"]
+
+def FindScenes(directoryName, patterns=SceneFilePatterns):
+    '''
+    Returns the files under directoryName that match any of patterns, sorted
+    '''
+    sceneFilenames = []
+    for walkDirectory, directoryNames, fileNames in os.walk(directoryName):
+        for fileName in fileNames:
+            if any([fnmatch.fnmatch(fileName, pattern) for pattern in patterns]):
+                sceneFilenames.append(os.path.join(walkDirectory, fileName))
+    
+    return sorted(sceneFilenames)
+
 def FindIndexOf(list, value, start=0, end=-1):
     '''
     Finds the first occurance of value in [start, end]
@@ -236,213 +281,6730 @@ def FindIndexOf(list, value, start=0, end=-1):
     return end
 
 '''
-Greymind Sequencer for Maya
-Version: 1.8.0
+FBX ASCII reader
+
+Lazy node tree over a memory-mapped FBX200611 ASCII file. Nodes only record
+byte offsets; their values are tokenized and their children parsed the first
+time they are asked for, so large files can be opened and navigated without
+reading the parts that are not needed.
 
 (c) 2009 - 2015 Greymind Inc.
     Balakrishnan (Balki) Ranganathan (balki_live_com)
     All Rights Reserved.
 '''
 
-# from Common import *
-from functools import partial as Partial
+import os
+import re
+import mmap
 
-SequencerVersion = "1.8.0"
+# Whitespace and ; comments between nodes
+FbxSkipPattern = re.compile(br'(?:\s+|;[^\n]*)*')
 
-class Animation:
-    Id = -1
+# Node name followed by its colon
+FbxNamePattern = re.compile(br'([A-Za-z_][A-Za-z0-9_]*)[ \t]*:')
+
+# Things that end the value list of a node: an opening or closing brace, or a
+# line break followed by another node, a closing brace, a comment or a blank line.
+# Strings and comments are matched so that braces inside them are skipped.
+FbxValueStopPattern = re.compile(br'"[^"]*"|;[^\n]*|\{|\}|\n[ \t]*(?=[A-Za-z_][A-Za-z0-9_]*[ \t]*:|\}|;|\r?\n)')
+
+# Things that matter when matching braces
+FbxBracePattern = re.compile(br'"[^"]*"|;[^\n]*|\{|\}')
+
+# Value tokens: a quoted string or a bare word / number
+FbxValuePattern = re.compile(br'"([^"]*)"|([^,\s]+)')
+FbxIntegerPattern = re.compile(br'[-+]?\d+$')
+
+class FbxAsciiError(Exception):
+    pass
+
+def ParseFbxValue(token):
+    '''
+    Converts a bare value token to an int or float, or text for words like Y or L
+    '''
+    if FbxIntegerPattern.match(token):
+        return int(token)
+        
+    try:
+        return float(token)
+    except ValueError:
+        return token.decode("utf-8")
+
+def FindValueEnd(data, position, end):
+    '''
+    Returns the offset where the value list starting at position ends,
+    and whether it ends with the { of a node body
+    '''
+    for match in FbxValueStopPattern.finditer(data, position, end):
+        stop = data[match.start():match.start() + 1]
+        if stop == b"{":
+            return match.start(), True
+        elif stop == b"}" or stop == b"\n":
+            return match.start(), False
+            
+    return end, False
+
+def FindClosingBrace(data, position, end):
+    '''
+    Returns the offset of the } matching the { just before position
+    '''
+    level = 1
+    for match in FbxBracePattern.finditer(data, position, end):
+        brace = data[match.start():match.start() + 1]
+        if brace == b"{":
+            level += 1
+        elif brace == b"}":
+            level -= 1
+            if level == 0:
+                return match.start()
+                
+    raise FbxAsciiError("Unbalanced braces after offset %d" % position)
+
+class FbxNode:
+    '''
+    A node of the FBX tree, e.g. Take: "Take 001" { ... }
+    Offsets are into the document data; BodyStart is -1 for nodes without a body
+    '''
+    Document = None
     Name = ""
-    StartFrame = -1
-    EndFrame = -1
-    Selected = False
+    LineStart = 0
+    ValueStart = 0
+    ValueEnd = 0
+    BodyStart = -1
+    BodyEnd = -1
+    End = 0
     
-    def __init__(self, name, startFrame, endFrame, selected=False, id=-1):
+    def __init__(self, document, name, lineStart, valueStart, valueEnd, bodyStart, bodyEnd, end):
+        self.Document = document
         self.Name = name
-        self.StartFrame = startFrame
-        self.EndFrame = endFrame
-        self.Selected = selected
-        self.Id = id
-
-class AnimationUI:
-    NameTextField = None
-    StartFrameTextField = None
-    EndFrameTextField = None
-    SelectedCheckBox = None
-    SetButton = None
-    
-    Animation = None
-    SequencerUI = None
-    
-    def __init__(self, sequencerUI, animation):
-        self.Create(sequencerUI, animation)
-        
-    def Name_Changed(self, extraArg=None):
-        self.Animation.Name = Cmds.textField(self.NameTextField, q=True, text=True)
-        self.SequencerUI.Save()
-        self.SequencerUI.Update()
-        
-    def StartFrame_Changed(self, extraArg=None):
-        self.Animation.StartFrame = int(Cmds.textField(self.StartFrameTextField, q=True, text=True))
-        self.SequencerUI.Save()
-        self.SequencerUI.Update()
+        self.LineStart = lineStart
+        self.ValueStart = valueStart
+        self.ValueEnd = valueEnd
+        self.BodyStart = bodyStart
+        self.BodyEnd = bodyEnd
+        self.End = end
+        self.values = None
+        self.children = None
         
-    def EndFrame_Changed(self, extraArg=None):
-        self.Animation.EndFrame = int(Cmds.textField(self.EndFrameTextField, q=True, text=True))
-        self.SequencerUI.Save()
-        self.SequencerUI.Update()
+    def HasBody(self):
+        return self.BodyStart >= 0
         
-    def Select_Changed(self, extraArg=None):
-        self.Animation.Selected = Cmds.checkBox(self.SelectedCheckBox, q=True, value=True)
-        self.SequencerUI.Save()
-        self.SequencerUI.Update()
+    def RawValue(self):
+        '''
+        Returns the bytes of the value list, untokenized
+        '''
+        return self.Document.Data[self.ValueStart:self.ValueEnd]
         
-    def Set_Clicked(self, extraArg=None):
-        self.SequencerUI.Save()
-        self.SequencerUI.Update()
-        Cmds.playbackOptions(e=True, min=self.Animation.StartFrame, max=self.Animation.EndFrame)
-    
-    def Create(self, sequencerUI, animation):
-        self.SequencerUI = sequencerUI
-        self.Animation = animation
+    def Values(self):
+        '''
+        Returns the tokenized values; strings and words as text, numbers as int or float
+        '''
+        if self.values is None:
+            self.values = []
+            for match in FbxValuePattern.finditer(self.RawValue()):
+                if match.group(1) is not None:
+                    self.values.append(match.group(1).decode("utf-8"))
+                else:
+                    self.values.append(ParseFbxValue(match.group(2)))
+                    
+        return self.values
         
-        self.SelectedCheckBox = Cmds.checkBox(label='', value=animation.Selected, cc=self.Select_Changed)
-        self.NameTextField = Cmds.textField(text=animation.Name, width=183, cc=self.Name_Changed)
-        self.StartFrameTextField = Cmds.textField(text=str(animation.StartFrame), cc=self.StartFrame_Changed)
-        self.EndFrameTextField = Cmds.textField(text=str(animation.EndFrame), cc=self.EndFrame_Changed)
-        self.SetButton = Cmds.button(label='Set', c=self.Set_Clicked)
+    def Value(self, default=None):
+        '''
+        Returns the first value, or default if there is none
+        '''
+        values = self.Values()
+        if len(values) == 0:
+            return default
+            
+        return values[0]
         
-    def Destroy(self):
-        Cmds.deleteUI(self.SelectedCheckBox)
-        Cmds.deleteUI(self.NameTextField)
-        Cmds.deleteUI(self.StartFrameTextField)
-        Cmds.deleteUI(self.EndFrameTextField)
-    
-class Sequencer:
-    UniqueId = 0 # Stores the top unique id 
-    
-    Animations = {} # Stores the animations keyed by a unique id
-    Ordering = [] # Stores the order in which the animations are to be displayed by the UI
-    
-    def GetUniqueId(self):
-        self.UniqueId = self.UniqueId + 1
-        return (self.UniqueId - 1)
-    
-    def Count(self):
-        if not len(self.Animations) == len(self.Ordering):
-            print "Warning: Animations dictionary and Ordering list do not have same number of elements"
+    def Children(self):
+        if self.children is None:
+            if self.HasBody():
+                self.children = list(ParseFbxNodes(self.Document, self.BodyStart, self.BodyEnd))
+            else:
+                self.children = []
+                
+        return self.children
         
-        return len(self.Animations)
+    def FindAll(self, name, value=None):
+        '''
+        Returns the children called name, optionally only those whose first value is value
+        '''
+        return [child for child in self.Children() if child.Name == name and (value is None or child.Value() == value)]
         
-    def StartFrame(self):
-        startFrame = int(1e6)
-        for animationId in self.Animations:
-            if self.Animations[animationId].StartFrame < startFrame:
-                startFrame = self.Animations[animationId].StartFrame
+    def Find(self, name, value=None):
+        '''
+        Returns the first child called name (and first value value), or None
+        '''
+        for child in self.Children():
+            if child.Name == name and (value is None or child.Value() == value):
+                return child
                 
-        if startFrame == int(1e6):
-            startFrame = 0
-        
-        return startFrame
+        return None
+
+def ParseFbxNode(document, position, end, topLevel=False):
+    '''
+    Parses the node that starts at position (after any whitespace)
+    Top level nodes end at the first } in column 0, so their bodies are skipped
+    without being tokenized; nested nodes are matched by counting braces
+    '''
+    data = document.Data
     
-    def EndFrame(self):
-        endFrame = 0
-        for animationId in self.Animations:
-            if self.Animations[animationId].EndFrame > endFrame:
-                endFrame = self.Animations[animationId].EndFrame
-                
-        return endFrame
-        
-    def AddAnimationWithId(self, animation):
-        self.Animations[animation.Id] = animation
-        self.Ordering.append(animation.Id)
+    match = FbxNamePattern.match(data, position, end)
+    if match is None:
+        raise FbxAsciiError("Expected a node name at offset %d" % position)
         
-    def AddAnimation(self, animation):
-        # Check if it exists perhaps?
-        animation.Id = self.GetUniqueId()
-        self.AddAnimationWithId(animation)
+    name = match.group(1).decode("utf-8")
+    lineStart = data.rfind(b"\n", 0, position) + 1
+    valueStart = match.end()
+    valueEnd, hasBody = FindValueEnd(data, valueStart, end)
+    
+    if not hasBody:
+        return FbxNode(document, name, lineStart, valueStart, valueEnd, -1, -1, valueEnd)
         
-    def RemoveAnimation(self, animationId):
-        del self.Animations[animationId]
-        self.Ordering.remove(animationId)
+    bodyStart = valueEnd + 1
+    if topLevel:
+        bodyEnd = data.find(b"\n}", bodyStart, end)
+        if bodyEnd < 0:
+            raise FbxAsciiError("Node %s at offset %d is not closed" % (name, position))
+            
+        bodyEnd += 1
+    else:
+        bodyEnd = FindClosingBrace(data, bodyStart, end)
         
-class SequencerUI:
-    progressBar = ""
-    windowName = ""
-    windowLayout = ""
-    animationsLayout = ""
-    buttonsLayout = ""
-    startFrameTextBox = ""
-    endFrameTextBox = ""
-    selectAll = ""
-    windowTitle = ""
-    width = 0
-    height = 0
-    sequencer = None
-    IncludePlayblastLinkCheckBox = None
+    return FbxNode(document, name, lineStart, valueStart, valueEnd, bodyStart, bodyEnd, bodyEnd + 1)
+
+def ParseFbxNodes(document, position, end, topLevel=False):
+    '''
+    Yields the nodes between position and end, one level deep
+    '''
+    data = document.Data
+    while True:
+        position = FbxSkipPattern.match(data, position, end).end()
+        if position >= end:
+            return
+            
+        node = ParseFbxNode(document, position, end, topLevel)
+        yield node
+        position = node.End
+
+class FbxDocument:
+    '''
+    An FBX ASCII file opened for reading, e.g.
     
-    AnimationUIs = {}
+        document = FbxDocument("Master.fbx")
+        take = document.Find("Takes").Find("Take", "Take 001")
+        document.Close()
+    '''
+    Filename = ""
+    Data = None
+    Size = 0
     
-    def __init__(self):
-        self.progressBar = Mel.eval('$tmp = $gMainProgressBar');
-        self.windowName = "SequencerWindow"
-        self.windowLayout = "SequencerLayout"
-        self.animationsLayout = "SequencerAnimations"
-        self.buttonsLayout = "SequencerButtons"
-        self.selectAll = "SequencerSelectAll"
-        self.startFrameTextBox = "SequencerStartFrameTextBox"
-        self.endFrameTextBox = "SequencerEndFrameTextBox"
-        self.prefixTextBox = "SequencerPrefixTextBox"
-        
-        self.windowTitle = "Sequencer " + SequencerVersion
-        self.width = 400
-        self.height = 550
+    def __init__(self, filename=None, data=None):
+        self.Filename = filename
+        self.file = None
+        self.map = None
+        self.children = None
         
-        self.Load()
+        if data is not None:
+            self.Data = data
+            self.Size = len(data)
+            return
+            
+        self.file = open(filename, "rb")
+        self.Size = os.fstat(self.file.fileno()).st_size
+        if self.Size == 0:
+            self.Data = b""
+        else:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.Data = self.map
+            
+    def __enter__(self):
+        return self
         
-    def AttributeName(self, baseNode, attributeName):
-        return "%s.%s" % (baseNode, attributeName)
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        self.Close()
         
-    def Load(self):
+    def Close(self):
+        self.Data = None
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+            
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            
+    def Children(self):
         '''
-        Populate sequencer class from maya nodes
+        Returns the top level nodes
         '''
-        Attr = self.AttributeName
-        
-        self.sequencer = Sequencer()
+        if self.children is None:
+            self.children = list(ParseFbxNodes(self, 0, self.Size, True))
+            
+        return self.children
         
+    def Find(self, name):
         '''
-        self.sequencer.AddAnimation(Animation("Idle", 1, 30))
-        self.sequencer.AddAnimation(Animation("Run", 61, 90))
-        self.sequencer.AddAnimation(Animation("Walk", 31, 60))
+        Returns the top level node called name, or None
+        Searches backwards for the name in column 0, which reaches the sections at
+        the end of the file (like Takes) without looking at the rest of it
+        '''
+        if self.children is not None:
+            for child in self.children:
+                if child.Name == name:
+                    return child
+                    
+            return None
+            
+        nameBytes = name.encode("utf-8")
+        position = self.Data.rfind(b"\n" + nameBytes + b":")
+        if position >= 0:
+            return ParseFbxNode(self, position + 1, self.Size, True)
+            
+        nameMatch = FbxNamePattern.match(self.Data, 0, self.Size)
+        if nameMatch is not None and nameMatch.group(1) == nameBytes:
+            return ParseFbxNode(self, 0, self.Size, True)
+            
+        return None
         
-        return
+    def FindTake(self, takeName):
         '''
+        Returns the Take node called takeName, or None
+        '''
+        takes = self.Find("Takes")
+        if takes is None:
+            return None
+            
+        return takes.Find("Take", takeName)
+
+'''
+FBX take stitcher
+
+Stitches the takes of per-animation ASCII FBX files into one master file.
+Every file is streamed line by line through a pipeline of stages, so memory
+use stays the same no matter how large the files are. Only depends on the
+standard library, so it runs from mayapy as well as from plain Python.
+
+The fast mode memory-maps each file to find the byte range of its take and
+copies those ranges straight into the master with copy_file_range/sendfile,
+so the bytes of the takes never pass through Python objects. For files that
+are kept between runs the ranges are remembered in a small sidecar index next
+to each file (useIndex), so unchanged files are not scanned again; files that
+were just written are scanned without one. The scans can be spread across a
+process pool.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import mmap
+import json
+import hashlib
+import warnings
+import multiprocessing
+
+try:
+    from concurrent import futures as Futures
+    from concurrent.futures.process import BrokenProcessPool
+except ImportError:
+    Futures = None
+    BrokenProcessPool = None
+
+FbxDefaultTakeName = "Take 001"
+
+# Size of the chunks used when the platform has no in-kernel file copy
+FbxCopyChunkSize = 1 << 20
+
+# Take index sidecar files
+FbxTakeIndexExtension = ".takeindex"
+FbxTakeIndexVersion = 1
+FbxTakeIndexHashBlockSize = 1 << 16
+
+# Sections of a generated FBX file, in the order they appear
+FbxHeaderSection = 0
+FbxTakeSection = 1
+FbxFooterSection = 2
+
+def FbxBytes(text):
+    '''
+    Returns text as utf-8 encoded bytes
+    '''
+    if isinstance(text, bytes):
+        return text
         
-        sequencerNode = "SequencerData"
-        if not Cmds.objExists(sequencerNode):
-            return
+    return text.encode("utf-8")
+
+def FbxTakeLine(takeName):
+    '''
+    Returns the (stripped) line that opens the take takeName
+    '''
+    return b"Take: \"" + FbxBytes(takeName) + b"\" {"
+
+class FbxStitchError(Exception):
+    pass
+
+class StitchTake:
+    Name = ""
+    Filename = ""
+    Index = 0
+    Count = 0
+    
+    def __init__(self, name, filename, index, count):
+        self.Name = name
+        self.Filename = filename
+        self.Index = index
+        self.Count = count
+        
+    def IsFirst(self):
+        return self.Index == 0
+        
+    def IsLast(self):
+        return self.Index == self.Count - 1
+
+def ReadFbxLines(filename):
+    '''
+    Yields the lines of filename one at a time, line endings included
+    '''
+    fbxFile = open(filename, "rb")
+    try:
+        for line in fbxFile:
+            yield line
+    finally:
+        fbxFile.close()
+
+def ExtractTake(lines, stitchTake):
+    '''
+    Stage that tags every line with the section it belongs to
+    '''
+    takeLine = FbxTakeLine(FbxDefaultTakeName)
+    takeLevel = None
+    section = FbxHeaderSection
+    
+    for line in lines:
+        strippedLine = line.strip(b" \r\n")
+        lineStartsWith = line[:len(line) - len(line.lstrip(b" "))]
+        
+        if section == FbxHeaderSection and strippedLine == takeLine:
+            section = FbxTakeSection
+            takeLevel = lineStartsWith
             
-        self.sequencer.UniqueId = Cmds.getAttr(Attr(sequencerNode, 'UniqueId'))
-        ordering = Cmds.getAttr(Attr(sequencerNode, 'Ordering'))
+        yield section, line
+        
+        if section == FbxTakeSection and strippedLine == b"}" and lineStartsWith == takeLevel:
+            section = FbxFooterSection
+
+def CaptureHeader(sectionLines, stitchTake):
+    '''
+    Stage that keeps the header of the first file only
+    '''
+    for section, line in sectionLines:
+        if section == FbxHeaderSection and not stitchTake.IsFirst():
+            continue
+            
+        yield section, line
+
+def RenameTake(sectionLines, stitchTake):
+    '''
+    Stage that renames the take to the name of the animation
+    '''
+    renamed = False
+    for section, line in sectionLines:
+        if section == FbxTakeSection and not renamed:
+            line = line.replace(FbxBytes(FbxDefaultTakeName), FbxBytes(stitchTake.Name), 1)
+            renamed = True
+            
+        yield section, line
+
+def CaptureFooter(sectionLines, stitchTake):
+    '''
+    Stage that keeps the footer of the last file only
+    '''
+    for section, line in sectionLines:
+        if section == FbxFooterSection and not stitchTake.IsLast():
+            continue
+            
+        yield section, line
+
+# Stages run in this order; the first one receives the raw lines of the file
+FbxStitchStages = [ExtractTake, CaptureHeader, RenameTake, CaptureFooter]
+
+def StitchFbxTakes(masterFilename, takes, stages=None):
+    '''
+    Stitches takes, a list of [takeName, filename] pairs, into masterFilename
+    The header comes from the first file and the footer from the last one
+    '''
+    if stages is None:
+        stages = FbxStitchStages
+        
+    masterFile = open(masterFilename, "wb")
+    try:
+        for takeIndex in range(len(takes)):
+            stitchTake = StitchTake(takes[takeIndex][0], takes[takeIndex][1], takeIndex, len(takes))
+            
+            stream = ReadFbxLines(stitchTake.Filename)
+            for stage in stages:
+                stream = stage(stream, stitchTake)
+                
+            for section, line in stream:
+                masterFile.write(line)
+    finally:
+        masterFile.close()
+
+class FbxTakeRange:
+    '''
+    Byte offsets of the take in a generated FBX file
+    The header is [0, HeaderEnd), the take header line [HeaderEnd, TakeBodyStart),
+    the rest of the take [TakeBodyStart, FooterStart) and the footer [FooterStart, FileSize)
+    '''
+    HeaderEnd = 0
+    TakeBodyStart = 0
+    FooterStart = 0
+    FileSize = 0
+    
+    def __init__(self, headerEnd, takeBodyStart, footerStart, fileSize):
+        self.HeaderEnd = headerEnd
+        self.TakeBodyStart = takeBodyStart
+        self.FooterStart = footerStart
+        self.FileSize = fileSize
+
+def FindLineEnd(data, position, size):
+    '''
+    Returns the offset just past the line ending after position
+    '''
+    lineEnd = data.find(b"\n", position)
+    if lineEnd < 0:
+        return size
+        
+    return lineEnd + 1
+
+def ScanTakeRange(data, size):
+    '''
+    Finds the take in data (bytes or mmap) the same way ExtractTake does
+    '''
+    takeLine = FbxTakeLine(FbxDefaultTakeName)
+    
+    headerEnd = -1
+    position = data.find(takeLine)
+    while position >= 0:
+        lineStart = data.rfind(b"\n", 0, position) + 1
+        lineEnd = FindLineEnd(data, position, size)
+        
+        if data[lineStart:position].strip(b" ") == b"" and data[position:lineEnd].strip(b" \r\n") == takeLine:
+            headerEnd = lineStart
+            break
+            
+        position = data.find(takeLine, position + len(takeLine))
+        
+    if headerEnd < 0:
+        raise FbxStitchError("Take \"%s\" not found" % FbxDefaultTakeName)
+        
+    takeLevel = data[headerEnd:position]
+    takeBodyStart = FindLineEnd(data, position, size)
+    
+    endTakeLine = b"\n" + takeLevel + b"}"
+    position = data.find(endTakeLine, takeBodyStart - 1)
+    while position >= 0:
+        lineEnd = FindLineEnd(data, position + 1, size)
+        
+        if data[position + len(endTakeLine):lineEnd].strip(b" \r\n") == b"":
+            return FbxTakeRange(headerEnd, takeBodyStart, lineEnd, size)
+            
+        position = data.find(endTakeLine, position + 1)
+        
+    raise FbxStitchError("Take \"%s\" is not closed" % FbxDefaultTakeName)
+
+def FindTakeRange(filename):
+    '''
+    Memory-maps filename and returns the FbxTakeRange of its take
+    '''
+    fbxFile = open(filename, "rb")
+    try:
+        fileSize = os.fstat(fbxFile.fileno()).st_size
+        if fileSize == 0:
+            raise FbxStitchError("%s is empty" % filename)
+            
+        fbxMap = mmap.mmap(fbxFile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return ScanTakeRange(fbxMap, fileSize)
+        finally:
+            fbxMap.close()
+    finally:
+        fbxFile.close()
+
+def TakeIndexFilename(filename):
+    return filename + FbxTakeIndexExtension
+
+def FbxFingerprint(filename):
+    '''
+    Returns the size, mtime and content hash that key the take index of filename
+    The hash covers the first and last blocks of the file, where the FBX header,
+    the take header and the footer live, so it is cheap even for huge files
+    '''
+    fileStat = os.stat(filename)
+    fileSize = fileStat.st_size
+    
+    contentHash = hashlib.sha1()
+    fbxFile = open(filename, "rb")
+    try:
+        contentHash.update(fbxFile.read(FbxTakeIndexHashBlockSize))
+        if fileSize > FbxTakeIndexHashBlockSize:
+            fbxFile.seek(max(FbxTakeIndexHashBlockSize, fileSize - FbxTakeIndexHashBlockSize))
+            contentHash.update(fbxFile.read(FbxTakeIndexHashBlockSize))
+    finally:
+        fbxFile.close()
+        
+    return {"Size": fileSize, "MTime": fileStat.st_mtime, "Hash": contentHash.hexdigest()}
+
+def LoadTakeIndex(filename, fingerprint=None):
+    '''
+    Returns the FbxTakeRange stored next to filename, or None if it is missing or stale
+    '''
+    try:
+        indexFile = open(TakeIndexFilename(filename), "r")
+        try:
+            index = json.load(indexFile)
+        finally:
+            indexFile.close()
+    except (IOError, OSError, ValueError):
+        return None
+        
+    if fingerprint is None:
+        fingerprint = FbxFingerprint(filename)
+        
+    if index.get("Version") != FbxTakeIndexVersion:
+        return None
+        
+    for key in fingerprint:
+        if index.get(key) != fingerprint[key]:
+            return None
+            
+    return FbxTakeRange(index["HeaderEnd"], index["TakeBodyStart"], index["FooterStart"], index["Size"])
+
+def SaveTakeIndex(filename, takeRange, fingerprint=None):
+    '''
+    Writes the take index for filename, quietly giving up if the folder is read-only
+    '''
+    if fingerprint is None:
+        fingerprint = FbxFingerprint(filename)
+        
+    index = {"Version": FbxTakeIndexVersion, "HeaderEnd": takeRange.HeaderEnd,
+        "TakeBodyStart": takeRange.TakeBodyStart, "FooterStart": takeRange.FooterStart}
+    index.update(fingerprint)
+    
+    try:
+        indexFile = open(TakeIndexFilename(filename), "w")
+        try:
+            json.dump(index, indexFile, sort_keys=True)
+        finally:
+            indexFile.close()
+    except (IOError, OSError):
+        pass
+
+def FindTakeRangeIndexed(filename):
+    '''
+    FindTakeRange that reads from and keeps up to date the take index of filename
+    '''
+    fingerprint = FbxFingerprint(filename)
+    
+    takeRange = LoadTakeIndex(filename, fingerprint)
+    if takeRange is None:
+        takeRange = FindTakeRange(filename)
+        SaveTakeIndex(filename, takeRange, fingerprint)
+        
+    return takeRange
+
+def ScanTakeRanges(filenames, useIndex=True, workers=1):
+    '''
+    Returns the FbxTakeRange of every file, in the same order as filenames
+    With more than one worker (None for one per core) the files are scanned on a
+    process pool; if no pool can be started the files are scanned serially, and if the
+    pool breaks they are scanned again serially with a RuntimeWarning
+    '''
+    if useIndex:
+        findTakeRange = FindTakeRangeIndexed
+    else:
+        findTakeRange = FindTakeRange
+        
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+        
+    workers = min(workers, len(filenames))
+    if workers > 1 and Futures is not None:
+        try:
+            executor = Futures.ProcessPoolExecutor(max_workers=workers)
+        except (OSError, NotImplementedError):
+            executor = None
+            
+        if executor is not None:
+            try:
+                chunkSize = max(1, len(filenames) // (workers * 4))
+                return list(executor.map(findTakeRange, filenames, chunksize=chunkSize))
+            except BrokenProcessPool as error:
+                # A warning goes to stderr, or wherever the caller sends it, not into the output on stdout
+                warnings.warn("Take scan process pool failed, scanning serially: %s" % error, RuntimeWarning)
+            finally:
+                executor.shutdown()
+                
+    return [findTakeRange(filename) for filename in filenames]
+
+def WriteAll(destinationFd, data):
+    while len(data) > 0:
+        data = data[os.write(destinationFd, data):]
+
+def CopyFileRange(sourceFd, destinationFd, offset, count):
+    '''
+    Copies count bytes at offset in sourceFd to the current position of destinationFd
+    Prefers copy_file_range, then sendfile, then plain chunked reads
+    '''
+    copyFileRange = getattr(os, "copy_file_range", None)
+    while count > 0 and copyFileRange is not None:
+        try:
+            copied = copyFileRange(sourceFd, destinationFd, count, offset)
+        except OSError:
+            break
+            
+        if copied == 0:
+            break
+            
+        offset += copied
+        count -= copied
+        
+    sendFile = getattr(os, "sendfile", None)
+    while count > 0 and sendFile is not None:
+        try:
+            copied = sendFile(destinationFd, sourceFd, offset, count)
+        except OSError:
+            break
+            
+        if copied == 0:
+            break
+            
+        offset += copied
+        count -= copied
+        
+    if count > 0:
+        os.lseek(sourceFd, offset, os.SEEK_SET)
+        
+    while count > 0:
+        chunk = os.read(sourceFd, min(count, FbxCopyChunkSize))
+        if len(chunk) == 0:
+            raise FbxStitchError("Unexpected end of file while copying")
+            
+        WriteAll(destinationFd, chunk)
+        count -= len(chunk)
+
+def OpenBinary(filename, flags, mode=0o666):
+    return os.open(filename, flags | getattr(os, "O_BINARY", 0), mode)
+
+def ReplaceFile(sourceFilename, destinationFilename):
+    '''
+    Renames sourceFilename over destinationFilename, atomically where the platform allows
+    '''
+    replace = getattr(os, "replace", None)
+    if replace is not None:
+        replace(sourceFilename, destinationFilename)
+        return
+    
+    # Python 2 on Windows cannot rename over an existing file
+    if os.name == "nt" and os.path.exists(destinationFilename):
+        os.remove(destinationFilename)
+    
+    os.rename(sourceFilename, destinationFilename)
+
+class FbxPatchWriter:
+    '''
+    Writes a copy of a source file with some byte ranges replaced
+    Patches must be given in file order; the bytes between them are copied with CopyFileRange
+    '''
+    Filename = ""
+    
+    def __init__(self, sourceFd, filename):
+        self.Filename = filename
+        self.sourceFd = sourceFd
+        self.fd = OpenBinary(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        self.position = 0
+        
+    def Patch(self, start, end, replacement):
+        if start < self.position:
+            raise FbxStitchError("Patches must be in file order")
+            
+        CopyFileRange(self.sourceFd, self.fd, self.position, start - self.position)
+        WriteAll(self.fd, replacement)
+        self.position = end
+        
+    def Finish(self, end, sync=False):
+        '''
+        Copies the rest of the source up to end and closes the file, flushed to disk if sync
+        '''
+        CopyFileRange(self.sourceFd, self.fd, self.position, end - self.position)
+        self.position = end
+        if sync:
+            os.fsync(self.fd)
+        
+        self.Close()
+        
+    def Close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+def StitchFbxTakesFast(masterFilename, takes, useIndex=True, workers=1):
+    '''
+    Same output as StitchFbxTakes, but copies byte ranges found with FindTakeRange
+    Only the take header line is read into Python to be renamed
+    The takes are scanned with ScanTakeRanges and written by this process alone
+    '''
+    takeRanges = ScanTakeRanges([takeFilename for takeName, takeFilename in takes], useIndex, workers)
+    
+    masterFd = OpenBinary(masterFilename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    try:
+        for takeIndex in range(len(takes)):
+            takeName, takeFilename = takes[takeIndex]
+            takeRange = takeRanges[takeIndex]
+            
+            sourceFd = OpenBinary(takeFilename, os.O_RDONLY)
+            try:
+                # For the first file, pick from top of file until the take
+                if takeIndex == 0:
+                    CopyFileRange(sourceFd, masterFd, 0, takeRange.HeaderEnd)
+                    
+                # Patch the take header and copy the rest of the take as is
+                os.lseek(sourceFd, takeRange.HeaderEnd, os.SEEK_SET)
+                takeHeader = os.read(sourceFd, takeRange.TakeBodyStart - takeRange.HeaderEnd)
+                WriteAll(masterFd, takeHeader.replace(FbxBytes(FbxDefaultTakeName), FbxBytes(takeName), 1))
+                CopyFileRange(sourceFd, masterFd, takeRange.TakeBodyStart, takeRange.FooterStart - takeRange.TakeBodyStart)
+                
+                # For the last file, pick after the take to the bottom of file
+                if takeIndex == len(takes) - 1:
+                    CopyFileRange(sourceFd, masterFd, takeRange.FooterStart, takeRange.FileSize - takeRange.FooterStart)
+            finally:
+                os.close(sourceFd)
+    finally:
+        os.close(masterFd)
+
+'''
+FBX take curves
+
+Decodes the Channel/Key blocks of FBX 6.1 takes into NumPy arrays, one time
+array (FBX ticks) and one value array per channel. The key lists are split and
+converted by NumPy as a whole instead of token by token.
+
+The same key splitting is used to cut a take exported once for the whole
+timeline into one take per animation.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxAscii import *
+    from FbxStitcher import *
+except ImportError:
+    pass
+
+FbxTicksPerSecond = 46186158000
+
+# Interpolation codes that follow the time and value of every key
+FbxKeyInterpolations = [b"C", b"L", b"U"]
+
+# Keys written per line when a Key node is rewritten
+FbxKeysPerLine = 4
+
+def RequireNumpy():
+    if Numpy is None:
+        raise ImportError("NumPy is required for FBX curve processing")
+
+def FramesToTicks(frames, framesPerSecond):
+    return Numpy.round(Numpy.asarray(frames, dtype=Numpy.float64) * FbxTicksPerSecond / framesPerSecond).astype(Numpy.int64)
+
+def TicksToFrames(ticks, framesPerSecond):
+    return Numpy.asarray(ticks, dtype=Numpy.float64) * framesPerSecond / FbxTicksPerSecond
+
+class FbxCurve:
+    '''
+    The keys of one channel of a take, e.g. Model::Hips Transform/T/X
+    '''
+    Model = ""
+    Channel = ""
+    Times = None
+    Values = None
+    Default = 0.0
+    Node = None
+    
+    def __init__(self, model, channel, times, values, default=0.0, node=None):
+        self.Model = model
+        self.Channel = channel
+        self.Times = times
+        self.Values = values
+        self.Default = default
+        self.Node = node
+        
+    def Name(self):
+        return "%s/%s" % (self.Model, self.Channel)
+        
+    def Count(self):
+        return len(self.Times)
+
+def SplitKeyRecords(rawKeys):
+    '''
+    Splits the raw value of a Key node into an array of tokens and the index of
+    the first token (the time) of every key. A key is time, value, then an
+    interpolation code (C, L or U) followed by a variable number of extras.
+    '''
+    RequireNumpy()
+    
+    compactKeys = bytes(rawKeys).translate(None, b" \t\r\n")
+    if len(compactKeys) == 0:
+        return Numpy.array([], dtype="S1"), Numpy.array([], dtype=Numpy.intp)
+        
+    tokens = Numpy.array(compactKeys.split(b","))
+    
+    firstBytes = tokens.view(Numpy.uint8).reshape(len(tokens), tokens.dtype.itemsize)[:, 0]
+    isWord = ((firstBytes >= ord("A")) & (firstBytes <= ord("Z"))) | ((firstBytes >= ord("a")) & (firstBytes <= ord("z")))
+    isInterpolation = Numpy.zeros(len(tokens), dtype=bool)
+    for interpolation in FbxKeyInterpolations:
+        isInterpolation |= tokens == interpolation
+        
+    isStart = ~isWord[:-2] & ~isWord[1:-1] & isInterpolation[2:]
+    return tokens, Numpy.flatnonzero(isStart)
+
+def DecodeKeys(rawKeys, keyCount=None):
+    '''
+    Returns the times (int64 ticks) and values (float64) of the raw value of a Key node
+    '''
+    tokens, starts = SplitKeyRecords(rawKeys)
+    if keyCount is not None and len(starts) != keyCount:
+        raise FbxAsciiError("Expected %d keys, found %d" % (keyCount, len(starts)))
+        
+    return tokens[starts].astype(Numpy.int64), tokens[starts + 1].astype(Numpy.float64)
+
+def ChannelNodes(channelNode, path):
+    '''
+    Yields [path, channelNode] for channelNode and its sub-channels that have keys
+    '''
+    if len(path) > 0:
+        path = path + "/" + channelNode.Value("")
+    else:
+        path = channelNode.Value("")
+        
+    if channelNode.Find("Key") is not None or channelNode.Find("KeyCount") is not None:
+        yield path, channelNode
+        
+    for childNode in channelNode.FindAll("Channel"):
+        for childPath, childChannelNode in ChannelNodes(childNode, path):
+            yield childPath, childChannelNode
+
+def KeyedChannels(takeNode):
+    '''
+    Yields [model, path, channelNode] for every channel with keys in takeNode, in file order
+    '''
+    for modelNode in takeNode.FindAll("Model"):
+        for channelNode in modelNode.FindAll("Channel"):
+            for path, keyedChannelNode in ChannelNodes(channelNode, ""):
+                yield modelNode.Value(""), path, keyedChannelNode
+
+def ChannelCurve(model, path, channelNode):
+    keyNode = channelNode.Find("Key")
+    keyCountNode = channelNode.Find("KeyCount")
+    
+    keyCount = None
+    if keyCountNode is not None:
+        keyCount = keyCountNode.Value()
+        
+    if keyNode is not None:
+        times, values = DecodeKeys(keyNode.RawValue(), keyCount)
+    else:
+        times, values = Numpy.zeros(0, Numpy.int64), Numpy.zeros(0, Numpy.float64)
+        
+    defaultNode = channelNode.Find("Default")
+    default = 0.0
+    if defaultNode is not None:
+        default = defaultNode.Value(0.0)
+        
+    return FbxCurve(model, path, times, values, default, channelNode)
+
+def TakeCurves(takeNode):
+    '''
+    Returns the FbxCurves of every model in takeNode, in file order
+    '''
+    RequireNumpy()
+    
+    return [ChannelCurve(model, path, channelNode) for model, path, channelNode in KeyedChannels(takeNode)]
+
+def FindTakeNode(document, takeName=None):
+    '''
+    Returns the take called takeName, or for a generated per-animation file
+    (takeName None) the take at the range found by the stitcher
+    '''
+    if takeName is not None:
+        takeNode = document.FindTake(takeName)
+        if takeNode is None:
+            raise FbxAsciiError("Take \"%s\" not found in %s" % (takeName, document.Filename))
+            
+        return takeNode
+        
+    # Scanned in the mapped document; readers do not leave a take index next to the file
+    takeRange = ScanTakeRange(document.Data, document.Size)
+    position = FbxSkipPattern.match(document.Data, takeRange.HeaderEnd, takeRange.FooterStart).end()
+    return ParseFbxNode(document, position, takeRange.FooterStart)
+
+def ReadTakeCurves(filename, takeName=None):
+    '''
+    Reads the curves of a take of filename into NumPy arrays, e.g.
+    
+        for curve in ReadTakeCurves("Run.fbx"):
+            print(curve.Name(), curve.Times, curve.Values)
+    '''
+    document = FbxDocument(filename)
+    try:
+        curves = TakeCurves(FindTakeNode(document, takeName))
+    finally:
+        document.Close()
+        
+    for curve in curves:
+        curve.Node = None
+        
+    return curves
+
+def ValueLineEnding(node):
+    '''
+    Returns what ends the value of node before its line break (a carriage return
+    in CRLF files) and the line break itself
+    '''
+    if node.RawValue().endswith(b"\r"):
+        return b"\r", b"\r\n"
+        
+    return b"", b"\n"
+
+def KeyIndent(keyNode):
+    '''
+    Returns the indentation of the key lines of keyNode
+    '''
+    data = keyNode.Document.Data
+    
+    rawKeys = keyNode.RawValue()
+    lineBreak = rawKeys.find(b"\n")
+    if lineBreak >= 0:
+        keys = rawKeys[lineBreak + 1:]
+        return keys[:len(keys) - len(keys.lstrip(b" \t"))]
+        
+    line = data[keyNode.LineStart:keyNode.ValueStart]
+    return line[:len(line) - len(line.lstrip(b" \t"))] + b"    "
+
+def FormatKeys(tokens, starts, first, last, times, indent, lineBreak):
+    '''
+    Returns the keys [first, last) as the value of a Key node, with their times replaced by times
+    '''
+    if last <= first:
+        return b""
+        
+    tokenStart = starts[first]
+    if last < len(starts):
+        tokenEnd = starts[last]
+    else:
+        tokenEnd = len(tokens)
+        
+    keyTokens = tokens[tokenStart:tokenEnd].astype("S%d" % max(tokens.dtype.itemsize, 20))
+    keyStarts = starts[first:last] - tokenStart
+    keyTokens[keyStarts] = Numpy.asarray(times, dtype=Numpy.int64).astype("S20")
+    
+    pieces = keyTokens.tolist()
+    lineStarts = keyStarts[::FbxKeysPerLine].tolist() + [len(pieces)]
+    lines = [b",".join(pieces[lineStarts[i]:lineStarts[i + 1]]) for i in range(len(lineStarts) - 1)]
+    
+    return lineBreak + indent + (b"," + lineBreak + indent).join(lines)
+
+def SplitFbxTakes(sourceFilename, splits, framesPerSecond):
+    '''
+    Cuts the take of sourceFilename, exported once for the whole timeline, into one file per split
+    splits is a list of [filename, startFrame, endFrame]; like the per-animation export (an inclusive
+    cutKey up to startFrame and from endFrame, then a shift by -startFrame) the keys strictly inside
+    (startFrame, endFrame) are kept and moved by -startFrame, and LocalTime and ReferenceTime stay
+    the playback range they were exported with; everything outside the take is copied as is
+    All the files are written in a single pass over the source
+    '''
+    RequireNumpy()
+    
+    document = FbxDocument(sourceFilename)
+    writers = []
+    try:
+        takeNode = FindTakeNode(document)
+        bounds = FramesToTicks([[split[1], split[2]] for split in splits], framesPerSecond).reshape(len(splits), 2)
+        
+        sourceFd = document.file.fileno()
+        for split in splits:
+            writers.append(FbxPatchWriter(sourceFd, split[0]))
+            
+        for model, path, channelNode in KeyedChannels(takeNode):
+            keyNode = channelNode.Find("Key")
+            keyCountNode = channelNode.Find("KeyCount")
+            if keyNode is None or keyCountNode is None:
+                continue
+                
+            tokens, starts = SplitKeyRecords(keyNode.RawValue())
+            times = tokens[starts].astype(Numpy.int64)
+            firsts = Numpy.searchsorted(times, bounds[:, 0], "right")
+            lasts = Numpy.searchsorted(times, bounds[:, 1], "left")
+            
+            valueEnd, lineBreak = ValueLineEnding(keyNode)
+            indent = KeyIndent(keyNode)
+            for splitIndex in range(len(splits)):
+                first = int(firsts[splitIndex])
+                last = int(lasts[splitIndex])
+                
+                keys = FormatKeys(tokens, starts, first, last, times[first:last] - bounds[splitIndex, 0], indent, lineBreak)
+                patches = [[keyCountNode.ValueStart, keyCountNode.ValueEnd, b" %d%s" % (max(last - first, 0), valueEnd)],
+                    [keyNode.ValueStart, keyNode.ValueEnd, b" " + keys + valueEnd]]
+                    
+                for start, end, replacement in sorted(patches):
+                    writers[splitIndex].Patch(start, end, replacement)
+                    
+        for writer in writers:
+            writer.Finish(document.Size)
+    finally:
+        for writer in writers:
+            writer.Close()
+            
+        document.Close()
+
+'''
+FBX key reduction
+
+Baking puts a key on every frame of every joint channel. Before a take is stitched,
+the keys that linear interpolation between their neighbours reproduces
+within a tolerance are removed (Ramer-Douglas-Peucker), with separate
+tolerances for translation, rotation and scale channels. The kept keys are
+written as linear keys, so the error bound holds in the engine too.
+
+All the channels of a take are reduced together: each pass finds the worst
+key of every open segment of every channel at once with NumPy, and splits
+the segments that are still out of tolerance, so there are about as many
+passes as the deepest split, not one per key. The first and last key of a
+channel are always kept, so a channel that stays within its tolerance over the
+whole take is left with two; StripStaticChannels collapses those to one key.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import tempfile
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxAscii import *
+    from FbxStitcher import *
+    from FbxCurves import *
+except ImportError:
+    pass
+
+# Largest error allowed per channel kind: translation in scene units, rotation in degrees, scale as a factor
+ReductionTolerances = {"T": 0.01, "R": 0.05, "S": 0.001}
+
+# Channels named after Maya attributes (translateX...) rather than Transform/T/X
+ReductionChannelPrefixes = [["translate", "T"], ["rotate", "R"], ["scale", "S"]]
+
+# Channels of other kinds only lose keys that lie exactly on the line between their neighbours
+ReductionDefaultTolerance = 0.0
+
+def ChannelTolerance(channel, tolerances):
+    '''
+    Returns the tolerance of a channel path such as Transform/R/X (or rotateX), by its T, R or S part
+    '''
+    for part in channel.split("/"):
+        if part in tolerances:
+            return tolerances[part]
+            
+        for prefix, kind in ReductionChannelPrefixes:
+            if part.startswith(prefix) and kind in tolerances:
+                return tolerances[kind]
+                
+    return ReductionDefaultTolerance
+
+def ParseTolerances(text):
+    '''
+    Returns the tolerances of text such as "T=0.01,R=0.05,S=0.001", on top of ReductionTolerances
+    '''
+    tolerances = dict(ReductionTolerances)
+    for item in text.split(","):
+        if len(item.strip()) == 0:
+            continue
+            
+        kind, separator, value = item.partition("=")
+        if len(separator) == 0:
+            raise ValueError("Tolerance %s is not kind=value" % item.strip())
+            
+        tolerances[kind.strip()] = float(value)
+        
+    return tolerances
+
+def ReduceKeyMasks(times, values, offsets, tolerances):
+    '''
+    Returns which keys to keep, for the keys of many channels concatenated in times and values
+    Channel i has the keys offsets[i] to offsets[i + 1] and the tolerance tolerances[i]
+    The first and last key of every channel are always kept
+    '''
+    RequireNumpy()
+    
+    times = Numpy.asarray(times, dtype=Numpy.float64)
+    values = Numpy.asarray(values, dtype=Numpy.float64)
+    offsets = Numpy.asarray(offsets, dtype=Numpy.int64)
+    
+    keep = Numpy.zeros(len(times), dtype=bool)
+    counts = Numpy.diff(offsets)
+    keep[offsets[:-1][counts > 0]] = True
+    keep[offsets[1:][counts > 0] - 1] = True
+    
+    # Open segments, as their first and last key and their channel's tolerance
+    isOpen = counts > 2
+    segmentStarts = offsets[:-1][isOpen]
+    segmentEnds = offsets[1:][isOpen] - 1
+    segmentTolerances = Numpy.asarray(tolerances, dtype=Numpy.float64)[isOpen]
+    
+    while len(segmentStarts) > 0:
+        interiorCounts = segmentEnds - segmentStarts - 1
+        segments = Numpy.repeat(Numpy.arange(len(segmentStarts)), interiorCounts)
+        interiorStarts = Numpy.cumsum(interiorCounts) - interiorCounts
+        keys = segmentStarts[segments] + 1 + Numpy.arange(len(segments)) - interiorStarts[segments]
+        
+        # Distance of every interior key from the line between its segment's ends
+        startTimes, endTimes = times[segmentStarts][segments], times[segmentEnds][segments]
+        startValues, endValues = values[segmentStarts][segments], values[segmentEnds][segments]
+        spans = endTimes - startTimes
+        fractions = Numpy.where(spans > 0, (times[keys] - startTimes) / Numpy.where(spans > 0, spans, 1), 0)
+        errors = Numpy.abs(values[keys] - (startValues + (endValues - startValues) * fractions))
+        
+        worstErrors = Numpy.maximum.reduceat(errors, interiorStarts)
+        # Keys are in segment order, so the first worst key of a segment is where the segment changes
+        worstIndices = Numpy.flatnonzero(errors == worstErrors[segments])
+        worstSegments = segments[worstIndices]
+        isFirst = Numpy.concatenate([[True], worstSegments[1:] != worstSegments[:-1]])
+        worstKeys = keys[worstIndices[isFirst]]
+        
+        split = worstErrors > segmentTolerances
+        keep[worstKeys[split]] = True
+        
+        starts = Numpy.concatenate([segmentStarts[split], worstKeys[split]])
+        ends = Numpy.concatenate([worstKeys[split], segmentEnds[split]])
+        splitTolerances = Numpy.concatenate([segmentTolerances[split], segmentTolerances[split]])
+        
+        isOpen = ends - starts > 1
+        segmentStarts, segmentEnds, segmentTolerances = starts[isOpen], ends[isOpen], splitTolerances[isOpen]
+        
+    return keep
+
+def FormatLinearKeys(timeTokens, valueTokens, indent, lineBreak):
+    '''
+    Returns keys as the value of a Key node, all with linear interpolation
+    '''
+    records = [time + b"," + value + b",L" for time, value in zip(timeTokens, valueTokens)]
+    lines = [b",".join(records[first:first + FbxKeysPerLine]) for first in range(0, len(records), FbxKeysPerLine)]
+    return lineBreak + indent + (b"," + lineBreak + indent).join(lines)
+
+def StaticChannelMask(values, offsets, tolerances):
+    '''
+    Returns which channels vary by no more than their tolerance, for the keys of many channels
+    concatenated as in ReduceKeyMasks; channels without keys are not static
+    '''
+    RequireNumpy()
+    
+    values = Numpy.asarray(values, dtype=Numpy.float64)
+    offsets = Numpy.asarray(offsets, dtype=Numpy.int64)
+    
+    counts = Numpy.diff(offsets)
+    static = Numpy.zeros(len(counts), dtype=bool)
+    if (counts > 0).any():
+        # Empty channels add no keys, so the starts of the others bound their keys
+        starts = offsets[:-1][counts > 0]
+        ranges = Numpy.maximum.reduceat(values, starts) - Numpy.minimum.reduceat(values, starts)
+        static[counts > 0] = ranges <= Numpy.asarray(tolerances, dtype=Numpy.float64)[counts > 0]
+        
+    return static
+
+def RewriteFbxKeys(filename, outputFilename, takeName, tolerances, rewrite):
+    '''
+    Calls rewrite(channels, offsets, times, values) with the keyed channels of a take of filename, as
+    [model, path, channelNode, keyNode, keyCountNode, tokens, starts, tolerance], and their keys concatenated
+    rewrite returns [start, end, replacement] patches, written in place or to outputFilename, and a result
+    Returns the result
+    '''
+    RequireNumpy()
+    
+    if tolerances is None:
+        tolerances = ReductionTolerances
+        
+    if outputFilename is None:
+        outputFilename = filename
+        
+    patches = []
+    document = FbxDocument(filename)
+    try:
+        takeNode = FindTakeNode(document, takeName)
+        
+        channels = []
+        for model, path, channelNode in KeyedChannels(takeNode):
+            keyNode = channelNode.Find("Key")
+            keyCountNode = channelNode.Find("KeyCount")
+            if keyNode is None or keyCountNode is None:
+                continue
+                
+            tokens, starts = SplitKeyRecords(keyNode.RawValue())
+            channels.append([model, path, channelNode, keyNode, keyCountNode, tokens, starts, ChannelTolerance(path, tolerances)])
+            
+        offsets = Numpy.cumsum([0] + [len(channel[6]) for channel in channels])
+        times = Numpy.concatenate([Numpy.zeros(0, Numpy.int64)] + [tokens[starts].astype(Numpy.int64) for model, path, channelNode, keyNode, keyCountNode, tokens, starts, tolerance in channels])
+        values = Numpy.concatenate([Numpy.zeros(0)] + [tokens[starts + 1].astype(Numpy.float64) for model, path, channelNode, keyNode, keyCountNode, tokens, starts, tolerance in channels])
+        patches, result = rewrite(channels, offsets, times, values)
+        
+        if len(patches) > 0:
+            outputDirectory = os.path.dirname(os.path.abspath(outputFilename))
+            temporaryFd, temporaryFilename = tempfile.mkstemp(suffix=".fbx", dir=outputDirectory)
+            os.close(temporaryFd)
+            
+            written = False
+            writer = FbxPatchWriter(document.file.fileno(), temporaryFilename)
+            try:
+                for start, end, replacement in sorted(patches):
+                    writer.Patch(start, end, replacement)
+                    
+                writer.Finish(document.Size)
+                written = True
+            finally:
+                writer.Close()
+                if not written:
+                    os.remove(temporaryFilename)
+    finally:
+        document.Close()
+        
+    # The source is closed first, Windows cannot replace a file that is mapped
+    if len(patches) > 0:
+        ReplaceFile(temporaryFilename, outputFilename)
+        
+    return result
+
+def KeyPatches(keyNode, keyCountNode, keyCount, keys):
+    '''
+    Returns the patches that set the KeyCount and Key values of a channel, keys formatted as by FormatKeys
+    '''
+    valueEnd, lineBreak = ValueLineEnding(keyNode)
+    return [[keyCountNode.ValueStart, keyCountNode.ValueEnd, b" %d%s" % (keyCount, valueEnd)],
+        [keyNode.ValueStart, keyNode.ValueEnd, b" " + keys + valueEnd]]
+
+def ReduceFbxKeys(filename, outputFilename=None, tolerances=None, takeName=None):
+    '''
+    Removes the keys of a take of the FBX ASCII file filename that are within tolerance of the line
+    between the kept keys around them, in place or to outputFilename; tolerances are by channel kind
+    (T, R, S), ReductionTolerances by default, and takeName as in ReadTakeCurves
+    Returns the key count before and after
+    '''
+    def Reduce(channels, offsets, times, values):
+        keep = ReduceKeyMasks(times, values, offsets, [channel[7] for channel in channels])
+        
+        patches = []
+        for channelIndex in range(len(channels)):
+            model, path, channelNode, keyNode, keyCountNode, tokens, starts, tolerance = channels[channelIndex]
+            kept = starts[keep[offsets[channelIndex]:offsets[channelIndex + 1]]]
+            if len(kept) == len(starts):
+                continue
+                
+            lineBreak = ValueLineEnding(keyNode)[1]
+            keys = FormatLinearKeys(tokens[kept].tolist(), tokens[kept + 1].tolist(), KeyIndent(keyNode), lineBreak)
+            patches += KeyPatches(keyNode, keyCountNode, len(kept), keys)
+            
+        return patches, [len(keep), int(keep.sum())]
+        
+    return RewriteFbxKeys(filename, outputFilename, takeName, tolerances, Reduce)
+
+def StripStaticChannels(filename, outputFilename=None, tolerances=None, takeName=None, dropDefaults=True):
+    '''
+    Collapses the channels of a take of filename that stay within tolerance of one value to their
+    first key, in place or to outputFilename; with dropDefaults, a channel whose keys are all within
+    tolerance of its Default loses its keys altogether. Tolerances and takeName are as in ReduceFbxKeys
+    Run on the per-animation files, so a channel is static or not for each animation's range
+    Returns the channel count and the number of static channels
+    '''
+    def Strip(channels, offsets, times, values):
+        static = StaticChannelMask(values, offsets, [channel[7] for channel in channels])
+        
+        patches = []
+        for channelIndex in Numpy.flatnonzero(static):
+            model, path, channelNode, keyNode, keyCountNode, tokens, starts, tolerance = channels[channelIndex]
+            defaultNode = channelNode.Find("Default")
+            channelValues = values[offsets[channelIndex]:offsets[channelIndex + 1]]
+            
+            # Every key, not just the first, has to be within tolerance of the Default the channel falls back to
+            if dropDefaults and defaultNode is not None and Numpy.abs(channelValues - defaultNode.Value(0.0)).max() <= tolerance:
+                patches += KeyPatches(keyNode, keyCountNode, 0, b"")
+            elif len(starts) > 1:
+                lineBreak = ValueLineEnding(keyNode)[1]
+                keys = FormatKeys(tokens, starts, 0, 1, times[offsets[channelIndex]:offsets[channelIndex] + 1], KeyIndent(keyNode), lineBreak)
+                patches += KeyPatches(keyNode, keyCountNode, 1, keys)
+                
+        return patches, [len(channels), int(static.sum())]
+        
+    return RewriteFbxKeys(filename, outputFilename, takeName, tolerances, Strip)
+
+'''
+Animation math
+
+Rotation helpers on NumPy arrays of many frames (and joints) at once.
+Quaternions are stored x, y, z, w in the last axis; Euler angles are in
+degrees and follow Maya's rotate orders, where xyz rotates about X first.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxCurves import *
+except ImportError:
+    pass
+
+RotateOrders = ["xyz", "yzx", "zxy", "xzy", "yxz", "zyx"]
+
+# The rotate orders by the value of an FBX RotationOrder property, which differs from Maya's rotateOrder
+FbxRotationOrders = ["xyz", "xzy", "yzx", "yxz", "zxy", "zyx"]
+
+def QuaternionMultiply(a, b):
+    '''
+    Returns a * b, the rotation b followed by a
+    '''
+    ax, ay, az, aw = a[..., 0], a[..., 1], a[..., 2], a[..., 3]
+    bx, by, bz, bw = b[..., 0], b[..., 1], b[..., 2], b[..., 3]
+    return Numpy.stack([aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw,
+        aw * bw - ax * bx - ay * by - az * bz], axis=-1)
+
+def NormalizeQuaternions(quaternions):
+    return quaternions / Numpy.linalg.norm(quaternions, axis=-1)[..., None]
+
+def EulerToQuaternions(degrees, rotateOrder="xyz"):
+    '''
+    Returns the quaternions of Euler angles (..., 3) in degrees, applied in rotateOrder
+    '''
+    RequireNumpy()
+    
+    halfAngles = Numpy.radians(Numpy.asarray(degrees, dtype=Numpy.float64)) / 2
+    quaternions = Numpy.zeros(halfAngles.shape[:-1] + (4,))
+    quaternions[..., 3] = 1
+    
+    for axisName in rotateOrder:
+        axis = "xyz".index(axisName)
+        axisQuaternions = Numpy.zeros(quaternions.shape)
+        axisQuaternions[..., axis] = Numpy.sin(halfAngles[..., axis])
+        axisQuaternions[..., 3] = Numpy.cos(halfAngles[..., axis])
+        quaternions = QuaternionMultiply(axisQuaternions, quaternions)
+    
+    return quaternions
+
+def ContinuousQuaternions(quaternions, axis=0):
+    '''
+    Returns quaternions with their signs flipped so each is in the same hemisphere as the one
+    before it along axis (frames), since q and -q are the same rotation
+    '''
+    quaternions = Numpy.moveaxis(Numpy.array(quaternions, dtype=Numpy.float64), axis, 0)
+    flips = Numpy.sum(quaternions[1:] * quaternions[:-1], axis=-1) < 0
+    signs = Numpy.concatenate([Numpy.ones((1,) + flips.shape[1:]), Numpy.where(Numpy.cumsum(flips, axis=0) % 2 == 1, -1.0, 1.0)])
+    return Numpy.moveaxis(quaternions * signs[..., None], 0, axis)
+
+def QuaternionAngles(a, b):
+    '''
+    Returns the angles in degrees of the rotations between the quaternions of a and b
+    '''
+    a = NormalizeQuaternions(a)
+    b = NormalizeQuaternions(b)
+    b = Numpy.where((Numpy.sum(a * b, axis=-1) < 0)[..., None], -b, b)
+    
+    # Better than arccos of the dot product for the small angles of quantization errors
+    return Numpy.degrees(4 * Numpy.arctan2(Numpy.linalg.norm(a - b, axis=-1), Numpy.linalg.norm(a + b, axis=-1)))
+
+def SlerpQuaternions(a, b, weights):
+    '''
+    Returns the spherical interpolations from the quaternions of a to those of b by weights (0 is a),
+    along the shorter arc
+    '''
+    dots = Numpy.sum(a * b, axis=-1)
+    b = Numpy.where((dots < 0)[..., None], -b, b)
+    angles = Numpy.arccos(Numpy.clip(Numpy.abs(dots), 0, 1))
+    sines = Numpy.sin(angles)
+    
+    # Nearly equal quaternions are lerped, their sines are too small to divide by
+    small = sines < 1e-6
+    sines = Numpy.where(small, 1, sines)
+    weightsA = Numpy.where(small, 1 - weights, Numpy.sin((1 - weights) * angles) / sines)
+    weightsB = Numpy.where(small, weights, Numpy.sin(weights * angles) / sines)
+    return NormalizeQuaternions(weightsA[..., None] * a + weightsB[..., None] * b)
+
+def QuaternionsToMatrices(quaternions):
+    x, y, z, w = [quaternions[..., index] for index in range(4)]
+    return Numpy.stack([Numpy.stack([1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)], axis=-1),
+        Numpy.stack([2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)], axis=-1),
+        Numpy.stack([2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], axis=-1)], axis=-2)
+
+def NearestAngles(degrees, reference):
+    '''
+    Returns degrees plus the multiples of 360 that bring them closest to reference
+    '''
+    return degrees + 360 * Numpy.round((reference - degrees) / 360)
+
+def QuaternionsToEuler(quaternions, rotateOrder="xyz", reference=None):
+    '''
+    Returns the Euler angles (..., 3) in degrees of quaternions for rotateOrder, the inverse of
+    EulerToQuaternions; of the two solutions, the one closest to the reference angles (e.g. the
+    keys around them) is picked, unwrapped next to them, otherwise the one with a middle angle
+    within [-90, 90]
+    '''
+    RequireNumpy()
+    
+    first, middle, last = ["xyz".index(axisName) for axisName in rotateOrder]
+    sign = 1 if rotateOrder in RotateOrders[:3] else -1
+    matrices = QuaternionsToMatrices(NormalizeQuaternions(Numpy.asarray(quaternions, dtype=Numpy.float64)))
+    
+    angles = Numpy.zeros(matrices.shape[:-2] + (3,))
+    angles[..., first] = Numpy.arctan2(sign * matrices[..., last, middle], matrices[..., last, last])
+    angles[..., middle] = Numpy.arcsin(Numpy.clip(-sign * matrices[..., last, first], -1, 1))
+    angles[..., last] = Numpy.arctan2(sign * matrices[..., middle, first], matrices[..., first, first])
+    angles = Numpy.degrees(angles)
+    if reference is None:
+        return angles
+    
+    # The same rotation turned 180 degrees about the first and last axes
+    alternatives = angles + 180
+    alternatives[..., middle] = 180 - angles[..., middle]
+    
+    angles = NearestAngles(angles, reference)
+    alternatives = NearestAngles(alternatives, reference)
+    closer = Numpy.sum((alternatives - reference) ** 2, axis=-1) < Numpy.sum((angles - reference) ** 2, axis=-1)
+    return Numpy.where(closer[..., None], alternatives, angles)
+
+'''
+Animation clips
+
+The local transforms of the joints of one animation sampled on every
+frame, as NumPy arrays: translations and scales (frames, joints, 3) and
+rotations as quaternions (frames, joints, 4). Clips are made from the
+curves of an FBX take, can be resampled to another frame rate and are what
+the clip codec compresses.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import re
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxCurves import *
+    from AnimationMath import *
+except ImportError:
+    pass
+
+# Transform/T/X as FBX names the channels, translateX as Maya does
+ClipChannelPattern = re.compile(r'(?:^|/)([TRS])/([XYZ])$|^(translate|rotate|scale)([XYZ])$')
+
+ClipChannelKinds = {"T": "T", "R": "R", "S": "S", "translate": "T", "rotate": "R", "scale": "S"}
+
+class AnimationClip:
+    '''
+    The sampled local transforms of Joints over the frames of one animation, e.g.
+        
+        clip = ReadFbxClip("Run.fbx", 30)
+        clip.Rotations[10, 3]
+    
+    is the rotation of joint 3 on the 11th frame
+    '''
+    Name = ""
+    Joints = None
+    FramesPerSecond = 24
+    Translations = None
+    Rotations = None
+    Scales = None
+    
+    def __init__(self, name, joints, translations, rotations, scales, framesPerSecond=24):
+        self.Name = name
+        self.Joints = list(joints)
+        self.Translations = translations
+        self.Rotations = rotations
+        self.Scales = scales
+        self.FramesPerSecond = framesPerSecond
+    
+    def FrameCount(self):
+        return len(self.Translations)
+    
+    def JointCount(self):
+        return len(self.Joints)
+
+def ClipChannel(channel):
+    '''
+    Returns the kind (T, R or S) and axis (0 to 2) of a channel path, or None
+    '''
+    match = ClipChannelPattern.search(channel)
+    if match is None:
+        return None
+    
+    if match.group(1) is not None:
+        return ClipChannelKinds[match.group(1)], "XYZ".index(match.group(2))
+    
+    return ClipChannelKinds[match.group(3)], "XYZ".index(match.group(4))
+
+def ClipFromCurves(name, curves, framesPerSecond, rotateOrder="xyz"):
+    '''
+    Returns the AnimationClip of the transform curves of a take, sampled on every frame from the
+    first key to the last; channels without keys keep their default value
+    '''
+    RequireNumpy()
+    
+    joints = []
+    channels = {}
+    for curve in curves:
+        channel = ClipChannel(curve.Channel)
+        if channel is None:
+            continue
+        
+        if curve.Model not in channels:
+            joints.append(curve.Model)
+            channels[curve.Model] = {}
+        
+        channels[curve.Model][channel] = curve
+    
+    keyTimes = [curve.Times for jointChannels in channels.values() for curve in jointChannels.values() if curve.Count() > 0]
+    if len(keyTimes) == 0:
+        frames = Numpy.zeros(1)
+    else:
+        firstFrame = Numpy.round(TicksToFrames(min([times[0] for times in keyTimes]), framesPerSecond))
+        lastFrame = Numpy.round(TicksToFrames(max([times[-1] for times in keyTimes]), framesPerSecond))
+        frames = Numpy.arange(firstFrame, lastFrame + 1)
+    
+    sampleTicks = FramesToTicks(frames, framesPerSecond).astype(Numpy.float64)
+    
+    # Identity transforms, then every keyed channel over them
+    transforms = {"T": Numpy.zeros((len(frames), len(joints), 3)), "R": Numpy.zeros((len(frames), len(joints), 3)),
+        "S": Numpy.ones((len(frames), len(joints), 3))}
+    for jointIndex in range(len(joints)):
+        for (kind, axis), curve in channels[joints[jointIndex]].items():
+            if curve.Count() == 0:
+                transforms[kind][:, jointIndex, axis] = curve.Default
+            else:
+                transforms[kind][:, jointIndex, axis] = Numpy.interp(sampleTicks, curve.Times.astype(Numpy.float64), curve.Values)
+    
+    rotations = ContinuousQuaternions(EulerToQuaternions(transforms["R"], rotateOrder))
+    return AnimationClip(name, joints, transforms["T"], rotations, transforms["S"], framesPerSecond)
+
+def ReadFbxClip(filename, framesPerSecond, takeName=None, rotateOrder="xyz"):
+    '''
+    Returns the AnimationClip of a take of an FBX ASCII file, takeName as in ReadTakeCurves
+    '''
+    curves = ReadTakeCurves(filename, takeName)
+    if takeName is None:
+        takeName = os.path.splitext(os.path.basename(filename))[0]
+    
+    return ClipFromCurves(takeName, curves, framesPerSecond, rotateOrder)
+
+def ResampleFrames(frameCount, framesPerSecond, targetFramesPerSecond):
+    '''
+    Returns, for every frame of an animation of frameCount frames resampled at targetFramesPerSecond,
+    the frame before it and its weight toward the next one; a final frame past the end is pulled back
+    onto the last one, so the end pose is kept
+    '''
+    duration = (frameCount - 1) / float(framesPerSecond)
+    sampleCount = int(Numpy.ceil(duration * targetFramesPerSecond - 1e-9)) + 1
+    positions = Numpy.minimum(Numpy.arange(sampleCount) * (float(framesPerSecond) / targetFramesPerSecond), frameCount - 1)
+    
+    indices = Numpy.minimum(Numpy.floor(positions).astype(Numpy.int64), max(frameCount - 2, 0))
+    return indices, positions - indices
+
+def ResampleClip(clip, framesPerSecond):
+    '''
+    Returns clip resampled at framesPerSecond, slerping rotations and lerping translations and scales
+    between the frames around every new one
+    '''
+    RequireNumpy()
+    
+    if clip.FrameCount() < 2 or framesPerSecond == clip.FramesPerSecond:
+        return AnimationClip(clip.Name, clip.Joints, clip.Translations, clip.Rotations, clip.Scales, framesPerSecond)
+    
+    indices, weights = ResampleFrames(clip.FrameCount(), clip.FramesPerSecond, framesPerSecond)
+    
+    def Lerp(values):
+        return values[indices] + weights[:, None, None] * (values[indices + 1] - values[indices])
+    
+    jointWeights = Numpy.repeat(weights[:, None], clip.JointCount(), axis=1)
+    rotations = ContinuousQuaternions(SlerpQuaternions(clip.Rotations[indices], clip.Rotations[indices + 1], jointWeights))
+    return AnimationClip(clip.Name, clip.Joints, Lerp(clip.Translations), rotations, Lerp(clip.Scales), framesPerSecond)
+
+'''
+FBX resampling
+
+Baking puts a key on every frame at the scene rate, but many platforms only
+play animations at 15 or 30 fps. The keys of a per-animation file are
+rewritten on a grid of the target rate instead of re-baking in Maya:
+translation, scale and other channels are interpolated linearly, while the
+rotation channels of each model are turned into quaternions, slerped between
+the keys around every new one, and written back as Euler angles next to the
+keys they came from, in the rotate order of the model. Each channel, and each
+model's rotations as one (keys, 3) array, is resampled with NumPy at once.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxCurves import *
+    from FbxReduce import *
+    from AnimationMath import *
+    from AnimationClip import *
+except ImportError:
+    pass
+
+def ResampleTicks(firstTick, lastTick, framesPerSecond):
+    '''
+    Returns the times of the frames at framesPerSecond from firstTick to lastTick, both included
+    even if they fall between frames, so the range and its end poses are kept
+    '''
+    firstFrame, lastFrame = TicksToFrames([firstTick, lastTick], framesPerSecond)
+    ticks = FramesToTicks(Numpy.arange(Numpy.ceil(firstFrame), Numpy.floor(lastFrame) + 1), framesPerSecond)
+    ticks = ticks[(ticks > firstTick) & (ticks < lastTick)]
+    return Numpy.concatenate([[firstTick], ticks, [lastTick]]).astype(Numpy.int64)
+
+def ResampleRotations(times, degrees, ticks, rotateOrder="xyz"):
+    '''
+    Returns the Euler angles (ticks, 3) at ticks of the rotation keys degrees (times, 3), slerped
+    between the keys around each tick
+    '''
+    if len(times) < 2:
+        return Numpy.repeat(degrees[:1], len(ticks), axis=0)
+    
+    indices = Numpy.clip(Numpy.searchsorted(times, ticks, side="right") - 1, 0, len(times) - 2)
+    weights = Numpy.clip((ticks - times[indices]).astype(Numpy.float64) / (times[indices + 1] - times[indices]), 0, 1)
+    
+    quaternions = EulerToQuaternions(degrees, rotateOrder)
+    slerped = SlerpQuaternions(quaternions[indices], quaternions[indices + 1], weights)
+    
+    # Linear interpolation of the angles picks the Euler solution and its turns
+    reference = degrees[indices] + weights[:, None] * (degrees[indices + 1] - degrees[indices])
+    return QuaternionsToEuler(slerped, rotateOrder, reference)
+
+def ReadRotateOrders(document):
+    '''
+    Returns the rotate order of every model of document that has a RotationOrder property
+    '''
+    objectsNode = document.Find("Objects")
+    if objectsNode is None:
+        return {}
+    
+    rotateOrders = {}
+    for modelNode in objectsNode.FindAll("Model"):
+        propertiesNode = modelNode.Find("Properties60")
+        if propertiesNode is None:
+            continue
+        
+        rotationOrderNode = propertiesNode.Find("Property", "RotationOrder")
+        if rotationOrderNode is not None and len(rotationOrderNode.Values()) > 3:
+            rotateOrders[modelNode.Value("")] = FbxRotationOrders[int(rotationOrderNode.Values()[3])]
+    
+    return rotateOrders
+
+def FormatResampledKeys(keyNode, ticks, values):
+    lineBreak = ValueLineEnding(keyNode)[1]
+    return FormatLinearKeys([b"%d" % tick for tick in ticks.tolist()], [b"%.9g" % value for value in values.tolist()],
+        KeyIndent(keyNode), lineBreak)
+
+def ResampleFbxKeys(filename, framesPerSecond, outputFilename=None, takeName=None, rotateOrders=None):
+    '''
+    Replaces the keys of every channel of a take of filename with linear keys on the frames at
+    framesPerSecond between its first key and its last, in place or to outputFilename; rotations are slerped in
+    the rotate order of their model, from rotateOrders (model to order) or else its RotationOrder property, an
+    unkeyed rotation axis of a model taken as its Default. takeName is as in ReadTakeCurves
+    Returns the key count before and after
+    '''
+    def Resample(channels, offsets, times, values):
+        counts = Numpy.diff(offsets)
+        
+        modelRotateOrders = {}
+        if len(channels) > 0:
+            modelRotateOrders = ReadRotateOrders(channels[0][2].Document)
+        modelRotateOrders.update(rotateOrders or {})
+        
+        # The rotation channels of each model are resampled together, by axis
+        rotations = {}
+        resampled = {}
+        for channelIndex in range(len(channels)):
+            model, path = channels[channelIndex][:2]
+            channel = ClipChannel(path)
+            if channel is not None and channel[0] == "R":
+                rotations.setdefault(model, {})[channel[1]] = channelIndex
+            elif counts[channelIndex] > 1:
+                channelTimes = times[offsets[channelIndex]:offsets[channelIndex + 1]]
+                ticks = ResampleTicks(channelTimes[0], channelTimes[-1], framesPerSecond)
+                resampled[channelIndex] = [ticks, Numpy.interp(ticks, channelTimes, values[offsets[channelIndex]:offsets[channelIndex + 1]])]
+        
+        for model, axes in rotations.items():
+            keyTimes = Numpy.unique(Numpy.concatenate([times[offsets[channelIndex]:offsets[channelIndex + 1]] for channelIndex in axes.values()]))
+            if len(keyTimes) < 2:
+                continue
+            
+            degrees = Numpy.zeros((len(keyTimes), 3))
+            for axis, channelIndex in axes.items():
+                if counts[channelIndex] > 0:
+                    degrees[:, axis] = Numpy.interp(keyTimes, times[offsets[channelIndex]:offsets[channelIndex + 1]], values[offsets[channelIndex]:offsets[channelIndex + 1]])
+                else:
+                    defaultNode = channels[channelIndex][2].Find("Default")
+                    degrees[:, axis] = 0.0 if defaultNode is None else defaultNode.Value(0.0)
+            
+            ticks = ResampleTicks(keyTimes[0], keyTimes[-1], framesPerSecond)
+            angles = ResampleRotations(keyTimes, degrees, ticks, modelRotateOrders.get(model, "xyz"))
+            for axis, channelIndex in axes.items():
+                if counts[channelIndex] > 1:
+                    resampled[channelIndex] = [ticks, angles[:, axis]]
+        
+        patches = []
+        keyCount = len(values)
+        for channelIndex, (ticks, channelValues) in resampled.items():
+            model, path, channelNode, keyNode, keyCountNode, tokens, starts, tolerance = channels[channelIndex]
+            patches += KeyPatches(keyNode, keyCountNode, len(ticks), FormatResampledKeys(keyNode, ticks, channelValues))
+            keyCount += len(ticks) - counts[channelIndex]
+        
+        return patches, [len(values), int(keyCount)]
+    
+    return RewriteFbxKeys(filename, outputFilename, takeName, None, Resample)
+
+'''
+Clip codec
+
+Compresses AnimationClips for the runtime. Every track (one joint's
+translation, rotation or scale) gets the fewest bits that keep it within an
+error budget:
+
+    Translation and scale components are stored as fixed point over their
+    range in the clip, min + q * range / (2^bits - 1), with the bits worked
+    out from the range and the budget; a component that stays within the
+    budget of one value takes no bits at all.
+    
+    Rotations are packed smallest-three: the largest of the four quaternion
+    components is dropped (2 bits say which one, its sign is made positive)
+    and the other three, which lie within +-sqrt(1/2), are stored fixed point.
+    The bits are found by decoding and measuring the angle error.
+
+All the tracks are quantized and bit-packed with NumPy, over every frame at
+once, into one byte string after a small JSON header.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import json
+import math
+import struct
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxStitcher import *
+    from FbxCurves import *
+    from AnimationMath import *
+    from AnimationClip import *
+except ImportError:
+    pass
+
+ClipExtension = ".clip"
+ClipMagic = b"GSQC"
+ClipVersion = 1
+
+# Magic, version and JSON header length
+ClipHeaderFormat = "<4sII"
+
+# Error budgets: translation in scene units, rotation in degrees, scale as a factor
+ClipErrors = {"T": 0.001, "R": 0.01, "S": 0.0001}
+
+ClipMaxBits = 24
+ClipRotationMinBits = 4
+ClipRotationMaxBits = 16
+ClipRotationIndexBits = 2
+
+# Bytes of one joint at one frame uncompressed: translation, rotation and scale as float32
+ClipRawJointSize = (3 + 4 + 3) * 4
+
+# Range of the three smallest components of a unit quaternion
+SmallestThreeRange = math.sqrt(0.5)
+
+class ClipCodecError(Exception):
+    pass
+
+def PackBits(streams):
+    '''
+    Returns the bytes of the [values, bits] streams, each value in its stream's bit width, most significant bit first
+    '''
+    pieces = []
+    for values, bits in streams:
+        if bits > 0:
+            shifts = Numpy.arange(bits - 1, -1, -1, dtype=Numpy.int64)
+            pieces.append(((Numpy.asarray(values, dtype=Numpy.int64)[:, None] >> shifts) & 1).astype(Numpy.uint8).ravel())
+    
+    if len(pieces) == 0:
+        return b""
+    
+    return Numpy.packbits(Numpy.concatenate(pieces)).tobytes()
+
+def UnpackBits(data, counts, widths):
+    '''
+    Returns the streams of PackBits, given the value count and bit width of each
+    '''
+    bits = Numpy.unpackbits(Numpy.frombuffer(data, dtype=Numpy.uint8))
+    if sum([count * width for count, width in zip(counts, widths)]) > len(bits):
+        raise ClipCodecError("Clip data is %d bytes, too short for its tracks" % len(data))
+    
+    streams = []
+    position = 0
+    for count, width in zip(counts, widths):
+        if width == 0:
+            streams.append(Numpy.zeros(count, dtype=Numpy.int64))
+            continue
+        
+        weights = Numpy.int64(1) << Numpy.arange(width - 1, -1, -1, dtype=Numpy.int64)
+        streams.append(bits[position:position + count * width].reshape(count, width).astype(Numpy.int64).dot(weights))
+        position += count * width
+    
+    return streams
+
+def FixedPointBits(valueRange, error):
+    '''
+    Returns the bits that store a value over valueRange within error of it
+    Raises ClipCodecError if that takes more than ClipMaxBits
+    '''
+    if valueRange <= 2 * error:
+        return 0
+    
+    bits = int(math.ceil(math.log(valueRange / (2 * error) + 1, 2)))
+    if bits > ClipMaxBits:
+        raise ClipCodecError("Range %g needs %d bits for an error of %g, more than %d" % (valueRange, bits, error, ClipMaxBits))
+    
+    return bits
+
+def EncodeComponents(values, error):
+    '''
+    Returns the header and [quantized values, bits] streams of the three components of a translation or scale track
+    '''
+    minimums = values.min(axis=0)
+    ranges = values.max(axis=0) - minimums
+    
+    header = {"Minimums": [], "Ranges": [], "Bits": []}
+    streams = []
+    for axis in range(3):
+        bits = FixedPointBits(ranges[axis], error)
+        if bits == 0:
+            # One value, the middle of the range
+            header["Minimums"].append(float(minimums[axis] + ranges[axis] / 2))
+            header["Ranges"].append(0.0)
+        else:
+            header["Minimums"].append(float(minimums[axis]))
+            header["Ranges"].append(float(ranges[axis]))
+        
+        header["Bits"].append(bits)
+        steps = (1 << bits) - 1
+        if bits > 0:
+            streams.append([Numpy.round((values[:, axis] - minimums[axis]) / ranges[axis] * steps), bits])
+        else:
+            streams.append([Numpy.zeros(len(values)), 0])
+    
+    return header, streams
+
+def DecodeComponents(header, streams):
+    values = []
+    for axis in range(3):
+        steps = (1 << header["Bits"][axis]) - 1
+        if steps == 0:
+            values.append(Numpy.full(len(streams[axis]), header["Minimums"][axis]))
+        else:
+            values.append(header["Minimums"][axis] + streams[axis] * (header["Ranges"][axis] / steps))
+    
+    return Numpy.stack(values, axis=-1)
+
+def QuantizeSmallestThree(quaternions, bits):
+    '''
+    Returns the index of the largest component and the three others quantized to bits
+    '''
+    largest = Numpy.argmax(Numpy.abs(quaternions), axis=-1)
+    signs = Numpy.where(quaternions[Numpy.arange(len(quaternions)), largest] < 0, -1.0, 1.0)
+    positive = quaternions * signs[:, None]
+    
+    # The other three components, in order
+    others = Numpy.array([[component for component in range(4) if component != index] for index in range(4)])[largest]
+    smallest = positive[Numpy.arange(len(quaternions))[:, None], others]
+    
+    steps = (1 << bits) - 1
+    quantized = Numpy.round((Numpy.clip(smallest, -SmallestThreeRange, SmallestThreeRange) + SmallestThreeRange) / (2 * SmallestThreeRange) * steps)
+    return largest, quantized
+
+def DequantizeSmallestThree(largest, quantized, bits):
+    steps = (1 << bits) - 1
+    smallest = quantized / float(steps) * (2 * SmallestThreeRange) - SmallestThreeRange
+    largestValues = Numpy.sqrt(Numpy.maximum(0.0, 1.0 - Numpy.sum(smallest * smallest, axis=-1)))
+    
+    quaternions = Numpy.zeros((len(largest), 4))
+    others = Numpy.array([[component for component in range(4) if component != index] for index in range(4)])[largest]
+    quaternions[Numpy.arange(len(largest))[:, None], others] = smallest
+    quaternions[Numpy.arange(len(largest)), largest] = largestValues
+    return NormalizeQuaternions(quaternions)
+
+def EncodeRotations(quaternions, error):
+    '''
+    Returns the header and [quantized values, bits] streams of a rotation track
+    Raises ClipCodecError if ClipRotationMaxBits do not keep it within error
+    '''
+    quaternions = NormalizeQuaternions(quaternions)
+    if QuaternionAngles(quaternions, quaternions[:1]).max() <= error:
+        return {"Bits": 0, "Constant": [float(component) for component in quaternions[0]]}, []
+    
+    for bits in range(ClipRotationMinBits, ClipRotationMaxBits + 1):
+        largest, quantized = QuantizeSmallestThree(quaternions, bits)
+        angle = QuaternionAngles(DequantizeSmallestThree(largest, quantized, bits), quaternions).max()
+        if angle <= error:
+            break
+    else:
+        raise ClipCodecError("Rotation error %g at %d bits, over the budget of %g" % (angle, ClipRotationMaxBits, error))
+    
+    streams = [[largest, ClipRotationIndexBits]] + [[quantized[:, axis], bits] for axis in range(3)]
+    return {"Bits": bits}, streams
+
+def DecodeRotations(header, streams, frameCount):
+    if header["Bits"] == 0:
+        return Numpy.tile(Numpy.array(header["Constant"]), (frameCount, 1))
+    
+    return ContinuousQuaternions(DequantizeSmallestThree(streams[0], Numpy.stack(streams[1:4], axis=-1), header["Bits"]))
+
+class EncodedClip:
+    '''
+    A compressed AnimationClip: a header of the joints and the range and bits of every
+    track, and the packed track data
+    '''
+    Header = None
+    Data = b""
+    
+    def __init__(self, header, data):
+        self.Header = header
+        self.Data = data
+    
+    def Bytes(self):
+        header = FbxBytes(json.dumps(self.Header, separators=(",", ":"), sort_keys=True))
+        return struct.pack(ClipHeaderFormat, ClipMagic, ClipVersion, len(header)) + header + self.Data
+
+def ParseEncodedClip(data):
+    '''
+    Returns the EncodedClip of the Bytes of one
+    '''
+    headerSize = struct.calcsize(ClipHeaderFormat)
+    if len(data) < headerSize:
+        raise ClipCodecError("Not a clip, %d bytes" % len(data))
+    
+    magic, version, headerLength = struct.unpack(ClipHeaderFormat, data[:headerSize])
+    if magic != ClipMagic:
+        raise ClipCodecError("Not a clip")
+    
+    if version != ClipVersion:
+        raise ClipCodecError("Clip version %d, expected %d" % (version, ClipVersion))
+    
+    header = json.loads(data[headerSize:headerSize + headerLength].decode("utf-8"))
+    return EncodedClip(header, data[headerSize + headerLength:])
+
+def EncodeClip(clip, errors=None):
+    '''
+    Returns the EncodedClip of clip, every track within the error budgets of errors
+    (by kind, T, R and S; ClipErrors by default)
+    '''
+    RequireNumpy()
+    
+    budgets = dict(ClipErrors)
+    budgets.update(errors or {})
+    
+    tracks = []
+    streams = []
+    for jointIndex in range(clip.JointCount()):
+        try:
+            translationHeader, translationStreams = EncodeComponents(clip.Translations[:, jointIndex], budgets["T"])
+            rotationHeader, rotationStreams = EncodeRotations(clip.Rotations[:, jointIndex], budgets["R"])
+            scaleHeader, scaleStreams = EncodeComponents(clip.Scales[:, jointIndex], budgets["S"])
+        except ClipCodecError as exception:
+            raise ClipCodecError("%s: %s" % (clip.Joints[jointIndex], exception))
+                
+        tracks.append({"T": translationHeader, "R": rotationHeader, "S": scaleHeader})
+        streams += translationStreams + rotationStreams + scaleStreams
+    
+    header = {"Name": clip.Name, "FramesPerSecond": clip.FramesPerSecond, "FrameCount": clip.FrameCount(),
+        "Joints": clip.Joints, "Tracks": tracks}
+    return EncodedClip(header, PackBits(streams))
+
+def DecodeClip(encodedClip):
+    '''
+    Returns the AnimationClip of an EncodedClip
+    '''
+    RequireNumpy()
+    
+    header = encodedClip.Header
+    frameCount = header["FrameCount"]
+    
+    widths = []
+    for track in header["Tracks"]:
+        widths += track["T"]["Bits"]
+        if track["R"]["Bits"] > 0:
+            widths += [ClipRotationIndexBits] + [track["R"]["Bits"]] * 3
+        
+        widths += track["S"]["Bits"]
+    
+    streams = UnpackBits(encodedClip.Data, [frameCount] * len(widths), widths)
+    
+    translations, rotations, scales = [], [], []
+    position = 0
+    for track in header["Tracks"]:
+        translations.append(DecodeComponents(track["T"], streams[position:position + 3]))
+        position += 3
+        
+        rotationStreamCount = 4 if track["R"]["Bits"] > 0 else 0
+        rotations.append(DecodeRotations(track["R"], streams[position:position + rotationStreamCount], frameCount))
+        position += rotationStreamCount
+        
+        scales.append(DecodeComponents(track["S"], streams[position:position + 3]))
+        position += 3
+    
+    shape = (frameCount, 0, 3)
+    return AnimationClip(header["Name"], header["Joints"],
+        Numpy.stack(translations, axis=1) if len(translations) > 0 else Numpy.zeros(shape),
+        Numpy.stack(rotations, axis=1) if len(rotations) > 0 else Numpy.zeros((frameCount, 0, 4)),
+        Numpy.stack(scales, axis=1) if len(scales) > 0 else Numpy.zeros(shape), header["FramesPerSecond"])
+
+def WriteClipFile(filename, encodedClip):
+    clipFile = open(filename, "wb")
+    try:
+        clipFile.write(encodedClip.Bytes())
+    finally:
+        clipFile.close()
+
+def ReadClipFile(filename):
+    '''
+    Returns the AnimationClip stored in filename
+    '''
+    clipFile = open(filename, "rb")
+    try:
+        return DecodeClip(ParseEncodedClip(clipFile.read()))
+    finally:
+        clipFile.close()
+
+def EncodeFbxClip(fbxFilename, framesPerSecond, clipFilename=None, errors=None, targetFramesPerSecond=None):
+    '''
+    Writes the take of a per-animation FBX file as a clip, by default next to it, resampled from
+    framesPerSecond to targetFramesPerSecond if given
+    Returns the clip filename and its size next to that of the uncompressed float32 tracks
+    '''
+    clip = ReadFbxClip(fbxFilename, framesPerSecond)
+    if targetFramesPerSecond is not None:
+        clip = ResampleClip(clip, targetFramesPerSecond)
+    if clipFilename is None:
+        clipFilename = os.path.splitext(fbxFilename)[0] + ClipExtension
+    
+    encodedClip = EncodeClip(clip, errors)
+    WriteClipFile(clipFilename, encodedClip)
+    return [clipFilename, len(encodedClip.Bytes()), clip.FrameCount() * clip.JointCount() * ClipRawJointSize]
+
+'''
+FBX binary writer
+
+Writes binary FBX 6.1 files node by node, so a file can be streamed out
+without building it in memory first. FBX 6.1 has no array properties, so
+numeric lists (vertices, indices) get one property per element.
+
+ConvertFbxToBinary streams an FBX 6.1 ASCII file, like the stitched master,
+into binary FBX 6.1, the same node tree in the other encoding. Nothing is
+translated to the FBX 7 object and connection graph: the takes keep their
+Model, Channel and Key nodes, and every key keeps its record, time (int64),
+value, interpolation and tangent flags (chars) and tangent data (doubles), so
+linear keys stay linear.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import struct
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxAscii import *
+    from FbxStitcher import *
+    from FbxCurves import *
+except ImportError:
+    pass
+
+FbxBinaryVersion = 6100
+FbxBinaryMagic = b"Kaydara FBX Binary  \x00\x1a\x00"
+FbxBinaryFooterId = b"\xfa\xbc\xab\x09\xd0\xc8\xd4\x66\xb1\x76\xfb\x83\x1c\xf7\x26\x7e"
+FbxBinaryFooterMagic = b"\xf8\x5a\x8c\x6a\xde\xf5\xd9\x7e\xec\xe9\x0c\xe3\x75\x8f\x29\x0b"
+
+# ASCII value lists longer than this many bytes are checked for being all numbers
+FbxNumericArrayThreshold = 256
+
+FbxScalarTypeCodes = {"f8": b"D", "f4": b"F", "i8": b"L", "i4": b"I", "b1": b"C"}
+
+# ASCII nodes whose whole numbers are doubles or KTime (int64) in the binary file
+FbxDoubleNodes = ["Default", "Color"]
+
+FbxTimeNodes = ["LocalTime", "ReferenceTime"]
+
+# Property types (the second value of a 6.1 Property) whose values are doubles or KTime
+FbxDoublePropertyTypes = ["double", "Number", "Real", "Float", "Vector", "Vector3D", "ColorRGB", "Color", "Lcl Translation",
+    "Lcl Rotation", "Lcl Scaling", "Visibility"]
+
+FbxTimePropertyTypes = ["KTime"]
+
+class FbxChar:
+    '''
+    A one character property, like the interpolation flags of FBX 6.1 keys
+    '''
+    Character = b""
+    
+    def __init__(self, character):
+        self.Character = FbxBytes(character)[:1]
+
+class FbxBinaryWriter:
+    '''
+    Streams nodes into a binary FBX file, e.g.
+    
+        writer = FbxBinaryWriter("Master.fbx")
+        writer.BeginNode("Takes")
+        writer.WriteNode("Current", ["Run"])
+        writer.EndNode()
+        writer.Close()
+        
+    Node lengths are patched in when each node ends, so the file must be seekable
+    '''
+    Filename = ""
+    Version = FbxBinaryVersion
+    
+    def __init__(self, filename, version=FbxBinaryVersion):
+        self.Filename = filename
+        self.Version = version
+        self.stack = []
+        
+        self.offsetFormat = "<I"
+        self.headerFormat = "<III"
+        self.nullRecord = b"\x00" * (struct.calcsize(self.headerFormat) + 1)
+        
+        self.file = open(filename, "wb")
+        self.file.write(FbxBinaryMagic + struct.pack("<I", version))
+        
+    def ArrayType(self, array):
+        dtypeKey = "%s%d" % (array.dtype.kind, array.dtype.itemsize)
+        if array.dtype.kind == "b":
+            dtypeKey = "b1"
+            
+        if dtypeKey not in FbxScalarTypeCodes:
+            raise ValueError("Unsupported array type %s" % array.dtype)
+            
+        return dtypeKey
+    
+    def EncodeScalars(self, array):
+        '''
+        Encodes the elements of array as one property each
+        '''
+        array = Numpy.ascontiguousarray(array)
+        dtypeKey = self.ArrayType(array)
+        
+        records = Numpy.empty((len(array), 1 + array.dtype.itemsize), dtype=Numpy.uint8)
+        records[:, 0] = ord(FbxScalarTypeCodes[dtypeKey])
+        records[:, 1:] = array.astype(array.dtype.newbyteorder("<")).view(Numpy.uint8).reshape(len(array), array.dtype.itemsize)
+        return records.tobytes()
+    
+    def EncodeProperty(self, value):
+        '''
+        Encodes one property: bool, FbxChar, int (int64 NumPy scalars as L), float or text/bytes
+        '''
+        if isinstance(value, bool):
+            return b"C" + struct.pack("<B", value)
+            
+        if isinstance(value, FbxChar):
+            return b"C" + value.Character
+        
+        if Numpy is not None and isinstance(value, Numpy.int64):
+            return b"L" + struct.pack("<q", value)
+        
+        if isinstance(value, float):
+            return b"D" + struct.pack("<d", value)
+            
+        if hasattr(value, "__index__"):
+            value = int(value)
+            if -(1 << 31) <= value < (1 << 31):
+                return b"I" + struct.pack("<i", value)
+                
+            return b"L" + struct.pack("<q", value)
+            
+        value = FbxBytes(value)
+        return b"S" + struct.pack("<I", len(value)) + value
+        
+    def BeginNode(self, name, properties=()):
+        propertyCount = 0
+        encodedProperties = []
+        for value in properties:
+            # FBX 6.1 has no array properties, the elements are written one by one
+            if Numpy is not None and isinstance(value, Numpy.ndarray):
+                encodedProperties.append(self.EncodeScalars(value))
+                propertyCount += len(value)
+            else:
+                encodedProperties.append(self.EncodeProperty(value))
+                propertyCount += 1
+        
+        self.BeginEncodedNode(name, propertyCount, b"".join(encodedProperties))
+    
+    def BeginEncodedNode(self, name, propertyCount, encodedProperties):
+        '''
+        Begins a node whose propertyCount properties are already encoded
+        '''
+        if len(self.stack) > 0:
+            self.stack[-1][1] = True
+            
+        nameBytes = FbxBytes(name)
+        
+        recordStart = self.file.tell()
+        self.file.write(struct.pack(self.headerFormat, 0, propertyCount, len(encodedProperties)))
+        self.file.write(struct.pack("<B", len(nameBytes)) + nameBytes)
+        self.file.write(encodedProperties)
+        
+        self.stack.append([recordStart, False, propertyCount > 0])
+        
+    def EndNode(self):
+        recordStart, hasChildren, hasProperties = self.stack.pop()
+        if hasChildren or not hasProperties:
+            self.file.write(self.nullRecord)
+            
+        recordEnd = self.file.tell()
+        self.file.seek(recordStart)
+        self.file.write(struct.pack(self.offsetFormat, recordEnd))
+        self.file.seek(recordEnd)
+        
+    def WriteNode(self, name, properties=()):
+        self.BeginNode(name, properties)
+        self.EndNode()
+        
+    def Close(self):
+        '''
+        Ends any open nodes and writes the footer
+        '''
+        if self.file is None:
+            return
+            
+        while len(self.stack) > 0:
+            self.EndNode()
+            
+        self.file.write(self.nullRecord)
+        self.file.write(FbxBinaryFooterId)
+        self.file.write(b"\x00" * 4)
+        
+        # Pad to 16 bytes, a full 16 if already aligned
+        padding = 16 - (self.file.tell() % 16)
+        self.file.write(b"\x00" * padding)
+        
+        self.file.write(struct.pack("<I", self.Version))
+        self.file.write(b"\x00" * 120)
+        self.file.write(FbxBinaryFooterMagic)
+        
+        self.file.close()
+        self.file = None
+
+def NumericArray(rawValue):
+    '''
+    Returns rawValue as an int or float NumPy array if it is a long list of
+    numbers only, otherwise None
+    '''
+    if len(rawValue) < FbxNumericArrayThreshold:
+        return None
+        
+    compactValue = bytes(rawValue).translate(None, b" \t\r\n")
+    if len(compactValue) == 0 or len(compactValue.translate(None, b"0123456789+-.eE,")) > 0:
+        return None
+        
+    tokens = Numpy.array(compactValue.split(b","))
+    if len(compactValue.translate(None, b"0123456789+-,")) == 0:
+        values = tokens.astype(Numpy.int64)
+        if values.min() >= -(1 << 31) and values.max() < (1 << 31):
+            return values.astype(Numpy.int32)
+            
+        return values
+        
+    return tokens.astype(Numpy.float64)
+
+def EncodeKeyRecords(rawKeys):
+    '''
+    Returns the property count and encoded properties of the raw value of a 6.1 Key node: the time
+    of every key as L, its value and tangent data as D and its interpolation and tangent flags as C
+    '''
+    tokens, starts = SplitKeyRecords(rawKeys)
+    if len(starts) == 0:
+        return 0, b""
+    
+    isTime = Numpy.zeros(len(tokens), dtype=bool)
+    isTime[starts] = True
+    firstBytes = tokens.view(Numpy.uint8).reshape(len(tokens), tokens.dtype.itemsize)[:, 0]
+    isFlag = ((firstBytes >= ord("A")) & (firstBytes <= ord("Z"))) | ((firstBytes >= ord("a")) & (firstBytes <= ord("z")))
+    isNumber = ~isTime & ~isFlag
+    
+    sizes = Numpy.where(isFlag, 2, 9)
+    offsets = Numpy.concatenate([[0], Numpy.cumsum(sizes)[:-1]])
+    encoded = Numpy.zeros(int(sizes.sum()), dtype=Numpy.uint8)
+    
+    encoded[offsets[isFlag]] = ord("C")
+    encoded[offsets[isFlag] + 1] = firstBytes[isFlag]
+    
+    for mask, typeCode, values in [[isTime, b"L", tokens[isTime].astype(Numpy.int64).astype("<i8")],
+        [isNumber, b"D", tokens[isNumber].astype(Numpy.float64).astype("<f8")]]:
+        encoded[offsets[mask]] = ord(typeCode)
+        encoded[(offsets[mask] + 1)[:, None] + Numpy.arange(8)] = values.view(Numpy.uint8).reshape(len(values), 8)
+    
+    return len(tokens), encoded.tobytes()
+
+def TypedValues(node):
+    '''
+    Returns the values of an ASCII node with the whole numbers that stand for doubles or KTime
+    converted, the way the binary format stores them
+    '''
+    values = list(node.Values())
+    first = len(values)
+    numberType = None
+    if node.Name in FbxDoubleNodes:
+        first = 0
+        numberType = float
+    elif node.Name in FbxTimeNodes:
+        first = 0
+        numberType = Numpy.int64
+    elif node.Name == "Property" and len(values) > 3:
+        first = 3
+        if values[1] in FbxDoublePropertyTypes:
+            numberType = float
+        elif values[1] in FbxTimePropertyTypes:
+            numberType = Numpy.int64
+    
+    if numberType is None:
+        return values
+    
+    return values[:first] + [numberType(value) if isinstance(value, (int, float)) else value for value in values[first:]]
+
+def WriteBinaryNode(writer, node):
+    '''
+    Writes node and its children, converting the values of the ASCII node
+    '''
+    if node.Name == "Key":
+        propertyCount, encodedProperties = EncodeKeyRecords(node.RawValue())
+        writer.BeginEncodedNode(node.Name, propertyCount, encodedProperties)
+        writer.EndNode()
+        return
+        
+    array = NumericArray(node.RawValue())
+    if array is not None:
+        writer.BeginNode(node.Name, [array])
+    else:
+        writer.BeginNode(node.Name, TypedValues(node))
+    
+    for childNode in node.Children():
+        WriteBinaryNode(writer, childNode)
+        
+    writer.EndNode()
+
+def ConvertFbxToBinary(asciiFilename, binaryFilename):
+    '''
+    Streams the FBX 6.1 ASCII file asciiFilename into the binary FBX 6.1 file binaryFilename
+    Only one top level node is parsed at a time
+    '''
+    RequireNumpy()
+    
+    document = FbxDocument(asciiFilename)
+    writer = FbxBinaryWriter(binaryFilename, FbxBinaryVersion)
+    try:
+        for node in ParseFbxNodes(document, 0, document.Size, True):
+            WriteBinaryNode(writer, node)
+    finally:
+        writer.Close()
+        document.Close()
+
+'''
+Export bundle
+
+Streams export artifacts (FBX files, playblasts, CSV) into a single zip file
+as they are produced. Entries are compressed in chunks on a thread pool and
+written with data descriptors, so nothing has to be known up front and the
+archive is written once, front to back. A manifest.json entry lists what the
+bundle holds. Zip64 records are used when an entry or the archive passes 4 GB.
+The archive is written under a .partial name and only renamed to its own once
+closed, so an aborted or failed export never looks like a finished bundle.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import time
+import json
+import zlib
+import struct
+import collections
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxStitcher import *
+except ImportError:
+    pass
+
+BundleChunkSize = 1 << 20
+BundleManifestName = "manifest.json"
+BundlePartialSuffix = ".partial"
+
+ZipLocalHeaderSignature = 0x04034b50
+ZipDataDescriptorSignature = 0x08074b50
+ZipCentralHeaderSignature = 0x02014b50
+ZipEndSignature = 0x06054b50
+Zip64EndSignature = 0x06064b50
+Zip64LocatorSignature = 0x07064b50
+
+# Sizes stored in the data descriptor, UTF-8 names
+ZipFlags = 0x0008 | 0x0800
+ZipDeflated = 8
+ZipVersion = 45
+ZipLimit = 0xFFFFFFFF
+
+def CompressChunk(chunk, level, last):
+    '''
+    Deflates one chunk of an entry on its own. Every chunk but the last ends with a
+    sync flush, so the compressed chunks can simply be written one after the other
+    '''
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    if last:
+        return compressor.compress(chunk) + compressor.flush(zlib.Z_FINISH)
+        
+    return compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+def DosDateTime(timestamp):
+    localTime = time.localtime(timestamp)
+    dosDate = ((max(localTime.tm_year, 1980) - 1980) << 9) | (localTime.tm_mon << 5) | localTime.tm_mday
+    dosTime = (localTime.tm_hour << 11) | (localTime.tm_min << 5) | (localTime.tm_sec // 2)
+    return dosDate, dosTime
+
+class BundleEntry:
+    '''
+    A file-like entry of an ExportBundle that is being written
+    '''
+    Name = ""
+    Size = 0
+    CompressedSize = 0
+    Crc32 = 0
+    Offset = 0
+    
+    def __init__(self, bundle, name):
+        self.Name = name
+        self.bundle = bundle
+        self.buffer = []
+        self.bufferSize = 0
+        self.pending = collections.deque()
+        self.closed = False
+        
+        self.Offset = bundle.position
+        self.dosDate, self.dosTime = DosDateTime(time.time())
+        bundle.WriteLocalHeader(self)
+        
+    def write(self, data):
+        data = FbxBytes(data)
+        self.buffer.append(data)
+        self.bufferSize += len(data)
+        
+        if self.bufferSize >= BundleChunkSize:
+            self.QueueChunk(False)
+            
+    def QueueChunk(self, last):
+        chunk = b"".join(self.buffer)
+        self.buffer = []
+        self.bufferSize = 0
+        
+        self.Size += len(chunk)
+        self.Crc32 = zlib.crc32(chunk, self.Crc32)
+        self.pending.append(self.bundle.pool.apply_async(CompressChunk, (chunk, self.bundle.CompressLevel, last)))
+        
+        # Keep a bounded number of chunks in flight, writing them back in order
+        while len(self.pending) > 0 and (last or len(self.pending) > 2 * self.bundle.Workers):
+            compressed = self.pending.popleft().get()
+            self.bundle.Write(compressed)
+            self.CompressedSize += len(compressed)
+            
+    def close(self):
+        if self.closed:
+            return
+            
+        self.QueueChunk(True)
+        self.Crc32 &= 0xFFFFFFFF
+        self.bundle.WriteDataDescriptor(self)
+        self.closed = True
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        self.close()
+
+class ExportBundle:
+    '''
+    A zip file that export artifacts are streamed into, e.g.
+    
+        bundle = ExportBundle("Export.zip")
+        bundle.AddFile("Run.fbx", "C:/Temp/Run.fbx")
+        csvEntry = bundle.OpenEntry("Export.csv")
+        csvEntry.write("Animation Name,Start Frame,End Frame\\n")
+        csvEntry.close()
+        bundle.Close()
+    
+    Abort() instead of Close() removes what was written
+    '''
+    Filename = ""
+    Workers = 1
+    CompressLevel = 6
+    
+    def __init__(self, filename, workers=None, compressLevel=6):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+            
+        self.Filename = filename
+        self.Workers = max(1, workers)
+        self.CompressLevel = compressLevel
+        self.Entries = []
+        
+        self.partialFilename = filename + BundlePartialSuffix
+        self.pool = ThreadPool(self.Workers)
+        self.file = open(self.partialFilename, "wb")
+        self.position = 0
+        self.entry = None
+        
+    def Write(self, data):
+        self.file.write(data)
+        self.position += len(data)
+        
+    def WriteLocalHeader(self, entry):
+        nameBytes = FbxBytes(entry.Name)
+        
+        # Zip64 sizes are always reserved since the entry size is not known yet
+        extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0)
+        self.Write(struct.pack("<IHHHHHIIIHH", ZipLocalHeaderSignature, ZipVersion, ZipFlags, ZipDeflated,
+            entry.dosTime, entry.dosDate, 0, ZipLimit, ZipLimit, len(nameBytes), len(extra)) + nameBytes + extra)
+            
+    def WriteDataDescriptor(self, entry):
+        self.Write(struct.pack("<IIQQ", ZipDataDescriptorSignature, entry.Crc32, entry.CompressedSize, entry.Size))
+        
+    def OpenEntry(self, name):
+        '''
+        Starts a new entry and returns it to be written to; entries are written one at a time
+        '''
+        if self.entry is not None:
+            self.entry.close()
+            
+        self.entry = BundleEntry(self, name)
+        self.Entries.append(self.entry)
+        return self.entry
+        
+    def AddBytes(self, name, data):
+        entry = self.OpenEntry(name)
+        entry.write(data)
+        entry.close()
+        
+    def AddFile(self, name, filename, remove=False):
+        '''
+        Streams filename into the entry name, removing the file afterwards if asked to
+        '''
+        entry = self.OpenEntry(name)
+        
+        sourceFile = open(filename, "rb")
+        try:
+            chunk = sourceFile.read(BundleChunkSize)
+            while len(chunk) > 0:
+                entry.write(chunk)
+                chunk = sourceFile.read(BundleChunkSize)
+        finally:
+            sourceFile.close()
+            
+        entry.close()
+        
+        if remove:
+            os.remove(filename)
+            
+    def WriteManifest(self):
+        manifest = {"Entries": [{"Name": entry.Name, "Size": entry.Size, "CompressedSize": entry.CompressedSize,
+            "Crc32": entry.Crc32} for entry in self.Entries]}
+            
+        self.AddBytes(BundleManifestName, json.dumps(manifest, indent=4, sort_keys=True))
+        
+    def WriteCentralDirectory(self):
+        centralStart = self.position
+        
+        for entry in self.Entries:
+            nameBytes = FbxBytes(entry.Name)
+            
+            # Only the values that do not fit go into the zip64 extra, in this order
+            zip64Values = []
+            size = entry.Size
+            if size >= ZipLimit:
+                zip64Values.append(size)
+                size = ZipLimit
+                
+            compressedSize = entry.CompressedSize
+            if compressedSize >= ZipLimit:
+                zip64Values.append(compressedSize)
+                compressedSize = ZipLimit
+                
+            offset = entry.Offset
+            if offset >= ZipLimit:
+                zip64Values.append(offset)
+                offset = ZipLimit
+                
+            extra = b""
+            if len(zip64Values) > 0:
+                extra = struct.pack("<HH%dQ" % len(zip64Values), 0x0001, 8 * len(zip64Values), *zip64Values)
+                
+            self.Write(struct.pack("<IHHHHHHIIIHHHHHII", ZipCentralHeaderSignature, ZipVersion | (3 << 8), ZipVersion,
+                ZipFlags, ZipDeflated, entry.dosTime, entry.dosDate, entry.Crc32, compressedSize, size,
+                len(nameBytes), len(extra), 0, 0, 0, 0o644 << 16, offset) + nameBytes + extra)
+                
+        centralEnd = self.position
+        centralSize = centralEnd - centralStart
+        
+        if len(self.Entries) >= 0xFFFF or centralStart >= ZipLimit or centralSize >= ZipLimit:
+            self.Write(struct.pack("<IQHHIIQQQQ", Zip64EndSignature, 44, ZipVersion | (3 << 8), ZipVersion, 0, 0,
+                len(self.Entries), len(self.Entries), centralSize, centralStart))
+            self.Write(struct.pack("<IIQI", Zip64LocatorSignature, 0, centralEnd, 1))
+            self.Write(struct.pack("<IHHHHIIH", ZipEndSignature, 0, 0, 0xFFFF, 0xFFFF, ZipLimit, ZipLimit, 0))
+        else:
+            self.Write(struct.pack("<IHHHHIIH", ZipEndSignature, 0, 0, len(self.Entries), len(self.Entries),
+                centralSize, centralStart, 0))
+                
+    def CloseFile(self):
+        self.file.close()
+        self.file = None
+        self.pool.close()
+        self.pool.join()
+    
+    def Close(self):
+        '''
+        Finishes the open entry, writes the manifest and the zip directory, and moves the
+        bundle to Filename; if that fails the partial file is removed
+        '''
+        if self.file is None:
+            return
+            
+        completed = False
+        try:
+            if self.entry is not None:
+                self.entry.close()
+                
+            self.WriteManifest()
+            self.WriteCentralDirectory()
+            completed = True
+        finally:
+            self.CloseFile()
+            if completed:
+                ReplaceFile(self.partialFilename, self.Filename)
+            else:
+                os.remove(self.partialFilename)
+    
+    def Abort(self):
+        '''
+        Stops writing and removes the partial bundle, leaving nothing under Filename
+        '''
+        if self.file is None:
+            return
+        
+        try:
+            self.CloseFile()
+        finally:
+            os.remove(self.partialFilename)
+
+'''
+Export farm
+
+Runs per-animation jobs (like FBX exports) on a pool of headless worker
+processes, each with its own copy of the scene loaded. Jobs and results are
+JSON lines over the workers' stdin and stdout, so any command that speaks the
+protocol can be a worker; the Sequencer uses mayapy running RunExportWorker.
+
+Every worker process is fed by its own thread. Jobs wait in a bounded queue,
+time out per job, are retried on a fresh process if a worker hangs or dies,
+and are handed back through the Results queue and an optional callback.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+import multiprocessing
+
+try:
+    import queue as Queue
+except ImportError:
+    import Queue
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxStitcher import *
+except ImportError:
+    pass
+
+# Seconds a worker may take to load the scene and report ready
+FarmReadyTimeout = 600
+
+# Seconds a single job may take by default
+FarmJobTimeout = 600
+
+# Extra attempts for a job whose worker failed, hung or died
+FarmRetries = 2
+
+# Seconds a worker gets to exit on its own once its input is closed
+FarmStopTimeout = 5
+
+class FarmError(Exception):
+    pass
+
+class FarmJob:
+    '''
+    One unit of work for the farm, a Kind of job (e.g. "fbx") and its Payload
+    After it is done either Result or Error is set
+    '''
+    Id = -1
+    Kind = ""
+    Payload = None
+    Timeout = None
+    Attempts = 0
+    Result = None
+    Error = None
+    Done = False
+    
+    def __init__(self, id, kind, payload, timeout=None):
+        self.Id = id
+        self.Kind = kind
+        self.Payload = payload
+        self.Timeout = timeout
+        
+    def Succeeded(self):
+        return self.Done and self.Error is None
+
+def WriteMessage(outputFile, message):
+    outputFile.write(FbxBytes(json.dumps(message) + "\n"))
+    outputFile.flush()
+
+def ReadMessages(inputFile, messages):
+    '''
+    Puts every JSON object read from inputFile on messages, then None at the end, and closes inputFile
+    Lines that are not JSON objects (stray output of the worker) are skipped
+    '''
+    try:
+        for line in iter(inputFile.readline, b""):
+            try:
+                message = json.loads(line.decode("utf-8"))
+            except ValueError:
+                continue
+                
+            if isinstance(message, dict):
+                messages.put(message)
+    finally:
+        inputFile.close()
+        messages.put(None)
+
+class FarmWorker:
+    '''
+    A worker process and the thread that feeds it jobs; the process is started
+    on the first job and restarted after it fails
+    '''
+    Index = 0
+    
+    def __init__(self, farm, index):
+        self.Index = index
+        self.farm = farm
+        self.process = None
+        self.messages = None
+        
+        self.thread = threading.Thread(target=self.Run)
+        self.thread.daemon = True
+        
+    def Start(self):
+        self.process = subprocess.Popen(self.farm.WorkerCommand, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            env=self.farm.Environment)
+            
+        # A new queue per process, so nothing left over from a killed one is read
+        self.messages = Queue.Queue()
+        reader = threading.Thread(target=ReadMessages, args=(self.process.stdout, self.messages))
+        reader.daemon = True
+        reader.start()
+        
+        if not self.Receive(self.farm.ReadyTimeout).get("Ready"):
+            raise FarmError("Worker %d did not report ready" % self.Index)
+            
+    def Receive(self, timeout):
+        try:
+            message = self.messages.get(timeout=timeout)
+        except Queue.Empty:
+            raise FarmError("Worker %d timed out after %d seconds" % (self.Index, timeout))
+            
+        if message is None:
+            raise FarmError("Worker %d exited with code %s" % (self.Index, self.process.wait()))
+            
+        return message
+        
+    def Stop(self):
+        if self.process is None:
+            return
+            
+        try:
+            self.process.stdin.close()
+        except (IOError, OSError):
+            pass
+            
+        stopTime = time.time() + FarmStopTimeout
+        while self.process.poll() is None and time.time() < stopTime:
+            time.sleep(0.05)
+            
+        if self.process.poll() is None:
+            self.process.kill()
+            
+        self.process.wait()
+        self.process = None
+        
+    def RunJob(self, job):
+        timeout = job.Timeout
+        if timeout is None:
+            timeout = self.farm.JobTimeout
+            
+        while True:
+            job.Attempts += 1
+            try:
+                if self.process is None:
+                    self.Start()
+                    
+                WriteMessage(self.process.stdin, {"Id": job.Id, "Kind": job.Kind, "Payload": job.Payload})
+                
+                message = self.Receive(timeout)
+                while message.get("Id") != job.Id:
+                    message = self.Receive(timeout)
+                    
+                # The worker survived a failing job, so only the job is retried
+                job.Error = message.get("Error")
+                job.Result = message.get("Result")
+            except (FarmError, IOError, OSError) as error:
+                job.Error = str(error)
+                self.Stop()
+                
+            if job.Error is None or job.Attempts > self.farm.Retries or self.farm.canceled:
+                return
+                
+    def Run(self):
+        try:
+            while True:
+                job = self.farm.jobs.get()
+                if job is None:
+                    return
+                    
+                self.RunJob(job)
+                self.farm.Finish(job)
+        finally:
+            self.Stop()
+
+class ExportFarm:
+    '''
+    Runs jobs on workerCommand processes, e.g.
+    
+        farm = ExportFarm(["mayapy", "-c", "..."], workers=8)
+        for payload in payloads:
+            farm.Submit("fbx", payload)
+        farm.Close()
+        results = [farm.Results.get() for payload in payloads]
+        
+    Submit blocks while the job queue is full. onResult is called with every
+    finished job from the worker threads; from the Maya UI poll Results instead
+    '''
+    WorkerCommand = None
+    Environment = None
+    Workers = 1
+    JobTimeout = FarmJobTimeout
+    ReadyTimeout = FarmReadyTimeout
+    Retries = FarmRetries
+    Results = None
+    
+    def __init__(self, workerCommand, workers=None, queueSize=None, jobTimeout=FarmJobTimeout, retries=FarmRetries,
+        readyTimeout=FarmReadyTimeout, onResult=None, environment=None):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+            
+        if queueSize is None:
+            queueSize = 2 * workers
+            
+        self.WorkerCommand = workerCommand
+        self.Environment = environment
+        self.Workers = max(1, workers)
+        self.JobTimeout = jobTimeout
+        self.ReadyTimeout = readyTimeout
+        self.Retries = retries
+        self.Results = Queue.Queue()
+        
+        self.onResult = onResult
+        self.jobs = Queue.Queue(queueSize)
+        self.nextId = 0
+        self.canceled = False
+        self.closed = False
+        
+        self.workers = [FarmWorker(self, index) for index in range(self.Workers)]
+        for worker in self.workers:
+            worker.thread.start()
+            
+    def Submit(self, kind, payload, timeout=None, block=True):
+        '''
+        Queues a job and returns it; raises Queue.Full if block is False and the queue is full
+        '''
+        job = FarmJob(self.nextId, kind, payload, timeout)
+        self.jobs.put(job, block)
+        self.nextId += 1
+        return job
+        
+    def IsFull(self):
+        return self.jobs.full()
+        
+    def Finish(self, job):
+        job.Done = True
+        self.Results.put(job)
+        
+        if self.onResult is not None:
+            self.onResult(job)
+            
+    def Cancel(self):
+        '''
+        Drops the queued jobs (they finish with an error); jobs already running complete
+        '''
+        self.canceled = True
+        stopCount = 0
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except Queue.Empty:
+                break
+                
+            if job is None:
+                stopCount += 1
+            else:
+                job.Error = "Canceled"
+                self.Finish(job)
+                
+        for index in range(stopCount):
+            self.jobs.put(None)
+            
+    def Close(self):
+        '''
+        Waits for the queued jobs to finish and stops the workers
+        '''
+        if self.closed:
+            return
+            
+        self.closed = True
+        for worker in self.workers:
+            self.jobs.put(None)
+            
+        for worker in self.workers:
+            worker.thread.join()
+            
+    def Map(self, kind, payloads):
+        '''
+        Runs a job per payload and returns the finished jobs in payload order
+        '''
+        jobs = [self.Submit(kind, payload) for payload in payloads]
+        for job in jobs:
+            self.Results.get()
+            
+        return jobs
+
+def RunExportWorker(handlers, inputFile=None, outputFile=None):
+    '''
+    Worker side of the farm: answers every job read from inputFile (stdin) with
+    the result of handlers[kind](payload), or its error, on outputFile (stdout)
+    '''
+    if outputFile is None:
+        # Keep the real stdout for messages and send anything else printed to stderr
+        outputFile = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+        sys.stdout.flush()
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+        
+    if inputFile is None:
+        inputFile = getattr(sys.stdin, "buffer", sys.stdin)
+        
+    WriteMessage(outputFile, {"Ready": True})
+    
+    for line in iter(inputFile.readline, b""):
+        if len(line.strip()) == 0:
+            continue
+            
+        job = json.loads(line.decode("utf-8"))
+        try:
+            message = {"Id": job["Id"], "Result": handlers[job["Kind"]](job["Payload"])}
+        except Exception as error:
+            message = {"Id": job["Id"], "Error": "%s: %s" % (type(error).__name__, error)}
+            
+        WriteMessage(outputFile, message)
+
+'''
+JSON-RPC server
+
+A small JSON-RPC 2.0 listener on a local socket, in the spirit of Maya's
+commandPort. Messages are JSON, one per line. A batch (a JSON array of
+requests) is answered with one array, so a client can fetch thousands of
+values in a single round-trip. Connections that call Server.Subscribe are
+pushed notifications (requests without an id) when the served data changes.
+
+Every connection is read on its own thread. All the calls of one request or
+batch run together through the invoke function, which in Maya hands them to
+the main thread, and share one context (e.g. a sequencer loaded once).
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import json
+import socket
+import threading
+
+try:
+    import queue as Queue
+except ImportError:
+    import Queue
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxStitcher import *
+except ImportError:
+    pass
+
+JsonRpcHost = "127.0.0.1"
+
+# Seconds the client waits for a response
+JsonRpcTimeout = 30
+
+# Seconds between checks for Stop while waiting for connections
+JsonRpcAcceptInterval = 0.25
+
+# Error codes of the JSON-RPC 2.0 specification
+JsonRpcParseError = -32700
+JsonRpcInvalidRequest = -32600
+JsonRpcMethodNotFound = -32601
+JsonRpcInvalidParams = -32602
+JsonRpcInternalError = -32603
+
+class JsonRpcError(Exception):
+    '''
+    Raised by methods to answer with a specific error, and by the client for error responses
+    '''
+    Code = JsonRpcInternalError
+    Data = None
+    
+    def __init__(self, code, message, data=None):
+        Exception.__init__(self, message)
+        self.Code = code
+        self.Data = data
+
+def JsonRpcErrorResponse(id, code, message, data=None):
+    error = {"code": code, "message": message}
+    if data is not None:
+        error["data"] = data
+        
+    return {"jsonrpc": "2.0", "id": id, "error": error}
+
+def SendJsonLine(connectionSocket, lock, message):
+    data = FbxBytes(json.dumps(message, separators=(",", ":")) + "\n")
+    with lock:
+        connectionSocket.sendall(data)
+
+class JsonRpcConnection:
+    '''
+    A client socket of a JsonRpcServer and the thread that answers it
+    '''
+    Subscribed = False
+    
+    def __init__(self, server, connectionSocket):
+        self.server = server
+        self.socket = connectionSocket
+        self.lock = threading.Lock()
+        
+        self.thread = threading.Thread(target=self.Run)
+        self.thread.daemon = True
+        
+    def Send(self, message):
+        SendJsonLine(self.socket, self.lock, message)
+        
+    def Close(self):
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except (IOError, OSError, socket.error):
+            pass
+            
+        self.socket.close()
+        
+    def Run(self):
+        reader = self.socket.makefile("rb")
+        try:
+            for line in iter(reader.readline, b""):
+                if len(line.strip()) == 0:
+                    continue
+                    
+                response = self.server.Handle(self, line)
+                if response is not None:
+                    self.Send(response)
+        except (IOError, OSError, socket.error):
+            pass
+        finally:
+            reader.close()
+            self.server.Disconnect(self)
+
+class JsonRpcServer:
+    '''
+    Serves methods over JSON-RPC on host:port, e.g.
+    
+        server = JsonRpcServer({"Add": lambda context, a, b: a + b}, port=7810)
+        server.Start()
+        server.Notify("Changed", {"Count": 3})
+        server.Stop()
+        
+    Methods are called with the context of their request or batch, then the
+    params: a list as arguments, an object as keyword arguments. Port 0 picks
+    a free port, which Port holds after Start
+    '''
+    Host = JsonRpcHost
+    Port = 0
+    Methods = None
+    
+    def __init__(self, methods, host=JsonRpcHost, port=0, context=None, invoke=None):
+        self.Methods = dict(methods)
+        self.Host = host
+        self.Port = port
+        
+        self.context = context
+        self.invoke = invoke
+        self.listenSocket = None
+        self.acceptThread = None
+        self.connections = []
+        self.connectionsLock = threading.Lock()
+        self.running = False
+        
+    def Start(self):
+        self.listenSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listenSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listenSocket.bind((self.Host, self.Port))
+        self.listenSocket.listen(5)
+        self.listenSocket.settimeout(JsonRpcAcceptInterval)
+        self.Port = self.listenSocket.getsockname()[1]
+        
+        self.running = True
+        self.acceptThread = threading.Thread(target=self.Accept)
+        self.acceptThread.daemon = True
+        self.acceptThread.start()
+        
+    def Accept(self):
+        while self.running:
+            try:
+                connectionSocket, address = self.listenSocket.accept()
+            except socket.timeout:
+                continue
+            except (IOError, OSError, socket.error):
+                return
+                
+            connectionSocket.settimeout(None)
+            connectionSocket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = JsonRpcConnection(self, connectionSocket)
+            with self.connectionsLock:
+                self.connections.append(connection)
+                
+            connection.thread.start()
+            
+    def Disconnect(self, connection):
+        with self.connectionsLock:
+            if connection in self.connections:
+                self.connections.remove(connection)
+                
+        connection.Close()
+        
+    def Stop(self):
+        '''
+        Stops listening and closes every connection
+        '''
+        if not self.running:
+            return
+            
+        self.running = False
+        self.acceptThread.join()
+        self.listenSocket.close()
+        
+        with self.connectionsLock:
+            connections = list(self.connections)
+            
+        for connection in connections:
+            self.Disconnect(connection)
+            
+    def Notify(self, method, params=None):
+        '''
+        Pushes a notification to every subscribed connection
+        '''
+        message = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            message["params"] = params
+            
+        with self.connectionsLock:
+            connections = [connection for connection in self.connections if connection.Subscribed]
+            
+        for connection in connections:
+            try:
+                connection.Send(message)
+            except (IOError, OSError, socket.error):
+                self.Disconnect(connection)
+                
+    def Handle(self, connection, line):
+        '''
+        Answers one line, a request or a batch; returns the response, or None if there is none
+        '''
+        try:
+            message = json.loads(line.decode("utf-8"))
+        except ValueError:
+            return JsonRpcErrorResponse(None, JsonRpcParseError, "Parse error")
+            
+        batch = isinstance(message, list)
+        if not batch:
+            message = [message]
+        elif len(message) == 0:
+            return JsonRpcErrorResponse(None, JsonRpcInvalidRequest, "Empty batch")
+            
+        if self.invoke is None:
+            responses = self.RunBatch(connection, message)
+        else:
+            responses = self.invoke(self.RunBatch, connection, message)
+            
+        # Notifications are not answered, not even inside a batch
+        responses = [response for response in responses if response is not None]
+        if len(responses) == 0:
+            return None
+            
+        if batch:
+            return responses
+            
+        return responses[0]
+        
+    def RunBatch(self, connection, requests):
+        context = None
+        if self.context is not None:
+            context = self.context()
+            
+        return [self.RunRequest(connection, context, request) for request in requests]
+        
+    def RunRequest(self, connection, context, request):
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or not isinstance(request.get("method"), (type(u""), str)):
+            return JsonRpcErrorResponse(None, JsonRpcInvalidRequest, "Invalid request")
+            
+        id = request.get("id")
+        try:
+            result = self.Call(connection, context, request["method"], request.get("params", []))
+        except JsonRpcError as error:
+            response = JsonRpcErrorResponse(id, error.Code, str(error), error.Data)
+        except Exception as error:
+            response = JsonRpcErrorResponse(id, JsonRpcInternalError, "%s: %s" % (type(error).__name__, error))
+        else:
+            response = {"jsonrpc": "2.0", "id": id, "result": result}
+            
+        if "id" not in request:
+            return None
+            
+        return response
+        
+    def Call(self, connection, context, method, params):
+        # Subscriptions belong to the connection rather than to the served data
+        if method == "Server.Subscribe":
+            connection.Subscribed = True
+            return True
+            
+        if method == "Server.Unsubscribe":
+            connection.Subscribed = False
+            return True
+            
+        if method == "Server.Methods":
+            return sorted(self.Methods)
+            
+        if method not in self.Methods:
+            raise JsonRpcError(JsonRpcMethodNotFound, "Method not found: %s" % method)
+            
+        if isinstance(params, list):
+            return self.Methods[method](context, *params)
+            
+        if isinstance(params, dict):
+            return self.Methods[method](context, **dict([(str(key), value) for key, value in params.items()]))
+            
+        raise JsonRpcError(JsonRpcInvalidParams, "Params must be a list or an object")
+
+class JsonRpcClient:
+    '''
+    Client of a JsonRpcServer, e.g.
+    
+        client = JsonRpcClient(port=7810)
+        count = client.Call("Sequencer.Count")
+        animations = client.Batch([["Sequencer.Animation", [id]] for id in ids])
+        
+    Calls are made one at a time. Notifications pushed by the server (after
+    Subscribe) are put on Notifications as [method, params]
+    '''
+    Timeout = JsonRpcTimeout
+    Notifications = None
+    
+    def __init__(self, host=JsonRpcHost, port=0, timeout=JsonRpcTimeout):
+        self.Timeout = timeout
+        self.Notifications = Queue.Queue()
+        
+        self.socket = socket.create_connection((host, port), timeout)
+        self.socket.settimeout(None)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.lock = threading.Lock()
+        self.responses = Queue.Queue()
+        self.nextId = 0
+        
+        self.thread = threading.Thread(target=self.Read)
+        self.thread.daemon = True
+        self.thread.start()
+        
+    def Read(self):
+        reader = self.socket.makefile("rb")
+        try:
+            for line in iter(reader.readline, b""):
+                message = json.loads(line.decode("utf-8"))
+                if isinstance(message, dict) and "id" not in message:
+                    self.Notifications.put([message.get("method"), message.get("params")])
+                else:
+                    self.responses.put(message)
+        except (IOError, OSError, ValueError, socket.error):
+            pass
+        finally:
+            reader.close()
+            self.responses.put(None)
+            
+    def Receive(self):
+        try:
+            response = self.responses.get(timeout=self.Timeout)
+        except Queue.Empty:
+            raise JsonRpcError(JsonRpcInternalError, "No response after %d seconds" % self.Timeout)
+            
+        if response is None:
+            raise JsonRpcError(JsonRpcInternalError, "Connection closed")
+            
+        return response
+        
+    def Request(self, method, params):
+        self.nextId += 1
+        return {"jsonrpc": "2.0", "id": self.nextId, "method": method, "params": params}
+        
+    def Result(self, response):
+        if "error" in response:
+            error = response["error"]
+            return JsonRpcError(error.get("code"), error.get("message"), error.get("data"))
+            
+        return response.get("result")
+        
+    def Call(self, method, *params):
+        SendJsonLine(self.socket, self.lock, self.Request(method, list(params)))
+        
+        result = self.Result(self.Receive())
+        if isinstance(result, JsonRpcError):
+            raise result
+            
+        return result
+        
+    def Batch(self, calls):
+        '''
+        Makes [method, params] calls in one round-trip and returns their results in
+        order; a call that failed has its JsonRpcError in place of a result
+        '''
+        if len(calls) == 0:
+            return []
+            
+        requests = [self.Request(method, params if isinstance(params, dict) else list(params)) for method, params in calls]
+        SendJsonLine(self.socket, self.lock, requests)
+        
+        responses = self.Receive()
+        if isinstance(responses, dict):
+            raise self.Result(responses)
+            
+        results = dict([(response.get("id"), self.Result(response)) for response in responses])
+        return [results.get(request["id"]) for request in requests]
+        
+    def Notify(self, method, *params):
+        SendJsonLine(self.socket, self.lock, {"jsonrpc": "2.0", "method": method, "params": list(params)})
+        
+    def Subscribe(self):
+        return self.Call("Server.Subscribe")
+        
+    def Close(self):
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except (IOError, OSError, socket.error):
+            pass
+            
+        self.socket.close()
+        self.thread.join()
+
+'''
+Animation index
+
+A SQLite database of the animations of every scene in a library (name,
+frames, order, scene path and modification time), so clips can be found
+without opening scenes. Update only reads the scenes whose modification
+time or size changed since the last run and drops the scenes that are gone.
+Scenes are read by a function passed in, e.g. one running on the export
+farm, since reading a scene needs Maya.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import time
+import sqlite3
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from Common import *
+except ImportError:
+    pass
+
+# Scenes written per transaction while updating
+IndexCommitInterval = 100
+
+IndexSchema = [
+    "CREATE TABLE IF NOT EXISTS Scenes (Id INTEGER PRIMARY KEY, Path TEXT UNIQUE NOT NULL, Mtime REAL NOT NULL, "
+        "Size INTEGER NOT NULL, Indexed REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS Animations (SceneId INTEGER NOT NULL, AnimationId INTEGER NOT NULL, "
+        "Ordering INTEGER NOT NULL, Name TEXT NOT NULL, StartFrame INTEGER NOT NULL, EndFrame INTEGER NOT NULL, "
+        "Selected INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS AnimationsByName ON Animations (Name)",
+    "CREATE INDEX IF NOT EXISTS AnimationsByRange ON Animations (StartFrame, EndFrame)",
+    "CREATE INDEX IF NOT EXISTS AnimationsByScene ON Animations (SceneId, Ordering)",
+]
+
+IndexSelect = ("SELECT Scenes.Path, Scenes.Mtime, Animations.AnimationId, Animations.Ordering, Animations.Name, "
+    "Animations.StartFrame, Animations.EndFrame, Animations.Selected FROM Animations "
+    "JOIN Scenes ON Scenes.Id = Animations.SceneId")
+
+IndexOrder = " ORDER BY Scenes.Path, Animations.Ordering"
+
+def PrefixUpperBound(prefix):
+    '''
+    Returns the smallest text after every text starting with prefix
+    '''
+    try:
+        nextCharacter = unichr(ord(prefix[-1]) + 1)
+    except NameError:
+        nextCharacter = chr(ord(prefix[-1]) + 1)
+        
+    return prefix[:-1] + nextCharacter
+
+class AnimationIndex:
+    '''
+    The index database at filename, e.g.
+    
+        index = AnimationIndex("Animations.db")
+        index.Update("Characters", readScenes)
+        index.FindName("Run_Fast")
+        index.FindOverlap(100, 200)
+        index.Close()
+        
+    Queries return dicts with the Scene, Mtime, Id, Order, Name, StartFrame,
+    EndFrame and Selected of every match, in scene and display order
+    '''
+    Filename = ""
+    
+    def __init__(self, filename):
+        self.Filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        
+        for statement in IndexSchema:
+            self.connection.execute(statement)
+            
+        self.connection.commit()
+        
+    def Close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+            
+    def Query(self, where="", parameters=()):
+        cursor = self.connection.execute(IndexSelect + where + IndexOrder, parameters)
+        return [{"Scene": path, "Mtime": mtime, "Id": animationId, "Order": ordering, "Name": name, "StartFrame": startFrame,
+            "EndFrame": endFrame, "Selected": selected != 0}
+            for path, mtime, animationId, ordering, name, startFrame, endFrame, selected in cursor]
+            
+    def FindName(self, name):
+        return self.Query(" WHERE Animations.Name = ?", (name,))
+        
+    def FindPrefix(self, prefix):
+        '''
+        Returns the animations whose name starts with prefix (case sensitive)
+        '''
+        if len(prefix) == 0:
+            return self.Query()
+            
+        # A range rather than LIKE, so the name index is used
+        return self.Query(" WHERE Animations.Name >= ? AND Animations.Name < ?", (prefix, PrefixUpperBound(prefix)))
+        
+    def FindOverlap(self, startFrame, endFrame):
+        '''
+        Returns the animations that share at least one frame with [startFrame, endFrame]
+        '''
+        return self.Query(" WHERE Animations.StartFrame <= ? AND Animations.EndFrame >= ?", (endFrame, startFrame))
+        
+    def SceneAnimations(self, sceneFilename):
+        return self.Query(" WHERE Scenes.Path = ?", (os.path.abspath(sceneFilename),))
+        
+    def Scenes(self):
+        '''
+        Returns [path, mtime, size] of every indexed scene
+        '''
+        return [list(row) for row in self.connection.execute("SELECT Path, Mtime, Size FROM Scenes ORDER BY Path")]
+        
+    def WriteScene(self, sceneFilename, mtime, size, animations):
+        '''
+        Replaces the animations of a scene; animations are records with the Id, Name,
+        StartFrame, EndFrame and Selected of each animation, in display order
+        '''
+        row = self.connection.execute("SELECT Id FROM Scenes WHERE Path = ?", (sceneFilename,)).fetchone()
+        if row is None:
+            sceneId = self.connection.execute("INSERT INTO Scenes (Path, Mtime, Size, Indexed) VALUES (?, ?, ?, ?)",
+                (sceneFilename, mtime, size, time.time())).lastrowid
+        else:
+            sceneId = row[0]
+            self.connection.execute("UPDATE Scenes SET Mtime = ?, Size = ?, Indexed = ? WHERE Id = ?", (mtime, size, time.time(), sceneId))
+            self.connection.execute("DELETE FROM Animations WHERE SceneId = ?", (sceneId,))
+            
+        self.connection.executemany("INSERT INTO Animations VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(sceneId, animation["Id"], ordering, animation["Name"], animation["StartFrame"], animation["EndFrame"],
+            int(bool(animation["Selected"]))) for ordering, animation in enumerate(animations)])
+            
+    def RemoveScene(self, sceneFilename):
+        self.connection.execute("DELETE FROM Animations WHERE SceneId IN (SELECT Id FROM Scenes WHERE Path = ?)", (sceneFilename,))
+        self.connection.execute("DELETE FROM Scenes WHERE Path = ?", (sceneFilename,))
+        
+    def Update(self, directoryName, readScenes, patterns=SceneFilePatterns):
+        '''
+        Brings the scenes under directoryName up to date. readScenes(sceneFilenames)
+        returns [sceneFilename, animations, error] for each of the scenes that changed
+        Returns what was done: Scenes, Updated, Removed, Failed (scene and error) and Seconds
+        '''
+        startTime = time.time()
+        rootDirectory = os.path.join(os.path.abspath(directoryName), "")
+        
+        # Stat before reading, so a scene saved while it is read is read again next time
+        sceneStats = {}
+        for sceneFilename in FindScenes(directoryName, patterns):
+            sceneStat = os.stat(sceneFilename)
+            sceneStats[os.path.abspath(sceneFilename)] = [sceneStat.st_mtime, sceneStat.st_size]
+            
+        indexedStats = dict([(path, [mtime, size]) for path, mtime, size in self.Scenes() if path.startswith(rootDirectory)])
+        staleScenes = sorted([path for path in sceneStats if indexedStats.get(path) != sceneStats[path]])
+        removedScenes = sorted([path for path in indexedStats if path not in sceneStats])
+        
+        updatedCount = 0
+        failedScenes = []
+        if len(staleScenes) > 0:
+            for sceneFilename, animations, error in readScenes(staleScenes):
+                sceneFilename = os.path.abspath(sceneFilename)
+                if error is not None:
+                    failedScenes.append([sceneFilename, error])
+                    continue
+                    
+                self.WriteScene(sceneFilename, sceneStats[sceneFilename][0], sceneStats[sceneFilename][1], animations)
+                updatedCount += 1
+                if updatedCount % IndexCommitInterval == 0:
+                    self.connection.commit()
+                    
+        for sceneFilename in removedScenes:
+            self.RemoveScene(sceneFilename)
+            
+        self.connection.commit()
+        
+        return {"Scenes": len(sceneStats), "Updated": updatedCount, "Removed": len(removedScenes), "Failed": failedScenes,
+            "Seconds": round(time.time() - startTime, 3)}
+
+'''
+Name index
+
+Finds the names containing a piece of text (case insensitive) without
+scanning them all. Every name is broken into its 1, 2 and 3 character
+grams, each mapped to the ids of the names that contain it. A query of up to
+three characters is a single lookup; a longer one intersects the sets of its
+trigrams, smallest first, and only the few names left are checked in full.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+NameGramLength = 3
+
+def NameGrams(text):
+    '''
+    Returns every 1 to NameGramLength character piece of text
+    '''
+    grams = set()
+    for length in range(1, NameGramLength + 1):
+        for start in range(len(text) - length + 1):
+            grams.add(text[start:start + length])
+    
+    return grams
+
+class NameIndex:
+    '''
+    Animation ids by the text of their names, e.g.
+        
+        index = NameIndex()
+        index.Add(4, "Run_Fast")
+        index.Match("fast")
+    
+    Add, Rename and Remove keep it up to date as names change
+    '''
+    Names = None
+    Grams = None
+    
+    def __init__(self):
+        self.Names = {}
+        self.Grams = {}
+    
+    def Count(self):
+        return len(self.Names)
+    
+    def Add(self, animationId, name):
+        name = (name or "").lower()
+        self.Names[animationId] = name
+        
+        for gram in NameGrams(name):
+            if gram not in self.Grams:
+                self.Grams[gram] = set()
+            
+            self.Grams[gram].add(animationId)
+    
+    def Remove(self, animationId):
+        if animationId not in self.Names:
+            return
+        
+        for gram in NameGrams(self.Names[animationId]):
+            animationIds = self.Grams[gram]
+            animationIds.discard(animationId)
+            if len(animationIds) == 0:
+                del self.Grams[gram]
+        
+        del self.Names[animationId]
+    
+    def Rename(self, animationId, name):
+        self.Remove(animationId)
+        self.Add(animationId, name)
+    
+    def Match(self, text):
+        '''
+        Returns the set of ids whose names contain text, every id for an empty text
+        '''
+        text = text.lower()
+        if len(text) == 0:
+            return set(self.Names)
+        
+        if len(text) <= NameGramLength:
+            return set(self.Grams.get(text, ()))
+        
+        trigramIds = []
+        for start in range(len(text) - NameGramLength + 1):
+            animationIds = self.Grams.get(text[start:start + NameGramLength])
+            if animationIds is None:
+                return set()
+            
+            trigramIds.append(animationIds)
+        
+        trigramIds.sort(key=len)
+        candidates = trigramIds[0].intersection(*trigramIds[1:])
+        return set([animationId for animationId in candidates if text in self.Names[animationId]])
+
+'''
+Maya ASCII reader
+
+Reads the SequencerData node out of Maya ASCII (.ma) scenes without Maya.
+The file is memory mapped and searched for the createNode line of the node,
+so the rest of the scene is never parsed or held in memory. Only the setAttr
+statements of that one node are decoded into the UniqueId, Ordering and
+Animation%d values written by SequencerUI.Save.
+
+PatchSequencerData rewrites those setAttr statements the same way: every
+other byte of the scene is copied through unchanged into a temporary file
+next to it, which then replaces the scene in one rename.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import re
+import mmap
+import shutil
+import tempfile
+import warnings
+import multiprocessing
+
+try:
+    from concurrent import futures as Futures
+    from concurrent.futures.process import BrokenProcessPool
+except ImportError:
+    Futures = None
+    BrokenProcessPool = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxStitcher import *
+except ImportError:
+    pass
+
+MayaSequencerNodeLine = b'createNode script -n "SequencerData"'
+
+# The node's statements are indented; the next line that is not ends them
+MayaBlockEndPattern = re.compile(br'\n(?=\S)')
+
+# Quoted strings (with escapes), statement ends and bare words
+MayaTokenPattern = re.compile(br'"(?:[^"\\]|\\.)*"|;|[^\s;"]+')
+
+MayaAnimationAttributePattern = re.compile(r'^(Name|StartFrame|EndFrame|Selected)(\d+)$')
+
+MayaAnimationCompoundPattern = re.compile(r'^Animation(\d+)$')
+
+# setAttr flags and how many values each one takes
+MayaSetAttrFlags = {"-type": 1, "-typ": 1, "-k": 1, "-keyable": 1, "-l": 1, "-lock": 1, "-cb": 1, "-channelBox": 1,
+    "-s": 1, "-size": 1, "-av": 0, "-alteredValue": 0, "-c": 0, "-clamp": 0}
+
+MayaEscapes = {"n": "\n", "t": "\t", "r": "\r"}
+
+MayaQuotes = {"\\": "\\\\", "\"": "\\\"", "\n": "\\n", "\t": "\\t", "\r": "\\r"}
+
+class MayaAsciiError(Exception):
+    pass
+
+def UnquoteMelString(token):
+    text = token[1:-1].decode("utf-8")
+    return re.sub(r'\\(.)', lambda match: MayaEscapes.get(match.group(1), match.group(1)), text)
+
+def MelBool(token):
+    return token in [b"yes", b"true", b"on", b"1"]
+
+def QuoteMelString(text):
+    return '"' + "".join([MayaQuotes.get(character, character) for character in text]) + '"'
+
+def FindSequencerBlock(data):
+    '''
+    Returns the start and end of the SequencerData node's statements in data, or None
+    '''
+    position = data.find(MayaSequencerNodeLine)
+    while position >= 0:
+        if position == 0 or data[position - 1:position] == b"\n":
+            match = MayaBlockEndPattern.search(data, position)
+            if match is None:
+                return position, len(data)
+                
+            return position, match.start()
+            
+        position = data.find(MayaSequencerNodeLine, position + 1)
+        
+    return None
+
+def ParseSetAttr(tokens):
+    '''
+    Returns the attribute and values of a setAttr statement's tokens
+    '''
+    index = 1
+    while index < len(tokens) and tokens[index].startswith(b"-"):
+        index += 1 + MayaSetAttrFlags.get(tokens[index].decode("utf-8"), 0)
+        
+    if index >= len(tokens):
+        raise MayaAsciiError("setAttr without an attribute")
+        
+    attribute = UnquoteMelString(tokens[index])
+    
+    # Maya writes -type after the attribute; anything else that is not a flag is data
+    values = []
+    index += 1
+    while index < len(tokens):
+        flag = tokens[index].decode("utf-8")
+        if flag in MayaSetAttrFlags:
+            index += 1 + MayaSetAttrFlags[flag]
+        else:
+            values.append(tokens[index])
+            index += 1
+            
+    return attribute.split(".")[-1], values
+
+def ParseSequencerBlock(block):
+    '''
+    Returns the UniqueId and the animation records (in display order) of a SequencerData block
+    '''
+    uniqueId = 0
+    ordering = []
+    animations = {}
+    
+    statement = []
+    for token in MayaTokenPattern.findall(block):
+        if token != b";":
+            statement.append(token)
+            continue
+            
+        if len(statement) > 0 and statement[0] == b"setAttr":
+            attributeName, values = ParseSetAttr(statement)
+            
+            if attributeName == "UniqueId":
+                uniqueId = int(values[0])
+            elif attributeName == "Ordering":
+                ordering = [int(value) for value in values[1:int(values[0]) + 1]]
+            else:
+                match = MayaAnimationAttributePattern.match(attributeName)
+                if match is not None:
+                    field, animationId = match.group(1), int(match.group(2))
+                    animation = animations.setdefault(animationId, {})
+                    if field == "Name":
+                        animation["Name"] = UnquoteMelString(values[0])
+                    elif field == "Selected":
+                        animation["Selected"] = MelBool(values[0])
+                    else:
+                        animation[field] = int(values[0])
+                        
+        statement = []
+        
+    # Maya leaves out values equal to the attribute default
+    return uniqueId, [{"Id": animationId, "Name": animations.get(animationId, {}).get("Name", ""),
+        "StartFrame": animations.get(animationId, {}).get("StartFrame", 0), "EndFrame": animations.get(animationId, {}).get("EndFrame", 0),
+        "Selected": animations.get(animationId, {}).get("Selected", False)} for animationId in ordering]
+
+def ReadSequencerData(filename):
+    '''
+    Returns [uniqueId, animations] stored in the .ma scene filename, or None if it has no SequencerData
+    '''
+    sceneFile = open(filename, "rb")
+    try:
+        if os.fstat(sceneFile.fileno()).st_size == 0:
+            return None
+            
+        data = mmap.mmap(sceneFile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            blockRange = FindSequencerBlock(data)
+            if blockRange is None:
+                return None
+                
+            return list(ParseSequencerBlock(data[blockRange[0]:blockRange[1]]))
+        finally:
+            data.close()
+    finally:
+        sceneFile.close()
+
+def ReadSequencerAnimations(filename):
+    '''
+    Returns [filename, animations, error] for filename; a scene without SequencerData has no animations
+    '''
+    try:
+        sequencerData = ReadSequencerData(filename)
+    except (IOError, OSError, ValueError, IndexError, MayaAsciiError) as error:
+        return [filename, None, "%s: %s" % (type(error).__name__, error)]
+        
+    if sequencerData is None:
+        return [filename, [], None]
+        
+    return [filename, sequencerData[1], None]
+
+def MapSceneFiles(function, items, workers=None):
+    '''
+    Returns function(item) of every item, in order; with more than one worker (None for
+    one per core) the items are run on a process pool, serially if none starts, and again
+    serially with a RuntimeWarning if it breaks
+    '''
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+        
+    workers = min(workers, len(items))
+    if workers > 1 and Futures is not None:
+        try:
+            executor = Futures.ProcessPoolExecutor(max_workers=workers)
+        except (OSError, NotImplementedError):
+            executor = None
+            
+        if executor is not None:
+            try:
+                chunkSize = max(1, len(items) // (workers * 4))
+                return list(executor.map(function, items, chunksize=chunkSize))
+            except BrokenProcessPool as error:
+                warnings.warn("Scene process pool failed, running serially: %s" % error, RuntimeWarning)
+            finally:
+                executor.shutdown()
+                
+    return [function(item) for item in items]
+
+def ReadSequencerAnimationFiles(filenames, workers=None):
+    '''
+    Returns ReadSequencerAnimations of every file, in order, read on a process pool
+    '''
+    return MapSceneFiles(ReadSequencerAnimations, filenames, workers)
+
+def MayaStatements(block):
+    '''
+    Yields [start, end, tokens] of every statement in block, with start at the newline before it
+    '''
+    statement = []
+    statementStart = 0
+    for match in MayaTokenPattern.finditer(block):
+        token = match.group(0)
+        if token != b";":
+            if len(statement) == 0:
+                statementStart = match.start()
+            
+            statement.append(token)
+            continue
+        
+        if len(statement) > 0:
+            yield [block.rfind(b"\n", 0, statementStart), match.end(), statement]
+        
+        statement = []
+
+def SequencerStatements(block):
+    '''
+    Returns the setAttr statements of a SequencerData block that hold sequencer values, as
+    [start, end] with start at the newline before the statement, and the ids of the animations
+    whose attributes the block adds
+    '''
+    statements = []
+    animationIds = set()
+    for start, end, statement in MayaStatements(block):
+        if statement[0] == b"setAttr":
+            attributeName = ParseSetAttr(statement)[0]
+            if attributeName in ["UniqueId", "Ordering"] or MayaAnimationAttributePattern.match(attributeName) is not None:
+                statements.append([start, end])
+        elif statement[0] == b"addAttr" and b"-ln" in statement:
+            nameIndex = statement.index(b"-ln") + 1
+            if nameIndex < len(statement):
+                match = MayaAnimationCompoundPattern.match(UnquoteMelString(statement[nameIndex]))
+                if match is not None:
+                    animationIds.add(int(match.group(1)))
+        
+    return statements, animationIds
+
+def SequencerSetAttrLines(uniqueId, animations):
+    '''
+    Returns the setAttr statements of the values, as Maya writes them
+    '''
+    lines = ['\tsetAttr ".UniqueId" %d;' % uniqueId,
+        '\tsetAttr ".Ordering" -type "Int32Array" %d %s;' % (len(animations), " ".join([str(animation["Id"]) for animation in animations]))]
+    
+    for animation in animations:
+        attributeName = ".Animations.Animation%d.%%s%d" % (animation["Id"], animation["Id"])
+        lines += ['\tsetAttr "%s" -type "string" %s;' % (attributeName % "Name", QuoteMelString(animation["Name"])),
+            '\tsetAttr "%s" %d;' % (attributeName % "StartFrame", animation["StartFrame"]),
+            '\tsetAttr "%s" %d;' % (attributeName % "EndFrame", animation["EndFrame"]),
+            '\tsetAttr "%s" %s;' % (attributeName % "Selected", "yes" if animation["Selected"] else "no")]
+    
+    return "".join(["\n" + line for line in lines]).encode("utf-8")
+
+def WritePatchedScene(sourceFd, filename, patches, outputFilename=None):
+    '''
+    Writes the scene filename (open as sourceFd) with the [start, end, replacement] patches, given
+    in file order, to a temporary file next to outputFilename (by default filename) that then replaces it
+    '''
+    if outputFilename is None:
+        outputFilename = filename
+    
+    outputDirectory = os.path.dirname(os.path.abspath(outputFilename))
+    temporaryFd, temporaryFilename = tempfile.mkstemp(suffix=".ma", dir=outputDirectory)
+    os.close(temporaryFd)
+    replaced = False
+    try:
+        writer = FbxPatchWriter(sourceFd, temporaryFilename)
+        try:
+            for start, end, replacement in patches:
+                writer.Patch(start, end, replacement)
+            
+            writer.Finish(os.fstat(sourceFd).st_size, sync=True)
+        finally:
+            writer.Close()
+        
+        shutil.copymode(filename, temporaryFilename)
+        ReplaceFile(temporaryFilename, outputFilename)
+        replaced = True
+    finally:
+        if not replaced and os.path.exists(temporaryFilename):
+            os.remove(temporaryFilename)
+
+def PatchSequencerData(filename, patch, outputFilename=None):
+    '''
+    Rewrites the SequencerData values of the .ma scene filename, in place or to outputFilename
+    patch(animations) is given copies of the animation records in display order and returns the
+    new ones; it may rename, re-range, reselect, reorder or drop animations, but not add any
+    Returns True if the scene was written, False if it has no SequencerData or nothing changed
+    '''
+    sourceFd = OpenBinary(filename, os.O_RDONLY)
+    try:
+        if os.fstat(sourceFd).st_size == 0:
+            return False
+        
+        data = mmap.mmap(sourceFd, 0, access=mmap.ACCESS_READ)
+        try:
+            blockRange = FindSequencerBlock(data)
+            if blockRange is None:
+                return False
+            
+            block = data[blockRange[0]:blockRange[1]]
+        finally:
+            data.close()
+        
+        uniqueId, animations = ParseSequencerBlock(block)
+        patchedAnimations = patch([dict(animation) for animation in animations])
+        if patchedAnimations == animations:
+            return False
+        
+        statements, animationIds = SequencerStatements(block)
+        for animation in patchedAnimations:
+            if animation["Id"] not in animationIds:
+                raise MayaAsciiError("Animation %d has no attributes in %s; new animations need Maya" % (animation["Id"], filename))
+        
+        # The old statements are cut out and the new ones go after the node's last statement
+        blockStart = blockRange[0]
+        patches = [[blockStart + start, blockStart + end, b""] for start, end in statements]
+        insertPosition = blockStart + len(block.rstrip())
+        patches.append([insertPosition, insertPosition, SequencerSetAttrLines(uniqueId, patchedAnimations)])
+        WritePatchedScene(sourceFd, filename, patches, outputFilename)
+    finally:
+        os.close(sourceFd)
+    
+    return True
+
+class AnimationPatch:
+    '''
+    A patch for PatchSequencerData that renames animations and sets frame ranges by name, e.g.
+        
+        AnimationPatch(renames={"Run": "Run_Fast"}, ranges={"Idle": [0, 59]})
+    
+    Ranges are looked up by the new name. Being a class, it can be sent to worker processes
+    '''
+    Renames = None
+    Ranges = None
+    
+    def __init__(self, renames=None, ranges=None):
+        self.Renames = dict(renames or {})
+        self.Ranges = dict(ranges or {})
+    
+    def __call__(self, animations):
+        for animation in animations:
+            animation["Name"] = self.Renames.get(animation["Name"], animation["Name"])
+            if animation["Name"] in self.Ranges:
+                animation["StartFrame"], animation["EndFrame"] = [int(frame) for frame in self.Ranges[animation["Name"]]]
+        
+        return animations
+
+def PatchSequencerFile(arguments):
+    '''
+    Returns [filename, patched, error] of PatchSequencerData for a [filename, patch] pair
+    '''
+    filename, patch = arguments
+    try:
+        return [filename, PatchSequencerData(filename, patch), None]
+    except (IOError, OSError, ValueError, IndexError, MayaAsciiError) as error:
+        return [filename, False, "%s: %s" % (type(error).__name__, error)]
+
+def PatchSequencerFiles(filenames, patch, workers=None):
+    '''
+    Returns PatchSequencerFile of every file, in order; patches the files on a process pool,
+    so patch must be picklable (e.g. an AnimationPatch)
+    '''
+    return MapSceneFiles(PatchSequencerFile, [[filename, patch] for filename in filenames], workers)
+
+'''
+Maya ASCII curves
+
+Trims the keys of Maya ASCII (.ma) scenes without Maya, the offline
+equivalent of TrimKeys. The time based animCurve nodes (animCurveTA, TL, TT
+and TU) are found in the memory mapped file and only their per key setAttr
+statements (.ktv times and values, .kit/.kot tangent types, .kix/.kiy/.kox/.koy
+tangents, locks...) are decoded. A NumPy mask of the key times drops every
+key outside the animations, the same mask is applied to every per key
+attribute, and the kept keys are renumbered from 0.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import re
+import mmap
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxCurves import *
+    from MayaAscii import *
+except ImportError:
+    pass
+
+MayaCurveNodePattern = re.compile(br'^createNode animCurveT[ALTU] ', re.M)
+
+# A per key attribute with one index or an index range, e.g. ktv[0:24] or kit[3]
+MayaKeyAttributePattern = re.compile(r'^([A-Za-z]+)\[(\d+)(?::(\d+))?\]$')
+
+MayaKeyTimeAttribute = "ktv"
+
+def AnimationIntervals(animations):
+    '''
+    Returns the starts and ends of the union of the frame ranges of animations, sorted and disjoint
+    '''
+    ranges = sorted([[animation["StartFrame"], animation["EndFrame"]] for animation in animations
+        if animation["StartFrame"] <= animation["EndFrame"]])
+    
+    intervals = []
+    for startFrame, endFrame in ranges:
+        if len(intervals) > 0 and startFrame <= intervals[-1][1]:
+            intervals[-1][1] = max(intervals[-1][1], endFrame)
+        else:
+            intervals.append([startFrame, endFrame])
+    
+    return Numpy.array([start for start, end in intervals], dtype=Numpy.float64), Numpy.array([end for start, end in intervals], dtype=Numpy.float64)
+
+def TimesInside(times, starts, ends):
+    '''
+    Returns a mask of the times inside one of the [starts, ends] intervals
+    '''
+    intervalIndices = Numpy.searchsorted(starts, times, side="right") - 1
+    return (intervalIndices >= 0) & (times <= ends[Numpy.maximum(intervalIndices, 0)])
+
+def KeyAttributeLines(name, indices, values):
+    '''
+    Returns the setAttr statements of a per key attribute, one per run of consecutive indices
+    '''
+    runStarts = Numpy.concatenate([[0], Numpy.flatnonzero(Numpy.diff(indices) != 1) + 1, [len(indices)]])
+    
+    lines = []
+    for runIndex in range(len(runStarts) - 1):
+        first, last = runStarts[runIndex], runStarts[runIndex + 1] - 1
+        text = b" ".join(values[first:last + 1].ravel().tolist()).decode("utf-8")
+        
+        if first == last:
+            lines.append('\tsetAttr ".%s[%d]" %s;' % (name, indices[first], text))
+        elif len(runStarts) == 2 and indices[0] == 0:
+            lines.append('\tsetAttr -s %d ".%s[%d:%d]" %s;' % (len(indices), name, indices[first], indices[last], text))
+        else:
+            lines.append('\tsetAttr ".%s[%d:%d]" %s;' % (name, indices[first], indices[last], text))
+    
+    return lines
+
+def ParseKeyAttributes(block):
+    '''
+    Returns the per key attributes of an animCurve block, as {name: [indices, values (keys, values per key)]},
+    their names in file order and the [start, end] of their setAttr statements
+    '''
+    statements = []
+    attributes = {}
+    attributeNames = []
+    for start, end, statement in MayaStatements(block):
+        if statement[0] != b"setAttr":
+            continue
+        
+        attributeName, values = ParseSetAttr(statement)
+        match = MayaKeyAttributePattern.match(attributeName)
+        if match is None:
+            continue
+        
+        name, first = match.group(1), int(match.group(2))
+        last = first if match.group(3) is None else int(match.group(3))
+        count = last - first + 1
+        if count <= 0 or len(values) % count != 0:
+            raise MayaAsciiError("%s has %d values for %d keys" % (attributeName, len(values), count))
+        
+        if name not in attributes:
+            attributes[name] = [[], []]
+            attributeNames.append(name)
+        
+        attributes[name][0].append(Numpy.arange(first, last + 1))
+        attributes[name][1].append(Numpy.array(values).reshape(count, len(values) // count))
+        statements.append([start, end])
+    
+    for name in attributeNames:
+        attributes[name] = [Numpy.concatenate(attributes[name][0]), Numpy.concatenate(attributes[name][1])]
+    
+    return attributes, attributeNames, statements
+
+def TrimCurveBlock(block, starts, ends, trimStart=None, trimEnd=None):
+    '''
+    Returns the [start, end, replacement] patches of an animCurve block that remove its keys outside
+    the [starts, ends] intervals (and inside [trimStart, trimEnd], if given), and the number of keys
+    removed. A curve without a key inside the intervals is left alone; deleting it needs Maya
+    '''
+    attributes, attributeNames, statements = ParseKeyAttributes(block)
+    if MayaKeyTimeAttribute not in attributes:
+        return [], 0
+    
+    keyIndices, keyValues = attributes[MayaKeyTimeAttribute]
+    times = keyValues[:, 0].astype(Numpy.float64)
+    
+    removed = ~TimesInside(times, starts, ends)
+    if trimStart is not None:
+        removed &= times >= trimStart
+    
+    if trimEnd is not None:
+        removed &= times <= trimEnd
+    
+    if not removed.any() or removed.all():
+        return [], 0
+    
+    # Keys without a time (there should be none) are kept
+    keyCount = max([attributes[name][0].max() for name in attributeNames]) + 1
+    keep = Numpy.ones(keyCount, dtype=bool)
+    keep[keyIndices[removed]] = False
+    newIndices = Numpy.cumsum(keep) - 1
+    
+    lines = []
+    for name in attributeNames:
+        indices, values = attributes[name]
+        order = Numpy.argsort(indices, kind="mergesort")
+        indices, values = indices[order], values[order]
+        
+        kept = keep[indices]
+        if kept.any():
+            lines += KeyAttributeLines(name, newIndices[indices[kept]], values[kept])
+    
+    # The first key statement is replaced by all of the new ones, the others are cut out
+    replacement = "".join(["\n" + line for line in lines]).encode("utf-8")
+    patches = [[statements[0][0], statements[0][1], replacement]] + [[start, end, b""] for start, end in statements[1:]]
+    return patches, int(removed.sum())
+
+def TrimMayaAsciiKeys(filename, outputFilename=None, animations=None, trimStart=None, trimEnd=None):
+    '''
+    Removes the keys of the time based animCurve nodes of the .ma scene filename that are outside
+    every animation, in place or to outputFilename; animations are records with a StartFrame and
+    EndFrame, by default the ones of the scene's SequencerData. Key times are in the scene's time unit
+    Returns the number of keys removed; nothing is written if there are none
+    '''
+    RequireNumpy()
+    
+    sourceFd = OpenBinary(filename, os.O_RDONLY)
+    try:
+        if os.fstat(sourceFd).st_size == 0:
+            return 0
+        
+        data = mmap.mmap(sourceFd, 0, access=mmap.ACCESS_READ)
+        try:
+            if animations is None:
+                blockRange = FindSequencerBlock(data)
+                if blockRange is None:
+                    return 0
+                
+                animations = ParseSequencerBlock(data[blockRange[0]:blockRange[1]])[1]
+            
+            # Without animations every key would go
+            if len(animations) == 0:
+                return 0
+            
+            starts, ends = AnimationIntervals(animations)
+            
+            patches = []
+            removedCount = 0
+            for match in MayaCurveNodePattern.finditer(data):
+                blockStart = match.start()
+                blockEnd = MayaBlockEndPattern.search(data, match.end())
+                blockEnd = len(data) if blockEnd is None else blockEnd.start()
+                
+                curvePatches, curveRemovedCount = TrimCurveBlock(data[blockStart:blockEnd], starts, ends, trimStart, trimEnd)
+                patches += [[blockStart + start, blockStart + end, replacement] for start, end, replacement in curvePatches]
+                removedCount += curveRemovedCount
+        finally:
+            data.close()
+        
+        if removedCount > 0:
+            WritePatchedScene(sourceFd, filename, patches, outputFilename)
+    finally:
+        os.close(sourceFd)
+    
+    return removedCount
+
+def TrimMayaAsciiFile(filename):
+    '''
+    Returns [filename, keys removed, error] of TrimMayaAsciiKeys for filename
+    '''
+    try:
+        return [filename, TrimMayaAsciiKeys(filename), None]
+    except (IOError, OSError, ValueError, IndexError, MayaAsciiError) as error:
+        return [filename, 0, "%s: %s" % (type(error).__name__, error)]
+
+def TrimMayaAsciiFiles(filenames, workers=None):
+    '''
+    Returns TrimMayaAsciiFile of every file, in order, trimmed on a process pool
+    '''
+    return MapSceneFiles(TrimMayaAsciiFile, filenames, workers)
+
+'''
+Animation curve evaluation
+
+Evaluates animation curves without Maya: the keys, tangents and pre/post
+infinity of an animCurve node (from a .ma scene) or of an FBX take channel
+are sampled at any number of times in one NumPy call, for offline trimming,
+reduction and resampling of scenes without a license.
+
+Every segment is a cubic between its two keys. Unweighted tangents make it a
+Hermite spline from the out slope of the first key to the in slope of the
+second; weighted tangents make it a Bezier whose handles are as long (in
+time) as the weights, and the time of every sample is solved on its segment
+by bisection. The slopes of Maya's tangent types are computed from the keys
+around each one: spline and clamped tangents follow their neighbours, while
+plateau and auto tangents are flat on extremes and limited so a segment
+never overshoots its keys. Slow and fast tangents are evaluated as flat and
+linear ones.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import math
+import mmap
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxAscii import *
+    from FbxStitcher import *
+    from FbxCurves import *
+    from MayaAscii import *
+    from MayaCurves import *
+except ImportError:
+    pass
+
+CurveTangentTypes = ["fixed", "linear", "flat", "step", "stepNext", "spline", "clamped", "plateau", "auto", "slow", "fast"]
+
+CurveInfinities = ["constant", "linear", "cycle", "cycleRelative", "oscillate"]
+
+# The .kit/.kot and .pre/.pst values of .ma animCurve nodes
+MayaTangentCodes = {1: "fixed", 2: "linear", 3: "flat", 4: "spline", 5: "step", 6: "slow", 7: "fast", 8: "clamped",
+    9: "spline", 10: "clamped", 16: "plateau", 17: "stepNext", 18: "auto"}
+
+MayaInfinityCodes = {0: "constant", 1: "linear", 2: "constant", 3: "cycle", 4: "cycleRelative", 5: "oscillate"}
+
+# Curves whose tangents are stored in radians but keyed in degrees
+MayaAngularCurveType = b"animCurveTA"
+
+# Bisection steps that find the parameter of a time on a weighted segment, to 2^-40 of the segment
+CurveBisectionSteps = 40
+
+def TangentTypeIndices(tangentTypes, count):
+    '''
+    Returns the indices in CurveTangentTypes of one tangent type name for every key, or of a list of them
+    '''
+    if isinstance(tangentTypes, str):
+        return Numpy.full(count, CurveTangentTypes.index(tangentTypes), dtype=Numpy.int64)
+    
+    return Numpy.array([CurveTangentTypes.index(tangentType) for tangentType in tangentTypes], dtype=Numpy.int64).reshape(count)
+
+def OptionalKeyArray(values, count):
+    if values is None:
+        return None
+    
+    return Numpy.asarray(values, dtype=Numpy.float64).reshape(count)
+
+class AnimationCurve:
+    '''
+    The keys of one animation curve and how they are interpolated, e.g.
+        
+        curve = AnimationCurve([0, 10, 20], [0, 5, 0], "auto", "auto", postInfinity="oscillate")
+        curve.Evaluate(Numpy.arange(0, 100, 0.5))
+    
+    Tangent types are names in CurveTangentTypes, one for all keys or one per key; fixed tangents
+    take their slopes (value per time unit) from InSlopes and OutSlopes. Weights, if given, are the
+    lengths in time of the tangent handles and make the curve weighted
+    '''
+    Times = None
+    Values = None
+    InTangentTypes = None
+    OutTangentTypes = None
+    InSlopes = None
+    OutSlopes = None
+    InWeights = None
+    OutWeights = None
+    PreInfinity = "constant"
+    PostInfinity = "constant"
+    
+    def __init__(self, times, values, inTangentTypes="spline", outTangentTypes="spline", inSlopes=None, outSlopes=None,
+        inWeights=None, outWeights=None, preInfinity="constant", postInfinity="constant"):
+        RequireNumpy()
+        
+        self.Times = Numpy.asarray(times, dtype=Numpy.float64).ravel()
+        self.Values = Numpy.asarray(values, dtype=Numpy.float64).reshape(len(self.Times))
+        self.InTangentTypes = TangentTypeIndices(inTangentTypes, len(self.Times))
+        self.OutTangentTypes = TangentTypeIndices(outTangentTypes, len(self.Times))
+        self.InSlopes = OptionalKeyArray(inSlopes, len(self.Times))
+        self.OutSlopes = OptionalKeyArray(outSlopes, len(self.Times))
+        self.InWeights = OptionalKeyArray(inWeights, len(self.Times))
+        self.OutWeights = OptionalKeyArray(outWeights, len(self.Times))
+        self.PreInfinity = preInfinity
+        self.PostInfinity = postInfinity
+        
+        if preInfinity not in CurveInfinities or postInfinity not in CurveInfinities:
+            raise ValueError("Unknown infinity %s or %s" % (preInfinity, postInfinity))
+    
+    def Count(self):
+        return len(self.Times)
+    
+    def IsWeighted(self):
+        return self.InWeights is not None and self.OutWeights is not None
+    
+    def Slopes(self):
+        '''
+        Returns the in and out slopes of every key
+        '''
+        return (TangentSlopes(self.Times, self.Values, self.InTangentTypes, self.InSlopes, True),
+            TangentSlopes(self.Times, self.Values, self.OutTangentTypes, self.OutSlopes, False))
+    
+    def Evaluate(self, times):
+        return EvaluateCurve(self, times)
+
+def TangentSlopes(times, values, tangentTypes, fixedSlopes, incoming):
+    '''
+    Returns the in (incoming) or out slopes of keys with tangentTypes (indices in CurveTangentTypes);
+    fixed tangents without a finite slope in fixedSlopes are treated as spline ones
+    '''
+    count = len(times)
+    if count < 2:
+        return Numpy.zeros(count)
+    
+    # The slopes of the segments before and after every key, an end key's only segment on both sides
+    segmentSlopes = Numpy.diff(values) / Numpy.diff(times)
+    before = Numpy.concatenate([segmentSlopes[:1], segmentSlopes])
+    after = Numpy.concatenate([segmentSlopes, segmentSlopes[-1:]])
+    
+    spline = before.copy()
+    spline[1:-1] = (values[2:] - values[:-2]) / (times[2:] - times[:-2])
+    spline[0] = after[0]
+    
+    # A key level with a neighbour, or an extreme, is flat
+    level = Numpy.zeros(count, dtype=bool)
+    level[1:] |= Numpy.diff(values) == 0
+    level[:-1] |= Numpy.diff(values) == 0
+    extreme = before * after <= 0
+    extreme[[0, -1]] = True
+    
+    # Limited to three times the gentler segment, the cubics stay within their keys (Fritsch-Carlson)
+    limited = Numpy.sign(spline) * Numpy.minimum(Numpy.abs(spline), 3 * Numpy.minimum(Numpy.abs(before), Numpy.abs(after)))
+    
+    slopes = {"linear": before if incoming else after, "flat": 0.0, "slow": 0.0, "fast": before if incoming else after,
+        "step": 0.0, "stepNext": 0.0, "spline": spline, "clamped": Numpy.where(level, 0.0, spline),
+        "plateau": Numpy.where(extreme, 0.0, limited), "auto": Numpy.where(extreme, 0.0, limited)}
+    
+    result = spline.copy()
+    for tangentType, tangentSlopes in slopes.items():
+        mask = tangentTypes == CurveTangentTypes.index(tangentType)
+        result[mask] = (Numpy.zeros(count) + tangentSlopes)[mask]
+    
+    if fixedSlopes is not None:
+        fixed = (tangentTypes == CurveTangentTypes.index("fixed")) & Numpy.isfinite(fixedSlopes)
+        result[fixed] = fixedSlopes[fixed]
+    
+    return result
+
+def InfinityTimes(curve, times, inSlopes, outSlopes):
+    '''
+    Returns the times within the keys of curve that times outside them repeat by its infinities,
+    and the offsets to add to the values there
+    '''
+    first, last = curve.Times[0], curve.Times[-1]
+    span = last - first
+    localTimes = Numpy.clip(times, first, last)
+    offsets = Numpy.zeros(len(times))
+    
+    for outside, infinity, end, slope in [[times < first, curve.PreInfinity, first, inSlopes[0]],
+        [times > last, curve.PostInfinity, last, outSlopes[-1]]]:
+        if not outside.any():
+            continue
+        
+        if infinity == "linear":
+            offsets[outside] = (times[outside] - end) * slope
+        elif infinity != "constant" and span > 0:
+            cycles = Numpy.floor((times[outside] - first) / span)
+            phases = times[outside] - first - cycles * span
+            if infinity == "oscillate":
+                phases = Numpy.where(cycles % 2 != 0, span - phases, phases)
+            elif infinity == "cycleRelative":
+                offsets[outside] = cycles * (curve.Values[-1] - curve.Values[0])
+            
+            localTimes[outside] = first + phases
+    
+    return localTimes, offsets
+
+def BezierComponent(p0, p1, p2, p3, u):
+    v = 1 - u
+    return v * v * v * p0 + 3 * v * v * u * p1 + 3 * v * u * u * p2 + u * u * u * p3
+
+def SegmentParameters(x0, x1, x2, x3, times):
+    '''
+    Returns the parameters of times on the Bezier segments with time control points x0 to x3
+    '''
+    low = Numpy.zeros(len(times))
+    high = Numpy.ones(len(times))
+    for step in range(CurveBisectionSteps):
+        middle = (low + high) / 2
+        below = BezierComponent(x0, x1, x2, x3, middle) < times
+        low = Numpy.where(below, middle, low)
+        high = Numpy.where(below, high, middle)
+    
+    return (low + high) / 2
+
+def EvaluateCurve(curve, times):
+    '''
+    Returns the values of curve at times, an array of any shape
+    '''
+    RequireNumpy()
+    
+    times = Numpy.asarray(times, dtype=Numpy.float64)
+    shape = times.shape
+    times = times.ravel()
+    
+    if curve.Count() == 0:
+        return Numpy.zeros(shape)
+    
+    if curve.Count() == 1:
+        return Numpy.full(shape, curve.Values[0])
+    
+    inSlopes, outSlopes = curve.Slopes()
+    localTimes, offsets = InfinityTimes(curve, times, inSlopes, outSlopes)
+    
+    segments = Numpy.clip(Numpy.searchsorted(curve.Times, localTimes, side="right") - 1, 0, curve.Count() - 2)
+    t0, t1 = curve.Times[segments], curve.Times[segments + 1]
+    v0, v1 = curve.Values[segments], curve.Values[segments + 1]
+    lengths = t1 - t0
+    
+    # Unweighted handles are a third of the segment, which makes the Bezier a Hermite spline
+    if curve.IsWeighted():
+        outLengths = Numpy.clip(curve.OutWeights[segments], 0, lengths)
+        inLengths = Numpy.clip(curve.InWeights[segments + 1], 0, lengths)
+        u = SegmentParameters(t0, t0 + outLengths, t1 - inLengths, t1, localTimes)
+    else:
+        outLengths = inLengths = lengths / 3
+        u = (localTimes - t0) / lengths
+    
+    values = BezierComponent(v0, v0 + outLengths * outSlopes[segments], v1 - inLengths * inSlopes[segments + 1], v1, u)
+    
+    outTypes = curve.OutTangentTypes[segments]
+    values = Numpy.where(outTypes == CurveTangentTypes.index("step"), Numpy.where(u >= 1, v1, v0), values)
+    values = Numpy.where(outTypes == CurveTangentTypes.index("stepNext"), Numpy.where(u <= 0, v0, v1), values)
+    
+    return (values + offsets).reshape(shape)
+
+def MayaCurveSetting(block, name, default):
+    '''
+    Returns the first value of the setAttr of name in an animCurve block, or default
+    '''
+    for start, end, statement in MayaStatements(block):
+        if statement[0] == b"setAttr":
+            attributeName, values = ParseSetAttr(statement)
+            if attributeName == name and len(values) > 0:
+                return values[0]
+    
+    return default
+
+def MayaCurveFromBlock(block, framesPerSecond=24):
+    '''
+    Returns the name and AnimationCurve of the statements of a time based animCurve node, in frames
+    and the curve's stored unit (degrees for rotations); Maya stores fixed tangents as x in seconds
+    and y in internal units (radians for rotations), weighted ones three times as long as their handles
+    '''
+    createNode = next(MayaStatements(block))[2]
+    name = ""
+    if b"-n" in createNode:
+        name = UnquoteMelString(createNode[createNode.index(b"-n") + 1])
+    
+    attributes = ParseKeyAttributes(block)[0]
+    if MayaKeyTimeAttribute not in attributes:
+        return name, AnimationCurve([], [])
+    
+    indices, keyValues = attributes[MayaKeyTimeAttribute]
+    order = Numpy.argsort(indices, kind="mergesort")
+    indices, keyValues = indices[order], keyValues[order].astype(Numpy.float64)
+    count = len(indices)
+    
+    def KeyAttribute(attributeName, default):
+        values = Numpy.full(count, default, dtype=Numpy.float64)
+        if attributeName in attributes:
+            attributeIndices, attributeValues = attributes[attributeName]
+            positions = Numpy.searchsorted(indices, attributeIndices)
+            found = (positions < count) & (indices[Numpy.minimum(positions, count - 1)] == attributeIndices)
+            values[positions[found]] = attributeValues[found, 0].astype(Numpy.float64)
+        
+        return values
+    
+    # Keys without a stored tangent type have the curve's
+    defaultCode = int(MayaCurveSetting(block, "tan", b"18"))
+    
+    def TangentTypes(attributeName):
+        codes = KeyAttribute(attributeName, defaultCode).astype(Numpy.int64)
+        return [MayaTangentCodes.get(code, "auto") for code in codes.tolist()]
+    
+    yScale = 1.0
+    if createNode[1] == MayaAngularCurveType:
+        yScale = math.degrees(1)
+    
+    inX, inY = KeyAttribute("kix", Numpy.nan), KeyAttribute("kiy", Numpy.nan)
+    outX, outY = KeyAttribute("kox", Numpy.nan), KeyAttribute("koy", Numpy.nan)
+    
+    # Slopes per frame; a vertical tangent is left to the tangent type
+    with Numpy.errstate(divide="ignore", invalid="ignore"):
+        inSlopes = Numpy.where(inX != 0, inY * yScale / (inX * framesPerSecond), Numpy.nan)
+        outSlopes = Numpy.where(outX != 0, outY * yScale / (outX * framesPerSecond), Numpy.nan)
+    
+    inWeights = outWeights = None
+    if MelBool(MayaCurveSetting(block, "wgt", b"no")):
+        inWeights = Numpy.where(Numpy.isfinite(inX), inX * framesPerSecond / 3, Numpy.nan)
+        outWeights = Numpy.where(Numpy.isfinite(outX), outX * framesPerSecond / 3, Numpy.nan)
+        
+        # Keys without stored tangents get a third of their segments
+        thirds = Numpy.diff(keyValues[:, 0]) / 3
+        inWeights[1:] = Numpy.where(Numpy.isfinite(inWeights[1:]), inWeights[1:], thirds)
+        outWeights[:-1] = Numpy.where(Numpy.isfinite(outWeights[:-1]), outWeights[:-1], thirds)
+    
+    preInfinity = MayaInfinityCodes.get(int(MayaCurveSetting(block, "pre", b"0")), "constant")
+    postInfinity = MayaInfinityCodes.get(int(MayaCurveSetting(block, "pst", b"0")), "constant")
+    
+    return name, AnimationCurve(keyValues[:, 0], keyValues[:, 1], TangentTypes("kit"), TangentTypes("kot"), inSlopes, outSlopes,
+        inWeights, outWeights, preInfinity, postInfinity)
+
+def ReadMayaCurves(filename, framesPerSecond=24):
+    '''
+    Returns {node name: AnimationCurve} of the time based animCurve nodes of the .ma scene filename,
+    times in the scene's frames at framesPerSecond
+    '''
+    RequireNumpy()
+    
+    curves = {}
+    sourceFd = OpenBinary(filename, os.O_RDONLY)
+    try:
+        if os.fstat(sourceFd).st_size == 0:
+            return curves
+        
+        data = mmap.mmap(sourceFd, 0, access=mmap.ACCESS_READ)
+        try:
+            for match in MayaCurveNodePattern.finditer(data):
+                blockEnd = MayaBlockEndPattern.search(data, match.end())
+                blockEnd = len(data) if blockEnd is None else blockEnd.start()
+                
+                name, curve = MayaCurveFromBlock(data[match.start():blockEnd], framesPerSecond)
+                curves[name] = curve
+        finally:
+            data.close()
+    finally:
+        os.close(sourceFd)
+    
+    return curves
+
+def FbxKeyCurve(rawKeys):
+    '''
+    Returns the AnimationCurve of the raw value of a Key node, in FBX ticks: L keys are linear, C keys
+    constant and U keys cubic, with the slopes of U,s keys (per second, out of the key and into the
+    next one) and auto tangents otherwise. FBX weights are not used
+    '''
+    tokens, starts = SplitKeyRecords(rawKeys)
+    count = len(starts)
+    if count == 0:
+        return AnimationCurve([], [])
+    
+    times = tokens[starts].astype(Numpy.float64)
+    values = tokens[starts + 1].astype(Numpy.float64)
+    codes = tokens[starts + 2]
+    
+    # U,s,outSlope,nextInSlope, when the key has those tokens
+    nextStarts = Numpy.concatenate([starts[1:], [len(tokens)]])
+    userSlopes = (codes == b"U") & (starts + 5 < nextStarts) & (tokens[Numpy.minimum(starts + 3, len(tokens) - 1)] == b"s")
+    slopeKeys = Numpy.flatnonzero(userSlopes)
+    nextKeys = slopeKeys[slopeKeys + 1 < count]
+    
+    outSlopes = Numpy.full(count, Numpy.nan)
+    inSlopes = Numpy.full(count, Numpy.nan)
+    outSlopes[slopeKeys] = tokens[starts[slopeKeys] + 4].astype(Numpy.float64) / FbxTicksPerSecond
+    inSlopes[nextKeys + 1] = tokens[starts[nextKeys] + 5].astype(Numpy.float64) / FbxTicksPerSecond
+    
+    # A key comes in the way the key before it goes out
+    outTypes = Numpy.where(codes == b"L", "linear", Numpy.where(codes == b"C", "step", Numpy.where(userSlopes, "fixed", "auto")))
+    inTypes = Numpy.where(outTypes == "step", "auto", outTypes)
+    inTypes = Numpy.concatenate([inTypes[:1], inTypes[:-1]])
+    
+    return AnimationCurve(times, values, inTypes.tolist(), outTypes.tolist(), inSlopes, outSlopes)
+
+def ReadFbxCurves(filename, takeName=None):
+    '''
+    Returns {"Model::Name/channel": AnimationCurve} of the channels of a take of an FBX ASCII file,
+    in FBX ticks; takeName is as in ReadTakeCurves
+    '''
+    RequireNumpy()
+    
+    curves = {}
+    document = FbxDocument(filename)
+    try:
+        for model, path, channelNode in KeyedChannels(FindTakeNode(document, takeName)):
+            keyNode = channelNode.Find("Key")
+            if keyNode is not None:
+                curves["%s/%s" % (model, path)] = FbxKeyCurve(keyNode.RawValue())
+    finally:
+        document.Close()
+    
+    return curves
+
+'''
+Pose sampler
+
+Querying transforms with Cmds.xform or getAttr costs a command per node,
+attribute and frame, millions of them over a skeleton and a long timeline.
+PoseSampler walks a joint hierarchy once, keeping the plugs of each joint's
+local translate, rotate and scale plugs, and evaluates them at every frame
+through one MDGContext, without moving the timeline. Each compound plug is
+read once per joint and frame as a vector, and the rotations of all the
+joints are turned into degrees at once. Values are written straight into a
+preallocated (frames, joints, 9) NumPy array.
+
+The evaluation goes through a backend: OpenMayaPoseBackend in Maya,
+FakePoseBackend (FakeMaya.py) on the in-memory stand-in.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from Common import *
+    from FbxCurves import *
+    from FakeMaya import *
+except ImportError:
+    pass
+
+PoseChannels = ["translateX", "translateY", "translateZ", "rotateX", "rotateY", "rotateZ", "scaleX", "scaleY", "scaleZ"]
+
+PoseChannelDefaults = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 1.0, 1.0]
+
+# Channels evaluated as angles, in degrees like getAttr
+PoseAngleChannels = [3, 4, 5]
+
+# The compound plugs of the channels, in the order of PoseChannels
+PoseCompoundPlugs = ["translate", "rotate", "scale"]
+
+class OpenMayaPoseBackend:
+    '''
+    Evaluates the translate, rotate and scale plugs of the transforms found through OpenMaya
+    '''
+    def Walk(self, rootJoint, descendants=True):
+        '''
+        Returns the names, depth first from rootJoint, and the path and compound plugs of rootJoint
+        and (with descendants) the joints below it
+        '''
+        selection = OpenMaya.MSelectionList()
+        selection.add(rootJoint)
+        rootPath = OpenMaya.MDagPath()
+        selection.getDagPath(0, rootPath)
+        
+        names = []
+        handles = []
+        paths = [rootPath]
+        while len(paths) > 0:
+            path = paths.pop()
+            transform = OpenMaya.MFnTransform(path)
+            names.append(path.partialPathName())
+            handles.append([path] + [transform.findPlug(plugName) for plugName in PoseCompoundPlugs])
+            
+            if not descendants:
+                continue
+            
+            # Pushed in reverse so the first child is walked first
+            for childIndex in reversed(range(path.childCount())):
+                child = path.child(childIndex)
+                if child.hasFn(OpenMaya.MFn.kJoint):
+                    childPath = OpenMaya.MDagPath(path)
+                    childPath.push(child)
+                    paths.append(childPath)
+        
+        return names, handles
+    
+    def Valid(self, names, handles):
+        '''
+        Returns whether the walked transforms still exist under their names
+        '''
+        for name, handle in zip(names, handles):
+            if not handle[0].isValid() or handle[0].partialPathName() != name:
+                return False
+        
+        return True
+    
+    def Evaluate(self, handles, frame, poses):
+        '''
+        Writes the channels of every joint at frame, in the current time unit, to the rows of poses
+        '''
+        context = OpenMaya.MDGContext(OpenMaya.MTime(float(frame), OpenMaya.MTime.uiUnit()))
+        for jointIndex in range(len(handles)):
+            for plugIndex in range(len(PoseCompoundPlugs)):
+                plug = handles[jointIndex][plugIndex + 1]
+                dataHandle = plug.asMDataHandle(context)
+                vector = dataHandle.asVector()
+                plug.destructHandle(dataHandle)
+                poses[jointIndex, 3 * plugIndex:3 * plugIndex + 3] = [vector.x, vector.y, vector.z]
+        
+        # The rotate plugs hold radians
+        poses[:, PoseAngleChannels] = Numpy.degrees(poses[:, PoseAngleChannels])
+
+def DefaultPoseBackend():
+    '''
+    Returns the backend of the current Cmds: OpenMaya in Maya, FakePoseBackend on FakeCmds
+    '''
+    if OpenMaya is None or isinstance(Cmds, FakeCmds):
+        return FakePoseBackend(Cmds)
+    
+    return OpenMayaPoseBackend()
+
+class PoseSampler:
+    '''
+    The local channels of a joint hierarchy (see PoseChannels), sampled over many frames at once, e.g.
+        
+        sampler = PoseSampler("Hips")
+        poses = sampler.Sample(range(0, 121))
+        poses[12, sampler.Joints.index("Head")]
+    '''
+    Joints = None
+    Backend = None
+    Handles = None
+    
+    def __init__(self, rootJoint, descendants=True, backend=None):
+        RequireNumpy()
+        
+        self.Backend = backend or DefaultPoseBackend()
+        self.Joints, self.Handles = self.Backend.Walk(rootJoint, descendants)
+    
+    def Valid(self):
+        '''
+        Returns whether the joints still exist under the names they were walked with
+        '''
+        return self.Backend.Valid(self.Joints, self.Handles)
+    
+    def Sample(self, frames, poses=None):
+        '''
+        Returns the channels of the joints at every frame as a (frames, joints, 9) array, poses if given
+        '''
+        shape = (len(frames), len(self.Joints), len(PoseChannels))
+        if poses is None:
+            poses = Numpy.empty(shape)
+        elif poses.shape != shape:
+            raise ValueError("Poses of shape %s for %d frames of %d joints" % (poses.shape, shape[0], shape[1]))
+        
+        for frameIndex in range(len(frames)):
+            self.Backend.Evaluate(self.Handles, frames[frameIndex], poses[frameIndex])
+        
+        return poses
+
+# The single transform samplers of SampleTransform, by node name
+TransformSamplers = {}
+
+def SampleTransform(nodeName):
+    '''
+    Returns the local translate, rotate and scale of nodeName at the current time
+    The sampler of nodeName is walked once and reused while the node is there
+    '''
+    sampler = TransformSamplers.get(nodeName)
+    if sampler is None or not sampler.Valid():
+        sampler = PoseSampler(nodeName, descendants=False)
+        TransformSamplers[nodeName] = sampler
+    
+    pose = sampler.Sample([Cmds.currentTime(query=True)])[0, 0]
+    return pose[0:3].tolist(), pose[3:6].tolist(), pose[6:9].tolist()
+
+'''
+Pose cache
+
+Baking, playblasts and every export evaluate the same rig over the same
+frames again and again. The local transform channels of every joint on every
+frame of an animation (translate, rotate and scale, a (frames, joints, 9)
+array) are sampled once and stored as a .npy file in a folder next to the
+scene, read back memory mapped so readers share the pages instead of driving
+the timeline.
+
+Each file is named by a hash of what its poses depend on: the joints, the
+animation's frame range, and the keys of their channels in that range and
+the ones just around it. Editing the keys of one animation changes the hash
+of that range only, so the other animations are still found; files no
+longer named by any animation are pruned.
+
+Poses come from a source: SessionPoseSource samples the open scene with a
+PoseSampler, MayaAsciiPoseSource evaluates the animCurves of a .ma scene without
+Maya.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import re
+import json
+import mmap
+import hashlib
+import tempfile
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxStitcher import *
+    from FbxCurves import *
+    from MayaAscii import *
+    from MayaCurves import *
+    from AnimationCurve import *
+    from PoseSampler import *
+except ImportError:
+    pass
+
+# Short names of the channels, and of the compounds that set three of them
+PoseChannelNames = {"tx": 0, "ty": 1, "tz": 2, "rx": 3, "ry": 4, "rz": 5, "sx": 6, "sy": 7, "sz": 8}
+
+PoseCompoundNames = {"t": 0, "translate": 0, "r": 3, "rotate": 3, "s": 6, "scale": 6}
+
+# Folder of the cache, next to the scene
+PoseCacheSuffix = "_Poses"
+
+PoseCacheExtension = ".npy"
+
+# Part of every key; changing how poses are sampled invalidates the old files
+PoseCacheVersion = 1
+
+MayaJointNodePattern = re.compile(br'^createNode joint ', re.M)
+
+MayaConnectionPattern = re.compile(br'^connectAttr (?:-\S+ )*"([^"]+)\.o(?:utput)?" "([^"]+)\.([A-Za-z]+)"', re.M)
+
+class PoseCacheError(Exception):
+    pass
+
+def PoseChannelIndex(attributeName):
+    '''
+    Returns the index in PoseChannels of a channel's long or short name, or None
+    '''
+    if attributeName in PoseChannels:
+        return PoseChannels.index(attributeName)
+    
+    return PoseChannelNames.get(attributeName)
+
+def PoseCacheDirectory(sceneFilename):
+    return os.path.splitext(sceneFilename)[0] + PoseCacheSuffix
+
+def PoseKey(joints, startFrame, endFrame, keyData):
+    '''
+    Returns the hex digest that names the poses of joints over [startFrame, endFrame], keyData
+    being byte strings of everything that drives them
+    '''
+    digest = hashlib.sha1()
+    digest.update(json.dumps([PoseCacheVersion, PoseChannels, list(joints), startFrame, endFrame]).encode("utf-8"))
+    for data in keyData:
+        digest.update(b"%d:" % len(data))
+        digest.update(data)
+    
+    return digest.hexdigest()
+
+class PoseCache:
+    '''
+    Pose arrays stored in directory as .npy files named by their PoseKey, e.g.
+        
+        cache = PoseCache(PoseCacheDirectory("Hero.ma"))
+        poses = cache.Get(key, lambda: source.Sample(frames))
+    
+    Arrays are returned memory mapped and read only
+    '''
+    Directory = ""
+    
+    def __init__(self, directory):
+        self.Directory = directory
+    
+    def Filename(self, key):
+        return os.path.join(self.Directory, key + PoseCacheExtension)
+    
+    def Load(self, key, shape=None):
+        '''
+        Returns the poses stored under key, or None
+        Raises PoseCacheError if they are not of shape, when given
+        '''
+        filename = self.Filename(key)
+        if not os.path.exists(filename):
+            return None
+        
+        # A file cut short (by a crash) is sampled again
+        try:
+            poses = Numpy.load(filename, mmap_mode="r")
+        except (IOError, ValueError):
+            return None
+        
+        if shape is not None and poses.shape != tuple(shape):
+            raise PoseCacheError("Poses of shape %s under %s, expected %s" % (poses.shape, key, tuple(shape)))
+        
+        return poses
+    
+    def Store(self, key, poses):
+        '''
+        Writes poses under key, replacing the file in one rename, and returns them memory mapped
+        '''
+        if not os.path.isdir(self.Directory):
+            os.makedirs(self.Directory)
+        
+        temporaryFd, temporaryFilename = tempfile.mkstemp(suffix=PoseCacheExtension, dir=self.Directory)
+        written = False
+        try:
+            temporaryFile = os.fdopen(temporaryFd, "wb")
+            try:
+                Numpy.save(temporaryFile, Numpy.ascontiguousarray(poses, dtype=Numpy.float64))
+            finally:
+                temporaryFile.close()
+            
+            ReplaceFile(temporaryFilename, self.Filename(key))
+            written = True
+        finally:
+            if not written:
+                os.remove(temporaryFilename)
+        
+        return self.Load(key)
+    
+    def Get(self, key, sample, shape=None):
+        '''
+        Returns the poses stored under key, or stores and returns those sample() returns
+        Raises PoseCacheError if the stored poses are not of shape, when given
+        '''
+        poses = self.Load(key, shape)
+        if poses is None:
+            poses = self.Store(key, sample())
+        
+        return poses
+    
+    def Keys(self):
+        if not os.path.isdir(self.Directory):
+            return []
+        
+        return sorted([os.path.splitext(fileName)[0] for fileName in os.listdir(self.Directory) if fileName.endswith(PoseCacheExtension)])
+    
+    def Prune(self, keys):
+        '''
+        Removes the files of every key but keys, and returns how many were removed
+        '''
+        keptKeys = set(keys)
+        removedKeys = [key for key in self.Keys() if key not in keptKeys]
+        for key in removedKeys:
+            os.remove(self.Filename(key))
+        
+        return len(removedKeys)
+
+def CachePoses(cache, source, ranges, prune=False):
+    '''
+    Returns {name: poses (frames, joints, 9)} of the [name, startFrame, endFrame] ranges, every
+    frame of each from the first to the last, out of cache or sampled by source and stored;
+    with prune, the files of other ranges (and other joints) are removed
+    '''
+    RequireNumpy()
+    
+    poses = {}
+    keys = []
+    for name, startFrame, endFrame in ranges:
+        frames = Numpy.arange(startFrame, endFrame + 1, dtype=Numpy.float64)
+        key = PoseKey(source.Joints, startFrame, endFrame, source.RangeKeyData(startFrame, endFrame))
+        poses[name] = cache.Get(key, lambda: source.Sample(frames), (len(frames), len(source.Joints), len(PoseChannels)))
+        keys.append(key)
+    
+    if prune:
+        cache.Prune(keys)
+    
+    return poses
+
+class SessionPoseSource:
+    '''
+    The joints of the open scene from rootJoint down, sampled with a PoseSampler
+    '''
+    Joints = None
+    Sampler = None
+    
+    def __init__(self, rootJoint, backend=None):
+        self.Sampler = PoseSampler(rootJoint, backend=backend)
+        self.Joints = self.Sampler.Joints
+    
+    def RangeKeyData(self, startFrame, endFrame):
+        '''
+        Yields the keys of every channel in [startFrame, endFrame] and the ones on either side, or
+        its value if it has none, as JSON
+        '''
+        for joint in self.Joints:
+            for channel in PoseChannels:
+                attribute = "%s.%s" % (joint, channel)
+                if not Cmds.keyframe(attribute, q=True, keyframeCount=True):
+                    yield json.dumps([attribute, Cmds.getAttr(attribute)]).encode("utf-8")
+                    continue
+                
+                # findKeyframe wraps around, so a previous key after the start is the last one
+                firstTime = Cmds.findKeyframe(attribute, which="previous", time=(startFrame, startFrame))
+                lastTime = Cmds.findKeyframe(attribute, which="next", time=(endFrame, endFrame))
+                timeRange = (min(firstTime, startFrame), max(lastTime, endFrame))
+                
+                keys = [attribute]
+                for flags in [{"timeChange": True}, {"valueChange": True}]:
+                    keys.append(Cmds.keyframe(attribute, q=True, time=timeRange, **flags))
+                
+                for flags in [{"inTangentType": True}, {"outTangentType": True}, {"inAngle": True}, {"outAngle": True},
+                    {"inWeight": True}, {"outWeight": True}]:
+                    keys.append(Cmds.keyTangent(attribute, q=True, time=timeRange, **flags))
+                
+                yield json.dumps(keys).encode("utf-8")
+    
+    def Sample(self, frames):
+        return self.Sampler.Sample(frames)
+
+def MayaJointBlock(block):
+    '''
+    Returns the name and the static channel values of the statements of a joint node
+    '''
+    createNode = next(MayaStatements(block))[2]
+    name = ""
+    if b"-n" in createNode:
+        name = UnquoteMelString(createNode[createNode.index(b"-n") + 1])
+    
+    values = list(PoseChannelDefaults)
+    for start, end, statement in MayaStatements(block):
+        if statement[0] != b"setAttr":
+            continue
+        
+        attributeName, attributeValues = ParseSetAttr(statement)
+        if attributeName in PoseCompoundNames and len(attributeValues) == 3:
+            first = PoseCompoundNames[attributeName]
+            values[first:first + 3] = [float(value) for value in attributeValues]
+        elif PoseChannelIndex(attributeName) is not None and len(attributeValues) == 1:
+            values[PoseChannelIndex(attributeName)] = float(attributeValues[0])
+    
+    return name, values
+
+def ShortNodeName(name):
+    return name.split("|")[-1]
+
+class MayaAsciiPoseSource:
+    '''
+    The joints of a .ma scene, evaluated from the animCurves connected to their channels (see
+    ReadMayaCurves) without Maya; frames are in the scene's time unit at framesPerSecond. Joints
+    are matched to connections by their short names
+    '''
+    Joints = None
+    StaticValues = None
+    Curves = None
+    
+    def __init__(self, filename, framesPerSecond=24):
+        RequireNumpy()
+        
+        self.Joints = []
+        self.StaticValues = []
+        self.Curves = []
+        
+        sourceFd = OpenBinary(filename, os.O_RDONLY)
+        try:
+            if os.fstat(sourceFd).st_size == 0:
+                return
+            
+            data = mmap.mmap(sourceFd, 0, access=mmap.ACCESS_READ)
+            try:
+                for match in MayaJointNodePattern.finditer(data):
+                    blockEnd = MayaBlockEndPattern.search(data, match.end())
+                    blockEnd = len(data) if blockEnd is None else blockEnd.start()
+                    
+                    name, values = MayaJointBlock(data[match.start():blockEnd])
+                    self.Joints.append(name)
+                    self.StaticValues.append(values)
+                
+                curves = {}
+                for match in MayaCurveNodePattern.finditer(data):
+                    blockEnd = MayaBlockEndPattern.search(data, match.end())
+                    blockEnd = len(data) if blockEnd is None else blockEnd.start()
+                    
+                    name, curve = MayaCurveFromBlock(data[match.start():blockEnd], framesPerSecond)
+                    curves[name] = curve
+                
+                jointIndices = dict([(ShortNodeName(joint), jointIndex) for jointIndex, joint in enumerate(self.Joints)])
+                for match in MayaConnectionPattern.finditer(data):
+                    curveName, nodeName, attributeName = [group.decode("utf-8") for group in match.groups()]
+                    channelIndex = PoseChannelIndex(attributeName)
+                    curveName = ShortNodeName(curveName)
+                    nodeName = ShortNodeName(nodeName)
+                    if channelIndex is not None and nodeName in jointIndices and curveName in curves:
+                        self.Curves.append([jointIndices[nodeName], channelIndex, curveName, curves[curveName]])
+            finally:
+                data.close()
+        finally:
+            os.close(sourceFd)
+        
+        self.StaticValues = Numpy.array(self.StaticValues, dtype=Numpy.float64).reshape(len(self.Joints), len(PoseChannels))
+    
+    def RangeKeyData(self, startFrame, endFrame):
+        '''
+        Yields the static values of the joints, then the keys of every connected curve in
+        [startFrame, endFrame] and the ones on either side (all of them if its infinity repeats them)
+        '''
+        yield self.StaticValues.tobytes()
+        
+        for jointIndex, channelIndex, curveName, curve in self.Curves:
+            first = max(Numpy.searchsorted(curve.Times, startFrame, side="left") - 1, 0)
+            last = Numpy.searchsorted(curve.Times, endFrame, side="right") + 1
+            outside = curve.Count() > 0 and (startFrame < curve.Times[0] or endFrame > curve.Times[-1])
+            if outside and (curve.PreInfinity != "constant" or curve.PostInfinity != "constant"):
+                first, last = 0, curve.Count()
+            
+            arrays = [curve.Times, curve.Values, curve.InTangentTypes, curve.OutTangentTypes, curve.InSlopes, curve.OutSlopes,
+                curve.InWeights, curve.OutWeights]
+            header = json.dumps([jointIndex, channelIndex, curveName, curve.PreInfinity, curve.PostInfinity, curve.IsWeighted()])
+            yield header.encode("utf-8") + b"".join([array[first:last].tobytes() for array in arrays if array is not None])
+    
+    def Sample(self, frames):
+        frames = Numpy.asarray(frames, dtype=Numpy.float64)
+        poses = Numpy.repeat(self.StaticValues[None], len(frames), axis=0)
+        for jointIndex, channelIndex, curveName, curve in self.Curves:
+            if curve.Count() > 0:
+                poses[:, jointIndex, channelIndex] = curve.Evaluate(frames)
+        
+        return poses
+
+def CacheMayaAsciiPoses(filename, framesPerSecond=24, animations=None):
+    '''
+    Returns {animation name: poses} of the joints of the .ma scene filename over the animations
+    of its SequencerData (or animations, records with a Name, StartFrame and EndFrame), cached
+    next to the scene, whose stale files are pruned
+    '''
+    if animations is None:
+        sequencerData = ReadSequencerData(filename)
+        animations = [] if sequencerData is None else sequencerData[1]
+    
+    source = MayaAsciiPoseSource(filename, framesPerSecond)
+    ranges = [[animation["Name"], animation["StartFrame"], animation["EndFrame"]] for animation in animations]
+    return CachePoses(PoseCache(PoseCacheDirectory(filename)), source, ranges, prune=True)
+
+def CacheMayaAsciiFile(filename):
+    '''
+    Returns [filename, animations cached, error] of CacheMayaAsciiPoses for filename
+    '''
+    try:
+        return [filename, len(CacheMayaAsciiPoses(filename)), None]
+    except (IOError, OSError, ValueError, IndexError, MayaAsciiError, PoseCacheError) as error:
+        return [filename, 0, "%s: %s" % (type(error).__name__, error)]
+
+def CacheMayaAsciiFiles(filenames, workers=None):
+    '''
+    Returns CacheMayaAsciiFile of every file, in order, cached on a process pool
+    '''
+    return MapSceneFiles(CacheMayaAsciiFile, filenames, workers)
+
+'''
+Maya backend
+
+The Sequencer talks to Maya through the module level Cmds and Mel. Outside
+Maya (when maya.cmds cannot be imported) they are pointed at FakeCmds and
+FakeMel, an in-memory stand-in for the part of Maya the Sequencer uses: nodes
+and their hierarchy, dynamic attributes (like the SequencerData script node),
+key curves, the timeline, undo and the UI controls. FBXExport and playblast
+write files, so whole pipelines can be run and profiled headless.
+FakePoseBackend evaluates the same nodes for PoseSampler.
+
+SetBackend swaps the backend, e.g. for a fresh FakeCmds between runs.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import re
+import bisect
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from Common import *
+    from FbxCurves import *
+    from AnimationMath import *
+except ImportError:
+    pass
+
+# Node types that get transform attributes and are picked by select(all=True)
+FakeDagTypes = ['transform', 'joint']
+
+FakeTransformAttributes = ['translateX', 'translateY', 'translateZ', 'rotateX', 'rotateY', 'rotateZ',
+    'scaleX', 'scaleY', 'scaleZ', 'visibility']
+
+FakeAttributeAliases = {'tx': 'translateX', 'ty': 'translateY', 'tz': 'translateZ', 'rx': 'rotateX', 'ry': 'rotateY',
+    'rz': 'rotateZ', 'sx': 'scaleX', 'sy': 'scaleY', 'sz': 'scaleZ', 'v': 'visibility', 'ro': 'rotateOrder'}
+
+FakeUiCommands = ['window', 'scrollLayout', 'columnLayout', 'rowLayout', 'frameLayout', 'checkBox', 'textField',
+    'text', 'button', 'separator', 'progressBar']
+
+# What controls return for flags that were never set
+FakeUiDefaults = {'text': '', 'value': False, 'isCancelled': False}
+
+def SetBackend(cmds, mel):
+    '''
+    Points the Cmds and Mel used by the Sequencer at another backend and returns
+    the previous pair; only has an effect in the combined Sequencer.py
+    '''
+    global Cmds, Mel
+    previousBackend = (globals().get("Cmds"), globals().get("Mel"))
+    Cmds = cmds
+    Mel = mel
+    return previousBackend
+
+def UseFakeMaya():
+    '''
+    Switches to a new, empty FakeCmds and returns it
+    '''
+    cmds = FakeCmds()
+    SetBackend(cmds, FakeMel(cmds))
+    return cmds
+
+def Flag(flags, longName, shortName, default=None):
+    '''
+    Returns the value of a command flag given by its long or short name
+    '''
+    if longName in flags:
+        return flags[longName]
+        
+    return flags.get(shortName, default)
+
+def TimeRange(time):
+    '''
+    Returns (start, end) of a time flag, a single time or a (start, end) pair
+    '''
+    if time is None:
+        return None
+        
+    if isinstance(time, (list, tuple)):
+        if len(time) == 1:
+            return time[0], time[0]
+            
+        return time[0], time[1]
+        
+    return time, time
+
+def FlatNames(objects):
+    names = []
+    for item in objects:
+        if isinstance(item, (list, tuple)):
+            names.extend(item)
+        else:
+            names.append(item)
+            
+    return names
+
+class FakeAttribute:
+    Type = ""
+    Value = None
+    Parent = None
+    
+    def __init__(self, attributeType, value, parent=None):
+        self.Type = attributeType
+        self.Value = value
+        self.Parent = parent
+
+class FakeCurve:
+    '''
+    The keys of one attribute, sorted by time
+    '''
+    def __init__(self, times=None, values=None):
+        self.Times = list(times or [])
+        self.Values = list(values or [])
+        
+    def Copy(self):
+        return FakeCurve(self.Times, self.Values)
+        
+    def Range(self, timeRange):
+        if timeRange is None:
+            return 0, len(self.Times)
+            
+        return bisect.bisect_left(self.Times, timeRange[0]), bisect.bisect_right(self.Times, timeRange[1])
+        
+    def SetKey(self, time, value):
+        index = bisect.bisect_left(self.Times, time)
+        if index < len(self.Times) and self.Times[index] == time:
+            self.Values[index] = value
+        else:
+            self.Times.insert(index, time)
+            self.Values.insert(index, value)
+            
+    def Evaluate(self, time):
+        '''
+        Linear interpolation between the keys, constant outside them
+        '''
+        index = bisect.bisect_right(self.Times, time)
+        if index == 0:
+            return self.Values[0]
+            
+        if index == len(self.Times):
+            return self.Values[-1]
+            
+        startTime, endTime = self.Times[index - 1], self.Times[index]
+        weight = float(time - startTime) / (endTime - startTime)
+        return self.Values[index - 1] + (self.Values[index] - self.Values[index - 1]) * weight
+
+class FakeNode:
+    Name = ""
+    Type = ""
+    Parent = None
+    
+    def __init__(self, name, nodeType, parent=None):
+        self.Name = name
+        self.Type = nodeType
+        self.Parent = parent
+        self.Children = []
+        self.Attributes = {}
+        self.Curves = {}
+        
+        if nodeType in FakeDagTypes:
+            for attributeName in FakeTransformAttributes:
+                default = 0.0
+                if attributeName.startswith('scale') or attributeName == 'visibility':
+                    default = 1.0
+                    
+                self.Attributes[attributeName] = FakeAttribute('double', default)
+
+            # An index into RotateOrders, like Maya's enum
+            self.Attributes['rotateOrder'] = FakeAttribute('enum', 0)
+
+class FakeCmds:
+    '''
+    In-memory stand-in for maya.cmds, e.g.
+    
+        cmds = UseFakeMaya()
+        cmds.createNode('joint', name='Joint_Root')
+        cmds.setKeyframe('Joint_Root.translateX', time=1, value=5.0)
+        
+    Dialogs answer with their dismissString (or first button) unless
+    DialogAnswer is set; the messages shown are kept in Dialogs. evalDeferred
+    callables wait in Deferred until Idle runs them, as Maya does when idle
+    '''
+    SceneName = ""
+    TimeUnit = "film"
+    CurrentTime = 0
+    DialogAnswer = None
+    PromptText = ""
+    
+    def __init__(self):
+        self.Nodes = {}
+        self.Selection = []
+        self.Controls = {}
+        self.Dialogs = []
+        self.Exports = []
+        self.Deferred = []
+        self.PlaybackRange = [1, 120]
+        self.undoStack = []
+        self.undoEnabled = True
+        self.undoing = False
+        self.chunkDepth = 0
+        self.controlCount = 0
+        self.parentControl = None
+        
+    def __getattr__(self, name):
+        if name in FakeUiCommands:
+            return lambda *objects, **flags: self.UiCommand(name, *objects, **flags)
+            
+        raise AttributeError("FakeCmds has no command %s" % name)
+        
+    # Undo
+    
+    def RecordUndo(self, undo):
+        if not self.undoEnabled or self.undoing:
+            return
+            
+        if self.chunkDepth > 0:
+            self.undoStack[-1].append(undo)
+        else:
+            self.undoStack.append([undo])
+            
+    def undo(self):
+        if len(self.undoStack) == 0:
+            return
+            
+        self.undoing = True
+        try:
+            for undo in reversed(self.undoStack.pop()):
+                undo()
+        finally:
+            self.undoing = False
+            
+    def undoInfo(self, **flags):
+        if Flag(flags, 'openChunk', 'ock'):
+            if self.chunkDepth == 0:
+                self.undoStack.append([])
+                
+            self.chunkDepth += 1
+        elif Flag(flags, 'closeChunk', 'cck'):
+            self.chunkDepth = max(0, self.chunkDepth - 1)
+        elif Flag(flags, 'query', 'q'):
+            return self.undoEnabled
+        elif Flag(flags, 'state', 'st') is not None:
+            self.undoEnabled = bool(Flag(flags, 'state', 'st'))
+            
+    # Nodes
+    
+    def Node(self, name):
+        if name not in self.Nodes:
+            raise ValueError("No object matches name: %s" % name)
+            
+        return self.Nodes[name]
+        
+    def Descendants(self, node):
+        nodes = [node]
+        for childName in node.Children:
+            nodes.extend(self.Descendants(self.Nodes[childName]))
+            
+        return nodes
+        
+    def Targets(self, objects, flags):
+        '''
+        Returns the nodes a command works on: objects or the selection, plus their
+        descendants with hierarchy below
+        '''
+        names = FlatNames(objects) or list(self.Selection)
+        nodes = [self.Node(name.split('.')[0]) for name in names]
+        
+        if Flag(flags, 'hierarchy', 'hi') == 'below':
+            nodes = [descendant for node in nodes for descendant in self.Descendants(node)]
+            
+        return nodes
+        
+    def createNode(self, nodeType, **flags):
+        name = Flag(flags, 'name', 'n') or nodeType
+        if name in self.Nodes:
+            name = "%s%d" % (name, len(self.Nodes))
+            
+        parentName = Flag(flags, 'parent', 'p')
+        self.Nodes[name] = FakeNode(name, nodeType, parentName)
+        if parentName is not None:
+            self.Node(parentName).Children.append(name)
+            
+        self.RecordUndo(lambda: self.delete(name))
+        self.select(name)
+        return name
+        
+    def objExists(self, name):
+        nodeName, attributeName = (name.split('.', 1) + [None])[:2]
+        if nodeName not in self.Nodes:
+            return False
+            
+        return attributeName is None or self.FindAttribute(name) is not None
+        
+    def delete(self, *objects, **flags):
+        for node in self.Targets(objects, {}):
+            for deletedNode in self.Descendants(node):
+                if deletedNode.Name not in self.Nodes:
+                    continue
+                    
+                del self.Nodes[deletedNode.Name]
+                if deletedNode.Name in self.Selection:
+                    self.Selection.remove(deletedNode.Name)
+                    
+            if node.Parent in self.Nodes:
+                self.Nodes[node.Parent].Children.remove(node.Name)
+                
+            self.RecordUndo(lambda node=node: self.RestoreNode(node))
+            
+    def RestoreNode(self, node):
+        for restoredNode in self.Descendants(node):
+            self.Nodes[restoredNode.Name] = restoredNode
+            
+        if node.Parent in self.Nodes:
+            self.Nodes[node.Parent].Children.append(node.Name)
+            
+    def nodeType(self, name):
+        if isinstance(name, (list, tuple)):
+            name = name[0]
+            
+        return self.Node(name.split('.')[0]).Type
+        
+    def ls(self, *objects, **flags):
+        if Flag(flags, 'selection', 'sl'):
+            return list(self.Selection)
+            
+        names = FlatNames(objects) or list(self.Nodes)
+        nodeType = Flag(flags, 'type', 'typ')
+        return [name for name in names if name in self.Nodes and (nodeType is None or self.Nodes[name].Type == nodeType)]
+        
+    def listRelatives(self, name, **flags):
+        node = self.Node(name)
+        if Flag(flags, 'allDescendents', 'ad'):
+            return [descendant.Name for descendant in self.Descendants(node)[1:]] or None
+            
+        if Flag(flags, 'parent', 'p'):
+            return [node.Parent] if node.Parent else None
+            
+        return list(node.Children) or None
+        
+    def select(self, *objects, **flags):
+        previousSelection = list(self.Selection)
+        
+        if Flag(flags, 'clear', 'cl'):
+            self.Selection = []
+        elif Flag(flags, 'all', 'all'):
+            self.Selection = [name for name, node in self.Nodes.items() if node.Type in FakeDagTypes]
+        else:
+            names = [node.Name for node in self.Targets(objects, flags)] if len(objects) > 0 else []
+            if Flag(flags, 'add', 'add'):
+                self.Selection.extend([name for name in names if name not in self.Selection])
+            else:
+                self.Selection = names
+                
+        self.RecordUndo(lambda: setattr(self, 'Selection', previousSelection))
+        
+    # Attributes
+    
+    def FindAttribute(self, path):
+        '''
+        Returns the node and attribute name of node.attribute or node.compound.attribute, or None
+        '''
+        parts = path.split('.')
+        node = self.Nodes.get(parts[0])
+        if node is None or len(parts) < 2:
+            return None
+            
+        attributeName = FakeAttributeAliases.get(parts[-1], parts[-1])
+        if attributeName not in node.Attributes:
+            return None
+            
+        return node, attributeName
+        
+    def Attribute(self, path):
+        found = self.FindAttribute(path)
+        if found is None:
+            raise ValueError("No object matches name: %s" % path)
+            
+        return found
+        
+    def addAttr(self, *objects, **flags):
+        names = FlatNames(objects) or self.Selection[:1]
+        node = self.Node(names[0])
+        
+        attributeName = Flag(flags, 'longName', 'ln')
+        attributeType = Flag(flags, 'attributeType', 'at') or Flag(flags, 'dataType', 'dt') or 'double'
+        
+        value = Flag(flags, 'defaultValue', 'dv')
+        if value is None:
+            value = {'long': 0, 'short': 0, 'bool': False, 'double': 0.0, 'float': 0.0}.get(attributeType)
+            
+        node.Attributes[attributeName] = FakeAttribute(attributeType, value, Flag(flags, 'parent', 'p'))
+        self.RecordUndo(lambda: node.Attributes.pop(attributeName, None))
+        
+    def getAttr(self, path, **flags):
+        node, attributeName = self.Attribute(path)
+        curve = node.Curves.get(attributeName)
+        if curve is not None and len(curve.Times) > 0:
+            return curve.Evaluate(Flag(flags, 'time', 't', self.CurrentTime))
+            
+        attribute = node.Attributes[attributeName]
+        if attribute.Type == 'compound':
+            return None
+            
+        if isinstance(attribute.Value, list):
+            return list(attribute.Value)
+            
+        return attribute.Value
+        
+    def setAttr(self, path, *values, **flags):
+        node, attributeName = self.Attribute(path)
+        attribute = node.Attributes[attributeName]
+        previousValue = attribute.Value
+        
+        if len(values) == 1:
+            value = values[0]
+        else:
+            value = list(values)
+            
+        if isinstance(value, (list, tuple)):
+            value = list(value)
+        elif attribute.Type == 'bool':
+            value = bool(value)
+        elif attribute.Type in ['long', 'short']:
+            value = int(value)
+            
+        attribute.Value = value
+        self.RecordUndo(lambda: setattr(attribute, 'Value', previousValue))
+        
+    # Keys
+    
+    def Curves(self, objects, flags):
+        '''
+        Returns [node, attributeName, curve] for the key curves a key command works on
+        '''
+        attributeNames = Flag(flags, 'attribute', 'at')
+        if isinstance(attributeNames, str):
+            attributeNames = [attributeNames]
+            
+        curves = []
+        for name in FlatNames(objects) or list(self.Selection):
+            if '.' in name:
+                node, attributeName = self.Attribute(name)
+                nodes = [[node, [attributeName]]]
+            else:
+                nodes = [[node, attributeNames] for node in self.Targets([name], flags)]
+                
+            for node, names in nodes:
+                for attributeName in sorted(node.Curves):
+                    if names is None or attributeName in [FakeAttributeAliases.get(name, name) for name in names]:
+                        curves.append([node, attributeName, node.Curves[attributeName]])
+                        
+        return curves
+        
+    def RecordCurveUndo(self, curves):
+        copies = [[node, attributeName, curve.Copy()] for node, attributeName, curve in curves]
+        
+        def Restore():
+            for node, attributeName, curve in copies:
+                node.Curves[attributeName] = curve
+                
+        self.RecordUndo(Restore)
+        
+    def setKeyframe(self, *objects, **flags):
+        names = FlatNames(objects) or list(self.Selection)
+        attributeNames = Flag(flags, 'attribute', 'at')
+        if isinstance(attributeNames, str):
+            attributeNames = [attributeNames]
+            
+        time = Flag(flags, 'time', 't', self.CurrentTime)
+        if isinstance(time, (list, tuple)):
+            time = time[0]
+            
+        keyedCurves = []
+        for name in names:
+            if '.' in name:
+                targets = [self.Attribute(name)]
+            else:
+                node = self.Node(name)
+                targets = [[node, FakeAttributeAliases.get(attributeName, attributeName)] for attributeName in (attributeNames or FakeTransformAttributes)]
+                
+            for node, attributeName in targets:
+                value = Flag(flags, 'value', 'v')
+                if value is None:
+                    value = self.getAttr("%s.%s" % (node.Name, attributeName), time=time)
+                    
+                curve = node.Curves.setdefault(attributeName, FakeCurve())
+                keyedCurves.append([node, attributeName, curve.Copy()])
+                curve.SetKey(time, value)
+                
+        self.RecordCurveUndo(keyedCurves)
+        return len(keyedCurves)
+        
+    def keyframe(self, *objects, **flags):
+        curves = self.Curves(objects, flags)
+        timeRange = TimeRange(Flag(flags, 'time', 't'))
+        
+        if Flag(flags, 'query', 'q'):
+            if Flag(flags, 'keyframeCount', 'kc'):
+                return sum([curve.Range(timeRange)[1] - curve.Range(timeRange)[0] for node, attributeName, curve in curves])
+                
+            results = []
+            for node, attributeName, curve in curves:
+                first, last = curve.Range(timeRange)
+                if Flag(flags, 'valueChange', 'vc'):
+                    results.extend(curve.Values[first:last])
+                else:
+                    results.extend(curve.Times[first:last])
+                    
+            return results or None
+            
+        if Flag(flags, 'edit', 'e'):
+            self.RecordCurveUndo(curves)
+            timeChange = Flag(flags, 'timeChange', 'tc')
+            valueChange = Flag(flags, 'valueChange', 'vc')
+            relative = Flag(flags, 'relative', 'r', False)
+            
+            for node, attributeName, curve in curves:
+                first, last = curve.Range(timeRange)
+                times = curve.Times[first:last]
+                values = curve.Values[first:last]
+                del curve.Times[first:last]
+                del curve.Values[first:last]
+                
+                if timeChange is not None:
+                    times = [time + timeChange if relative else timeChange for time in times]
+                    
+                if valueChange is not None:
+                    values = [value + valueChange if relative else valueChange for value in values]
+                    
+                for time, value in zip(times, values):
+                    curve.SetKey(time, value)
+                    
+            return len(curves)
+            
+    def findKeyframe(self, *objects, **flags):
+        '''
+        Returns the first or last key time, or the one before or after time, wrapping around like Maya
+        '''
+        times = sorted(set([time for node, attributeName, curve in self.Curves(objects, flags) for time in curve.Times]))
+        time = TimeRange(Flag(flags, 'time', 't', self.CurrentTime))[0]
+        if len(times) == 0:
+            return time
+        
+        which = Flag(flags, 'which', 'w', 'next')
+        if which == 'first':
+            return times[0]
+        
+        if which == 'last':
+            return times[-1]
+        
+        if which == 'previous':
+            return times[bisect.bisect_left(times, time) - 1]
+        
+        return times[bisect.bisect_right(times, time) % len(times)]
+    
+    def keyTangent(self, *objects, **flags):
+        '''
+        Fake curves are linear and unweighted; only queries are supported
+        '''
+        if not Flag(flags, 'query', 'q'):
+            return None
+        
+        timeRange = TimeRange(Flag(flags, 'time', 't'))
+        count = sum([curve.Range(timeRange)[1] - curve.Range(timeRange)[0] for node, attributeName, curve in self.Curves(objects, flags)])
+        if Flag(flags, 'inTangentType', 'itt') or Flag(flags, 'outTangentType', 'ott'):
+            return ['linear'] * count or None
+        
+        if Flag(flags, 'inWeight', 'iw') or Flag(flags, 'outWeight', 'ow'):
+            return [1.0] * count or None
+        
+        return [0.0] * count or None
+    
+    def cutKey(self, *objects, **flags):
+        curves = self.Curves(objects, flags)
+        timeRange = TimeRange(Flag(flags, 'time', 't'))
+        self.RecordCurveUndo(curves)
+        
+        for node, attributeName, curve in curves:
+            first, last = curve.Range(timeRange)
+            del curve.Times[first:last]
+            del curve.Values[first:last]
+            
+        return len(curves)
+        
+    def bakeResults(self, *objects, **flags):
+        '''
+        Keys every sampleBy frames in the time range, from the curves themselves
+        '''
+        startTime, endTime = TimeRange(Flag(flags, 'time', 't', tuple(self.PlaybackRange)))
+        sampleBy = Flag(flags, 'sampleBy', 'sb', 1)
+        curves = [[node, attributeName, curve] for node, attributeName, curve in self.Curves(objects, flags) if len(curve.Times) > 0]
+        self.RecordCurveUndo(curves)
+        
+        frameCount = int((endTime - startTime) // sampleBy) + 1
+        for node, attributeName, curve in curves:
+            bakedValues = [curve.Evaluate(startTime + index * sampleBy) for index in range(frameCount)]
+            for index in range(frameCount):
+                curve.SetKey(startTime + index * sampleBy, bakedValues[index])
+                
+    def xform(self, name, **flags):
+        prefix = 'translate'
+        if Flag(flags, 'rotation', 'ro'):
+            prefix = 'rotate'
+        elif Flag(flags, 'scale', 's'):
+            prefix = 'scale'
+            
+        return [self.getAttr("%s.%s%s" % (name, prefix, axis)) for axis in "XYZ"]
+        
+    # Scene and time
+    
+    def playbackOptions(self, **flags):
+        if Flag(flags, 'query', 'q'):
+            if Flag(flags, 'maxTime', 'max'):
+                return self.PlaybackRange[1]
+                
+            return self.PlaybackRange[0]
+            
+        if Flag(flags, 'minTime', 'min') is not None:
+            self.PlaybackRange[0] = Flag(flags, 'minTime', 'min')
+            
+        if Flag(flags, 'maxTime', 'max') is not None:
+            self.PlaybackRange[1] = Flag(flags, 'maxTime', 'max')
+            
+    def currentTime(self, *time, **flags):
+        if Flag(flags, 'query', 'q'):
+            return self.CurrentTime
+            
+        self.CurrentTime = time[0]
+        return self.CurrentTime
+        
+    def currentUnit(self, **flags):
+        if Flag(flags, 'query', 'q'):
+            return self.TimeUnit
+            
+        if Flag(flags, 'time', 't') is not None:
+            self.TimeUnit = Flag(flags, 'time', 't')
+            
+    def file(self, *names, **flags):
+        '''
+        Nothing is read from disk: opening a scene starts an empty one with the scene name set
+        '''
+        if Flag(flags, 'query', 'q'):
+            if Flag(flags, 'modified', 'mf'):
+                return False
+                
+            return self.SceneName
+            
+        if Flag(flags, 'rename', 'rn') is not None:
+            self.SceneName = Flag(flags, 'rename', 'rn')
+        elif Flag(flags, 'new', 'new') or Flag(flags, 'open', 'o'):
+            self.__init__()
+            if len(names) > 0:
+                self.SceneName = names[0]
+                
+    def loadPlugin(self, *names, **flags):
+        return list(names)
+        
+    def FramesPerSecond(self):
+        if self.TimeUnit in TimeUnitFramesPerSecond:
+            return TimeUnitFramesPerSecond[self.TimeUnit]
+            
+        return float(self.TimeUnit[:-3])
+        
+    def ExportFbx(self, filename):
+        '''
+        Writes the keyed nodes as an FBX 6.1 ASCII file with one take, like FBXExport
+        '''
+        self.Exports.append(filename)
+        ticksPerFrame = FbxTicksPerSecond / self.FramesPerSecond()
+        keyedNodes = [node for node in self.Nodes.values() if len(node.Curves) > 0]
+        
+        lines = ['; FBX 6.1.0 project file', '', 'FBXHeaderExtension:  {', '    FBXHeaderVersion: 1003', '    FBXVersion: 6100', '}', '',
+            'Objects:  {']
+        for node in keyedNodes:
+            rotationOrder = FbxRotationOrders.index(RotateOrders[int(node.Attributes['rotateOrder'].Value)])
+            lines += ['    Model: "Model::%s", "Limb" {' % node.Name, '        Version: 232', '        Properties60:  {',
+                '            Property: "RotationOrder", "enum", "",%d' % rotationOrder, '        }', '    }']
+            
+        localTime = '%d,%d' % (round(self.PlaybackRange[0] * ticksPerFrame), round(self.PlaybackRange[1] * ticksPerFrame))
+        lines += ['}', '', 'Takes:  {', '    Current: "%s"' % FbxDefaultTakeName, '    Take: "%s" {' % FbxDefaultTakeName,
+            '        FileName: "Take_001.tak"', '        LocalTime: %s' % localTime, '        ReferenceTime: %s' % localTime]
+            
+        for node in keyedNodes:
+            lines += ['        Model: "Model::%s" {' % node.Name, '            Version: 1.1']
+            for attributeName in sorted(node.Curves):
+                curve = node.Curves[attributeName]
+                keys = ['%d,%r,L' % (round(time * ticksPerFrame), float(value)) for time, value in zip(curve.Times, curve.Values)]
+                keyLines = [','.join(keys[index:index + FbxKeysPerLine]) for index in range(0, len(keys), FbxKeysPerLine)]
+                
+                lines += ['            Channel: "%s" {' % attributeName, '                Default: %r' % float(node.Attributes[attributeName].Value or 0),
+                    '                KeyVer: 4005', '                KeyCount: %d' % len(keys), '                Key: ']
+                lines += ['                    ' + keyLines[index] + (',' if index < len(keyLines) - 1 else '') for index in range(len(keyLines))]
+                lines += ['                Color: 1,1,1', '            }']
+                
+            lines += ['        }']
+            
+        lines += ['    }', '}', '']
+        
+        fbxFile = open(filename, 'w')
+        fbxFile.write('\n'.join(lines))
+        fbxFile.close()
+        
+    def playblast(self, **flags):
+        movieFilename = "%s.avi" % Flag(flags, 'filename', 'f')
+        open(movieFilename, 'wb').close()
+        return movieFilename
+        
+    # UI
+    
+    def UiCommand(self, controlType, *objects, **flags):
+        name = None
+        if len(objects) > 0:
+            name = objects[0]
+            
+        if Flag(flags, 'exists', 'ex'):
+            return name in self.Controls
+            
+        if Flag(flags, 'query', 'q'):
+            control = self.Controls[name]
+            for flag in flags:
+                if flag not in ['query', 'q']:
+                    return control[1].get(flag, FakeUiDefaults.get(flag))
+                    
+            return None
+            
+        if Flag(flags, 'edit', 'e'):
+            self.Controls[name][1].update(flags)
+            return name
+            
+        if name is None:
+            self.controlCount += 1
+            name = "%s%d" % (controlType, self.controlCount)
+            
+        self.Controls[name] = [controlType, flags, self.parentControl]
+        if controlType.endswith('Layout') or controlType == 'window':
+            self.parentControl = name
+            
+        return name
+        
+    def setParent(self, parent):
+        if parent == '..':
+            if self.parentControl in self.Controls:
+                self.parentControl = self.Controls[self.parentControl][2]
+        else:
+            self.parentControl = parent
+            
+        return self.parentControl
+        
+    def deleteUI(self, *names, **flags):
+        for name in FlatNames(names):
+            self.Controls.pop(name, None)
+            
+    def showWindow(self, name):
+        return name
+        
+    def evalDeferred(self, command, **flags):
+        self.Deferred.append(command)
+    
+    def Idle(self):
+        '''
+        Runs the deferred callables, including any they defer in turn
+        '''
+        while len(self.Deferred) > 0:
+            self.Deferred.pop(0)()
+
+    def confirmDialog(self, **flags):
+        self.Dialogs.append(Flag(flags, 'message', 'm'))
+        if self.DialogAnswer is not None:
+            return self.DialogAnswer
+            
+        return Flag(flags, 'dismissString', 'ds') or Flag(flags, 'button', 'b', [""])[0]
+        
+    def promptDialog(self, **flags):
+        if Flag(flags, 'query', 'q'):
+            return self.PromptText
+            
+        self.Dialogs.append(Flag(flags, 'message', 'm'))
+        if self.DialogAnswer is not None:
+            return self.DialogAnswer
+            
+        return Flag(flags, 'dismissString', 'ds') or Flag(flags, 'button', 'b', [""])[0]
+
+class FakePoseBackend:
+    '''
+    PoseSampler backend on the nodes and key curves of a FakeCmds
+    '''
+    def __init__(self, cmds):
+        self.cmds = cmds
+    
+    def Walk(self, rootJoint, descendants=True):
+        nodes = []
+        def Visit(node):
+            nodes.append(node)
+            if descendants:
+                for childName in node.Children:
+                    if self.cmds.Nodes[childName].Type == 'joint':
+                        Visit(self.cmds.Nodes[childName])
+        
+        Visit(self.cmds.Node(rootJoint))
+        return [node.Name for node in nodes], nodes
+    
+    def Valid(self, names, handles):
+        if self.cmds is not Cmds:
+            return False
+        
+        for name, node in zip(names, handles):
+            if self.cmds.Nodes.get(name) is not node:
+                return False
+        
+        return True
+    
+    def Evaluate(self, handles, frame, poses):
+        # The translate, rotate and scale attributes, in the order of PoseChannels
+        for jointIndex in range(len(handles)):
+            node = handles[jointIndex]
+            for channelIndex in range(9):
+                attributeName = FakeTransformAttributes[channelIndex]
+                curve = node.Curves.get(attributeName)
+                if curve is not None and len(curve.Times) > 0:
+                    poses[jointIndex, channelIndex] = curve.Evaluate(frame)
+                else:
+                    poses[jointIndex, channelIndex] = node.Attributes[attributeName].Value
+
+class FakeMel:
+    '''
+    Stand-in for maya.mel that understands the MEL the Sequencer evaluates
+    '''
+    FbxExportPattern = re.compile(r'\s*FBXExport\s+-f\s+"([^"]*)"')
+    
+    def __init__(self, cmds):
+        self.cmds = cmds
+        self.Evaluated = []
+        
+    def eval(self, code):
+        self.Evaluated.append(code)
+        
+        if code.strip() == '$tmp = $gMainProgressBar':
+            return 'MainProgressBar'
+            
+        match = self.FbxExportPattern.match(code)
+        if match is not None:
+            self.cmds.ExportFbx(match.group(1))
+            
+        return None
+
+if globals().get("Cmds") is None:
+    UseFakeMaya()
+
+'''
+Greymind Sequencer for Maya
+Version: 1.8.0
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+# from Common import *
+from functools import partial as Partial
+
+SequencerVersion = "1.8.0"
+
+# Port of the JSON-RPC server pipeline tools read the sequencer from
+SequencerServerPort = 7810
+
+# Rows the filter shows or hides at once, the rest follow when Maya is idle, so typing stays responsive
+FilterRowsPerStep = 200
+
+class Animation:
+    Id = -1
+    Name = ""
+    StartFrame = -1
+    EndFrame = -1
+    Selected = False
+    
+    def __init__(self, name, startFrame, endFrame, selected=False, id=-1):
+        self.Name = name
+        self.StartFrame = startFrame
+        self.EndFrame = endFrame
+        self.Selected = selected
+        self.Id = id
+
+class AnimationUI:
+    NameTextField = None
+    StartFrameTextField = None
+    EndFrameTextField = None
+    SelectedCheckBox = None
+    SetButton = None
+    RowLayout = None
+    Visible = True
+    
+    Animation = None
+    SequencerUI = None
+    
+    def __init__(self, sequencerUI, animation, rowLayout=None):
+        self.RowLayout = rowLayout
+        self.Create(sequencerUI, animation)
+        
+    def Name_Changed(self, extraArg=None):
+        self.SequencerUI.sequencer.RenameAnimation(self.Animation.Id, Cmds.textField(self.NameTextField, q=True, text=True))
+        self.SequencerUI.Save()
+        self.SequencerUI.Update()
+        
+        # The new name may no longer (or now) match the filter
+        self.SequencerUI.Filter_Changed()
+        
+    def StartFrame_Changed(self, extraArg=None):
+        self.Animation.StartFrame = int(Cmds.textField(self.StartFrameTextField, q=True, text=True))
+        self.SequencerUI.Save()
+        self.SequencerUI.Update()
+        
+    def EndFrame_Changed(self, extraArg=None):
+        self.Animation.EndFrame = int(Cmds.textField(self.EndFrameTextField, q=True, text=True))
+        self.SequencerUI.Save()
+        self.SequencerUI.Update()
+        
+    def Select_Changed(self, extraArg=None):
+        self.Animation.Selected = Cmds.checkBox(self.SelectedCheckBox, q=True, value=True)
+        self.SequencerUI.Save()
+        self.SequencerUI.Update()
+        
+    def Set_Clicked(self, extraArg=None):
+        self.SequencerUI.Save()
+        self.SequencerUI.Update()
+        Cmds.playbackOptions(e=True, min=self.Animation.StartFrame, max=self.Animation.EndFrame)
+    
+    def Create(self, sequencerUI, animation):
+        self.SequencerUI = sequencerUI
+        self.Animation = animation
+        
+        self.SelectedCheckBox = Cmds.checkBox(label='', value=animation.Selected, cc=self.Select_Changed)
+        self.NameTextField = Cmds.textField(text=animation.Name, width=183, cc=self.Name_Changed)
+        self.StartFrameTextField = Cmds.textField(text=str(animation.StartFrame), cc=self.StartFrame_Changed)
+        self.EndFrameTextField = Cmds.textField(text=str(animation.EndFrame), cc=self.EndFrame_Changed)
+        self.SetButton = Cmds.button(label='Set', c=self.Set_Clicked)
+        
+    def SetVisible(self, visible):
+        if self.RowLayout is None or visible == self.Visible:
+            return
+        
+        Cmds.rowLayout(self.RowLayout, e=True, visible=visible)
+        self.Visible = visible
+    
+    def Destroy(self):
+        Cmds.deleteUI(self.SelectedCheckBox)
+        Cmds.deleteUI(self.NameTextField)
+        Cmds.deleteUI(self.StartFrameTextField)
+        Cmds.deleteUI(self.EndFrameTextField)
+    
+class Sequencer:
+    UniqueId = 0 # Stores the top unique id 
+    
+    Animations = None # Stores the animations keyed by a unique id
+    Ordering = None # Stores the order in which the animations are to be displayed by the UI
+    
+    def __init__(self):
+        # Per instance, so that sequencers do not share their animations
+        self.Animations = {}
+        self.Ordering = []
+        self.nameIndex = None
+    
+    def GetUniqueId(self):
+        self.UniqueId = self.UniqueId + 1
+        return (self.UniqueId - 1)
+    
+    def Count(self):
+        if not len(self.Animations) == len(self.Ordering):
+            print("Warning: Animations dictionary and Ordering list do not have same number of elements")
+        
+        return len(self.Animations)
+        
+    def StartFrame(self):
+        startFrame = int(1e6)
+        for animationId in self.Animations:
+            if self.Animations[animationId].StartFrame < startFrame:
+                startFrame = self.Animations[animationId].StartFrame
+                
+        if startFrame == int(1e6):
+            startFrame = 0
+        
+        return startFrame
+    
+    def EndFrame(self):
+        endFrame = 0
+        for animationId in self.Animations:
+            if self.Animations[animationId].EndFrame > endFrame:
+                endFrame = self.Animations[animationId].EndFrame
+                
+        return endFrame
+        
+    def NameIndex(self):
+        '''
+        Returns the index of the animation names, built on first use and kept up to date after
+        '''
+        if self.nameIndex is None:
+            self.nameIndex = NameIndex()
+            for animation in self.Animations.values():
+                self.nameIndex.Add(animation.Id, animation.Name)
+        
+        return self.nameIndex
+    
+    def AddAnimationWithId(self, animation):
+        self.Animations[animation.Id] = animation
+        self.Ordering.append(animation.Id)
+        
+        if self.nameIndex is not None:
+            self.nameIndex.Add(animation.Id, animation.Name)
+    
+    def AddAnimation(self, animation):
+        # Check if it exists perhaps?
+        animation.Id = self.GetUniqueId()
+        self.AddAnimationWithId(animation)
+        
+    def RemoveAnimation(self, animationId):
+        del self.Animations[animationId]
+        self.Ordering.remove(animationId)
+        
+        if self.nameIndex is not None:
+            self.nameIndex.Remove(animationId)
+    
+    def RenameAnimation(self, animationId, name):
+        self.Animations[animationId].Name = name
+        
+        if self.nameIndex is not None:
+            self.nameIndex.Rename(animationId, name)
+
+def AttributeName(baseNode, attributeName):
+    return "%s.%s" % (baseNode, attributeName)
+
+def LoadSequencer(sequencerNode="SequencerData"):
+    '''
+    Returns a Sequencer populated from the maya node sequencerNode
+    '''
+    Attr = AttributeName
+    
+    sequencer = Sequencer()
+    
+    if not Cmds.objExists(sequencerNode):
+        return sequencer
+        
+    sequencer.UniqueId = Cmds.getAttr(Attr(sequencerNode, 'UniqueId'))
+    ordering = Cmds.getAttr(Attr(sequencerNode, 'Ordering'))
+    
+    if ordering is None or len(ordering) == 0:
+        return sequencer
+    
+    try:
+        for orderId in range(len(ordering)):
+            animationId = ordering[orderId]
+            parentAttribute = Attr(sequencerNode, 'Animation%d' % animationId)
+            
+            name = Cmds.getAttr(Attr(parentAttribute, "Name%d" % animationId))
+            startFrame = Cmds.getAttr(Attr(parentAttribute, "StartFrame%d" % animationId))
+            endFrame = Cmds.getAttr(Attr(parentAttribute, "EndFrame%d" % animationId))
+            selected = Cmds.getAttr(Attr(parentAttribute, "Selected%d" % animationId))
+            
+            animation = Animation(name, startFrame, endFrame, selected, animationId)
+            sequencer.AddAnimationWithId(animation)
+    except TypeError:
+        print("There seems to be an error loading sequencer data, reseting Sequencer")
+        Cmds.delete(sequencerNode)
+        
+    return sequencer
+
+def LoadSequencerFile(sceneFilename):
+    '''
+    Returns a Sequencer read from the .ma scene sceneFilename without opening it in Maya
+    '''
+    sequencer = Sequencer()
+    
+    sequencerData = ReadSequencerData(sceneFilename)
+    if sequencerData is None:
+        return sequencer
+    
+    sequencer.UniqueId = sequencerData[0]
+    for record in sequencerData[1]:
+        sequencer.AddAnimationWithId(Animation(record["Name"], record["StartFrame"], record["EndFrame"], record["Selected"], record["Id"]))
+    
+    return sequencer
+
+def TrimSequencerKeys(sequencer, selection, trimStart, trimEnd):
+    '''
+    Cuts the keys below selection in [trimStart, trimEnd] that are outside every animation of sequencer
+    '''
+    trimRegions = [0] * (trimEnd + 1)
+    for animation in sequencer.Animations.values():
+        trimRegions[animation.StartFrame:animation.EndFrame + 1] = [1] * (animation.EndFrame - animation.StartFrame + 1)
+    
+    i = 0
+    while i < len(trimRegions):
+        tStart = FindIndexOf(trimRegions, 0, i, trimEnd)
+        tEnd = FindIndexOf(trimRegions, 1, tStart, trimEnd) - 1
+        
+        if tEnd < tStart:
+            break
+        
+        Cmds.cutKey(selection, animation='keysOrObjects', option='keys', clear=True, hierarchy='below', time=(tStart,tEnd))
+        
+        i = tEnd + 1
+        i = i + 1
+
+def GenerateSequencerFbx(sequencer, directoryName, prefixText, fileName, singleExport=False, binaryFbx=False, exportAnimations=None, reduceTolerances=None, staticTolerances=None, framesPerSecond=None, scanWorkers=1):
+    '''
+    Exports the selected animations of sequencer into directoryName, one file each, and
+    stitches them into the master fileName.fbx
+    exportAnimations, if given, exports the [animation, fbxFilename] files instead of this session
+    framesPerSecond, if given, resamples the keys of every animation file to that rate (see ResampleFbxKeys)
+    staticTolerances, if given, strips the channels that stay within those tolerances (see StripStaticChannels)
+    reduceTolerances, if given, removes the keys within those tolerances (see ReduceFbxKeys) before stitching
+    scanWorkers processes scan the animation files for stitching (None for one per core); keep 1 in a Maya
+    session, where a process pool would launch Maya itself
+    Returns the filenames of the animation files followed by the master
+    '''
+    generatedAnimationFiles = []
+    
+    # Either cut and export every animation (here or on the farm), or export the timeline once and split it afterwards
+    farmExport = exportAnimations is not None and not singleExport
+    createFiles = not singleExport and not farmExport
+    for animationId in sequencer.Ordering:
+        animation = sequencer.Animations[animationId]
+        if animation.Selected == True:
+            negativeStartFrame = -animation.StartFrame
+            
+            if createFiles == True:
+                Cmds.select(all=True)
+                Cmds.cutKey(time=(sequencer.StartFrame() - 10, animation.StartFrame))
+                Cmds.cutKey(time=(animation.EndFrame, sequencer.EndFrame() + 10))
+                Cmds.keyframe(edit=True, relative=True, timeChange=negativeStartFrame, time=(animation.StartFrame, animation.EndFrame))
+            
+            fbxFilename = "%s/%s%s.fbx" % (directoryName, prefixText, animation.Name)
+            generatedAnimationFiles.append([animation, fbxFilename])
+            
+            if createFiles == True:
+                melCode = 'FBXExport -f "%s"' % fbxFilename
+                Mel.eval(melCode)
+            
+                Cmds.undo()
+                Cmds.undo()
+                Cmds.undo()
+                Cmds.undo()
+        
+    if farmExport:
+        exportAnimations(generatedAnimationFiles)
+    
+    if singleExport:
+        timelineFilename = "%s/%s%s_Timeline.fbx" % (directoryName, prefixText, fileName)
+        Mel.eval('FBXExport -f "%s"' % timelineFilename)
+        
+        splits = [[generatedFilename, generatedAnimation.StartFrame, generatedAnimation.EndFrame] for generatedAnimation, generatedFilename in generatedAnimationFiles]
+        try:
+            SplitFbxTakes(timelineFilename, splits, GetFramesPerSecond())
+        finally:
+            os.remove(timelineFilename)
+    
+    if framesPerSecond is not None:
+        for generatedAnimation, generatedFilename in generatedAnimationFiles:
+            ResampleFbxKeys(generatedFilename, framesPerSecond)
+    
+    # Per animation file, so a channel only has to be static over its own animation
+    if staticTolerances is not None:
+        for generatedAnimation, generatedFilename in generatedAnimationFiles:
+            StripStaticChannels(generatedFilename, tolerances=staticTolerances)
+    
+    if reduceTolerances is not None:
+        for generatedAnimation, generatedFilename in generatedAnimationFiles:
+            ReduceFbxKeys(generatedFilename, tolerances=reduceTolerances)
+    
+    # Open each of these files and stitch them
+    masterFilename = "%s/%s%s.fbx" % (directoryName, prefixText, fileName)
+    takes = [[generatedAnimation.Name, generatedFilename] for generatedAnimation, generatedFilename in generatedAnimationFiles]
+    
+    # A binary master is converted from a stitched ASCII one
+    stitchFilename = masterFilename
+    if binaryFbx:
+        stitchFilename = "%s/%s%s_Ascii.fbx" % (directoryName, prefixText, fileName)
+    
+    # The animation files were just written, an index next to them would never be read again
+    StitchFbxTakesFast(stitchFilename, takes, useIndex=False, workers=scanWorkers)
+    
+    if binaryFbx:
+        ConvertFbxToBinary(stitchFilename, masterFilename)
+        os.remove(stitchFilename)
+    
+    return [generatedFilename for generatedAnimation, generatedFilename in generatedAnimationFiles] + [masterFilename]
+
+def WriteSequencerCsv(sequencer, exportFile, playblastLinks=None):
+    '''
+    Writes the selected animations of sequencer as CSV to exportFile
+    With playblastLinks (animation id to movie filename) a playblast column is added
+    '''
+    if playblastLinks is None:
+        exportFile.write("%s,%s,%s\n" % ('Animation Name', 'Start Frame', 'End Frame'))
+    else:
+        exportFile.write("%s,%s,%s,%s\n" % ('Animation Name', 'Start Frame', 'End Frame', 'Playblast'))
+    
+    for animation in sequencer.Animations.values():
+        if animation.Selected == True:
+            if playblastLinks is None:
+                exportFile.write("%s,%d,%d\n" % (animation.Name, animation.StartFrame, animation.EndFrame))
+            elif animation.Id in playblastLinks:
+                exportFile.write("%s,%d,%d,\"=HYPERLINK(\"\"%s\"\", \"\"[open]\"\")\"\n" % (animation.Name, animation.StartFrame, animation.EndFrame, playblastLinks[animation.Id]))
+            else:
+                exportFile.write("%s,%d,%d,n/a\n" % (animation.Name, animation.StartFrame, animation.EndFrame))
+
+def AnimationRecord(animation):
+    return {"Id": animation.Id, "Name": animation.Name, "StartFrame": animation.StartFrame, "EndFrame": animation.EndFrame,
+        "Selected": animation.Selected}
+
+def RpcAnimations(sequencer, ids=None, selectedOnly=False):
+    '''
+    Returns the animations in display order, only those in ids if given
+    '''
+    animationIds = sequencer.Ordering
+    if ids is not None:
+        wantedIds = set(ids)
+        animationIds = [animationId for animationId in animationIds if animationId in wantedIds]
+    
+    animations = [sequencer.Animations[animationId] for animationId in animationIds]
+    return [AnimationRecord(animation) for animation in animations if animation.Selected or not selectedOnly]
+
+def RpcAnimation(sequencer, id):
+    if id not in sequencer.Animations:
+        raise JsonRpcError(JsonRpcInvalidParams, "No animation with id %s" % id)
+    
+    return AnimationRecord(sequencer.Animations[id])
+
+def RpcFind(sequencer, name):
+    return [AnimationRecord(sequencer.Animations[animationId]) for animationId in sequencer.Ordering
+        if sequencer.Animations[animationId].Name == name]
+
+SequencerRpcMethods = {
+    "Sequencer.Count": lambda sequencer: sequencer.Count(),
+    "Sequencer.Range": lambda sequencer: [sequencer.StartFrame(), sequencer.EndFrame()],
+    "Sequencer.Animations": RpcAnimations,
+    "Sequencer.Animation": RpcAnimation,
+    "Sequencer.Find": RpcFind,
+}
+
+SequencerServerInstance = None
+
+def StartSequencerServer(port=SequencerServerPort):
+    '''
+    Serves the sequencer of the open scene over JSON-RPC on localhost:port, e.g.
+        
+        client = JsonRpcClient(port=SequencerServerPort)
+        animations = client.Call("Sequencer.Animations")
+    
+    Every request or batch loads SequencerData once, on the main thread
+    '''
+    global SequencerServerInstance
+    StopSequencerServer()
+    
+    invoke = None
+    try:
+        import maya.utils
+        invoke = maya.utils.executeInMainThreadWithResult
+    except ImportError:
+        pass
+    
+    SequencerServerInstance = JsonRpcServer(SequencerRpcMethods, port=port, context=LoadSequencer, invoke=invoke)
+    SequencerServerInstance.Start()
+    return SequencerServerInstance
+
+def StopSequencerServer():
+    global SequencerServerInstance
+    if SequencerServerInstance is not None:
+        SequencerServerInstance.Stop()
+        SequencerServerInstance = None
+
+def NotifySequencerChanged(sequencer):
+    '''
+    Tells the subscribed clients that the animations were saved
+    '''
+    if SequencerServerInstance is not None:
+        SequencerServerInstance.Notify("Sequencer.Changed", {"Count": sequencer.Count(), "StartFrame": sequencer.StartFrame(),
+            "EndFrame": sequencer.EndFrame()})
+
+class SequencerUI:
+    progressBar = ""
+    windowName = ""
+    windowLayout = ""
+    animationsLayout = ""
+    buttonsLayout = ""
+    startFrameTextBox = ""
+    endFrameTextBox = ""
+    selectAll = ""
+    windowTitle = ""
+    width = 0
+    height = 0
+    sequencer = None
+    IncludePlayblastLinkCheckBox = None
+    SingleExportCheckBox = None
+    BinaryFbxCheckBox = None
+    ReduceKeysCheckBox = None
+    StripStaticCheckBox = None
+    FarmCheckBox = None
+    ServerCheckBox = None
+    
+    AnimationUIs = None
+    
+    def __init__(self):
+        self.AnimationUIs = {}
+        self.visibleIds = set()
+        self.filterIds = set()
+        self.pendingFilterIds = []
+        self.filterDeferred = False
+        self.progressBar = Mel.eval('$tmp = $gMainProgressBar');
+        self.windowName = "SequencerWindow"
+        self.windowLayout = "SequencerLayout"
+        self.animationsLayout = "SequencerAnimations"
+        self.buttonsLayout = "SequencerButtons"
+        self.selectAll = "SequencerSelectAll"
+        self.startFrameTextBox = "SequencerStartFrameTextBox"
+        self.endFrameTextBox = "SequencerEndFrameTextBox"
+        self.prefixTextBox = "SequencerPrefixTextBox"
+        self.filterTextBox = "SequencerFilterTextBox"
+        self.rateTextBox = "SequencerRateTextBox"
+        
+        self.windowTitle = "Sequencer " + SequencerVersion
+        self.width = 400
+        self.height = 550
         
-        if ordering is None or len(ordering) == 0:
-            return
+        self.Load()
         
-        try:
-            for orderId in range(len(ordering)):
-                animationId = ordering[orderId]
-                parentAttribute = Attr(sequencerNode, 'Animation%d' % animationId)
-                
-                name = Cmds.getAttr(Attr(parentAttribute, "Name%d" % animationId))
-                startFrame = Cmds.getAttr(Attr(parentAttribute, "StartFrame%d" % animationId))
-                endFrame = Cmds.getAttr(Attr(parentAttribute, "EndFrame%d" % animationId))
-                selected = Cmds.getAttr(Attr(parentAttribute, "Selected%d" % animationId))
-                
-                animation = Animation(name, startFrame, endFrame, selected, animationId)
-                self.sequencer.AddAnimationWithId(animation)
-        except TypeError:
-            print "There seems to be an error loading sequencer data, reseting Sequencer"
-            Cmds.delete(sequencerNode)
+    def AttributeName(self, baseNode, attributeName):
+        return AttributeName(baseNode, attributeName)
+        
+    def Load(self):
+        '''
+        Populate sequencer class from maya nodes
+        '''
+        self.sequencer = LoadSequencer()
         
     def Save(self):
         '''
@@ -464,6 +7026,7 @@ class SequencerUI:
         Cmds.setAttr(Attr(sequencerNode, 'Ordering'), self.sequencer.Ordering, type='Int32Array')
         
         if self.sequencer.Count() == 0:
+            NotifySequencerChanged(self.sequencer)
             return
             
         Cmds.addAttr(sequencerNode, longName='Animations', attributeType='compound', numberOfChildren=self.sequencer.Count())
@@ -488,14 +7051,16 @@ class SequencerUI:
         if len(selection) > 0:
             Cmds.select(selection)
         
+        NotifySequencerChanged(self.sequencer)
+
     def CreateAnimationEntry(self, animation):
         '''
         Create the UI entry for the animation
         '''
         Cmds.setParent(self.animationsLayout)
-        Cmds.rowLayout(numberOfColumns = 5, columnWidth5 = [35, 185, 50, 50, 35], columnAttach=[1, 'left', 8])
+        rowLayout = Cmds.rowLayout(numberOfColumns = 5, columnWidth5 = [35, 185, 50, 50, 35], columnAttach=[1, 'left', 8])
         
-        self.AnimationUIs[animation.Id] = AnimationUI(self, animation)
+        self.AnimationUIs[animation.Id] = AnimationUI(self, animation, rowLayout)
         
     def Refresh(self, extraArg=None):
         '''
@@ -537,13 +7102,18 @@ class SequencerUI:
         
         # Add back based on order
         
-        #print self.sequencer.Ordering
+        #print(self.sequencer.Ordering)
         #return
         
         for orderId in range(len(self.sequencer.Ordering)):
             animationId = self.sequencer.Ordering[orderId]
             self.CreateAnimationEntry(self.sequencer.Animations[animationId])
             
+        # The new rows are all shown, hide the ones the filter leaves out
+        self.visibleIds = set(self.AnimationUIs)
+        self.pendingFilterIds = []
+        self.Filter_Changed()
+        
         # Update
         self.Update()
         
@@ -555,6 +7125,47 @@ class SequencerUI:
         Cmds.textField(self.startFrameTextBox, e=True, text=str(self.sequencer.StartFrame()))
         Cmds.textField(self.endFrameTextBox, e=True, text=str(self.sequencer.EndFrame()))
         
+    def Filter_Changed(self, extraArg=None):
+        '''
+        Shows only the animations whose names contain the filter text; only rows that change are touched
+        '''
+        filterText = ""
+        if Cmds.textField(self.filterTextBox, q=True, exists=True):
+            filterText = Cmds.textField(self.filterTextBox, q=True, text=True)
+        
+        self.filterIds = self.sequencer.NameIndex().Match(filterText)
+        self.filterIds.intersection_update(self.AnimationUIs)
+        
+        # Top rows first; rows still pending from the last keystroke are compared again
+        changedIds = self.filterIds.symmetric_difference(self.visibleIds)
+        self.pendingFilterIds = [animationId for animationId in self.sequencer.Ordering if animationId in changedIds]
+        self.pendingFilterIds.reverse()
+        self.ApplyFilter()
+    
+    def ApplyFilter(self):
+        '''
+        Shows or hides the next FilterRowsPerStep pending rows and defers the rest to when Maya is idle
+        '''
+        for step in range(min(FilterRowsPerStep, len(self.pendingFilterIds))):
+            animationId = self.pendingFilterIds.pop()
+            if animationId not in self.AnimationUIs:
+                continue
+            
+            visible = animationId in self.filterIds
+            self.AnimationUIs[animationId].SetVisible(visible)
+            if visible:
+                self.visibleIds.add(animationId)
+            else:
+                self.visibleIds.discard(animationId)
+        
+        if len(self.pendingFilterIds) > 0 and not self.filterDeferred:
+            self.filterDeferred = True
+            Cmds.evalDeferred(self.ApplyDeferredFilter, lowestPriority=True)
+    
+    def ApplyDeferredFilter(self):
+        self.filterDeferred = False
+        self.ApplyFilter()
+    
     def MoveUp(self, extraArg=None):
         '''
         Moves a given entry (or a collection of entries) up
@@ -697,42 +7308,36 @@ class SequencerUI:
             
             playblastPrefix = self.InputBox("Enter prefix (if any)")
         
+        playblastLinks = None
+        if includePlayblastLink:
+            playblastLinks = {}
+            for animation in self.sequencer.Animations.values():
+                playblastLink = "%s.avi" % self.GetPlayblastMovieFilename(playblastFolder, playblastPrefix, animation)
+                if os.path.isfile(playblastLink):
+                    playblastLinks[animation.Id] = playblastLink
+        
         now = datetime.datetime.now()
         exportFilename = "%s/Export %d%d%d-%d%d%d.csv" % (directoryName, now.year, now.month, now.day, now.hour, now.minute, now.second)
         exportFile = open(exportFilename, "w")
-        
-        if not includePlayblastLink:
-            exportFile.write("%s,%s,%s\n" % ('Animation Name', 'Start Frame', 'End Frame'))
-        else:
-            exportFile.write("%s,%s,%s,%s\n" % ('Animation Name', 'Start Frame', 'End Frame', 'Playblast'))
-        
-        for animation in self.sequencer.Animations.values():
-            if animation.Selected == True:
-                if not includePlayblastLink:
-                    exportFile.write("%s,%d,%d\n" % (animation.Name, animation.StartFrame, animation.EndFrame))
-                else:
-                    playblastLink = "%s.avi" % self.GetPlayblastMovieFilename(playblastFolder, playblastPrefix, animation)
-                    if os.path.isfile(playblastLink):
-                        exportFile.write("%s,%d,%d,\"=HYPERLINK(\"\"%s\"\", \"\"[open]\"\")\"\n" % (animation.Name, animation.StartFrame, animation.EndFrame, playblastLink))
-                    else:
-                        exportFile.write("%s,%d,%d,n/a\n" % (animation.Name, animation.StartFrame, animation.EndFrame))
-        
+        self.WriteCsv(exportFile, playblastLinks)
         exportFile.close()
         
         choice = Cmds.confirmDialog(title='Export Complete!', message='Do you want to open the file %s now?' % (exportFilename), button=['Yes','No'], defaultButton='Yes', cancelButton='No', dismissString='No')
         if choice == 'Yes':
             os.startfile(exportFilename)
         
+    def WriteCsv(self, exportFile, playblastLinks=None):
+        '''
+        Writes the selected animations as CSV to exportFile, see WriteSequencerCsv
+        '''
+        WriteSequencerCsv(self.sequencer, exportFile, playblastLinks)
+        
     def GeneratePlayblast(self, extraArg=None):
         prefixText = Cmds.textField(self.prefixTextBox, q=True, text=True)
         if not IsNoneOrEmpty(prefixText):
             prefixText = "%s_" % prefixText
             
         cameraName = 'persp'
-        blackThick = 1
-        horizontalResolution = 320
-        verticalResolution = 240
-        scalePercentage = 100
         
         if not Cmds.objExists(cameraName):
             self.MessageBox('Playblast generation requires a camera named %s.' % (cameraName), 'Playblast pre-requisite error')
@@ -750,22 +7355,39 @@ class SequencerUI:
             self.MessageBox('Please select animations to blast!')
             return
             
-        self.StartProgressBar('Generating Playblast', selectedCount)
+        if self.GeneratePlayblastFiles(directoryName, prefixText) is None:
+            self.MessageBox('Playblast generation canceled by the user')
+            return
+            
+        self.MessageBox('Playblast generation complete!')
+
+    def GeneratePlayblastFiles(self, directoryName, prefixText):
+        '''
+        Blasts the selected animations into directoryName
+        Returns a list of [animation, movieFilename], or None if canceled by the user
+        '''
+        blackThick = 1
+        horizontalResolution = 320
+        verticalResolution = 240
+        scalePercentage = 100
+        
+        generatedMovieFiles = []
+        self.StartProgressBar('Generating Playblast', self.CountSelected())
         for animation in self.sequencer.Animations.values():
             if self.IsProgressBarCanceled():
                 self.EndProgressBar()
-                self.MessageBox('Playblast generation canceled by the user')
-                return
-                
+                return None
+            
             if animation.Selected == True:
                 self.SetPlaybackRange(animation.StartFrame, animation.EndFrame)
                 
                 movieFilename = self.GetPlayblastMovieFilename(directoryName, prefixText, animation)
-                Cmds.playblast(format='movie', filename=movieFilename, clearCache=True, viewer=False, showOrnaments=True, fp=4, percent=scalePercentage, compression='none', widthHeight=(horizontalResolution, verticalResolution), fo=True)
+                movieFilename = Cmds.playblast(format='movie', filename=movieFilename, clearCache=True, viewer=False, showOrnaments=True, fp=4, percent=scalePercentage, compression='none', widthHeight=(horizontalResolution, verticalResolution), fo=True)
+                generatedMovieFiles.append([animation, movieFilename])
                 self.StepProgressBar(1)
         
         self.EndProgressBar()
-        self.MessageBox('Playblast generation complete!')
+        return generatedMovieFiles
 
     def GetPlayblastMovieFilename(self, directoryName, prefixText, animation):
         assert(directoryName)
@@ -810,22 +7432,7 @@ class SequencerUI:
         if trimStart < 0:
             self.MessageBox('Trim can start only from 0. Please ensure start frame is valid.', 'Trim keys pre-requisite error')
             
-        trimRegions = [0] * (trimEnd + 1)
-        for animation in self.sequencer.Animations.values():
-            trimRegions[animation.StartFrame:animation.EndFrame + 1] = [1] * (animation.EndFrame - animation.StartFrame + 1)
-        
-        i = 0
-        while i < len(trimRegions):
-            tStart = FindIndexOf(trimRegions, 0, i, trimEnd)
-            tEnd = FindIndexOf(trimRegions, 1, tStart, trimEnd) - 1
-            
-            if tEnd < tStart:
-                break
-            
-            Cmds.cutKey(selection, animation='keysOrObjects', option='keys', clear=True, hierarchy='below', time=(tStart,tEnd))
-            
-            i = tEnd + 1
-            i = i + 1
+        TrimSequencerKeys(self.sequencer, selection, trimStart, trimEnd)
             
         self.MessageBox('Trim complete!')
         
@@ -837,102 +7444,189 @@ class SequencerUI:
         mayaFile = Cmds.file(q=True, sn=True)
         directoryName = os.path.dirname(mayaFile)
         fileName = os.path.splitext(os.path.basename(mayaFile))[0]
-        generatedAnimationFiles = []
         
-        createFiles = True
-        for animation in self.sequencer.Animations.values():
-            if animation.Selected == True:
-                negativeStartFrame = -animation.StartFrame
-                
-                if createFiles == True:
-                    Cmds.select(all=True)
-                    Cmds.cutKey(time=(self.sequencer.StartFrame() - 10, animation.StartFrame))
-                    Cmds.cutKey(time=(animation.EndFrame, self.sequencer.EndFrame() + 10))
-                    Cmds.keyframe(edit=True, relative=True, timeChange=negativeStartFrame, time=(animation.StartFrame, animation.EndFrame))
-                
-                fbxFilename = "%s/%s%s.fbx" % (directoryName, prefixText, animation.Name)
-                generatedAnimationFiles.append([animation, fbxFilename])
-                
-                if createFiles == True:
-                    melCode = 'FBXExport -f "%s"' % fbxFilename
-                    Mel.eval(melCode)
-                
-                    Cmds.undo()
-                    Cmds.undo()
-                    Cmds.undo()
-                    Cmds.undo()
-            
         # Make sure at least some files were selected
-        if len(generatedAnimationFiles) == 0:
+        if self.CountSelected() == 0:
             self.MessageBox('Please select at least one animation to export')
             return
         
-        # Ready the progress bar
-        #self.StartProgressBar('Generating FBX', len(generatedAnimationFiles))
+        if not self.IsRateValid():
+            self.MessageBox('The rate should be a number of frames per second, or blank for the scene rate')
+            return
         
-        # Open each of these files and stitch them
-        masterFilename = "%s/%s%s.fbx" % (directoryName, prefixText, fileName)
-        masterFile = open(masterFilename, "w")
-        for animationFileIndex in range(len(generatedAnimationFiles)):
-            '''
-            if self.IsProgressBarCanceled():
-                self.EndProgressBar()
-                self.MessageBox('FBX generation canceled by user!')
-                return
-            '''
-                
-            generatedAnimationFile = generatedAnimationFiles[animationFileIndex]
-            generatedAnimation = generatedAnimationFile[0]
-            generatedFilename = generatedAnimationFile[1]
-            generatedFile = open(generatedFilename, "r")
-            
-            preTake = True
-            inTake = False
-            postTake = False
-            
-            takeString = "Take: \"Take 001\" {"
-            endTakeString = "}"
-            takeLevel = "    "
+        try:
+            self.GenerateFbxFiles(directoryName, prefixText, fileName)
+        except (FbxAsciiError, FbxStitchError, FarmError) as error:
+            self.MessageBox('FBX generation failed: %s' % error)
+            return
+        
+        self.MessageBox('FBX generation complete!')
+    
+    def ExportFrameRate(self):
+        '''
+        Returns the frame rate of the Rate field, or None when it is blank for the scene rate
+        Raises ValueError if it is not a positive number
+        '''
+        rateText = Cmds.textField(self.rateTextBox, q=True, text=True)
+        if IsNoneOrEmpty(rateText) or IsNoneOrEmpty(rateText.strip()):
+            return None
+        
+        framesPerSecond = float(rateText)
+        if not framesPerSecond > 0:
+            raise ValueError("Frame rate %s is not positive" % rateText)
+        
+        return framesPerSecond
+    
+    def IsRateValid(self):
+        try:
+            self.ExportFrameRate()
+        except ValueError:
+            return False
+        
+        return True
+    
+    def GenerateFbxFiles(self, directoryName, prefixText, fileName):
+        '''
+        Runs GenerateSequencerFbx with the options of the FBX row
+        '''
+        singleExport = Cmds.checkBox(self.SingleExportCheckBox, q=True, value=True)
+        binaryFbx = Cmds.checkBox(self.BinaryFbxCheckBox, q=True, value=True)
+        
+        reduceTolerances = None
+        if Cmds.checkBox(self.ReduceKeysCheckBox, q=True, value=True):
+            reduceTolerances = ReductionTolerances
+        
+        staticTolerances = None
+        if Cmds.checkBox(self.StripStaticCheckBox, q=True, value=True):
+            staticTolerances = ReductionTolerances
+        
+        framesPerSecond = self.ExportFrameRate()
+        
+        exportAnimations = None
+        if Cmds.checkBox(self.FarmCheckBox, q=True, value=True):
+            exportAnimations = self.ExportFbxOnFarm
             
-            for currentLine in generatedFile:
-                strippedLine = currentLine.strip(" \r\n")
+        return GenerateSequencerFbx(self.sequencer, directoryName, prefixText, fileName, singleExport, binaryFbx, exportAnimations, reduceTolerances, staticTolerances, framesPerSecond)
+        
+    def ExportFbxOnFarm(self, generatedAnimationFiles):
+        '''
+        Exports the [animation, fbxFilename] files on mayapy workers that each load the saved scene
+        '''
+        if Cmds.file(q=True, modified=True):
+            raise FarmError('please save the Maya file first, the farm exports the saved scene')
+        
+        waitingPayloads = []
+        for animation, fbxFilename in generatedAnimationFiles:
+            waitingPayloads.append({"Name": animation.Name, "StartFrame": animation.StartFrame, "EndFrame": animation.EndFrame,
+                "TimelineStart": self.sequencer.StartFrame() - 10, "TimelineEnd": self.sequencer.EndFrame() + 10, "Filename": fbxFilename})
+        
+        workerCommand, workerEnvironment = MayaFarmCommand(Cmds.file(q=True, sn=True))
+        farm = ExportFarm(workerCommand, environment=workerEnvironment)
+        
+        # Feed the farm and poll its results so the progress bar stays live
+        canceled = False
+        failedJobs = []
+        submittedCount = 0
+        finishedCount = 0
+        self.StartProgressBar('Generating FBX', len(waitingPayloads))
+        try:
+            while len(waitingPayloads) > 0 or finishedCount < submittedCount:
+                while len(waitingPayloads) > 0 and not farm.IsFull():
+                    farm.Submit("fbx", waitingPayloads.pop(0))
+                    submittedCount += 1
                 
-                if not IsNoneOrEmpty(strippedLine):
-                    splitLine = currentLine.split(strippedLine)
-                else:
-                    splitLine = [''] * 2
-                    
-                lineStartsWith = splitLine[0]
-                lineEndsWith = splitLine[1]
-                
-                if strippedLine == takeString:
-                    inTake = True
-                    preTake = False
-                    takeLevel = lineStartsWith
-                    currentLine = currentLine.replace("Take 001", generatedAnimation.Name)
-                    
-                # For the first file, pick from top of file until the take also
-                if animationFileIndex == 0 and preTake == True:
-                    masterFile.write(currentLine)
-                    
-                # For all other files, just cut the take and paste it in
-                if inTake == True:
-                    masterFile.write(currentLine)
-                    
-                # For the last file, pick after the take to the bottom of file
-                if animationFileIndex == (len(generatedAnimationFiles) - 1) and postTake == True:
-                    masterFile.write(currentLine)
-                    
-                if inTake == True and strippedLine == endTakeString and lineStartsWith == takeLevel:
-                    inTake = False
-                    postTake = True
+                if not canceled and self.IsProgressBarCanceled():
+                    canceled = True
+                    farm.Cancel()
+                    waitingPayloads = []
                 
-            #self.StepProgressBar(1)
-            
-        masterFile.close()
+                try:
+                    job = farm.Results.get(timeout=0.1)
+                except Queue.Empty:
+                    continue
+                
+                finishedCount += 1
+                self.StepProgressBar(1)
+                if not job.Succeeded():
+                    failedJobs.append(job)
+        finally:
+            farm.Close()
+            self.EndProgressBar()
         
-        self.MessageBox('FBX generation complete!')
+        if canceled:
+            raise FarmError('canceled by the user')
+        
+        if len(failedJobs) > 0:
+            raise FarmError(', '.join(['%s (%s)' % (job.Payload["Name"], job.Error) for job in failedJobs]))
+
+    def GenerateBundle(self, extraArg=None):
+        '''
+        Exports the FBX files, playblasts and CSV of the selected animations into one zip file
+        All FBX files, then all playblasts, are first written to a temporary staging folder; each
+        file is then compressed into the bundle and deleted, and the staging folder is removed at
+        the end, so only the bundle is written next to the scene
+        '''
+        prefixText = Cmds.textField(self.prefixTextBox, q=True, text=True)
+        if not IsNoneOrEmpty(prefixText):
+            prefixText = "%s_" % prefixText
+        
+        mayaFile = Cmds.file(q=True, sn=True)
+        directoryName = os.path.dirname(mayaFile)
+        if not directoryName:
+            self.MessageBox('Please save Maya file before exporting.')
+            return
+        
+        if self.CountSelected() == 0:
+            self.MessageBox('Please select animations to export!')
+            return
+        
+        if not self.IsRateValid():
+            self.MessageBox('The rate should be a number of frames per second, or blank for the scene rate')
+            return
+        
+        fileName = os.path.splitext(os.path.basename(mayaFile))[0]
+        now = datetime.datetime.now()
+        bundleFilename = "%s/%s%s Export %d%d%d-%d%d%d.zip" % (directoryName, prefixText, fileName, now.year, now.month, now.day, now.hour, now.minute, now.second)
+        
+        stagingDirectory = tempfile.mkdtemp(prefix='Sequencer')
+        bundle = ExportBundle(bundleFilename)
+        completed = False
+        try:
+            for generatedFilename in self.GenerateFbxFiles(stagingDirectory, prefixText, fileName):
+                bundle.AddFile(os.path.basename(generatedFilename), generatedFilename, remove=True)
+            
+            playblastLinks = None
+            if Cmds.objExists('persp'):
+                self.PlayblastDisplayEnable(False)
+                generatedMovieFiles = self.GeneratePlayblastFiles(stagingDirectory, prefixText)
+                if generatedMovieFiles is None:
+                    self.MessageBox('Bundle export canceled by the user')
+                    return
+                
+                # Links are relative, next to the CSV inside the bundle
+                playblastLinks = {}
+                for generatedAnimation, movieFilename in generatedMovieFiles:
+                    movieName = "Playblasts/%s" % os.path.basename(movieFilename)
+                    bundle.AddFile(movieName, movieFilename, remove=True)
+                    playblastLinks[generatedAnimation.Id] = movieName
+            
+            csvEntry = bundle.OpenEntry("%s%s.csv" % (prefixText, fileName))
+            self.WriteCsv(csvEntry, playblastLinks)
+            csvEntry.close()
+            completed = True
+        except (FbxAsciiError, FbxStitchError, FarmError) as error:
+            self.MessageBox('Bundle export failed: %s' % error)
+            return
+        finally:
+            # A canceled or failed export leaves no bundle behind
+            if completed:
+                bundle.Close()
+            else:
+                bundle.Abort()
+            shutil.rmtree(stagingDirectory, ignore_errors=True)
         
+        self.MessageBox('Bundle export complete!\n%s' % bundleFilename)
+
     def Create(self):
         '''
         Creates the window
@@ -955,6 +7649,11 @@ class SequencerUI:
         Cmds.button(label='Move Down', c=Partial(self.MoveDown))
         Cmds.button(label='Refresh', backgroundColor=[0.6, 0.6, 0.9], c=Partial(self.Refresh))
         
+        Cmds.setParent('..')
+        Cmds.rowLayout(numberOfColumns = 2, columnWidth2=[45, 290], columnAlign2=['left', 'left'])
+        Cmds.text(label=' Filter')
+        Cmds.textField(self.filterTextBox, width = 288, textChangedCommand=self.Filter_Changed)
+        
         self.CreateSeparator()
         
         # Tool controls
@@ -964,6 +7663,11 @@ class SequencerUI:
         Cmds.text(label=' Prefix')
         Cmds.textField(self.prefixTextBox, width = 288)
         
+        Cmds.setParent('..')
+        Cmds.rowLayout(numberOfColumns = 2, columnWidth2=[45, 290], columnAlign2=['left', 'left'])
+        Cmds.text(label=' Rate')
+        Cmds.textField(self.rateTextBox, width = 288)
+        
         Cmds.setParent('..')
         Cmds.rowLayout(numberOfColumns = 2, columnWidth2=[200, 48], columnAlign2=['left', 'left'])
         Cmds.text(label=' To import from MoveLister')
@@ -981,10 +7685,26 @@ class SequencerUI:
         self.IncludePlayblastLinkCheckBox = Cmds.checkBox(label='playblast link')
         
         Cmds.setParent('..')
-        Cmds.rowLayout(numberOfColumns = 2, columnWidth2=[200, 48], columnAlign2=['left', 'left'])
+        Cmds.rowLayout(numberOfColumns = 7, columnWidth=[(1, 200), (2, 90), (3, 90), (4, 55), (5, 48), (6, 90), (7, 90)], columnAlign=[(column, 'left') for column in range(1, 8)])
         Cmds.text(label=' To generate animation-aware FBX')
         Cmds.button(label='Generate FBX', c=Partial(self.GenerateFbx), backgroundColor=[0.9, 0.9, 0.8])
+        self.SingleExportCheckBox = Cmds.checkBox(label='single export')
+        self.BinaryFbxCheckBox = Cmds.checkBox(label='binary')
+        self.FarmCheckBox = Cmds.checkBox(label='farm')
+        self.ReduceKeysCheckBox = Cmds.checkBox(label='reduce keys')
+        self.StripStaticCheckBox = Cmds.checkBox(label='strip static')
         
+        Cmds.setParent('..')
+        Cmds.rowLayout(numberOfColumns = 2, columnWidth2=[200, 48], columnAlign2=['left', 'left'])
+        Cmds.text(label=' To export FBX, playblasts and CSV as one zip')
+        Cmds.button(label='Export Bundle', c=Partial(self.GenerateBundle), backgroundColor=[0.9, 0.9, 0.8])
+
+        Cmds.setParent('..')
+        Cmds.rowLayout(numberOfColumns = 2, columnWidth2=[200, 120], columnAlign2=['left', 'left'])
+        Cmds.text(label=' To serve animations to pipeline tools')
+        self.ServerCheckBox = Cmds.checkBox(label='server on %d' % SequencerServerPort, value=SequencerServerInstance is not None,
+            cc=self.Server_Changed)
+
         self.CreateSeparator()
         
         # Skyrigger controls
@@ -1015,6 +7735,17 @@ class SequencerUI:
         
         self.Refresh()
         
+    def Server_Changed(self, extraArg=None):
+        if not Cmds.checkBox(self.ServerCheckBox, q=True, value=True):
+            StopSequencerServer()
+            return
+        
+        try:
+            StartSequencerServer()
+        except (IOError, OSError) as error:
+            Cmds.checkBox(self.ServerCheckBox, e=True, value=False)
+            self.MessageBox('Could not start the server on port %d:\n%s' % (SequencerServerPort, error))
+    
     def CreateSeparator(self, parent=None, separatorStyle='double'):
         '''
         Creates a separator
@@ -1032,3 +7763,371 @@ def Run():
     sequencerUI = SequencerUI()
     sequencerUI.Create()
     sequencerUI.Show()
+
+def MayaFarmCommand(sceneFilename):
+    '''
+    Returns the command and environment of a mayapy farm worker for sceneFilename
+    '''
+    mayapy = os.path.join(os.environ.get("MAYA_LOCATION", ""), "bin", "mayapy")
+    workerCode = "import maya.standalone; maya.standalone.initialize(); import Sequencer; Sequencer.RunMayaExportWorker(%r)" % sceneFilename
+    
+    # Make sure the worker imports this same Sequencer.py
+    environment = dict(os.environ)
+    pythonPath = [os.path.dirname(os.path.abspath(__file__))]
+    if environment.get("PYTHONPATH"):
+        pythonPath.append(environment["PYTHONPATH"])
+    
+    environment["PYTHONPATH"] = os.pathsep.join(pythonPath)
+    return [mayapy, "-c", workerCode], environment
+
+def ExportAnimationFbx(payload):
+    '''
+    Farm job: moves the keys of one animation to start at frame 0 and exports them, like GenerateFbx does
+    '''
+    Cmds.undoInfo(openChunk=True)
+    try:
+        Cmds.select(all=True)
+        Cmds.cutKey(time=(payload["TimelineStart"], payload["StartFrame"]))
+        Cmds.cutKey(time=(payload["EndFrame"], payload["TimelineEnd"]))
+        Cmds.keyframe(edit=True, relative=True, timeChange=-payload["StartFrame"], time=(payload["StartFrame"], payload["EndFrame"]))
+        Mel.eval('FBXExport -f "%s"' % payload["Filename"])
+    finally:
+        Cmds.undoInfo(closeChunk=True)
+        Cmds.undo()
+    
+    return payload["Filename"]
+
+def RunMayaExportWorker(sceneFilename):
+    '''
+    Entry point of the mayapy farm workers: loads sceneFilename and runs export jobs until stdin closes
+    '''
+    PrepareFbxExport()
+    Cmds.file(sceneFilename, open=True, force=True)
+    Cmds.undoInfo(state=True, infinity=True)
+    
+    RunExportWorker({"fbx": ExportAnimationFbx})
+
+class BatchError(Exception):
+    pass
+
+BatchPipelineSteps = ["bake", "trim", "poses", "fbx", "clips", "csv"]
+
+def PrepareFbxExport():
+    '''
+    Loads the FBX plugin of a headless session and sets the mode the stitcher works on
+    '''
+    Cmds.loadPlugin('fbxmaya', quiet=True)
+    Mel.eval('FBXExportInAscii -v true')
+    Mel.eval('FBXExportFileVersion -v FBX200611')
+
+def FindRootJoint():
+    '''
+    Returns the topmost joint of the scene, or None
+    '''
+    for joint in Cmds.ls(type='joint') or []:
+        parents = Cmds.listRelatives(joint, parent=True)
+        if not parents or not Cmds.nodeType(parents[0]) == 'joint':
+            return joint
+    
+    return None
+
+def ProcessScene(payload):
+    '''
+    Batch job: opens a scene and runs the pipeline steps on its sequencer
+    Returns the animation count, the files written and the seconds each step took
+    '''
+    timings = {}
+    stepStart = time.time()
+    Cmds.file(payload["Scene"], open=True, force=True)
+    sequencer = LoadSequencer()
+    timings["open"] = round(time.time() - stepStart, 3)
+    
+    if payload.get("All"):
+        for animation in sequencer.Animations.values():
+            animation.Selected = True
+    
+    directoryName = payload.get("Output") or os.path.dirname(payload["Scene"])
+    fileName = os.path.splitext(os.path.basename(payload["Scene"]))[0]
+    prefixText = payload.get("Prefix", "")
+    if not IsNoneOrEmpty(prefixText):
+        prefixText = "%s_" % prefixText
+    
+    generatedFiles = []
+    animationFbxFiles = None
+    for step in payload["Pipeline"]:
+        stepStart = time.time()
+        
+        if step in ["bake", "trim", "poses"]:
+            rootJoint = FindRootJoint()
+            if rootJoint is None:
+                raise BatchError("No joint to %s in %s" % (step, payload["Scene"]))
+        
+        if step == "bake":
+            Cmds.select(rootJoint)
+            Bake(sequencer.StartFrame(), sequencer.EndFrame())
+        elif step == "trim":
+            TrimSequencerKeys(sequencer, [rootJoint], sequencer.StartFrame(), sequencer.EndFrame())
+        elif step == "poses":
+            ranges = [[animation.Name, animation.StartFrame, animation.EndFrame] for animation in sequencer.Animations.values()]
+            poses = CachePoses(PoseCache(PoseCacheDirectory(payload["Scene"])), SessionPoseSource(rootJoint), ranges, prune=True)
+            generatedFiles += [poses[name].filename for name in sorted(poses)]
+        elif step == "fbx" and sequencer.Count() > 0:
+            fbxFiles = GenerateSequencerFbx(sequencer, directoryName, prefixText, fileName, payload.get("SingleExport", False), payload.get("Binary", False),
+                reduceTolerances=payload.get("Reduce"), staticTolerances=payload.get("StripStatic"),
+                framesPerSecond=payload.get("FramesPerSecond"), scanWorkers=payload.get("ScanWorkers", 1))
+            animationFbxFiles = fbxFiles[:-1]
+            generatedFiles += fbxFiles
+        elif step == "clips":
+            if animationFbxFiles is None:
+                raise BatchError("The clips step needs the fbx step before it")
+            
+            for fbxFilename in animationFbxFiles:
+                # The fbx step already resampled the keys to this rate
+                generatedFiles.append(EncodeFbxClip(fbxFilename, payload.get("FramesPerSecond") or GetFramesPerSecond())[0])
+        elif step == "csv":
+            csvFilename = "%s/%s%s.csv" % (directoryName, prefixText, fileName)
+            csvFile = open(csvFilename, "w")
+            WriteSequencerCsv(sequencer, csvFile)
+            csvFile.close()
+            generatedFiles.append(csvFilename)
+        
+        timings[step] = round(time.time() - stepStart, 3)
+    
+    if payload.get("Save"):
+        Cmds.file(save=True, force=True)
+    
+    animationList = [AnimationRecord(sequencer.Animations[animationId]) for animationId in sequencer.Ordering]
+    return {"Animations": sequencer.Count(), "AnimationList": animationList, "Files": generatedFiles, "Timings": timings}
+
+def RunBatchWorker():
+    '''
+    Entry point of the batch workers (Sequencer.py --worker); outside mayapy it runs on FakeMaya
+    FakeCmds.file(open=True) does not read the scene, so on FakeMaya every scene is processed as an
+    empty scene: no SequencerData, no animations and nothing exported. Run the workers with mayapy
+    for real scenes; the offline .ma commands (--patch, --trim-offline, --cache-poses) need no Maya
+    '''
+    try:
+        import maya.standalone
+        maya.standalone.initialize()
+    except ImportError:
+        warnings.warn("maya.standalone is not available, the batch worker runs on FakeMaya and opens every scene empty",
+            RuntimeWarning)
+    
+    PrepareFbxExport()
+    RunExportWorker({"scene": ProcessScene})
+
+def WriteSummary(summary, summaryFilename=None):
+    summaryText = json.dumps(summary, indent=4, sort_keys=True)
+    if summaryFilename:
+        summaryFile = open(summaryFilename, "w")
+        summaryFile.write(summaryText)
+        summaryFile.close()
+    else:
+        print(summaryText)
+
+def RunOfflineScenes(arguments, mapFunction, resultKey):
+    '''
+    Runs mapFunction(sceneFilenames, workers) over the .ma scenes under the directory, without Maya, and
+    writes the summary, with the scenes whose result is not empty under resultKey
+    mapFunction returns [sceneFilename, result, error] for every scene; the exit code is 1 if any failed
+    '''
+    startTime = time.time()
+    sceneFilenames = [sceneFilename for sceneFilename in FindScenes(arguments.directory, arguments.pattern or SceneFilePatterns)
+        if sceneFilename.lower().endswith(".ma")]
+    results = mapFunction(sceneFilenames, arguments.workers)
+    
+    failedScenes = [[sceneFilename, error] for sceneFilename, result, error in results if error is not None]
+    summary = {"Directory": arguments.directory, "Scenes": len(results), "Failed": failedScenes,
+        resultKey: dict([(sceneFilename, result) for sceneFilename, result, error in results if result]),
+        "Seconds": round(time.time() - startTime, 3)}
+    WriteSummary(summary, arguments.summary)
+    
+    if len(failedScenes) > 0:
+        return 1
+    
+    return 0
+
+def PatchScenes(arguments):
+    '''
+    Applies the --patch file to the .ma scenes under the directory, e.g. a patch file of
+        
+        {"Renames": {"Run": "Run_Fast"}, "Ranges": {"Idle": [0, 59]}}
+    '''
+    patchFile = open(arguments.patch, "r")
+    try:
+        patchData = json.load(patchFile)
+    finally:
+        patchFile.close()
+    
+    animationPatch = AnimationPatch(patchData.get("Renames"), patchData.get("Ranges"))
+    return RunOfflineScenes(arguments, lambda sceneFilenames, workers: PatchSequencerFiles(sceneFilenames, animationPatch, workers), "Patched")
+
+def TrimScenes(arguments):
+    '''
+    Cuts the keys outside every animation from the time based animCurves of the .ma scenes under the directory
+    '''
+    return RunOfflineScenes(arguments, TrimMayaAsciiFiles, "Trimmed")
+
+def CachePoseScenes(arguments):
+    '''
+    Caches the poses of the joints of the .ma scenes under the directory over each of their animations, without Maya
+    '''
+    return RunOfflineScenes(arguments, CacheMayaAsciiFiles, "Cached")
+
+def Main(argv=None):
+    '''
+    Batch command line: runs a pipeline over every scene under a directory on a pool of workers, e.g.
+        
+        mayapy Sequencer.py Characters --pipeline bake,trim,fbx --workers 8 --summary Summary.json
+    
+    Prints (or writes) a JSON summary with the result and timings of every scene
+    '''
+    parser = argparse.ArgumentParser(description="Runs a Sequencer pipeline over every scene under a directory")
+    parser.add_argument("directory", nargs="?", help="directory searched for scenes")
+    parser.add_argument("--pipeline", help="comma separated steps out of %s, run in order; fbx by default, none with --index" % ",".join(BatchPipelineSteps))
+    parser.add_argument("--pattern", action="append", help="scene file pattern, *.ma and *.mb by default")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, one per core by default")
+    parser.add_argument("--scan-workers", type=int, default=None, help="processes each worker scans its animation files on before stitching, the cores left per worker by default")
+    parser.add_argument("--timeout", type=float, default=FarmJobTimeout, help="seconds a scene may take")
+    parser.add_argument("--retries", type=int, default=FarmRetries, help="extra attempts for a failed scene")
+    parser.add_argument("--output", help="directory for the exported files, next to each scene by default")
+    parser.add_argument("--prefix", default="", help="prefix of the exported files")
+    parser.add_argument("--all", action="store_true", help="export every animation, not only the selected ones")
+    parser.add_argument("--single-export", action="store_true", help="export the timeline once and split it")
+    parser.add_argument("--binary", action="store_true", help="write the stitched master as binary FBX 6.1 (the same node tree, not FBX 7)")
+    parser.add_argument("--fps", type=float, help="frame rate the exported keys and clips are resampled to, the scene rate by default")
+    parser.add_argument("--reduce", nargs="?", const="", help="remove the baked keys within tolerance before stitching, e.g. T=0.01,R=0.05,S=0.001")
+    parser.add_argument("--strip-static", nargs="?", const="", help="collapse the channels that stay within tolerance to one key before stitching, same format as --reduce")
+    parser.add_argument("--save", action="store_true", help="save the scenes after the pipeline")
+    parser.add_argument("--summary", help="file the JSON summary is written to instead of stdout")
+    parser.add_argument("--index", help="animation index database; only the scenes changed since it was updated are run")
+    parser.add_argument("--patch", help="JSON file of Renames and Ranges by animation name, applied to the .ma scenes without Maya")
+    parser.add_argument("--trim-offline", action="store_true", help="cut the keys outside every animation from the .ma scenes without Maya")
+    parser.add_argument("--cache-poses", action="store_true", help="cache the joint poses of every animation of the .ma scenes without Maya")
+    parser.add_argument("--worker-command", help="command of the worker processes, this script by default")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    arguments = parser.parse_args(argv)
+    
+    if arguments.worker:
+        RunBatchWorker()
+        return 0
+    
+    if arguments.directory is None:
+        parser.error("a directory is required")
+    
+    if arguments.patch:
+        return PatchScenes(arguments)
+    
+    if arguments.trim_offline:
+        return TrimScenes(arguments)
+    
+    if arguments.cache_poses:
+        return CachePoseScenes(arguments)
+    
+    pipelineText = arguments.pipeline
+    if pipelineText is None:
+        pipelineText = "" if arguments.index else "fbx"
+    
+    pipeline = [step.strip() for step in pipelineText.split(",") if step.strip()]
+    for step in pipeline:
+        if step not in BatchPipelineSteps:
+            parser.error("unknown pipeline step %s" % step)
+    
+    if arguments.worker_command:
+        workerCommand = shlex.split(arguments.worker_command)
+    else:
+        workerCommand = [sys.executable, os.path.abspath(__file__), "--worker"]
+    
+    reduceTolerances = None
+    if arguments.reduce is not None:
+        try:
+            reduceTolerances = ParseTolerances(arguments.reduce)
+        except ValueError as error:
+            parser.error(str(error))
+    
+    if arguments.fps is not None and not arguments.fps > 0:
+        parser.error("the frame rate should be positive")
+    
+    staticTolerances = None
+    if arguments.strip_static is not None:
+        try:
+            staticTolerances = ParseTolerances(arguments.strip_static)
+        except ValueError as error:
+            parser.error(str(error))
+    
+    workers = arguments.workers
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    
+    # The scene workers already run in parallel, so each scans on its share of the cores
+    scanWorkers = arguments.scan_workers
+    if scanWorkers is None:
+        scanWorkers = max(1, multiprocessing.cpu_count() // workers)
+    
+    jobs = []
+    def RunScenes(sceneFilenames):
+        payloads = [{"Scene": sceneFilename, "Pipeline": pipeline, "Output": arguments.output, "Prefix": arguments.prefix,
+            "All": arguments.all, "SingleExport": arguments.single_export, "Binary": arguments.binary, "Reduce": reduceTolerances, "StripStatic": staticTolerances, "FramesPerSecond": arguments.fps, "Save": arguments.save,
+            "ScanWorkers": scanWorkers}
+            for sceneFilename in sceneFilenames]
+        
+        farm = ExportFarm(workerCommand, workers=max(1, min(workers, len(payloads))), jobTimeout=arguments.timeout, retries=arguments.retries)
+        try:
+            sceneJobs = farm.Map("scene", payloads)
+        finally:
+            farm.Close()
+        
+        # Every job goes into the summary, but only this call's scenes are returned
+        jobs.extend(sceneJobs)
+        return [[job.Payload["Scene"], (job.Result or {}).get("AnimationList"), job.Error] for job in sceneJobs]
+    
+    def ReadScenes(sceneFilenames):
+        # Without pipeline steps .ma scenes are read offline, only the others need Maya
+        if len(pipeline) > 0:
+            return RunScenes(sceneFilenames)
+        
+        asciiScenes = [sceneFilename for sceneFilename in sceneFilenames if sceneFilename.lower().endswith(".ma")]
+        otherScenes = [sceneFilename for sceneFilename in sceneFilenames if not sceneFilename.lower().endswith(".ma")]
+        
+        results = ReadSequencerAnimationFiles(asciiScenes, workers)
+        if len(otherScenes) > 0:
+            results += RunScenes(otherScenes)
+        
+        return results
+    
+    startTime = time.time()
+    patterns = arguments.pattern or SceneFilePatterns
+    indexSummary = None
+    if arguments.index:
+        index = AnimationIndex(arguments.index)
+        try:
+            indexSummary = index.Update(arguments.directory, ReadScenes, patterns)
+        finally:
+            index.Close()
+    else:
+        RunScenes(FindScenes(arguments.directory, patterns))
+    
+    scenes = []
+    for job in jobs:
+        scene = {"Scene": job.Payload["Scene"], "Succeeded": job.Succeeded(), "Attempts": job.Attempts, "Error": job.Error}
+        if job.Result is not None:
+            scene.update(job.Result)
+            del scene["AnimationList"]
+        
+        scenes.append(scene)
+    
+    failedCount = len([job for job in jobs if not job.Succeeded()])
+    summary = {"Directory": arguments.directory, "Pipeline": pipeline, "Workers": workers, "Failed": failedCount,
+        "Seconds": round(time.time() - startTime, 3), "Scenes": scenes}
+    if indexSummary is not None:
+        summary["Index"] = indexSummary
+    
+    WriteSummary(summary, arguments.summary)
+    
+    if failedCount > 0:
+        return 1
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(Main())
@@ -0,0 +1,161 @@
+'''
+Animation clips
+
+The local transforms of the joints of one animation sampled on every
+frame, as NumPy arrays: translations and scales (frames, joints, 3) and
+rotations as quaternions (frames, joints, 4). Clips are made from the
+curves of an FBX take, can be resampled to another frame rate and are what
+the clip codec compresses.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import re
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxCurves import *
+    from AnimationMath import *
+except ImportError:
+    pass
+
+# Transform/T/X as FBX names the channels, translateX as Maya does
+ClipChannelPattern = re.compile(r'(?:^|/)([TRS])/([XYZ])$|^(translate|rotate|scale)([XYZ])$')
+
+ClipChannelKinds = {"T": "T", "R": "R", "S": "S", "translate": "T", "rotate": "R", "scale": "S"}
+
+class AnimationClip:
+    '''
+    The sampled local transforms of Joints over the frames of one animation, e.g.
+        
+        clip = ReadFbxClip("Run.fbx", 30)
+        clip.Rotations[10, 3]
+    
+    is the rotation of joint 3 on the 11th frame
+    '''
+    Name = ""
+    Joints = None
+    FramesPerSecond = 24
+    Translations = None
+    Rotations = None
+    Scales = None
+    
+    def __init__(self, name, joints, translations, rotations, scales, framesPerSecond=24):
+        self.Name = name
+        self.Joints = list(joints)
+        self.Translations = translations
+        self.Rotations = rotations
+        self.Scales = scales
+        self.FramesPerSecond = framesPerSecond
+    
+    def FrameCount(self):
+        return len(self.Translations)
+    
+    def JointCount(self):
+        return len(self.Joints)
+
+def ClipChannel(channel):
+    '''
+    Returns the kind (T, R or S) and axis (0 to 2) of a channel path, or None
+    '''
+    match = ClipChannelPattern.search(channel)
+    if match is None:
+        return None
+    
+    if match.group(1) is not None:
+        return ClipChannelKinds[match.group(1)], "XYZ".index(match.group(2))
+    
+    return ClipChannelKinds[match.group(3)], "XYZ".index(match.group(4))
+
+def ClipFromCurves(name, curves, framesPerSecond, rotateOrder="xyz"):
+    '''
+    Returns the AnimationClip of the transform curves of a take, sampled on every frame from the
+    first key to the last; channels without keys keep their default value
+    '''
+    RequireNumpy()
+    
+    joints = []
+    channels = {}
+    for curve in curves:
+        channel = ClipChannel(curve.Channel)
+        if channel is None:
+            continue
+        
+        if curve.Model not in channels:
+            joints.append(curve.Model)
+            channels[curve.Model] = {}
+        
+        channels[curve.Model][channel] = curve
+    
+    keyTimes = [curve.Times for jointChannels in channels.values() for curve in jointChannels.values() if curve.Count() > 0]
+    if len(keyTimes) == 0:
+        frames = Numpy.zeros(1)
+    else:
+        firstFrame = Numpy.round(TicksToFrames(min([times[0] for times in keyTimes]), framesPerSecond))
+        lastFrame = Numpy.round(TicksToFrames(max([times[-1] for times in keyTimes]), framesPerSecond))
+        frames = Numpy.arange(firstFrame, lastFrame + 1)
+    
+    sampleTicks = FramesToTicks(frames, framesPerSecond).astype(Numpy.float64)
+    
+    # Identity transforms, then every keyed channel over them
+    transforms = {"T": Numpy.zeros((len(frames), len(joints), 3)), "R": Numpy.zeros((len(frames), len(joints), 3)),
+        "S": Numpy.ones((len(frames), len(joints), 3))}
+    for jointIndex in range(len(joints)):
+        for (kind, axis), curve in channels[joints[jointIndex]].items():
+            if curve.Count() == 0:
+                transforms[kind][:, jointIndex, axis] = curve.Default
+            else:
+                transforms[kind][:, jointIndex, axis] = Numpy.interp(sampleTicks, curve.Times.astype(Numpy.float64), curve.Values)
+    
+    rotations = ContinuousQuaternions(EulerToQuaternions(transforms["R"], rotateOrder))
+    return AnimationClip(name, joints, transforms["T"], rotations, transforms["S"], framesPerSecond)
+
+def ReadFbxClip(filename, framesPerSecond, takeName=None, rotateOrder="xyz"):
+    '''
+    Returns the AnimationClip of a take of an FBX ASCII file, takeName as in ReadTakeCurves
+    '''
+    curves = ReadTakeCurves(filename, takeName)
+    if takeName is None:
+        takeName = os.path.splitext(os.path.basename(filename))[0]
+    
+    return ClipFromCurves(takeName, curves, framesPerSecond, rotateOrder)
+
+def ResampleFrames(frameCount, framesPerSecond, targetFramesPerSecond):
+    '''
+    Returns, for every frame of an animation of frameCount frames resampled at targetFramesPerSecond,
+    the frame before it and its weight toward the next one; a final frame past the end is pulled back
+    onto the last one, so the end pose is kept
+    '''
+    duration = (frameCount - 1) / float(framesPerSecond)
+    sampleCount = int(Numpy.ceil(duration * targetFramesPerSecond - 1e-9)) + 1
+    positions = Numpy.minimum(Numpy.arange(sampleCount) * (float(framesPerSecond) / targetFramesPerSecond), frameCount - 1)
+    
+    indices = Numpy.minimum(Numpy.floor(positions).astype(Numpy.int64), max(frameCount - 2, 0))
+    return indices, positions - indices
+
+def ResampleClip(clip, framesPerSecond):
+    '''
+    Returns clip resampled at framesPerSecond, slerping rotations and lerping translations and scales
+    between the frames around every new one
+    '''
+    RequireNumpy()
+    
+    if clip.FrameCount() < 2 or framesPerSecond == clip.FramesPerSecond:
+        return AnimationClip(clip.Name, clip.Joints, clip.Translations, clip.Rotations, clip.Scales, framesPerSecond)
+    
+    indices, weights = ResampleFrames(clip.FrameCount(), clip.FramesPerSecond, framesPerSecond)
+    
+    def Lerp(values):
+        return values[indices] + weights[:, None, None] * (values[indices + 1] - values[indices])
+    
+    jointWeights = Numpy.repeat(weights[:, None], clip.JointCount(), axis=1)
+    rotations = ContinuousQuaternions(SlerpQuaternions(clip.Rotations[indices], clip.Rotations[indices + 1], jointWeights))
+    return AnimationClip(clip.Name, clip.Joints, Lerp(clip.Translations), rotations, Lerp(clip.Scales), framesPerSecond)
@@ -0,0 +1,416 @@
+'''
+Animation curve evaluation
+
+Evaluates animation curves without Maya: the keys, tangents and pre/post
+infinity of an animCurve node (from a .ma scene) or of an FBX take channel
+are sampled at any number of times in one NumPy call, for offline trimming,
+reduction and resampling of scenes without a license.
+
+Every segment is a cubic between its two keys. Unweighted tangents make it a
+Hermite spline from the out slope of the first key to the in slope of the
+second; weighted tangents make it a Bezier whose handles are as long (in
+time) as the weights, and the time of every sample is solved on its segment
+by bisection. The slopes of Maya's tangent types are computed from the keys
+around each one: spline and clamped tangents follow their neighbours, while
+plateau and auto tangents are flat on extremes and limited so a segment
+never overshoots its keys. Slow and fast tangents are evaluated as flat and
+linear ones.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import math
+import mmap
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxAscii import *
+    from FbxStitcher import *
+    from FbxCurves import *
+    from MayaAscii import *
+    from MayaCurves import *
+except ImportError:
+    pass
+
+CurveTangentTypes = ["fixed", "linear", "flat", "step", "stepNext", "spline", "clamped", "plateau", "auto", "slow", "fast"]
+
+CurveInfinities = ["constant", "linear", "cycle", "cycleRelative", "oscillate"]
+
+# The .kit/.kot and .pre/.pst values of .ma animCurve nodes
+MayaTangentCodes = {1: "fixed", 2: "linear", 3: "flat", 4: "spline", 5: "step", 6: "slow", 7: "fast", 8: "clamped",
+    9: "spline", 10: "clamped", 16: "plateau", 17: "stepNext", 18: "auto"}
+
+MayaInfinityCodes = {0: "constant", 1: "linear", 2: "constant", 3: "cycle", 4: "cycleRelative", 5: "oscillate"}
+
+# Curves whose tangents are stored in radians but keyed in degrees
+MayaAngularCurveType = b"animCurveTA"
+
+# Bisection steps that find the parameter of a time on a weighted segment, to 2^-40 of the segment
+CurveBisectionSteps = 40
+
+def TangentTypeIndices(tangentTypes, count):
+    '''
+    Returns the indices in CurveTangentTypes of one tangent type name for every key, or of a list of them
+    '''
+    if isinstance(tangentTypes, str):
+        return Numpy.full(count, CurveTangentTypes.index(tangentTypes), dtype=Numpy.int64)
+    
+    return Numpy.array([CurveTangentTypes.index(tangentType) for tangentType in tangentTypes], dtype=Numpy.int64).reshape(count)
+
+def OptionalKeyArray(values, count):
+    if values is None:
+        return None
+    
+    return Numpy.asarray(values, dtype=Numpy.float64).reshape(count)
+
+class AnimationCurve:
+    '''
+    The keys of one animation curve and how they are interpolated, e.g.
+        
+        curve = AnimationCurve([0, 10, 20], [0, 5, 0], "auto", "auto", postInfinity="oscillate")
+        curve.Evaluate(Numpy.arange(0, 100, 0.5))
+    
+    Tangent types are names in CurveTangentTypes, one for all keys or one per key; fixed tangents
+    take their slopes (value per time unit) from InSlopes and OutSlopes. Weights, if given, are the
+    lengths in time of the tangent handles and make the curve weighted
+    '''
+    Times = None
+    Values = None
+    InTangentTypes = None
+    OutTangentTypes = None
+    InSlopes = None
+    OutSlopes = None
+    InWeights = None
+    OutWeights = None
+    PreInfinity = "constant"
+    PostInfinity = "constant"
+    
+    def __init__(self, times, values, inTangentTypes="spline", outTangentTypes="spline", inSlopes=None, outSlopes=None,
+        inWeights=None, outWeights=None, preInfinity="constant", postInfinity="constant"):
+        RequireNumpy()
+        
+        self.Times = Numpy.asarray(times, dtype=Numpy.float64).ravel()
+        self.Values = Numpy.asarray(values, dtype=Numpy.float64).reshape(len(self.Times))
+        self.InTangentTypes = TangentTypeIndices(inTangentTypes, len(self.Times))
+        self.OutTangentTypes = TangentTypeIndices(outTangentTypes, len(self.Times))
+        self.InSlopes = OptionalKeyArray(inSlopes, len(self.Times))
+        self.OutSlopes = OptionalKeyArray(outSlopes, len(self.Times))
+        self.InWeights = OptionalKeyArray(inWeights, len(self.Times))
+        self.OutWeights = OptionalKeyArray(outWeights, len(self.Times))
+        self.PreInfinity = preInfinity
+        self.PostInfinity = postInfinity
+        
+        if preInfinity not in CurveInfinities or postInfinity not in CurveInfinities:
+            raise ValueError("Unknown infinity %s or %s" % (preInfinity, postInfinity))
+    
+    def Count(self):
+        return len(self.Times)
+    
+    def IsWeighted(self):
+        return self.InWeights is not None and self.OutWeights is not None
+    
+    def Slopes(self):
+        '''
+        Returns the in and out slopes of every key
+        '''
+        return (TangentSlopes(self.Times, self.Values, self.InTangentTypes, self.InSlopes, True),
+            TangentSlopes(self.Times, self.Values, self.OutTangentTypes, self.OutSlopes, False))
+    
+    def Evaluate(self, times):
+        return EvaluateCurve(self, times)
+
+def TangentSlopes(times, values, tangentTypes, fixedSlopes, incoming):
+    '''
+    Returns the in (incoming) or out slopes of keys with tangentTypes (indices in CurveTangentTypes);
+    fixed tangents without a finite slope in fixedSlopes are treated as spline ones
+    '''
+    count = len(times)
+    if count < 2:
+        return Numpy.zeros(count)
+    
+    # The slopes of the segments before and after every key, an end key's only segment on both sides
+    segmentSlopes = Numpy.diff(values) / Numpy.diff(times)
+    before = Numpy.concatenate([segmentSlopes[:1], segmentSlopes])
+    after = Numpy.concatenate([segmentSlopes, segmentSlopes[-1:]])
+    
+    spline = before.copy()
+    spline[1:-1] = (values[2:] - values[:-2]) / (times[2:] - times[:-2])
+    spline[0] = after[0]
+    
+    # A key level with a neighbour, or an extreme, is flat
+    level = Numpy.zeros(count, dtype=bool)
+    level[1:] |= Numpy.diff(values) == 0
+    level[:-1] |= Numpy.diff(values) == 0
+    extreme = before * after <= 0
+    extreme[[0, -1]] = True
+    
+    # Limited to three times the gentler segment, the cubics stay within their keys (Fritsch-Carlson)
+    limited = Numpy.sign(spline) * Numpy.minimum(Numpy.abs(spline), 3 * Numpy.minimum(Numpy.abs(before), Numpy.abs(after)))
+    
+    slopes = {"linear": before if incoming else after, "flat": 0.0, "slow": 0.0, "fast": before if incoming else after,
+        "step": 0.0, "stepNext": 0.0, "spline": spline, "clamped": Numpy.where(level, 0.0, spline),
+        "plateau": Numpy.where(extreme, 0.0, limited), "auto": Numpy.where(extreme, 0.0, limited)}
+    
+    result = spline.copy()
+    for tangentType, tangentSlopes in slopes.items():
+        mask = tangentTypes == CurveTangentTypes.index(tangentType)
+        result[mask] = (Numpy.zeros(count) + tangentSlopes)[mask]
+    
+    if fixedSlopes is not None:
+        fixed = (tangentTypes == CurveTangentTypes.index("fixed")) & Numpy.isfinite(fixedSlopes)
+        result[fixed] = fixedSlopes[fixed]
+    
+    return result
+
+def InfinityTimes(curve, times, inSlopes, outSlopes):
+    '''
+    Returns the times within the keys of curve that times outside them repeat by its infinities,
+    and the offsets to add to the values there
+    '''
+    first, last = curve.Times[0], curve.Times[-1]
+    span = last - first
+    localTimes = Numpy.clip(times, first, last)
+    offsets = Numpy.zeros(len(times))
+    
+    for outside, infinity, end, slope in [[times < first, curve.PreInfinity, first, inSlopes[0]],
+        [times > last, curve.PostInfinity, last, outSlopes[-1]]]:
+        if not outside.any():
+            continue
+        
+        if infinity == "linear":
+            offsets[outside] = (times[outside] - end) * slope
+        elif infinity != "constant" and span > 0:
+            cycles = Numpy.floor((times[outside] - first) / span)
+            phases = times[outside] - first - cycles * span
+            if infinity == "oscillate":
+                phases = Numpy.where(cycles % 2 != 0, span - phases, phases)
+            elif infinity == "cycleRelative":
+                offsets[outside] = cycles * (curve.Values[-1] - curve.Values[0])
+            
+            localTimes[outside] = first + phases
+    
+    return localTimes, offsets
+
+def BezierComponent(p0, p1, p2, p3, u):
+    v = 1 - u
+    return v * v * v * p0 + 3 * v * v * u * p1 + 3 * v * u * u * p2 + u * u * u * p3
+
+def SegmentParameters(x0, x1, x2, x3, times):
+    '''
+    Returns the parameters of times on the Bezier segments with time control points x0 to x3
+    '''
+    low = Numpy.zeros(len(times))
+    high = Numpy.ones(len(times))
+    for step in range(CurveBisectionSteps):
+        middle = (low + high) / 2
+        below = BezierComponent(x0, x1, x2, x3, middle) < times
+        low = Numpy.where(below, middle, low)
+        high = Numpy.where(below, high, middle)
+    
+    return (low + high) / 2
+
+def EvaluateCurve(curve, times):
+    '''
+    Returns the values of curve at times, an array of any shape
+    '''
+    RequireNumpy()
+    
+    times = Numpy.asarray(times, dtype=Numpy.float64)
+    shape = times.shape
+    times = times.ravel()
+    
+    if curve.Count() == 0:
+        return Numpy.zeros(shape)
+    
+    if curve.Count() == 1:
+        return Numpy.full(shape, curve.Values[0])
+    
+    inSlopes, outSlopes = curve.Slopes()
+    localTimes, offsets = InfinityTimes(curve, times, inSlopes, outSlopes)
+    
+    segments = Numpy.clip(Numpy.searchsorted(curve.Times, localTimes, side="right") - 1, 0, curve.Count() - 2)
+    t0, t1 = curve.Times[segments], curve.Times[segments + 1]
+    v0, v1 = curve.Values[segments], curve.Values[segments + 1]
+    lengths = t1 - t0
+    
+    # Unweighted handles are a third of the segment, which makes the Bezier a Hermite spline
+    if curve.IsWeighted():
+        outLengths = Numpy.clip(curve.OutWeights[segments], 0, lengths)
+        inLengths = Numpy.clip(curve.InWeights[segments + 1], 0, lengths)
+        u = SegmentParameters(t0, t0 + outLengths, t1 - inLengths, t1, localTimes)
+    else:
+        outLengths = inLengths = lengths / 3
+        u = (localTimes - t0) / lengths
+    
+    values = BezierComponent(v0, v0 + outLengths * outSlopes[segments], v1 - inLengths * inSlopes[segments + 1], v1, u)
+    
+    outTypes = curve.OutTangentTypes[segments]
+    values = Numpy.where(outTypes == CurveTangentTypes.index("step"), Numpy.where(u >= 1, v1, v0), values)
+    values = Numpy.where(outTypes == CurveTangentTypes.index("stepNext"), Numpy.where(u <= 0, v0, v1), values)
+    
+    return (values + offsets).reshape(shape)
+
+def MayaCurveSetting(block, name, default):
+    '''
+    Returns the first value of the setAttr of name in an animCurve block, or default
+    '''
+    for start, end, statement in MayaStatements(block):
+        if statement[0] == b"setAttr":
+            attributeName, values = ParseSetAttr(statement)
+            if attributeName == name and len(values) > 0:
+                return values[0]
+    
+    return default
+
+def MayaCurveFromBlock(block, framesPerSecond=24):
+    '''
+    Returns the name and AnimationCurve of the statements of a time based animCurve node, in frames
+    and the curve's stored unit (degrees for rotations); Maya stores fixed tangents as x in seconds
+    and y in internal units (radians for rotations), weighted ones three times as long as their handles
+    '''
+    createNode = next(MayaStatements(block))[2]
+    name = ""
+    if b"-n" in createNode:
+        name = UnquoteMelString(createNode[createNode.index(b"-n") + 1])
+    
+    attributes = ParseKeyAttributes(block)[0]
+    if MayaKeyTimeAttribute not in attributes:
+        return name, AnimationCurve([], [])
+    
+    indices, keyValues = attributes[MayaKeyTimeAttribute]
+    order = Numpy.argsort(indices, kind="mergesort")
+    indices, keyValues = indices[order], keyValues[order].astype(Numpy.float64)
+    count = len(indices)
+    
+    def KeyAttribute(attributeName, default):
+        values = Numpy.full(count, default, dtype=Numpy.float64)
+        if attributeName in attributes:
+            attributeIndices, attributeValues = attributes[attributeName]
+            positions = Numpy.searchsorted(indices, attributeIndices)
+            found = (positions < count) & (indices[Numpy.minimum(positions, count - 1)] == attributeIndices)
+            values[positions[found]] = attributeValues[found, 0].astype(Numpy.float64)
+        
+        return values
+    
+    # Keys without a stored tangent type have the curve's
+    defaultCode = int(MayaCurveSetting(block, "tan", b"18"))
+    
+    def TangentTypes(attributeName):
+        codes = KeyAttribute(attributeName, defaultCode).astype(Numpy.int64)
+        return [MayaTangentCodes.get(code, "auto") for code in codes.tolist()]
+    
+    yScale = 1.0
+    if createNode[1] == MayaAngularCurveType:
+        yScale = math.degrees(1)
+    
+    inX, inY = KeyAttribute("kix", Numpy.nan), KeyAttribute("kiy", Numpy.nan)
+    outX, outY = KeyAttribute("kox", Numpy.nan), KeyAttribute("koy", Numpy.nan)
+    
+    # Slopes per frame; a vertical tangent is left to the tangent type
+    with Numpy.errstate(divide="ignore", invalid="ignore"):
+        inSlopes = Numpy.where(inX != 0, inY * yScale / (inX * framesPerSecond), Numpy.nan)
+        outSlopes = Numpy.where(outX != 0, outY * yScale / (outX * framesPerSecond), Numpy.nan)
+    
+    inWeights = outWeights = None
+    if MelBool(MayaCurveSetting(block, "wgt", b"no")):
+        inWeights = Numpy.where(Numpy.isfinite(inX), inX * framesPerSecond / 3, Numpy.nan)
+        outWeights = Numpy.where(Numpy.isfinite(outX), outX * framesPerSecond / 3, Numpy.nan)
+        
+        # Keys without stored tangents get a third of their segments
+        thirds = Numpy.diff(keyValues[:, 0]) / 3
+        inWeights[1:] = Numpy.where(Numpy.isfinite(inWeights[1:]), inWeights[1:], thirds)
+        outWeights[:-1] = Numpy.where(Numpy.isfinite(outWeights[:-1]), outWeights[:-1], thirds)
+    
+    preInfinity = MayaInfinityCodes.get(int(MayaCurveSetting(block, "pre", b"0")), "constant")
+    postInfinity = MayaInfinityCodes.get(int(MayaCurveSetting(block, "pst", b"0")), "constant")
+    
+    return name, AnimationCurve(keyValues[:, 0], keyValues[:, 1], TangentTypes("kit"), TangentTypes("kot"), inSlopes, outSlopes,
+        inWeights, outWeights, preInfinity, postInfinity)
+
+def ReadMayaCurves(filename, framesPerSecond=24):
+    '''
+    Returns {node name: AnimationCurve} of the time based animCurve nodes of the .ma scene filename,
+    times in the scene's frames at framesPerSecond
+    '''
+    RequireNumpy()
+    
+    curves = {}
+    sourceFd = OpenBinary(filename, os.O_RDONLY)
+    try:
+        if os.fstat(sourceFd).st_size == 0:
+            return curves
+        
+        data = mmap.mmap(sourceFd, 0, access=mmap.ACCESS_READ)
+        try:
+            for match in MayaCurveNodePattern.finditer(data):
+                blockEnd = MayaBlockEndPattern.search(data, match.end())
+                blockEnd = len(data) if blockEnd is None else blockEnd.start()
+                
+                name, curve = MayaCurveFromBlock(data[match.start():blockEnd], framesPerSecond)
+                curves[name] = curve
+        finally:
+            data.close()
+    finally:
+        os.close(sourceFd)
+    
+    return curves
+
+def FbxKeyCurve(rawKeys):
+    '''
+    Returns the AnimationCurve of the raw value of a Key node, in FBX ticks: L keys are linear, C keys
+    constant and U keys cubic, with the slopes of U,s keys (per second, out of the key and into the
+    next one) and auto tangents otherwise. FBX weights are not used
+    '''
+    tokens, starts = SplitKeyRecords(rawKeys)
+    count = len(starts)
+    if count == 0:
+        return AnimationCurve([], [])
+    
+    times = tokens[starts].astype(Numpy.float64)
+    values = tokens[starts + 1].astype(Numpy.float64)
+    codes = tokens[starts + 2]
+    
+    # U,s,outSlope,nextInSlope, when the key has those tokens
+    nextStarts = Numpy.concatenate([starts[1:], [len(tokens)]])
+    userSlopes = (codes == b"U") & (starts + 5 < nextStarts) & (tokens[Numpy.minimum(starts + 3, len(tokens) - 1)] == b"s")
+    slopeKeys = Numpy.flatnonzero(userSlopes)
+    nextKeys = slopeKeys[slopeKeys + 1 < count]
+    
+    outSlopes = Numpy.full(count, Numpy.nan)
+    inSlopes = Numpy.full(count, Numpy.nan)
+    outSlopes[slopeKeys] = tokens[starts[slopeKeys] + 4].astype(Numpy.float64) / FbxTicksPerSecond
+    inSlopes[nextKeys + 1] = tokens[starts[nextKeys] + 5].astype(Numpy.float64) / FbxTicksPerSecond
+    
+    # A key comes in the way the key before it goes out
+    outTypes = Numpy.where(codes == b"L", "linear", Numpy.where(codes == b"C", "step", Numpy.where(userSlopes, "fixed", "auto")))
+    inTypes = Numpy.where(outTypes == "step", "auto", outTypes)
+    inTypes = Numpy.concatenate([inTypes[:1], inTypes[:-1]])
+    
+    return AnimationCurve(times, values, inTypes.tolist(), outTypes.tolist(), inSlopes, outSlopes)
+
+def ReadFbxCurves(filename, takeName=None):
+    '''
+    Returns {"Model::Name/channel": AnimationCurve} of the channels of a take of an FBX ASCII file,
+    in FBX ticks; takeName is as in ReadTakeCurves
+    '''
+    RequireNumpy()
+    
+    curves = {}
+    document = FbxDocument(filename)
+    try:
+        for model, path, channelNode in KeyedChannels(FindTakeNode(document, takeName)):
+            keyNode = channelNode.Find("Key")
+            if keyNode is not None:
+                curves["%s/%s" % (model, path)] = FbxKeyCurve(keyNode.RawValue())
+    finally:
+        document.Close()
+    
+    return curves
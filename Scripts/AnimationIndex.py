@@ -0,0 +1,183 @@
+'''
+Animation index
+
+A SQLite database of the animations of every scene in a library (name,
+frames, order, scene path and modification time), so clips can be found
+without opening scenes. Update only reads the scenes whose modification
+time or size changed since the last run and drops the scenes that are gone.
+Scenes are read by a function passed in, e.g. one running on the export
+farm, since reading a scene needs Maya.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import time
+import sqlite3
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from Common import *
+except ImportError:
+    pass
+
+# Scenes written per transaction while updating
+IndexCommitInterval = 100
+
+IndexSchema = [
+    "CREATE TABLE IF NOT EXISTS Scenes (Id INTEGER PRIMARY KEY, Path TEXT UNIQUE NOT NULL, Mtime REAL NOT NULL, "
+        "Size INTEGER NOT NULL, Indexed REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS Animations (SceneId INTEGER NOT NULL, AnimationId INTEGER NOT NULL, "
+        "Ordering INTEGER NOT NULL, Name TEXT NOT NULL, StartFrame INTEGER NOT NULL, EndFrame INTEGER NOT NULL, "
+        "Selected INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS AnimationsByName ON Animations (Name)",
+    "CREATE INDEX IF NOT EXISTS AnimationsByRange ON Animations (StartFrame, EndFrame)",
+    "CREATE INDEX IF NOT EXISTS AnimationsByScene ON Animations (SceneId, Ordering)",
+]
+
+IndexSelect = ("SELECT Scenes.Path, Scenes.Mtime, Animations.AnimationId, Animations.Ordering, Animations.Name, "
+    "Animations.StartFrame, Animations.EndFrame, Animations.Selected FROM Animations "
+    "JOIN Scenes ON Scenes.Id = Animations.SceneId")
+
+IndexOrder = " ORDER BY Scenes.Path, Animations.Ordering"
+
+def PrefixUpperBound(prefix):
+    '''
+    Returns the smallest text after every text starting with prefix
+    '''
+    try:
+        nextCharacter = unichr(ord(prefix[-1]) + 1)
+    except NameError:
+        nextCharacter = chr(ord(prefix[-1]) + 1)
+        
+    return prefix[:-1] + nextCharacter
+
+class AnimationIndex:
+    '''
+    The index database at filename, e.g.
+    
+        index = AnimationIndex("Animations.db")
+        index.Update("Characters", readScenes)
+        index.FindName("Run_Fast")
+        index.FindOverlap(100, 200)
+        index.Close()
+        
+    Queries return dicts with the Scene, Mtime, Id, Order, Name, StartFrame,
+    EndFrame and Selected of every match, in scene and display order
+    '''
+    Filename = ""
+    
+    def __init__(self, filename):
+        self.Filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        
+        for statement in IndexSchema:
+            self.connection.execute(statement)
+            
+        self.connection.commit()
+        
+    def Close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+            
+    def Query(self, where="", parameters=()):
+        cursor = self.connection.execute(IndexSelect + where + IndexOrder, parameters)
+        return [{"Scene": path, "Mtime": mtime, "Id": animationId, "Order": ordering, "Name": name, "StartFrame": startFrame,
+            "EndFrame": endFrame, "Selected": selected != 0}
+            for path, mtime, animationId, ordering, name, startFrame, endFrame, selected in cursor]
+            
+    def FindName(self, name):
+        return self.Query(" WHERE Animations.Name = ?", (name,))
+        
+    def FindPrefix(self, prefix):
+        '''
+        Returns the animations whose name starts with prefix (case sensitive)
+        '''
+        if len(prefix) == 0:
+            return self.Query()
+            
+        # A range rather than LIKE, so the name index is used
+        return self.Query(" WHERE Animations.Name >= ? AND Animations.Name < ?", (prefix, PrefixUpperBound(prefix)))
+        
+    def FindOverlap(self, startFrame, endFrame):
+        '''
+        Returns the animations that share at least one frame with [startFrame, endFrame]
+        '''
+        return self.Query(" WHERE Animations.StartFrame <= ? AND Animations.EndFrame >= ?", (endFrame, startFrame))
+        
+    def SceneAnimations(self, sceneFilename):
+        return self.Query(" WHERE Scenes.Path = ?", (os.path.abspath(sceneFilename),))
+        
+    def Scenes(self):
+        '''
+        Returns [path, mtime, size] of every indexed scene
+        '''
+        return [list(row) for row in self.connection.execute("SELECT Path, Mtime, Size FROM Scenes ORDER BY Path")]
+        
+    def WriteScene(self, sceneFilename, mtime, size, animations):
+        '''
+        Replaces the animations of a scene; animations are records with the Id, Name,
+        StartFrame, EndFrame and Selected of each animation, in display order
+        '''
+        row = self.connection.execute("SELECT Id FROM Scenes WHERE Path = ?", (sceneFilename,)).fetchone()
+        if row is None:
+            sceneId = self.connection.execute("INSERT INTO Scenes (Path, Mtime, Size, Indexed) VALUES (?, ?, ?, ?)",
+                (sceneFilename, mtime, size, time.time())).lastrowid
+        else:
+            sceneId = row[0]
+            self.connection.execute("UPDATE Scenes SET Mtime = ?, Size = ?, Indexed = ? WHERE Id = ?", (mtime, size, time.time(), sceneId))
+            self.connection.execute("DELETE FROM Animations WHERE SceneId = ?", (sceneId,))
+            
+        self.connection.executemany("INSERT INTO Animations VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(sceneId, animation["Id"], ordering, animation["Name"], animation["StartFrame"], animation["EndFrame"],
+            int(bool(animation["Selected"]))) for ordering, animation in enumerate(animations)])
+            
+    def RemoveScene(self, sceneFilename):
+        self.connection.execute("DELETE FROM Animations WHERE SceneId IN (SELECT Id FROM Scenes WHERE Path = ?)", (sceneFilename,))
+        self.connection.execute("DELETE FROM Scenes WHERE Path = ?", (sceneFilename,))
+        
+    def Update(self, directoryName, readScenes, patterns=SceneFilePatterns):
+        '''
+        Brings the scenes under directoryName up to date. readScenes(sceneFilenames)
+        returns [sceneFilename, animations, error] for each of the scenes that changed
+        Returns what was done: Scenes, Updated, Removed, Failed (scene and error) and Seconds
+        '''
+        startTime = time.time()
+        rootDirectory = os.path.join(os.path.abspath(directoryName), "")
+        
+        # Stat before reading, so a scene saved while it is read is read again next time
+        sceneStats = {}
+        for sceneFilename in FindScenes(directoryName, patterns):
+            sceneStat = os.stat(sceneFilename)
+            sceneStats[os.path.abspath(sceneFilename)] = [sceneStat.st_mtime, sceneStat.st_size]
+            
+        indexedStats = dict([(path, [mtime, size]) for path, mtime, size in self.Scenes() if path.startswith(rootDirectory)])
+        staleScenes = sorted([path for path in sceneStats if indexedStats.get(path) != sceneStats[path]])
+        removedScenes = sorted([path for path in indexedStats if path not in sceneStats])
+        
+        updatedCount = 0
+        failedScenes = []
+        if len(staleScenes) > 0:
+            for sceneFilename, animations, error in readScenes(staleScenes):
+                sceneFilename = os.path.abspath(sceneFilename)
+                if error is not None:
+                    failedScenes.append([sceneFilename, error])
+                    continue
+                    
+                self.WriteScene(sceneFilename, sceneStats[sceneFilename][0], sceneStats[sceneFilename][1], animations)
+                updatedCount += 1
+                if updatedCount % IndexCommitInterval == 0:
+                    self.connection.commit()
+                    
+        for sceneFilename in removedScenes:
+            self.RemoveScene(sceneFilename)
+            
+        self.connection.commit()
+        
+        return {"Scenes": len(sceneStats), "Updated": updatedCount, "Removed": len(removedScenes), "Failed": failedScenes,
+            "Seconds": round(time.time() - startTime, 3)}
@@ -0,0 +1,140 @@
+'''
+Animation math
+
+Rotation helpers on NumPy arrays of many frames (and joints) at once.
+Quaternions are stored x, y, z, w in the last axis; Euler angles are in
+degrees and follow Maya's rotate orders, where xyz rotates about X first.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxCurves import *
+except ImportError:
+    pass
+
+RotateOrders = ["xyz", "yzx", "zxy", "xzy", "yxz", "zyx"]
+
+# The rotate orders by the value of an FBX RotationOrder property, which differs from Maya's rotateOrder
+FbxRotationOrders = ["xyz", "xzy", "yzx", "yxz", "zxy", "zyx"]
+
+def QuaternionMultiply(a, b):
+    '''
+    Returns a * b, the rotation b followed by a
+    '''
+    ax, ay, az, aw = a[..., 0], a[..., 1], a[..., 2], a[..., 3]
+    bx, by, bz, bw = b[..., 0], b[..., 1], b[..., 2], b[..., 3]
+    return Numpy.stack([aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw,
+        aw * bw - ax * bx - ay * by - az * bz], axis=-1)
+
+def NormalizeQuaternions(quaternions):
+    return quaternions / Numpy.linalg.norm(quaternions, axis=-1)[..., None]
+
+def EulerToQuaternions(degrees, rotateOrder="xyz"):
+    '''
+    Returns the quaternions of Euler angles (..., 3) in degrees, applied in rotateOrder
+    '''
+    RequireNumpy()
+    
+    halfAngles = Numpy.radians(Numpy.asarray(degrees, dtype=Numpy.float64)) / 2
+    quaternions = Numpy.zeros(halfAngles.shape[:-1] + (4,))
+    quaternions[..., 3] = 1
+    
+    for axisName in rotateOrder:
+        axis = "xyz".index(axisName)
+        axisQuaternions = Numpy.zeros(quaternions.shape)
+        axisQuaternions[..., axis] = Numpy.sin(halfAngles[..., axis])
+        axisQuaternions[..., 3] = Numpy.cos(halfAngles[..., axis])
+        quaternions = QuaternionMultiply(axisQuaternions, quaternions)
+    
+    return quaternions
+
+def ContinuousQuaternions(quaternions, axis=0):
+    '''
+    Returns quaternions with their signs flipped so each is in the same hemisphere as the one
+    before it along axis (frames), since q and -q are the same rotation
+    '''
+    quaternions = Numpy.moveaxis(Numpy.array(quaternions, dtype=Numpy.float64), axis, 0)
+    flips = Numpy.sum(quaternions[1:] * quaternions[:-1], axis=-1) < 0
+    signs = Numpy.concatenate([Numpy.ones((1,) + flips.shape[1:]), Numpy.where(Numpy.cumsum(flips, axis=0) % 2 == 1, -1.0, 1.0)])
+    return Numpy.moveaxis(quaternions * signs[..., None], 0, axis)
+
+def QuaternionAngles(a, b):
+    '''
+    Returns the angles in degrees of the rotations between the quaternions of a and b
+    '''
+    a = NormalizeQuaternions(a)
+    b = NormalizeQuaternions(b)
+    b = Numpy.where((Numpy.sum(a * b, axis=-1) < 0)[..., None], -b, b)
+    
+    # Better than arccos of the dot product for the small angles of quantization errors
+    return Numpy.degrees(4 * Numpy.arctan2(Numpy.linalg.norm(a - b, axis=-1), Numpy.linalg.norm(a + b, axis=-1)))
+
+def SlerpQuaternions(a, b, weights):
+    '''
+    Returns the spherical interpolations from the quaternions of a to those of b by weights (0 is a),
+    along the shorter arc
+    '''
+    dots = Numpy.sum(a * b, axis=-1)
+    b = Numpy.where((dots < 0)[..., None], -b, b)
+    angles = Numpy.arccos(Numpy.clip(Numpy.abs(dots), 0, 1))
+    sines = Numpy.sin(angles)
+    
+    # Nearly equal quaternions are lerped, their sines are too small to divide by
+    small = sines < 1e-6
+    sines = Numpy.where(small, 1, sines)
+    weightsA = Numpy.where(small, 1 - weights, Numpy.sin((1 - weights) * angles) / sines)
+    weightsB = Numpy.where(small, weights, Numpy.sin(weights * angles) / sines)
+    return NormalizeQuaternions(weightsA[..., None] * a + weightsB[..., None] * b)
+
+def QuaternionsToMatrices(quaternions):
+    x, y, z, w = [quaternions[..., index] for index in range(4)]
+    return Numpy.stack([Numpy.stack([1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)], axis=-1),
+        Numpy.stack([2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)], axis=-1),
+        Numpy.stack([2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], axis=-1)], axis=-2)
+
+def NearestAngles(degrees, reference):
+    '''
+    Returns degrees plus the multiples of 360 that bring them closest to reference
+    '''
+    return degrees + 360 * Numpy.round((reference - degrees) / 360)
+
+def QuaternionsToEuler(quaternions, rotateOrder="xyz", reference=None):
+    '''
+    Returns the Euler angles (..., 3) in degrees of quaternions for rotateOrder, the inverse of
+    EulerToQuaternions; of the two solutions, the one closest to the reference angles (e.g. the
+    keys around them) is picked, unwrapped next to them, otherwise the one with a middle angle
+    within [-90, 90]
+    '''
+    RequireNumpy()
+    
+    first, middle, last = ["xyz".index(axisName) for axisName in rotateOrder]
+    sign = 1 if rotateOrder in RotateOrders[:3] else -1
+    matrices = QuaternionsToMatrices(NormalizeQuaternions(Numpy.asarray(quaternions, dtype=Numpy.float64)))
+    
+    angles = Numpy.zeros(matrices.shape[:-2] + (3,))
+    angles[..., first] = Numpy.arctan2(sign * matrices[..., last, middle], matrices[..., last, last])
+    angles[..., middle] = Numpy.arcsin(Numpy.clip(-sign * matrices[..., last, first], -1, 1))
+    angles[..., last] = Numpy.arctan2(sign * matrices[..., middle, first], matrices[..., first, first])
+    angles = Numpy.degrees(angles)
+    if reference is None:
+        return angles
+    
+    # The same rotation turned 180 degrees about the first and last axes
+    alternatives = angles + 180
+    alternatives[..., middle] = 180 - angles[..., middle]
+    
+    angles = NearestAngles(angles, reference)
+    alternatives = NearestAngles(alternatives, reference)
+    closer = Numpy.sum((alternatives - reference) ** 2, axis=-1) < Numpy.sum((angles - reference) ** 2, axis=-1)
+    return Numpy.where(closer[..., None], alternatives, angles)
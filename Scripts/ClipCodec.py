@@ -0,0 +1,341 @@
+'''
+Clip codec
+
+Compresses AnimationClips for the runtime. Every track (one joint's
+translation, rotation or scale) gets the fewest bits that keep it within an
+error budget:
+
+    Translation and scale components are stored as fixed point over their
+    range in the clip, min + q * range / (2^bits - 1), with the bits worked
+    out from the range and the budget; a component that stays within the
+    budget of one value takes no bits at all.
+    
+    Rotations are packed smallest-three: the largest of the four quaternion
+    components is dropped (2 bits say which one, its sign is made positive)
+    and the other three, which lie within +-sqrt(1/2), are stored fixed point.
+    The bits are found by decoding and measuring the angle error.
+
+All the tracks are quantized and bit-packed with NumPy, over every frame at
+once, into one byte string after a small JSON header.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import json
+import math
+import struct
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxStitcher import *
+    from FbxCurves import *
+    from AnimationMath import *
+    from AnimationClip import *
+except ImportError:
+    pass
+
+ClipExtension = ".clip"
+ClipMagic = b"GSQC"
+ClipVersion = 1
+
+# Magic, version and JSON header length
+ClipHeaderFormat = "<4sII"
+
+# Error budgets: translation in scene units, rotation in degrees, scale as a factor
+ClipErrors = {"T": 0.001, "R": 0.01, "S": 0.0001}
+
+ClipMaxBits = 24
+ClipRotationMinBits = 4
+ClipRotationMaxBits = 16
+ClipRotationIndexBits = 2
+
+# Bytes of one joint at one frame uncompressed: translation, rotation and scale as float32
+ClipRawJointSize = (3 + 4 + 3) * 4
+
+# Range of the three smallest components of a unit quaternion
+SmallestThreeRange = math.sqrt(0.5)
+
+class ClipCodecError(Exception):
+    pass
+
+def PackBits(streams):
+    '''
+    Returns the bytes of the [values, bits] streams, each value in its stream's bit width, most significant bit first
+    '''
+    pieces = []
+    for values, bits in streams:
+        if bits > 0:
+            shifts = Numpy.arange(bits - 1, -1, -1, dtype=Numpy.int64)
+            pieces.append(((Numpy.asarray(values, dtype=Numpy.int64)[:, None] >> shifts) & 1).astype(Numpy.uint8).ravel())
+    
+    if len(pieces) == 0:
+        return b""
+    
+    return Numpy.packbits(Numpy.concatenate(pieces)).tobytes()
+
+def UnpackBits(data, counts, widths):
+    '''
+    Returns the streams of PackBits, given the value count and bit width of each
+    '''
+    bits = Numpy.unpackbits(Numpy.frombuffer(data, dtype=Numpy.uint8))
+    if sum([count * width for count, width in zip(counts, widths)]) > len(bits):
+        raise ClipCodecError("Clip data is %d bytes, too short for its tracks" % len(data))
+    
+    streams = []
+    position = 0
+    for count, width in zip(counts, widths):
+        if width == 0:
+            streams.append(Numpy.zeros(count, dtype=Numpy.int64))
+            continue
+        
+        weights = Numpy.int64(1) << Numpy.arange(width - 1, -1, -1, dtype=Numpy.int64)
+        streams.append(bits[position:position + count * width].reshape(count, width).astype(Numpy.int64).dot(weights))
+        position += count * width
+    
+    return streams
+
+def FixedPointBits(valueRange, error):
+    '''
+    Returns the bits that store a value over valueRange within error of it
+    Raises ClipCodecError if that takes more than ClipMaxBits
+    '''
+    if valueRange <= 2 * error:
+        return 0
+    
+    bits = int(math.ceil(math.log(valueRange / (2 * error) + 1, 2)))
+    if bits > ClipMaxBits:
+        raise ClipCodecError("Range %g needs %d bits for an error of %g, more than %d" % (valueRange, bits, error, ClipMaxBits))
+    
+    return bits
+
+def EncodeComponents(values, error):
+    '''
+    Returns the header and [quantized values, bits] streams of the three components of a translation or scale track
+    '''
+    minimums = values.min(axis=0)
+    ranges = values.max(axis=0) - minimums
+    
+    header = {"Minimums": [], "Ranges": [], "Bits": []}
+    streams = []
+    for axis in range(3):
+        bits = FixedPointBits(ranges[axis], error)
+        if bits == 0:
+            # One value, the middle of the range
+            header["Minimums"].append(float(minimums[axis] + ranges[axis] / 2))
+            header["Ranges"].append(0.0)
+        else:
+            header["Minimums"].append(float(minimums[axis]))
+            header["Ranges"].append(float(ranges[axis]))
+        
+        header["Bits"].append(bits)
+        steps = (1 << bits) - 1
+        if bits > 0:
+            streams.append([Numpy.round((values[:, axis] - minimums[axis]) / ranges[axis] * steps), bits])
+        else:
+            streams.append([Numpy.zeros(len(values)), 0])
+    
+    return header, streams
+
+def DecodeComponents(header, streams):
+    values = []
+    for axis in range(3):
+        steps = (1 << header["Bits"][axis]) - 1
+        if steps == 0:
+            values.append(Numpy.full(len(streams[axis]), header["Minimums"][axis]))
+        else:
+            values.append(header["Minimums"][axis] + streams[axis] * (header["Ranges"][axis] / steps))
+    
+    return Numpy.stack(values, axis=-1)
+
+def QuantizeSmallestThree(quaternions, bits):
+    '''
+    Returns the index of the largest component and the three others quantized to bits
+    '''
+    largest = Numpy.argmax(Numpy.abs(quaternions), axis=-1)
+    signs = Numpy.where(quaternions[Numpy.arange(len(quaternions)), largest] < 0, -1.0, 1.0)
+    positive = quaternions * signs[:, None]
+    
+    # The other three components, in order
+    others = Numpy.array([[component for component in range(4) if component != index] for index in range(4)])[largest]
+    smallest = positive[Numpy.arange(len(quaternions))[:, None], others]
+    
+    steps = (1 << bits) - 1
+    quantized = Numpy.round((Numpy.clip(smallest, -SmallestThreeRange, SmallestThreeRange) + SmallestThreeRange) / (2 * SmallestThreeRange) * steps)
+    return largest, quantized
+
+def DequantizeSmallestThree(largest, quantized, bits):
+    steps = (1 << bits) - 1
+    smallest = quantized / float(steps) * (2 * SmallestThreeRange) - SmallestThreeRange
+    largestValues = Numpy.sqrt(Numpy.maximum(0.0, 1.0 - Numpy.sum(smallest * smallest, axis=-1)))
+    
+    quaternions = Numpy.zeros((len(largest), 4))
+    others = Numpy.array([[component for component in range(4) if component != index] for index in range(4)])[largest]
+    quaternions[Numpy.arange(len(largest))[:, None], others] = smallest
+    quaternions[Numpy.arange(len(largest)), largest] = largestValues
+    return NormalizeQuaternions(quaternions)
+
+def EncodeRotations(quaternions, error):
+    '''
+    Returns the header and [quantized values, bits] streams of a rotation track
+    Raises ClipCodecError if ClipRotationMaxBits do not keep it within error
+    '''
+    quaternions = NormalizeQuaternions(quaternions)
+    if QuaternionAngles(quaternions, quaternions[:1]).max() <= error:
+        return {"Bits": 0, "Constant": [float(component) for component in quaternions[0]]}, []
+    
+    for bits in range(ClipRotationMinBits, ClipRotationMaxBits + 1):
+        largest, quantized = QuantizeSmallestThree(quaternions, bits)
+        angle = QuaternionAngles(DequantizeSmallestThree(largest, quantized, bits), quaternions).max()
+        if angle <= error:
+            break
+    else:
+        raise ClipCodecError("Rotation error %g at %d bits, over the budget of %g" % (angle, ClipRotationMaxBits, error))
+    
+    streams = [[largest, ClipRotationIndexBits]] + [[quantized[:, axis], bits] for axis in range(3)]
+    return {"Bits": bits}, streams
+
+def DecodeRotations(header, streams, frameCount):
+    if header["Bits"] == 0:
+        return Numpy.tile(Numpy.array(header["Constant"]), (frameCount, 1))
+    
+    return ContinuousQuaternions(DequantizeSmallestThree(streams[0], Numpy.stack(streams[1:4], axis=-1), header["Bits"]))
+
+class EncodedClip:
+    '''
+    A compressed AnimationClip: a header of the joints and the range and bits of every
+    track, and the packed track data
+    '''
+    Header = None
+    Data = b""
+    
+    def __init__(self, header, data):
+        self.Header = header
+        self.Data = data
+    
+    def Bytes(self):
+        header = FbxBytes(json.dumps(self.Header, separators=(",", ":"), sort_keys=True))
+        return struct.pack(ClipHeaderFormat, ClipMagic, ClipVersion, len(header)) + header + self.Data
+
+def ParseEncodedClip(data):
+    '''
+    Returns the EncodedClip of the Bytes of one
+    '''
+    headerSize = struct.calcsize(ClipHeaderFormat)
+    if len(data) < headerSize:
+        raise ClipCodecError("Not a clip, %d bytes" % len(data))
+    
+    magic, version, headerLength = struct.unpack(ClipHeaderFormat, data[:headerSize])
+    if magic != ClipMagic:
+        raise ClipCodecError("Not a clip")
+    
+    if version != ClipVersion:
+        raise ClipCodecError("Clip version %d, expected %d" % (version, ClipVersion))
+    
+    header = json.loads(data[headerSize:headerSize + headerLength].decode("utf-8"))
+    return EncodedClip(header, data[headerSize + headerLength:])
+
+def EncodeClip(clip, errors=None):
+    '''
+    Returns the EncodedClip of clip, every track within the error budgets of errors
+    (by kind, T, R and S; ClipErrors by default)
+    '''
+    RequireNumpy()
+    
+    budgets = dict(ClipErrors)
+    budgets.update(errors or {})
+    
+    tracks = []
+    streams = []
+    for jointIndex in range(clip.JointCount()):
+        try:
+            translationHeader, translationStreams = EncodeComponents(clip.Translations[:, jointIndex], budgets["T"])
+            rotationHeader, rotationStreams = EncodeRotations(clip.Rotations[:, jointIndex], budgets["R"])
+            scaleHeader, scaleStreams = EncodeComponents(clip.Scales[:, jointIndex], budgets["S"])
+        except ClipCodecError as exception:
+            raise ClipCodecError("%s: %s" % (clip.Joints[jointIndex], exception))
+                
+        tracks.append({"T": translationHeader, "R": rotationHeader, "S": scaleHeader})
+        streams += translationStreams + rotationStreams + scaleStreams
+    
+    header = {"Name": clip.Name, "FramesPerSecond": clip.FramesPerSecond, "FrameCount": clip.FrameCount(),
+        "Joints": clip.Joints, "Tracks": tracks}
+    return EncodedClip(header, PackBits(streams))
+
+def DecodeClip(encodedClip):
+    '''
+    Returns the AnimationClip of an EncodedClip
+    '''
+    RequireNumpy()
+    
+    header = encodedClip.Header
+    frameCount = header["FrameCount"]
+    
+    widths = []
+    for track in header["Tracks"]:
+        widths += track["T"]["Bits"]
+        if track["R"]["Bits"] > 0:
+            widths += [ClipRotationIndexBits] + [track["R"]["Bits"]] * 3
+        
+        widths += track["S"]["Bits"]
+    
+    streams = UnpackBits(encodedClip.Data, [frameCount] * len(widths), widths)
+    
+    translations, rotations, scales = [], [], []
+    position = 0
+    for track in header["Tracks"]:
+        translations.append(DecodeComponents(track["T"], streams[position:position + 3]))
+        position += 3
+        
+        rotationStreamCount = 4 if track["R"]["Bits"] > 0 else 0
+        rotations.append(DecodeRotations(track["R"], streams[position:position + rotationStreamCount], frameCount))
+        position += rotationStreamCount
+        
+        scales.append(DecodeComponents(track["S"], streams[position:position + 3]))
+        position += 3
+    
+    shape = (frameCount, 0, 3)
+    return AnimationClip(header["Name"], header["Joints"],
+        Numpy.stack(translations, axis=1) if len(translations) > 0 else Numpy.zeros(shape),
+        Numpy.stack(rotations, axis=1) if len(rotations) > 0 else Numpy.zeros((frameCount, 0, 4)),
+        Numpy.stack(scales, axis=1) if len(scales) > 0 else Numpy.zeros(shape), header["FramesPerSecond"])
+
+def WriteClipFile(filename, encodedClip):
+    clipFile = open(filename, "wb")
+    try:
+        clipFile.write(encodedClip.Bytes())
+    finally:
+        clipFile.close()
+
+def ReadClipFile(filename):
+    '''
+    Returns the AnimationClip stored in filename
+    '''
+    clipFile = open(filename, "rb")
+    try:
+        return DecodeClip(ParseEncodedClip(clipFile.read()))
+    finally:
+        clipFile.close()
+
+def EncodeFbxClip(fbxFilename, framesPerSecond, clipFilename=None, errors=None, targetFramesPerSecond=None):
+    '''
+    Writes the take of a per-animation FBX file as a clip, by default next to it, resampled from
+    framesPerSecond to targetFramesPerSecond if given
+    Returns the clip filename and its size next to that of the uncompressed float32 tracks
+    '''
+    clip = ReadFbxClip(fbxFilename, framesPerSecond)
+    if targetFramesPerSecond is not None:
+        clip = ResampleClip(clip, targetFramesPerSecond)
+    if clipFilename is None:
+        clipFilename = os.path.splitext(fbxFilename)[0] + ClipExtension
+    
+    encodedClip = EncodeClip(clip, errors)
+    WriteClipFile(clipFilename, encodedClip)
+    return [clipFilename, len(encodedClip.Bytes()), clip.FrameCount() * clip.JointCount() * ClipRawJointSize]
@@ -9,17 +9,32 @@ Common functions and utilities
 import os
 import io
 import sys
+import time
+import json
+import shlex
+import argparse
+import multiprocessing
 import re
 import math
 import shutil
+import tempfile
 import fnmatch
 import datetime
 import glob
-import maya.cmds as Cmds
-import maya.mel as Mel
+import warnings
 import xml.dom.minidom as Dom
-import maya.OpenMaya as OpenMaya
-import maya.OpenMayaAnim as OpenMayaAnim
+
+# Outside Maya, FakeMaya.py points Cmds and Mel at an in-memory stand-in
+try:
+    import maya.cmds as Cmds
+    import maya.mel as Mel
+    import maya.OpenMaya as OpenMaya
+    import maya.OpenMayaAnim as OpenMayaAnim
+except ImportError:
+    Cmds = None
+    Mel = None
+    OpenMaya = None
+    OpenMayaAnim = None
 
 global InfiniteLoopCounter
 
@@ -32,7 +47,7 @@ def CheckInfinity(infinity=1000):
     InfiniteLoopCounter = InfiniteLoopCounter + 1
     
     if InfiniteLoopCounter >= infinity:
-        print 'Loop overboard!'
+        print('Loop overboard!')
         return True
     
     return False
@@ -120,15 +135,10 @@ class XmlWriter:
         self.WriteElementEnd(True)
 
 def PrintXYZ(xyz):
-    print "X", str(xyz[0]),
-    print "Y", str(xyz[1]),
-    print "Z", str(xyz[2])
+    print("X %s Y %s Z %s" % (xyz[0], xyz[1], xyz[2]))
 
 def PrintXYZW(xyzw):
-    print "X", str(xyzw[0]),
-    print "Y", str(xyzw[1]),
-    print "Z", str(xyzw[2]),
-    print "W", str(xyzw[3])
+    print("X %s Y %s Z %s W %s" % (xyzw[0], xyzw[1], xyzw[2], xyzw[3]))
 
 def CreateXYZKey(xyz):
     key = "X" + str(xyz[0])
@@ -178,16 +188,20 @@ def VectorDegreesToRadians(vector):
 def VectorRadiansToDegrees(vector):
     return OpenMaya.MVector(OpenMaya.MAngle(vector[0], OpenMaya.MAngle.kRadians).asDegrees(), OpenMaya.MAngle(vector[1], OpenMaya.MAngle.kRadians).asDegrees(), OpenMaya.MAngle(vector[2], OpenMaya.MAngle.kRadians).asDegrees())
 
-def CreateTransformNodes(nodeName, xmlNode):
+def CreateTransformNodes(nodeName, xmlNode, pose=None):
     '''
     Creates position, rotation and scale nodes for the node nodeName
-    and attaches them to xmlNode
+    and attaches them to xmlNode; pose is its row of a PoseSampler sample,
+    queried at the current time if not given
     '''
-    print "Getting transform for", nodeName, Cmds.nodeType(nodeName)
+    print("Getting transform for %s %s" % (nodeName, Cmds.nodeType(nodeName)))
     
-    position = Cmds.xform(nodeName, q=True, t=True);
-    rotation = Cmds.xform(nodeName, q=True, ro=True);
-    scale = Cmds.xform(nodeName, q=True, s=True);
+    if pose is None:
+        position = Cmds.xform(nodeName, q=True, t=True)
+        rotation = Cmds.xform(nodeName, q=True, ro=True)
+        scale = Cmds.xform(nodeName, q=True, s=True)
+    else:
+        position, rotation, scale = list(pose[0:3]), list(pose[3:6]), list(pose[6:9])
     
     if not IsZero(position):
         positionNode = xmlDocument.createElement("Position")
@@ -219,6 +233,37 @@ def GetParentName(fullNodePath):
 def Bake(minFrame, maxFrame):
     Cmds.bakeResults(sm=True, t=(minFrame, maxFrame), hi="below", sb=1, dic=True, pok=False, sac=False, ral=False, cp=False, shape=False)
 
+# Frame rates of the named time units; the others are spelled like '120fps'
+TimeUnitFramesPerSecond = {'game': 15, 'film': 24, 'pal': 25, 'ntsc': 30, 'show': 48, 'palf': 50, 'ntscf': 60}
+
+def GetFramesPerSecond():
+    '''
+    Returns the frame rate of the current time unit
+    '''
+    timeUnit = Cmds.currentUnit(query=True, time=True)
+    
+    if timeUnit in TimeUnitFramesPerSecond:
+        return TimeUnitFramesPerSecond[timeUnit]
+    
+    if timeUnit.endswith('fps'):
+        return float(timeUnit[:-3])
+    
+    return 24
+
+SceneFilePatterns = ["*.ma", "*.mb"]
+
+def FindScenes(directoryName, patterns=SceneFilePatterns):
+    '''
+    Returns the files under directoryName that match any of patterns, sorted
+    '''
+    sceneFilenames = []
+    for walkDirectory, directoryNames, fileNames in os.walk(directoryName):
+        for fileName in fileNames:
+            if any([fnmatch.fnmatch(fileName, pattern) for pattern in patterns]):
+                sceneFilenames.append(os.path.join(walkDirectory, fileName))
+    
+    return sorted(sceneFilenames)
+
 def FindIndexOf(list, value, start=0, end=-1):
     '''
     Finds the first occurance of value in [start, end]
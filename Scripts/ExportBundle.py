@@ -0,0 +1,297 @@
+'''
+Export bundle
+
+Streams export artifacts (FBX files, playblasts, CSV) into a single zip file
+as they are produced. Entries are compressed in chunks on a thread pool and
+written with data descriptors, so nothing has to be known up front and the
+archive is written once, front to back. A manifest.json entry lists what the
+bundle holds. Zip64 records are used when an entry or the archive passes 4 GB.
+The archive is written under a .partial name and only renamed to its own once
+closed, so an aborted or failed export never looks like a finished bundle.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import time
+import json
+import zlib
+import struct
+import collections
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxStitcher import *
+except ImportError:
+    pass
+
+BundleChunkSize = 1 << 20
+BundleManifestName = "manifest.json"
+BundlePartialSuffix = ".partial"
+
+ZipLocalHeaderSignature = 0x04034b50
+ZipDataDescriptorSignature = 0x08074b50
+ZipCentralHeaderSignature = 0x02014b50
+ZipEndSignature = 0x06054b50
+Zip64EndSignature = 0x06064b50
+Zip64LocatorSignature = 0x07064b50
+
+# Sizes stored in the data descriptor, UTF-8 names
+ZipFlags = 0x0008 | 0x0800
+ZipDeflated = 8
+ZipVersion = 45
+ZipLimit = 0xFFFFFFFF
+
+def CompressChunk(chunk, level, last):
+    '''
+    Deflates one chunk of an entry on its own. Every chunk but the last ends with a
+    sync flush, so the compressed chunks can simply be written one after the other
+    '''
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    if last:
+        return compressor.compress(chunk) + compressor.flush(zlib.Z_FINISH)
+        
+    return compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+def DosDateTime(timestamp):
+    localTime = time.localtime(timestamp)
+    dosDate = ((max(localTime.tm_year, 1980) - 1980) << 9) | (localTime.tm_mon << 5) | localTime.tm_mday
+    dosTime = (localTime.tm_hour << 11) | (localTime.tm_min << 5) | (localTime.tm_sec // 2)
+    return dosDate, dosTime
+
+class BundleEntry:
+    '''
+    A file-like entry of an ExportBundle that is being written
+    '''
+    Name = ""
+    Size = 0
+    CompressedSize = 0
+    Crc32 = 0
+    Offset = 0
+    
+    def __init__(self, bundle, name):
+        self.Name = name
+        self.bundle = bundle
+        self.buffer = []
+        self.bufferSize = 0
+        self.pending = collections.deque()
+        self.closed = False
+        
+        self.Offset = bundle.position
+        self.dosDate, self.dosTime = DosDateTime(time.time())
+        bundle.WriteLocalHeader(self)
+        
+    def write(self, data):
+        data = FbxBytes(data)
+        self.buffer.append(data)
+        self.bufferSize += len(data)
+        
+        if self.bufferSize >= BundleChunkSize:
+            self.QueueChunk(False)
+            
+    def QueueChunk(self, last):
+        chunk = b"".join(self.buffer)
+        self.buffer = []
+        self.bufferSize = 0
+        
+        self.Size += len(chunk)
+        self.Crc32 = zlib.crc32(chunk, self.Crc32)
+        self.pending.append(self.bundle.pool.apply_async(CompressChunk, (chunk, self.bundle.CompressLevel, last)))
+        
+        # Keep a bounded number of chunks in flight, writing them back in order
+        while len(self.pending) > 0 and (last or len(self.pending) > 2 * self.bundle.Workers):
+            compressed = self.pending.popleft().get()
+            self.bundle.Write(compressed)
+            self.CompressedSize += len(compressed)
+            
+    def close(self):
+        if self.closed:
+            return
+            
+        self.QueueChunk(True)
+        self.Crc32 &= 0xFFFFFFFF
+        self.bundle.WriteDataDescriptor(self)
+        self.closed = True
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        self.close()
+
+class ExportBundle:
+    '''
+    A zip file that export artifacts are streamed into, e.g.
+    
+        bundle = ExportBundle("Export.zip")
+        bundle.AddFile("Run.fbx", "C:/Temp/Run.fbx")
+        csvEntry = bundle.OpenEntry("Export.csv")
+        csvEntry.write("Animation Name,Start Frame,End Frame\\n")
+        csvEntry.close()
+        bundle.Close()
+    
+    Abort() instead of Close() removes what was written
+    '''
+    Filename = ""
+    Workers = 1
+    CompressLevel = 6
+    
+    def __init__(self, filename, workers=None, compressLevel=6):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+            
+        self.Filename = filename
+        self.Workers = max(1, workers)
+        self.CompressLevel = compressLevel
+        self.Entries = []
+        
+        self.partialFilename = filename + BundlePartialSuffix
+        self.pool = ThreadPool(self.Workers)
+        self.file = open(self.partialFilename, "wb")
+        self.position = 0
+        self.entry = None
+        
+    def Write(self, data):
+        self.file.write(data)
+        self.position += len(data)
+        
+    def WriteLocalHeader(self, entry):
+        nameBytes = FbxBytes(entry.Name)
+        
+        # Zip64 sizes are always reserved since the entry size is not known yet
+        extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0)
+        self.Write(struct.pack("<IHHHHHIIIHH", ZipLocalHeaderSignature, ZipVersion, ZipFlags, ZipDeflated,
+            entry.dosTime, entry.dosDate, 0, ZipLimit, ZipLimit, len(nameBytes), len(extra)) + nameBytes + extra)
+            
+    def WriteDataDescriptor(self, entry):
+        self.Write(struct.pack("<IIQQ", ZipDataDescriptorSignature, entry.Crc32, entry.CompressedSize, entry.Size))
+        
+    def OpenEntry(self, name):
+        '''
+        Starts a new entry and returns it to be written to; entries are written one at a time
+        '''
+        if self.entry is not None:
+            self.entry.close()
+            
+        self.entry = BundleEntry(self, name)
+        self.Entries.append(self.entry)
+        return self.entry
+        
+    def AddBytes(self, name, data):
+        entry = self.OpenEntry(name)
+        entry.write(data)
+        entry.close()
+        
+    def AddFile(self, name, filename, remove=False):
+        '''
+        Streams filename into the entry name, removing the file afterwards if asked to
+        '''
+        entry = self.OpenEntry(name)
+        
+        sourceFile = open(filename, "rb")
+        try:
+            chunk = sourceFile.read(BundleChunkSize)
+            while len(chunk) > 0:
+                entry.write(chunk)
+                chunk = sourceFile.read(BundleChunkSize)
+        finally:
+            sourceFile.close()
+            
+        entry.close()
+        
+        if remove:
+            os.remove(filename)
+            
+    def WriteManifest(self):
+        manifest = {"Entries": [{"Name": entry.Name, "Size": entry.Size, "CompressedSize": entry.CompressedSize,
+            "Crc32": entry.Crc32} for entry in self.Entries]}
+            
+        self.AddBytes(BundleManifestName, json.dumps(manifest, indent=4, sort_keys=True))
+        
+    def WriteCentralDirectory(self):
+        centralStart = self.position
+        
+        for entry in self.Entries:
+            nameBytes = FbxBytes(entry.Name)
+            
+            # Only the values that do not fit go into the zip64 extra, in this order
+            zip64Values = []
+            size = entry.Size
+            if size >= ZipLimit:
+                zip64Values.append(size)
+                size = ZipLimit
+                
+            compressedSize = entry.CompressedSize
+            if compressedSize >= ZipLimit:
+                zip64Values.append(compressedSize)
+                compressedSize = ZipLimit
+                
+            offset = entry.Offset
+            if offset >= ZipLimit:
+                zip64Values.append(offset)
+                offset = ZipLimit
+                
+            extra = b""
+            if len(zip64Values) > 0:
+                extra = struct.pack("<HH%dQ" % len(zip64Values), 0x0001, 8 * len(zip64Values), *zip64Values)
+                
+            self.Write(struct.pack("<IHHHHHHIIIHHHHHII", ZipCentralHeaderSignature, ZipVersion | (3 << 8), ZipVersion,
+                ZipFlags, ZipDeflated, entry.dosTime, entry.dosDate, entry.Crc32, compressedSize, size,
+                len(nameBytes), len(extra), 0, 0, 0, 0o644 << 16, offset) + nameBytes + extra)
+                
+        centralEnd = self.position
+        centralSize = centralEnd - centralStart
+        
+        if len(self.Entries) >= 0xFFFF or centralStart >= ZipLimit or centralSize >= ZipLimit:
+            self.Write(struct.pack("<IQHHIIQQQQ", Zip64EndSignature, 44, ZipVersion | (3 << 8), ZipVersion, 0, 0,
+                len(self.Entries), len(self.Entries), centralSize, centralStart))
+            self.Write(struct.pack("<IIQI", Zip64LocatorSignature, 0, centralEnd, 1))
+            self.Write(struct.pack("<IHHHHIIH", ZipEndSignature, 0, 0, 0xFFFF, 0xFFFF, ZipLimit, ZipLimit, 0))
+        else:
+            self.Write(struct.pack("<IHHHHIIH", ZipEndSignature, 0, 0, len(self.Entries), len(self.Entries),
+                centralSize, centralStart, 0))
+                
+    def CloseFile(self):
+        self.file.close()
+        self.file = None
+        self.pool.close()
+        self.pool.join()
+    
+    def Close(self):
+        '''
+        Finishes the open entry, writes the manifest and the zip directory, and moves the
+        bundle to Filename; if that fails the partial file is removed
+        '''
+        if self.file is None:
+            return
+            
+        completed = False
+        try:
+            if self.entry is not None:
+                self.entry.close()
+                
+            self.WriteManifest()
+            self.WriteCentralDirectory()
+            completed = True
+        finally:
+            self.CloseFile()
+            if completed:
+                ReplaceFile(self.partialFilename, self.Filename)
+            else:
+                os.remove(self.partialFilename)
+    
+    def Abort(self):
+        '''
+        Stops writing and removes the partial bundle, leaving nothing under Filename
+        '''
+        if self.file is None:
+            return
+        
+        try:
+            self.CloseFile()
+        finally:
+            os.remove(self.partialFilename)
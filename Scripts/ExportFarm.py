@@ -0,0 +1,332 @@
+'''
+Export farm
+
+Runs per-animation jobs (like FBX exports) on a pool of headless worker
+processes, each with its own copy of the scene loaded. Jobs and results are
+JSON lines over the workers' stdin and stdout, so any command that speaks the
+protocol can be a worker; the Sequencer uses mayapy running RunExportWorker.
+
+Every worker process is fed by its own thread. Jobs wait in a bounded queue,
+time out per job, are retried on a fresh process if a worker hangs or dies,
+and are handed back through the Results queue and an optional callback.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import sys
+import json
+import time
+import threading
+import subprocess
+import multiprocessing
+
+try:
+    import queue as Queue
+except ImportError:
+    import Queue
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxStitcher import *
+except ImportError:
+    pass
+
+# Seconds a worker may take to load the scene and report ready
+FarmReadyTimeout = 600
+
+# Seconds a single job may take by default
+FarmJobTimeout = 600
+
+# Extra attempts for a job whose worker failed, hung or died
+FarmRetries = 2
+
+# Seconds a worker gets to exit on its own once its input is closed
+FarmStopTimeout = 5
+
+class FarmError(Exception):
+    pass
+
+class FarmJob:
+    '''
+    One unit of work for the farm, a Kind of job (e.g. "fbx") and its Payload
+    After it is done either Result or Error is set
+    '''
+    Id = -1
+    Kind = ""
+    Payload = None
+    Timeout = None
+    Attempts = 0
+    Result = None
+    Error = None
+    Done = False
+    
+    def __init__(self, id, kind, payload, timeout=None):
+        self.Id = id
+        self.Kind = kind
+        self.Payload = payload
+        self.Timeout = timeout
+        
+    def Succeeded(self):
+        return self.Done and self.Error is None
+
+def WriteMessage(outputFile, message):
+    outputFile.write(FbxBytes(json.dumps(message) + "\n"))
+    outputFile.flush()
+
+def ReadMessages(inputFile, messages):
+    '''
+    Puts every JSON object read from inputFile on messages, then None at the end, and closes inputFile
+    Lines that are not JSON objects (stray output of the worker) are skipped
+    '''
+    try:
+        for line in iter(inputFile.readline, b""):
+            try:
+                message = json.loads(line.decode("utf-8"))
+            except ValueError:
+                continue
+                
+            if isinstance(message, dict):
+                messages.put(message)
+    finally:
+        inputFile.close()
+        messages.put(None)
+
+class FarmWorker:
+    '''
+    A worker process and the thread that feeds it jobs; the process is started
+    on the first job and restarted after it fails
+    '''
+    Index = 0
+    
+    def __init__(self, farm, index):
+        self.Index = index
+        self.farm = farm
+        self.process = None
+        self.messages = None
+        
+        self.thread = threading.Thread(target=self.Run)
+        self.thread.daemon = True
+        
+    def Start(self):
+        self.process = subprocess.Popen(self.farm.WorkerCommand, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            env=self.farm.Environment)
+            
+        # A new queue per process, so nothing left over from a killed one is read
+        self.messages = Queue.Queue()
+        reader = threading.Thread(target=ReadMessages, args=(self.process.stdout, self.messages))
+        reader.daemon = True
+        reader.start()
+        
+        if not self.Receive(self.farm.ReadyTimeout).get("Ready"):
+            raise FarmError("Worker %d did not report ready" % self.Index)
+            
+    def Receive(self, timeout):
+        try:
+            message = self.messages.get(timeout=timeout)
+        except Queue.Empty:
+            raise FarmError("Worker %d timed out after %d seconds" % (self.Index, timeout))
+            
+        if message is None:
+            raise FarmError("Worker %d exited with code %s" % (self.Index, self.process.wait()))
+            
+        return message
+        
+    def Stop(self):
+        if self.process is None:
+            return
+            
+        try:
+            self.process.stdin.close()
+        except (IOError, OSError):
+            pass
+            
+        stopTime = time.time() + FarmStopTimeout
+        while self.process.poll() is None and time.time() < stopTime:
+            time.sleep(0.05)
+            
+        if self.process.poll() is None:
+            self.process.kill()
+            
+        self.process.wait()
+        self.process = None
+        
+    def RunJob(self, job):
+        timeout = job.Timeout
+        if timeout is None:
+            timeout = self.farm.JobTimeout
+            
+        while True:
+            job.Attempts += 1
+            try:
+                if self.process is None:
+                    self.Start()
+                    
+                WriteMessage(self.process.stdin, {"Id": job.Id, "Kind": job.Kind, "Payload": job.Payload})
+                
+                message = self.Receive(timeout)
+                while message.get("Id") != job.Id:
+                    message = self.Receive(timeout)
+                    
+                # The worker survived a failing job, so only the job is retried
+                job.Error = message.get("Error")
+                job.Result = message.get("Result")
+            except (FarmError, IOError, OSError) as error:
+                job.Error = str(error)
+                self.Stop()
+                
+            if job.Error is None or job.Attempts > self.farm.Retries or self.farm.canceled:
+                return
+                
+    def Run(self):
+        try:
+            while True:
+                job = self.farm.jobs.get()
+                if job is None:
+                    return
+                    
+                self.RunJob(job)
+                self.farm.Finish(job)
+        finally:
+            self.Stop()
+
+class ExportFarm:
+    '''
+    Runs jobs on workerCommand processes, e.g.
+    
+        farm = ExportFarm(["mayapy", "-c", "..."], workers=8)
+        for payload in payloads:
+            farm.Submit("fbx", payload)
+        farm.Close()
+        results = [farm.Results.get() for payload in payloads]
+        
+    Submit blocks while the job queue is full. onResult is called with every
+    finished job from the worker threads; from the Maya UI poll Results instead
+    '''
+    WorkerCommand = None
+    Environment = None
+    Workers = 1
+    JobTimeout = FarmJobTimeout
+    ReadyTimeout = FarmReadyTimeout
+    Retries = FarmRetries
+    Results = None
+    
+    def __init__(self, workerCommand, workers=None, queueSize=None, jobTimeout=FarmJobTimeout, retries=FarmRetries,
+        readyTimeout=FarmReadyTimeout, onResult=None, environment=None):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+            
+        if queueSize is None:
+            queueSize = 2 * workers
+            
+        self.WorkerCommand = workerCommand
+        self.Environment = environment
+        self.Workers = max(1, workers)
+        self.JobTimeout = jobTimeout
+        self.ReadyTimeout = readyTimeout
+        self.Retries = retries
+        self.Results = Queue.Queue()
+        
+        self.onResult = onResult
+        self.jobs = Queue.Queue(queueSize)
+        self.nextId = 0
+        self.canceled = False
+        self.closed = False
+        
+        self.workers = [FarmWorker(self, index) for index in range(self.Workers)]
+        for worker in self.workers:
+            worker.thread.start()
+            
+    def Submit(self, kind, payload, timeout=None, block=True):
+        '''
+        Queues a job and returns it; raises Queue.Full if block is False and the queue is full
+        '''
+        job = FarmJob(self.nextId, kind, payload, timeout)
+        self.jobs.put(job, block)
+        self.nextId += 1
+        return job
+        
+    def IsFull(self):
+        return self.jobs.full()
+        
+    def Finish(self, job):
+        job.Done = True
+        self.Results.put(job)
+        
+        if self.onResult is not None:
+            self.onResult(job)
+            
+    def Cancel(self):
+        '''
+        Drops the queued jobs (they finish with an error); jobs already running complete
+        '''
+        self.canceled = True
+        stopCount = 0
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except Queue.Empty:
+                break
+                
+            if job is None:
+                stopCount += 1
+            else:
+                job.Error = "Canceled"
+                self.Finish(job)
+                
+        for index in range(stopCount):
+            self.jobs.put(None)
+            
+    def Close(self):
+        '''
+        Waits for the queued jobs to finish and stops the workers
+        '''
+        if self.closed:
+            return
+            
+        self.closed = True
+        for worker in self.workers:
+            self.jobs.put(None)
+            
+        for worker in self.workers:
+            worker.thread.join()
+            
+    def Map(self, kind, payloads):
+        '''
+        Runs a job per payload and returns the finished jobs in payload order
+        '''
+        jobs = [self.Submit(kind, payload) for payload in payloads]
+        for job in jobs:
+            self.Results.get()
+            
+        return jobs
+
+def RunExportWorker(handlers, inputFile=None, outputFile=None):
+    '''
+    Worker side of the farm: answers every job read from inputFile (stdin) with
+    the result of handlers[kind](payload), or its error, on outputFile (stdout)
+    '''
+    if outputFile is None:
+        # Keep the real stdout for messages and send anything else printed to stderr
+        outputFile = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+        sys.stdout.flush()
+        os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+        
+    if inputFile is None:
+        inputFile = getattr(sys.stdin, "buffer", sys.stdin)
+        
+    WriteMessage(outputFile, {"Ready": True})
+    
+    for line in iter(inputFile.readline, b""):
+        if len(line.strip()) == 0:
+            continue
+            
+        job = json.loads(line.decode("utf-8"))
+        try:
+            message = {"Id": job["Id"], "Result": handlers[job["Kind"]](job["Payload"])}
+        except Exception as error:
+            message = {"Id": job["Id"], "Error": "%s: %s" % (type(error).__name__, error)}
+            
+        WriteMessage(outputFile, message)
@@ -0,0 +1,848 @@
+'''
+Maya backend
+
+The Sequencer talks to Maya through the module level Cmds and Mel. Outside
+Maya (when maya.cmds cannot be imported) they are pointed at FakeCmds and
+FakeMel, an in-memory stand-in for the part of Maya the Sequencer uses: nodes
+and their hierarchy, dynamic attributes (like the SequencerData script node),
+key curves, the timeline, undo and the UI controls. FBXExport and playblast
+write files, so whole pipelines can be run and profiled headless.
+FakePoseBackend evaluates the same nodes for PoseSampler.
+
+SetBackend swaps the backend, e.g. for a fresh FakeCmds between runs.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import re
+import bisect
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from Common import *
+    from FbxCurves import *
+    from AnimationMath import *
+except ImportError:
+    pass
+
+# Node types that get transform attributes and are picked by select(all=True)
+FakeDagTypes = ['transform', 'joint']
+
+FakeTransformAttributes = ['translateX', 'translateY', 'translateZ', 'rotateX', 'rotateY', 'rotateZ',
+    'scaleX', 'scaleY', 'scaleZ', 'visibility']
+
+FakeAttributeAliases = {'tx': 'translateX', 'ty': 'translateY', 'tz': 'translateZ', 'rx': 'rotateX', 'ry': 'rotateY',
+    'rz': 'rotateZ', 'sx': 'scaleX', 'sy': 'scaleY', 'sz': 'scaleZ', 'v': 'visibility', 'ro': 'rotateOrder'}
+
+FakeUiCommands = ['window', 'scrollLayout', 'columnLayout', 'rowLayout', 'frameLayout', 'checkBox', 'textField',
+    'text', 'button', 'separator', 'progressBar']
+
+# What controls return for flags that were never set
+FakeUiDefaults = {'text': '', 'value': False, 'isCancelled': False}
+
+def SetBackend(cmds, mel):
+    '''
+    Points the Cmds and Mel used by the Sequencer at another backend and returns
+    the previous pair; only has an effect in the combined Sequencer.py
+    '''
+    global Cmds, Mel
+    previousBackend = (globals().get("Cmds"), globals().get("Mel"))
+    Cmds = cmds
+    Mel = mel
+    return previousBackend
+
+def UseFakeMaya():
+    '''
+    Switches to a new, empty FakeCmds and returns it
+    '''
+    cmds = FakeCmds()
+    SetBackend(cmds, FakeMel(cmds))
+    return cmds
+
+def Flag(flags, longName, shortName, default=None):
+    '''
+    Returns the value of a command flag given by its long or short name
+    '''
+    if longName in flags:
+        return flags[longName]
+        
+    return flags.get(shortName, default)
+
+def TimeRange(time):
+    '''
+    Returns (start, end) of a time flag, a single time or a (start, end) pair
+    '''
+    if time is None:
+        return None
+        
+    if isinstance(time, (list, tuple)):
+        if len(time) == 1:
+            return time[0], time[0]
+            
+        return time[0], time[1]
+        
+    return time, time
+
+def FlatNames(objects):
+    names = []
+    for item in objects:
+        if isinstance(item, (list, tuple)):
+            names.extend(item)
+        else:
+            names.append(item)
+            
+    return names
+
+class FakeAttribute:
+    Type = ""
+    Value = None
+    Parent = None
+    
+    def __init__(self, attributeType, value, parent=None):
+        self.Type = attributeType
+        self.Value = value
+        self.Parent = parent
+
+class FakeCurve:
+    '''
+    The keys of one attribute, sorted by time
+    '''
+    def __init__(self, times=None, values=None):
+        self.Times = list(times or [])
+        self.Values = list(values or [])
+        
+    def Copy(self):
+        return FakeCurve(self.Times, self.Values)
+        
+    def Range(self, timeRange):
+        if timeRange is None:
+            return 0, len(self.Times)
+            
+        return bisect.bisect_left(self.Times, timeRange[0]), bisect.bisect_right(self.Times, timeRange[1])
+        
+    def SetKey(self, time, value):
+        index = bisect.bisect_left(self.Times, time)
+        if index < len(self.Times) and self.Times[index] == time:
+            self.Values[index] = value
+        else:
+            self.Times.insert(index, time)
+            self.Values.insert(index, value)
+            
+    def Evaluate(self, time):
+        '''
+        Linear interpolation between the keys, constant outside them
+        '''
+        index = bisect.bisect_right(self.Times, time)
+        if index == 0:
+            return self.Values[0]
+            
+        if index == len(self.Times):
+            return self.Values[-1]
+            
+        startTime, endTime = self.Times[index - 1], self.Times[index]
+        weight = float(time - startTime) / (endTime - startTime)
+        return self.Values[index - 1] + (self.Values[index] - self.Values[index - 1]) * weight
+
+class FakeNode:
+    Name = ""
+    Type = ""
+    Parent = None
+    
+    def __init__(self, name, nodeType, parent=None):
+        self.Name = name
+        self.Type = nodeType
+        self.Parent = parent
+        self.Children = []
+        self.Attributes = {}
+        self.Curves = {}
+        
+        if nodeType in FakeDagTypes:
+            for attributeName in FakeTransformAttributes:
+                default = 0.0
+                if attributeName.startswith('scale') or attributeName == 'visibility':
+                    default = 1.0
+                    
+                self.Attributes[attributeName] = FakeAttribute('double', default)
+
+            # An index into RotateOrders, like Maya's enum
+            self.Attributes['rotateOrder'] = FakeAttribute('enum', 0)
+
+class FakeCmds:
+    '''
+    In-memory stand-in for maya.cmds, e.g.
+    
+        cmds = UseFakeMaya()
+        cmds.createNode('joint', name='Joint_Root')
+        cmds.setKeyframe('Joint_Root.translateX', time=1, value=5.0)
+        
+    Dialogs answer with their dismissString (or first button) unless
+    DialogAnswer is set; the messages shown are kept in Dialogs. evalDeferred
+    callables wait in Deferred until Idle runs them, as Maya does when idle
+    '''
+    SceneName = ""
+    TimeUnit = "film"
+    CurrentTime = 0
+    DialogAnswer = None
+    PromptText = ""
+    
+    def __init__(self):
+        self.Nodes = {}
+        self.Selection = []
+        self.Controls = {}
+        self.Dialogs = []
+        self.Exports = []
+        self.Deferred = []
+        self.PlaybackRange = [1, 120]
+        self.undoStack = []
+        self.undoEnabled = True
+        self.undoing = False
+        self.chunkDepth = 0
+        self.controlCount = 0
+        self.parentControl = None
+        
+    def __getattr__(self, name):
+        if name in FakeUiCommands:
+            return lambda *objects, **flags: self.UiCommand(name, *objects, **flags)
+            
+        raise AttributeError("FakeCmds has no command %s" % name)
+        
+    # Undo
+    
+    def RecordUndo(self, undo):
+        if not self.undoEnabled or self.undoing:
+            return
+            
+        if self.chunkDepth > 0:
+            self.undoStack[-1].append(undo)
+        else:
+            self.undoStack.append([undo])
+            
+    def undo(self):
+        if len(self.undoStack) == 0:
+            return
+            
+        self.undoing = True
+        try:
+            for undo in reversed(self.undoStack.pop()):
+                undo()
+        finally:
+            self.undoing = False
+            
+    def undoInfo(self, **flags):
+        if Flag(flags, 'openChunk', 'ock'):
+            if self.chunkDepth == 0:
+                self.undoStack.append([])
+                
+            self.chunkDepth += 1
+        elif Flag(flags, 'closeChunk', 'cck'):
+            self.chunkDepth = max(0, self.chunkDepth - 1)
+        elif Flag(flags, 'query', 'q'):
+            return self.undoEnabled
+        elif Flag(flags, 'state', 'st') is not None:
+            self.undoEnabled = bool(Flag(flags, 'state', 'st'))
+            
+    # Nodes
+    
+    def Node(self, name):
+        if name not in self.Nodes:
+            raise ValueError("No object matches name: %s" % name)
+            
+        return self.Nodes[name]
+        
+    def Descendants(self, node):
+        nodes = [node]
+        for childName in node.Children:
+            nodes.extend(self.Descendants(self.Nodes[childName]))
+            
+        return nodes
+        
+    def Targets(self, objects, flags):
+        '''
+        Returns the nodes a command works on: objects or the selection, plus their
+        descendants with hierarchy below
+        '''
+        names = FlatNames(objects) or list(self.Selection)
+        nodes = [self.Node(name.split('.')[0]) for name in names]
+        
+        if Flag(flags, 'hierarchy', 'hi') == 'below':
+            nodes = [descendant for node in nodes for descendant in self.Descendants(node)]
+            
+        return nodes
+        
+    def createNode(self, nodeType, **flags):
+        name = Flag(flags, 'name', 'n') or nodeType
+        if name in self.Nodes:
+            name = "%s%d" % (name, len(self.Nodes))
+            
+        parentName = Flag(flags, 'parent', 'p')
+        self.Nodes[name] = FakeNode(name, nodeType, parentName)
+        if parentName is not None:
+            self.Node(parentName).Children.append(name)
+            
+        self.RecordUndo(lambda: self.delete(name))
+        self.select(name)
+        return name
+        
+    def objExists(self, name):
+        nodeName, attributeName = (name.split('.', 1) + [None])[:2]
+        if nodeName not in self.Nodes:
+            return False
+            
+        return attributeName is None or self.FindAttribute(name) is not None
+        
+    def delete(self, *objects, **flags):
+        for node in self.Targets(objects, {}):
+            for deletedNode in self.Descendants(node):
+                if deletedNode.Name not in self.Nodes:
+                    continue
+                    
+                del self.Nodes[deletedNode.Name]
+                if deletedNode.Name in self.Selection:
+                    self.Selection.remove(deletedNode.Name)
+                    
+            if node.Parent in self.Nodes:
+                self.Nodes[node.Parent].Children.remove(node.Name)
+                
+            self.RecordUndo(lambda node=node: self.RestoreNode(node))
+            
+    def RestoreNode(self, node):
+        for restoredNode in self.Descendants(node):
+            self.Nodes[restoredNode.Name] = restoredNode
+            
+        if node.Parent in self.Nodes:
+            self.Nodes[node.Parent].Children.append(node.Name)
+            
+    def nodeType(self, name):
+        if isinstance(name, (list, tuple)):
+            name = name[0]
+            
+        return self.Node(name.split('.')[0]).Type
+        
+    def ls(self, *objects, **flags):
+        if Flag(flags, 'selection', 'sl'):
+            return list(self.Selection)
+            
+        names = FlatNames(objects) or list(self.Nodes)
+        nodeType = Flag(flags, 'type', 'typ')
+        return [name for name in names if name in self.Nodes and (nodeType is None or self.Nodes[name].Type == nodeType)]
+        
+    def listRelatives(self, name, **flags):
+        node = self.Node(name)
+        if Flag(flags, 'allDescendents', 'ad'):
+            return [descendant.Name for descendant in self.Descendants(node)[1:]] or None
+            
+        if Flag(flags, 'parent', 'p'):
+            return [node.Parent] if node.Parent else None
+            
+        return list(node.Children) or None
+        
+    def select(self, *objects, **flags):
+        previousSelection = list(self.Selection)
+        
+        if Flag(flags, 'clear', 'cl'):
+            self.Selection = []
+        elif Flag(flags, 'all', 'all'):
+            self.Selection = [name for name, node in self.Nodes.items() if node.Type in FakeDagTypes]
+        else:
+            names = [node.Name for node in self.Targets(objects, flags)] if len(objects) > 0 else []
+            if Flag(flags, 'add', 'add'):
+                self.Selection.extend([name for name in names if name not in self.Selection])
+            else:
+                self.Selection = names
+                
+        self.RecordUndo(lambda: setattr(self, 'Selection', previousSelection))
+        
+    # Attributes
+    
+    def FindAttribute(self, path):
+        '''
+        Returns the node and attribute name of node.attribute or node.compound.attribute, or None
+        '''
+        parts = path.split('.')
+        node = self.Nodes.get(parts[0])
+        if node is None or len(parts) < 2:
+            return None
+            
+        attributeName = FakeAttributeAliases.get(parts[-1], parts[-1])
+        if attributeName not in node.Attributes:
+            return None
+            
+        return node, attributeName
+        
+    def Attribute(self, path):
+        found = self.FindAttribute(path)
+        if found is None:
+            raise ValueError("No object matches name: %s" % path)
+            
+        return found
+        
+    def addAttr(self, *objects, **flags):
+        names = FlatNames(objects) or self.Selection[:1]
+        node = self.Node(names[0])
+        
+        attributeName = Flag(flags, 'longName', 'ln')
+        attributeType = Flag(flags, 'attributeType', 'at') or Flag(flags, 'dataType', 'dt') or 'double'
+        
+        value = Flag(flags, 'defaultValue', 'dv')
+        if value is None:
+            value = {'long': 0, 'short': 0, 'bool': False, 'double': 0.0, 'float': 0.0}.get(attributeType)
+            
+        node.Attributes[attributeName] = FakeAttribute(attributeType, value, Flag(flags, 'parent', 'p'))
+        self.RecordUndo(lambda: node.Attributes.pop(attributeName, None))
+        
+    def getAttr(self, path, **flags):
+        node, attributeName = self.Attribute(path)
+        curve = node.Curves.get(attributeName)
+        if curve is not None and len(curve.Times) > 0:
+            return curve.Evaluate(Flag(flags, 'time', 't', self.CurrentTime))
+            
+        attribute = node.Attributes[attributeName]
+        if attribute.Type == 'compound':
+            return None
+            
+        if isinstance(attribute.Value, list):
+            return list(attribute.Value)
+            
+        return attribute.Value
+        
+    def setAttr(self, path, *values, **flags):
+        node, attributeName = self.Attribute(path)
+        attribute = node.Attributes[attributeName]
+        previousValue = attribute.Value
+        
+        if len(values) == 1:
+            value = values[0]
+        else:
+            value = list(values)
+            
+        if isinstance(value, (list, tuple)):
+            value = list(value)
+        elif attribute.Type == 'bool':
+            value = bool(value)
+        elif attribute.Type in ['long', 'short']:
+            value = int(value)
+            
+        attribute.Value = value
+        self.RecordUndo(lambda: setattr(attribute, 'Value', previousValue))
+        
+    # Keys
+    
+    def Curves(self, objects, flags):
+        '''
+        Returns [node, attributeName, curve] for the key curves a key command works on
+        '''
+        attributeNames = Flag(flags, 'attribute', 'at')
+        if isinstance(attributeNames, str):
+            attributeNames = [attributeNames]
+            
+        curves = []
+        for name in FlatNames(objects) or list(self.Selection):
+            if '.' in name:
+                node, attributeName = self.Attribute(name)
+                nodes = [[node, [attributeName]]]
+            else:
+                nodes = [[node, attributeNames] for node in self.Targets([name], flags)]
+                
+            for node, names in nodes:
+                for attributeName in sorted(node.Curves):
+                    if names is None or attributeName in [FakeAttributeAliases.get(name, name) for name in names]:
+                        curves.append([node, attributeName, node.Curves[attributeName]])
+                        
+        return curves
+        
+    def RecordCurveUndo(self, curves):
+        copies = [[node, attributeName, curve.Copy()] for node, attributeName, curve in curves]
+        
+        def Restore():
+            for node, attributeName, curve in copies:
+                node.Curves[attributeName] = curve
+                
+        self.RecordUndo(Restore)
+        
+    def setKeyframe(self, *objects, **flags):
+        names = FlatNames(objects) or list(self.Selection)
+        attributeNames = Flag(flags, 'attribute', 'at')
+        if isinstance(attributeNames, str):
+            attributeNames = [attributeNames]
+            
+        time = Flag(flags, 'time', 't', self.CurrentTime)
+        if isinstance(time, (list, tuple)):
+            time = time[0]
+            
+        keyedCurves = []
+        for name in names:
+            if '.' in name:
+                targets = [self.Attribute(name)]
+            else:
+                node = self.Node(name)
+                targets = [[node, FakeAttributeAliases.get(attributeName, attributeName)] for attributeName in (attributeNames or FakeTransformAttributes)]
+                
+            for node, attributeName in targets:
+                value = Flag(flags, 'value', 'v')
+                if value is None:
+                    value = self.getAttr("%s.%s" % (node.Name, attributeName), time=time)
+                    
+                curve = node.Curves.setdefault(attributeName, FakeCurve())
+                keyedCurves.append([node, attributeName, curve.Copy()])
+                curve.SetKey(time, value)
+                
+        self.RecordCurveUndo(keyedCurves)
+        return len(keyedCurves)
+        
+    def keyframe(self, *objects, **flags):
+        curves = self.Curves(objects, flags)
+        timeRange = TimeRange(Flag(flags, 'time', 't'))
+        
+        if Flag(flags, 'query', 'q'):
+            if Flag(flags, 'keyframeCount', 'kc'):
+                return sum([curve.Range(timeRange)[1] - curve.Range(timeRange)[0] for node, attributeName, curve in curves])
+                
+            results = []
+            for node, attributeName, curve in curves:
+                first, last = curve.Range(timeRange)
+                if Flag(flags, 'valueChange', 'vc'):
+                    results.extend(curve.Values[first:last])
+                else:
+                    results.extend(curve.Times[first:last])
+                    
+            return results or None
+            
+        if Flag(flags, 'edit', 'e'):
+            self.RecordCurveUndo(curves)
+            timeChange = Flag(flags, 'timeChange', 'tc')
+            valueChange = Flag(flags, 'valueChange', 'vc')
+            relative = Flag(flags, 'relative', 'r', False)
+            
+            for node, attributeName, curve in curves:
+                first, last = curve.Range(timeRange)
+                times = curve.Times[first:last]
+                values = curve.Values[first:last]
+                del curve.Times[first:last]
+                del curve.Values[first:last]
+                
+                if timeChange is not None:
+                    times = [time + timeChange if relative else timeChange for time in times]
+                    
+                if valueChange is not None:
+                    values = [value + valueChange if relative else valueChange for value in values]
+                    
+                for time, value in zip(times, values):
+                    curve.SetKey(time, value)
+                    
+            return len(curves)
+            
+    def findKeyframe(self, *objects, **flags):
+        '''
+        Returns the first or last key time, or the one before or after time, wrapping around like Maya
+        '''
+        times = sorted(set([time for node, attributeName, curve in self.Curves(objects, flags) for time in curve.Times]))
+        time = TimeRange(Flag(flags, 'time', 't', self.CurrentTime))[0]
+        if len(times) == 0:
+            return time
+        
+        which = Flag(flags, 'which', 'w', 'next')
+        if which == 'first':
+            return times[0]
+        
+        if which == 'last':
+            return times[-1]
+        
+        if which == 'previous':
+            return times[bisect.bisect_left(times, time) - 1]
+        
+        return times[bisect.bisect_right(times, time) % len(times)]
+    
+    def keyTangent(self, *objects, **flags):
+        '''
+        Fake curves are linear and unweighted; only queries are supported
+        '''
+        if not Flag(flags, 'query', 'q'):
+            return None
+        
+        timeRange = TimeRange(Flag(flags, 'time', 't'))
+        count = sum([curve.Range(timeRange)[1] - curve.Range(timeRange)[0] for node, attributeName, curve in self.Curves(objects, flags)])
+        if Flag(flags, 'inTangentType', 'itt') or Flag(flags, 'outTangentType', 'ott'):
+            return ['linear'] * count or None
+        
+        if Flag(flags, 'inWeight', 'iw') or Flag(flags, 'outWeight', 'ow'):
+            return [1.0] * count or None
+        
+        return [0.0] * count or None
+    
+    def cutKey(self, *objects, **flags):
+        curves = self.Curves(objects, flags)
+        timeRange = TimeRange(Flag(flags, 'time', 't'))
+        self.RecordCurveUndo(curves)
+        
+        for node, attributeName, curve in curves:
+            first, last = curve.Range(timeRange)
+            del curve.Times[first:last]
+            del curve.Values[first:last]
+            
+        return len(curves)
+        
+    def bakeResults(self, *objects, **flags):
+        '''
+        Keys every sampleBy frames in the time range, from the curves themselves
+        '''
+        startTime, endTime = TimeRange(Flag(flags, 'time', 't', tuple(self.PlaybackRange)))
+        sampleBy = Flag(flags, 'sampleBy', 'sb', 1)
+        curves = [[node, attributeName, curve] for node, attributeName, curve in self.Curves(objects, flags) if len(curve.Times) > 0]
+        self.RecordCurveUndo(curves)
+        
+        frameCount = int((endTime - startTime) // sampleBy) + 1
+        for node, attributeName, curve in curves:
+            bakedValues = [curve.Evaluate(startTime + index * sampleBy) for index in range(frameCount)]
+            for index in range(frameCount):
+                curve.SetKey(startTime + index * sampleBy, bakedValues[index])
+                
+    def xform(self, name, **flags):
+        prefix = 'translate'
+        if Flag(flags, 'rotation', 'ro'):
+            prefix = 'rotate'
+        elif Flag(flags, 'scale', 's'):
+            prefix = 'scale'
+            
+        return [self.getAttr("%s.%s%s" % (name, prefix, axis)) for axis in "XYZ"]
+        
+    # Scene and time
+    
+    def playbackOptions(self, **flags):
+        if Flag(flags, 'query', 'q'):
+            if Flag(flags, 'maxTime', 'max'):
+                return self.PlaybackRange[1]
+                
+            return self.PlaybackRange[0]
+            
+        if Flag(flags, 'minTime', 'min') is not None:
+            self.PlaybackRange[0] = Flag(flags, 'minTime', 'min')
+            
+        if Flag(flags, 'maxTime', 'max') is not None:
+            self.PlaybackRange[1] = Flag(flags, 'maxTime', 'max')
+            
+    def currentTime(self, *time, **flags):
+        if Flag(flags, 'query', 'q'):
+            return self.CurrentTime
+            
+        self.CurrentTime = time[0]
+        return self.CurrentTime
+        
+    def currentUnit(self, **flags):
+        if Flag(flags, 'query', 'q'):
+            return self.TimeUnit
+            
+        if Flag(flags, 'time', 't') is not None:
+            self.TimeUnit = Flag(flags, 'time', 't')
+            
+    def file(self, *names, **flags):
+        '''
+        Nothing is read from disk: opening a scene starts an empty one with the scene name set
+        '''
+        if Flag(flags, 'query', 'q'):
+            if Flag(flags, 'modified', 'mf'):
+                return False
+                
+            return self.SceneName
+            
+        if Flag(flags, 'rename', 'rn') is not None:
+            self.SceneName = Flag(flags, 'rename', 'rn')
+        elif Flag(flags, 'new', 'new') or Flag(flags, 'open', 'o'):
+            self.__init__()
+            if len(names) > 0:
+                self.SceneName = names[0]
+                
+    def loadPlugin(self, *names, **flags):
+        return list(names)
+        
+    def FramesPerSecond(self):
+        if self.TimeUnit in TimeUnitFramesPerSecond:
+            return TimeUnitFramesPerSecond[self.TimeUnit]
+            
+        return float(self.TimeUnit[:-3])
+        
+    def ExportFbx(self, filename):
+        '''
+        Writes the keyed nodes as an FBX 6.1 ASCII file with one take, like FBXExport
+        '''
+        self.Exports.append(filename)
+        ticksPerFrame = FbxTicksPerSecond / self.FramesPerSecond()
+        keyedNodes = [node for node in self.Nodes.values() if len(node.Curves) > 0]
+        
+        lines = ['; FBX 6.1.0 project file', '', 'FBXHeaderExtension:  {', '    FBXHeaderVersion: 1003', '    FBXVersion: 6100', '}', '',
+            'Objects:  {']
+        for node in keyedNodes:
+            rotationOrder = FbxRotationOrders.index(RotateOrders[int(node.Attributes['rotateOrder'].Value)])
+            lines += ['    Model: "Model::%s", "Limb" {' % node.Name, '        Version: 232', '        Properties60:  {',
+                '            Property: "RotationOrder", "enum", "",%d' % rotationOrder, '        }', '    }']
+            
+        localTime = '%d,%d' % (round(self.PlaybackRange[0] * ticksPerFrame), round(self.PlaybackRange[1] * ticksPerFrame))
+        lines += ['}', '', 'Takes:  {', '    Current: "%s"' % FbxDefaultTakeName, '    Take: "%s" {' % FbxDefaultTakeName,
+            '        FileName: "Take_001.tak"', '        LocalTime: %s' % localTime, '        ReferenceTime: %s' % localTime]
+            
+        for node in keyedNodes:
+            lines += ['        Model: "Model::%s" {' % node.Name, '            Version: 1.1']
+            for attributeName in sorted(node.Curves):
+                curve = node.Curves[attributeName]
+                keys = ['%d,%r,L' % (round(time * ticksPerFrame), float(value)) for time, value in zip(curve.Times, curve.Values)]
+                keyLines = [','.join(keys[index:index + FbxKeysPerLine]) for index in range(0, len(keys), FbxKeysPerLine)]
+                
+                lines += ['            Channel: "%s" {' % attributeName, '                Default: %r' % float(node.Attributes[attributeName].Value or 0),
+                    '                KeyVer: 4005', '                KeyCount: %d' % len(keys), '                Key: ']
+                lines += ['                    ' + keyLines[index] + (',' if index < len(keyLines) - 1 else '') for index in range(len(keyLines))]
+                lines += ['                Color: 1,1,1', '            }']
+                
+            lines += ['        }']
+            
+        lines += ['    }', '}', '']
+        
+        fbxFile = open(filename, 'w')
+        fbxFile.write('\n'.join(lines))
+        fbxFile.close()
+        
+    def playblast(self, **flags):
+        movieFilename = "%s.avi" % Flag(flags, 'filename', 'f')
+        open(movieFilename, 'wb').close()
+        return movieFilename
+        
+    # UI
+    
+    def UiCommand(self, controlType, *objects, **flags):
+        name = None
+        if len(objects) > 0:
+            name = objects[0]
+            
+        if Flag(flags, 'exists', 'ex'):
+            return name in self.Controls
+            
+        if Flag(flags, 'query', 'q'):
+            control = self.Controls[name]
+            for flag in flags:
+                if flag not in ['query', 'q']:
+                    return control[1].get(flag, FakeUiDefaults.get(flag))
+                    
+            return None
+            
+        if Flag(flags, 'edit', 'e'):
+            self.Controls[name][1].update(flags)
+            return name
+            
+        if name is None:
+            self.controlCount += 1
+            name = "%s%d" % (controlType, self.controlCount)
+            
+        self.Controls[name] = [controlType, flags, self.parentControl]
+        if controlType.endswith('Layout') or controlType == 'window':
+            self.parentControl = name
+            
+        return name
+        
+    def setParent(self, parent):
+        if parent == '..':
+            if self.parentControl in self.Controls:
+                self.parentControl = self.Controls[self.parentControl][2]
+        else:
+            self.parentControl = parent
+            
+        return self.parentControl
+        
+    def deleteUI(self, *names, **flags):
+        for name in FlatNames(names):
+            self.Controls.pop(name, None)
+            
+    def showWindow(self, name):
+        return name
+        
+    def evalDeferred(self, command, **flags):
+        self.Deferred.append(command)
+    
+    def Idle(self):
+        '''
+        Runs the deferred callables, including any they defer in turn
+        '''
+        while len(self.Deferred) > 0:
+            self.Deferred.pop(0)()
+
+    def confirmDialog(self, **flags):
+        self.Dialogs.append(Flag(flags, 'message', 'm'))
+        if self.DialogAnswer is not None:
+            return self.DialogAnswer
+            
+        return Flag(flags, 'dismissString', 'ds') or Flag(flags, 'button', 'b', [""])[0]
+        
+    def promptDialog(self, **flags):
+        if Flag(flags, 'query', 'q'):
+            return self.PromptText
+            
+        self.Dialogs.append(Flag(flags, 'message', 'm'))
+        if self.DialogAnswer is not None:
+            return self.DialogAnswer
+            
+        return Flag(flags, 'dismissString', 'ds') or Flag(flags, 'button', 'b', [""])[0]
+
+class FakePoseBackend:
+    '''
+    PoseSampler backend on the nodes and key curves of a FakeCmds
+    '''
+    def __init__(self, cmds):
+        self.cmds = cmds
+    
+    def Walk(self, rootJoint, descendants=True):
+        nodes = []
+        def Visit(node):
+            nodes.append(node)
+            if descendants:
+                for childName in node.Children:
+                    if self.cmds.Nodes[childName].Type == 'joint':
+                        Visit(self.cmds.Nodes[childName])
+        
+        Visit(self.cmds.Node(rootJoint))
+        return [node.Name for node in nodes], nodes
+    
+    def Valid(self, names, handles):
+        if self.cmds is not Cmds:
+            return False
+        
+        for name, node in zip(names, handles):
+            if self.cmds.Nodes.get(name) is not node:
+                return False
+        
+        return True
+    
+    def Evaluate(self, handles, frame, poses):
+        # The translate, rotate and scale attributes, in the order of PoseChannels
+        for jointIndex in range(len(handles)):
+            node = handles[jointIndex]
+            for channelIndex in range(9):
+                attributeName = FakeTransformAttributes[channelIndex]
+                curve = node.Curves.get(attributeName)
+                if curve is not None and len(curve.Times) > 0:
+                    poses[jointIndex, channelIndex] = curve.Evaluate(frame)
+                else:
+                    poses[jointIndex, channelIndex] = node.Attributes[attributeName].Value
+
+class FakeMel:
+    '''
+    Stand-in for maya.mel that understands the MEL the Sequencer evaluates
+    '''
+    FbxExportPattern = re.compile(r'\s*FBXExport\s+-f\s+"([^"]*)"')
+    
+    def __init__(self, cmds):
+        self.cmds = cmds
+        self.Evaluated = []
+        
+    def eval(self, code):
+        self.Evaluated.append(code)
+        
+        if code.strip() == '$tmp = $gMainProgressBar':
+            return 'MainProgressBar'
+            
+        match = self.FbxExportPattern.match(code)
+        if match is not None:
+            self.cmds.ExportFbx(match.group(1))
+            
+        return None
+
+if globals().get("Cmds") is None:
+    UseFakeMaya()
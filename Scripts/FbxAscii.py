@@ -0,0 +1,299 @@
+'''
+FBX ASCII reader
+
+Lazy node tree over a memory-mapped FBX200611 ASCII file. Nodes only record
+byte offsets; their values are tokenized and their children parsed the first
+time they are asked for, so large files can be opened and navigated without
+reading the parts that are not needed.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import re
+import mmap
+
+# Whitespace and ; comments between nodes
+FbxSkipPattern = re.compile(br'(?:\s+|;[^\n]*)*')
+
+# Node name followed by its colon
+FbxNamePattern = re.compile(br'([A-Za-z_][A-Za-z0-9_]*)[ \t]*:')
+
+# Things that end the value list of a node: an opening or closing brace, or a
+# line break followed by another node, a closing brace, a comment or a blank line.
+# Strings and comments are matched so that braces inside them are skipped.
+FbxValueStopPattern = re.compile(br'"[^"]*"|;[^\n]*|\{|\}|\n[ \t]*(?=[A-Za-z_][A-Za-z0-9_]*[ \t]*:|\}|;|\r?\n)')
+
+# Things that matter when matching braces
+FbxBracePattern = re.compile(br'"[^"]*"|;[^\n]*|\{|\}')
+
+# Value tokens: a quoted string or a bare word / number
+FbxValuePattern = re.compile(br'"([^"]*)"|([^,\s]+)')
+FbxIntegerPattern = re.compile(br'[-+]?\d+$')
+
+class FbxAsciiError(Exception):
+    pass
+
+def ParseFbxValue(token):
+    '''
+    Converts a bare value token to an int or float, or text for words like Y or L
+    '''
+    if FbxIntegerPattern.match(token):
+        return int(token)
+        
+    try:
+        return float(token)
+    except ValueError:
+        return token.decode("utf-8")
+
+def FindValueEnd(data, position, end):
+    '''
+    Returns the offset where the value list starting at position ends,
+    and whether it ends with the { of a node body
+    '''
+    for match in FbxValueStopPattern.finditer(data, position, end):
+        stop = data[match.start():match.start() + 1]
+        if stop == b"{":
+            return match.start(), True
+        elif stop == b"}" or stop == b"\n":
+            return match.start(), False
+            
+    return end, False
+
+def FindClosingBrace(data, position, end):
+    '''
+    Returns the offset of the } matching the { just before position
+    '''
+    level = 1
+    for match in FbxBracePattern.finditer(data, position, end):
+        brace = data[match.start():match.start() + 1]
+        if brace == b"{":
+            level += 1
+        elif brace == b"}":
+            level -= 1
+            if level == 0:
+                return match.start()
+                
+    raise FbxAsciiError("Unbalanced braces after offset %d" % position)
+
+class FbxNode:
+    '''
+    A node of the FBX tree, e.g. Take: "Take 001" { ... }
+    Offsets are into the document data; BodyStart is -1 for nodes without a body
+    '''
+    Document = None
+    Name = ""
+    LineStart = 0
+    ValueStart = 0
+    ValueEnd = 0
+    BodyStart = -1
+    BodyEnd = -1
+    End = 0
+    
+    def __init__(self, document, name, lineStart, valueStart, valueEnd, bodyStart, bodyEnd, end):
+        self.Document = document
+        self.Name = name
+        self.LineStart = lineStart
+        self.ValueStart = valueStart
+        self.ValueEnd = valueEnd
+        self.BodyStart = bodyStart
+        self.BodyEnd = bodyEnd
+        self.End = end
+        self.values = None
+        self.children = None
+        
+    def HasBody(self):
+        return self.BodyStart >= 0
+        
+    def RawValue(self):
+        '''
+        Returns the bytes of the value list, untokenized
+        '''
+        return self.Document.Data[self.ValueStart:self.ValueEnd]
+        
+    def Values(self):
+        '''
+        Returns the tokenized values; strings and words as text, numbers as int or float
+        '''
+        if self.values is None:
+            self.values = []
+            for match in FbxValuePattern.finditer(self.RawValue()):
+                if match.group(1) is not None:
+                    self.values.append(match.group(1).decode("utf-8"))
+                else:
+                    self.values.append(ParseFbxValue(match.group(2)))
+                    
+        return self.values
+        
+    def Value(self, default=None):
+        '''
+        Returns the first value, or default if there is none
+        '''
+        values = self.Values()
+        if len(values) == 0:
+            return default
+            
+        return values[0]
+        
+    def Children(self):
+        if self.children is None:
+            if self.HasBody():
+                self.children = list(ParseFbxNodes(self.Document, self.BodyStart, self.BodyEnd))
+            else:
+                self.children = []
+                
+        return self.children
+        
+    def FindAll(self, name, value=None):
+        '''
+        Returns the children called name, optionally only those whose first value is value
+        '''
+        return [child for child in self.Children() if child.Name == name and (value is None or child.Value() == value)]
+        
+    def Find(self, name, value=None):
+        '''
+        Returns the first child called name (and first value value), or None
+        '''
+        for child in self.Children():
+            if child.Name == name and (value is None or child.Value() == value):
+                return child
+                
+        return None
+
+def ParseFbxNode(document, position, end, topLevel=False):
+    '''
+    Parses the node that starts at position (after any whitespace)
+    Top level nodes end at the first } in column 0, so their bodies are skipped
+    without being tokenized; nested nodes are matched by counting braces
+    '''
+    data = document.Data
+    
+    match = FbxNamePattern.match(data, position, end)
+    if match is None:
+        raise FbxAsciiError("Expected a node name at offset %d" % position)
+        
+    name = match.group(1).decode("utf-8")
+    lineStart = data.rfind(b"\n", 0, position) + 1
+    valueStart = match.end()
+    valueEnd, hasBody = FindValueEnd(data, valueStart, end)
+    
+    if not hasBody:
+        return FbxNode(document, name, lineStart, valueStart, valueEnd, -1, -1, valueEnd)
+        
+    bodyStart = valueEnd + 1
+    if topLevel:
+        bodyEnd = data.find(b"\n}", bodyStart, end)
+        if bodyEnd < 0:
+            raise FbxAsciiError("Node %s at offset %d is not closed" % (name, position))
+            
+        bodyEnd += 1
+    else:
+        bodyEnd = FindClosingBrace(data, bodyStart, end)
+        
+    return FbxNode(document, name, lineStart, valueStart, valueEnd, bodyStart, bodyEnd, bodyEnd + 1)
+
+def ParseFbxNodes(document, position, end, topLevel=False):
+    '''
+    Yields the nodes between position and end, one level deep
+    '''
+    data = document.Data
+    while True:
+        position = FbxSkipPattern.match(data, position, end).end()
+        if position >= end:
+            return
+            
+        node = ParseFbxNode(document, position, end, topLevel)
+        yield node
+        position = node.End
+
+class FbxDocument:
+    '''
+    An FBX ASCII file opened for reading, e.g.
+    
+        document = FbxDocument("Master.fbx")
+        take = document.Find("Takes").Find("Take", "Take 001")
+        document.Close()
+    '''
+    Filename = ""
+    Data = None
+    Size = 0
+    
+    def __init__(self, filename=None, data=None):
+        self.Filename = filename
+        self.file = None
+        self.map = None
+        self.children = None
+        
+        if data is not None:
+            self.Data = data
+            self.Size = len(data)
+            return
+            
+        self.file = open(filename, "rb")
+        self.Size = os.fstat(self.file.fileno()).st_size
+        if self.Size == 0:
+            self.Data = b""
+        else:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.Data = self.map
+            
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, exceptionType, exceptionValue, traceback):
+        self.Close()
+        
+    def Close(self):
+        self.Data = None
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+            
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            
+    def Children(self):
+        '''
+        Returns the top level nodes
+        '''
+        if self.children is None:
+            self.children = list(ParseFbxNodes(self, 0, self.Size, True))
+            
+        return self.children
+        
+    def Find(self, name):
+        '''
+        Returns the top level node called name, or None
+        Searches backwards for the name in column 0, which reaches the sections at
+        the end of the file (like Takes) without looking at the rest of it
+        '''
+        if self.children is not None:
+            for child in self.children:
+                if child.Name == name:
+                    return child
+                    
+            return None
+            
+        nameBytes = name.encode("utf-8")
+        position = self.Data.rfind(b"\n" + nameBytes + b":")
+        if position >= 0:
+            return ParseFbxNode(self, position + 1, self.Size, True)
+            
+        nameMatch = FbxNamePattern.match(self.Data, 0, self.Size)
+        if nameMatch is not None and nameMatch.group(1) == nameBytes:
+            return ParseFbxNode(self, 0, self.Size, True)
+            
+        return None
+        
+    def FindTake(self, takeName):
+        '''
+        Returns the Take node called takeName, or None
+        '''
+        takes = self.Find("Takes")
+        if takes is None:
+            return None
+            
+        return takes.Find("Take", takeName)
@@ -0,0 +1,321 @@
+'''
+FBX binary writer
+
+Writes binary FBX 6.1 files node by node, so a file can be streamed out
+without building it in memory first. FBX 6.1 has no array properties, so
+numeric lists (vertices, indices) get one property per element.
+
+ConvertFbxToBinary streams an FBX 6.1 ASCII file, like the stitched master,
+into binary FBX 6.1, the same node tree in the other encoding. Nothing is
+translated to the FBX 7 object and connection graph: the takes keep their
+Model, Channel and Key nodes, and every key keeps its record, time (int64),
+value, interpolation and tangent flags (chars) and tangent data (doubles), so
+linear keys stay linear.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import struct
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxAscii import *
+    from FbxStitcher import *
+    from FbxCurves import *
+except ImportError:
+    pass
+
+FbxBinaryVersion = 6100
+FbxBinaryMagic = b"Kaydara FBX Binary  \x00\x1a\x00"
+FbxBinaryFooterId = b"\xfa\xbc\xab\x09\xd0\xc8\xd4\x66\xb1\x76\xfb\x83\x1c\xf7\x26\x7e"
+FbxBinaryFooterMagic = b"\xf8\x5a\x8c\x6a\xde\xf5\xd9\x7e\xec\xe9\x0c\xe3\x75\x8f\x29\x0b"
+
+# ASCII value lists longer than this many bytes are checked for being all numbers
+FbxNumericArrayThreshold = 256
+
+FbxScalarTypeCodes = {"f8": b"D", "f4": b"F", "i8": b"L", "i4": b"I", "b1": b"C"}
+
+# ASCII nodes whose whole numbers are doubles or KTime (int64) in the binary file
+FbxDoubleNodes = ["Default", "Color"]
+
+FbxTimeNodes = ["LocalTime", "ReferenceTime"]
+
+# Property types (the second value of a 6.1 Property) whose values are doubles or KTime
+FbxDoublePropertyTypes = ["double", "Number", "Real", "Float", "Vector", "Vector3D", "ColorRGB", "Color", "Lcl Translation",
+    "Lcl Rotation", "Lcl Scaling", "Visibility"]
+
+FbxTimePropertyTypes = ["KTime"]
+
+class FbxChar:
+    '''
+    A one character property, like the interpolation flags of FBX 6.1 keys
+    '''
+    Character = b""
+    
+    def __init__(self, character):
+        self.Character = FbxBytes(character)[:1]
+
+class FbxBinaryWriter:
+    '''
+    Streams nodes into a binary FBX file, e.g.
+    
+        writer = FbxBinaryWriter("Master.fbx")
+        writer.BeginNode("Takes")
+        writer.WriteNode("Current", ["Run"])
+        writer.EndNode()
+        writer.Close()
+        
+    Node lengths are patched in when each node ends, so the file must be seekable
+    '''
+    Filename = ""
+    Version = FbxBinaryVersion
+    
+    def __init__(self, filename, version=FbxBinaryVersion):
+        self.Filename = filename
+        self.Version = version
+        self.stack = []
+        
+        self.offsetFormat = "<I"
+        self.headerFormat = "<III"
+        self.nullRecord = b"\x00" * (struct.calcsize(self.headerFormat) + 1)
+        
+        self.file = open(filename, "wb")
+        self.file.write(FbxBinaryMagic + struct.pack("<I", version))
+        
+    def ArrayType(self, array):
+        dtypeKey = "%s%d" % (array.dtype.kind, array.dtype.itemsize)
+        if array.dtype.kind == "b":
+            dtypeKey = "b1"
+            
+        if dtypeKey not in FbxScalarTypeCodes:
+            raise ValueError("Unsupported array type %s" % array.dtype)
+            
+        return dtypeKey
+    
+    def EncodeScalars(self, array):
+        '''
+        Encodes the elements of array as one property each
+        '''
+        array = Numpy.ascontiguousarray(array)
+        dtypeKey = self.ArrayType(array)
+        
+        records = Numpy.empty((len(array), 1 + array.dtype.itemsize), dtype=Numpy.uint8)
+        records[:, 0] = ord(FbxScalarTypeCodes[dtypeKey])
+        records[:, 1:] = array.astype(array.dtype.newbyteorder("<")).view(Numpy.uint8).reshape(len(array), array.dtype.itemsize)
+        return records.tobytes()
+    
+    def EncodeProperty(self, value):
+        '''
+        Encodes one property: bool, FbxChar, int (int64 NumPy scalars as L), float or text/bytes
+        '''
+        if isinstance(value, bool):
+            return b"C" + struct.pack("<B", value)
+            
+        if isinstance(value, FbxChar):
+            return b"C" + value.Character
+        
+        if Numpy is not None and isinstance(value, Numpy.int64):
+            return b"L" + struct.pack("<q", value)
+        
+        if isinstance(value, float):
+            return b"D" + struct.pack("<d", value)
+            
+        if hasattr(value, "__index__"):
+            value = int(value)
+            if -(1 << 31) <= value < (1 << 31):
+                return b"I" + struct.pack("<i", value)
+                
+            return b"L" + struct.pack("<q", value)
+            
+        value = FbxBytes(value)
+        return b"S" + struct.pack("<I", len(value)) + value
+        
+    def BeginNode(self, name, properties=()):
+        propertyCount = 0
+        encodedProperties = []
+        for value in properties:
+            # FBX 6.1 has no array properties, the elements are written one by one
+            if Numpy is not None and isinstance(value, Numpy.ndarray):
+                encodedProperties.append(self.EncodeScalars(value))
+                propertyCount += len(value)
+            else:
+                encodedProperties.append(self.EncodeProperty(value))
+                propertyCount += 1
+        
+        self.BeginEncodedNode(name, propertyCount, b"".join(encodedProperties))
+    
+    def BeginEncodedNode(self, name, propertyCount, encodedProperties):
+        '''
+        Begins a node whose propertyCount properties are already encoded
+        '''
+        if len(self.stack) > 0:
+            self.stack[-1][1] = True
+            
+        nameBytes = FbxBytes(name)
+        
+        recordStart = self.file.tell()
+        self.file.write(struct.pack(self.headerFormat, 0, propertyCount, len(encodedProperties)))
+        self.file.write(struct.pack("<B", len(nameBytes)) + nameBytes)
+        self.file.write(encodedProperties)
+        
+        self.stack.append([recordStart, False, propertyCount > 0])
+        
+    def EndNode(self):
+        recordStart, hasChildren, hasProperties = self.stack.pop()
+        if hasChildren or not hasProperties:
+            self.file.write(self.nullRecord)
+            
+        recordEnd = self.file.tell()
+        self.file.seek(recordStart)
+        self.file.write(struct.pack(self.offsetFormat, recordEnd))
+        self.file.seek(recordEnd)
+        
+    def WriteNode(self, name, properties=()):
+        self.BeginNode(name, properties)
+        self.EndNode()
+        
+    def Close(self):
+        '''
+        Ends any open nodes and writes the footer
+        '''
+        if self.file is None:
+            return
+            
+        while len(self.stack) > 0:
+            self.EndNode()
+            
+        self.file.write(self.nullRecord)
+        self.file.write(FbxBinaryFooterId)
+        self.file.write(b"\x00" * 4)
+        
+        # Pad to 16 bytes, a full 16 if already aligned
+        padding = 16 - (self.file.tell() % 16)
+        self.file.write(b"\x00" * padding)
+        
+        self.file.write(struct.pack("<I", self.Version))
+        self.file.write(b"\x00" * 120)
+        self.file.write(FbxBinaryFooterMagic)
+        
+        self.file.close()
+        self.file = None
+
+def NumericArray(rawValue):
+    '''
+    Returns rawValue as an int or float NumPy array if it is a long list of
+    numbers only, otherwise None
+    '''
+    if len(rawValue) < FbxNumericArrayThreshold:
+        return None
+        
+    compactValue = bytes(rawValue).translate(None, b" \t\r\n")
+    if len(compactValue) == 0 or len(compactValue.translate(None, b"0123456789+-.eE,")) > 0:
+        return None
+        
+    tokens = Numpy.array(compactValue.split(b","))
+    if len(compactValue.translate(None, b"0123456789+-,")) == 0:
+        values = tokens.astype(Numpy.int64)
+        if values.min() >= -(1 << 31) and values.max() < (1 << 31):
+            return values.astype(Numpy.int32)
+            
+        return values
+        
+    return tokens.astype(Numpy.float64)
+
+def EncodeKeyRecords(rawKeys):
+    '''
+    Returns the property count and encoded properties of the raw value of a 6.1 Key node: the time
+    of every key as L, its value and tangent data as D and its interpolation and tangent flags as C
+    '''
+    tokens, starts = SplitKeyRecords(rawKeys)
+    if len(starts) == 0:
+        return 0, b""
+    
+    isTime = Numpy.zeros(len(tokens), dtype=bool)
+    isTime[starts] = True
+    firstBytes = tokens.view(Numpy.uint8).reshape(len(tokens), tokens.dtype.itemsize)[:, 0]
+    isFlag = ((firstBytes >= ord("A")) & (firstBytes <= ord("Z"))) | ((firstBytes >= ord("a")) & (firstBytes <= ord("z")))
+    isNumber = ~isTime & ~isFlag
+    
+    sizes = Numpy.where(isFlag, 2, 9)
+    offsets = Numpy.concatenate([[0], Numpy.cumsum(sizes)[:-1]])
+    encoded = Numpy.zeros(int(sizes.sum()), dtype=Numpy.uint8)
+    
+    encoded[offsets[isFlag]] = ord("C")
+    encoded[offsets[isFlag] + 1] = firstBytes[isFlag]
+    
+    for mask, typeCode, values in [[isTime, b"L", tokens[isTime].astype(Numpy.int64).astype("<i8")],
+        [isNumber, b"D", tokens[isNumber].astype(Numpy.float64).astype("<f8")]]:
+        encoded[offsets[mask]] = ord(typeCode)
+        encoded[(offsets[mask] + 1)[:, None] + Numpy.arange(8)] = values.view(Numpy.uint8).reshape(len(values), 8)
+    
+    return len(tokens), encoded.tobytes()
+
+def TypedValues(node):
+    '''
+    Returns the values of an ASCII node with the whole numbers that stand for doubles or KTime
+    converted, the way the binary format stores them
+    '''
+    values = list(node.Values())
+    first = len(values)
+    numberType = None
+    if node.Name in FbxDoubleNodes:
+        first = 0
+        numberType = float
+    elif node.Name in FbxTimeNodes:
+        first = 0
+        numberType = Numpy.int64
+    elif node.Name == "Property" and len(values) > 3:
+        first = 3
+        if values[1] in FbxDoublePropertyTypes:
+            numberType = float
+        elif values[1] in FbxTimePropertyTypes:
+            numberType = Numpy.int64
+    
+    if numberType is None:
+        return values
+    
+    return values[:first] + [numberType(value) if isinstance(value, (int, float)) else value for value in values[first:]]
+
+def WriteBinaryNode(writer, node):
+    '''
+    Writes node and its children, converting the values of the ASCII node
+    '''
+    if node.Name == "Key":
+        propertyCount, encodedProperties = EncodeKeyRecords(node.RawValue())
+        writer.BeginEncodedNode(node.Name, propertyCount, encodedProperties)
+        writer.EndNode()
+        return
+        
+    array = NumericArray(node.RawValue())
+    if array is not None:
+        writer.BeginNode(node.Name, [array])
+    else:
+        writer.BeginNode(node.Name, TypedValues(node))
+    
+    for childNode in node.Children():
+        WriteBinaryNode(writer, childNode)
+        
+    writer.EndNode()
+
+def ConvertFbxToBinary(asciiFilename, binaryFilename):
+    '''
+    Streams the FBX 6.1 ASCII file asciiFilename into the binary FBX 6.1 file binaryFilename
+    Only one top level node is parsed at a time
+    '''
+    RequireNumpy()
+    
+    document = FbxDocument(asciiFilename)
+    writer = FbxBinaryWriter(binaryFilename, FbxBinaryVersion)
+    try:
+        for node in ParseFbxNodes(document, 0, document.Size, True):
+            WriteBinaryNode(writer, node)
+    finally:
+        writer.Close()
+        document.Close()
@@ -0,0 +1,291 @@
+'''
+FBX take curves
+
+Decodes the Channel/Key blocks of FBX 6.1 takes into NumPy arrays, one time
+array (FBX ticks) and one value array per channel. The key lists are split and
+converted by NumPy as a whole instead of token by token.
+
+The same key splitting is used to cut a take exported once for the whole
+timeline into one take per animation.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxAscii import *
+    from FbxStitcher import *
+except ImportError:
+    pass
+
+FbxTicksPerSecond = 46186158000
+
+# Interpolation codes that follow the time and value of every key
+FbxKeyInterpolations = [b"C", b"L", b"U"]
+
+# Keys written per line when a Key node is rewritten
+FbxKeysPerLine = 4
+
+def RequireNumpy():
+    if Numpy is None:
+        raise ImportError("NumPy is required for FBX curve processing")
+
+def FramesToTicks(frames, framesPerSecond):
+    return Numpy.round(Numpy.asarray(frames, dtype=Numpy.float64) * FbxTicksPerSecond / framesPerSecond).astype(Numpy.int64)
+
+def TicksToFrames(ticks, framesPerSecond):
+    return Numpy.asarray(ticks, dtype=Numpy.float64) * framesPerSecond / FbxTicksPerSecond
+
+class FbxCurve:
+    '''
+    The keys of one channel of a take, e.g. Model::Hips Transform/T/X
+    '''
+    Model = ""
+    Channel = ""
+    Times = None
+    Values = None
+    Default = 0.0
+    Node = None
+    
+    def __init__(self, model, channel, times, values, default=0.0, node=None):
+        self.Model = model
+        self.Channel = channel
+        self.Times = times
+        self.Values = values
+        self.Default = default
+        self.Node = node
+        
+    def Name(self):
+        return "%s/%s" % (self.Model, self.Channel)
+        
+    def Count(self):
+        return len(self.Times)
+
+def SplitKeyRecords(rawKeys):
+    '''
+    Splits the raw value of a Key node into an array of tokens and the index of
+    the first token (the time) of every key. A key is time, value, then an
+    interpolation code (C, L or U) followed by a variable number of extras.
+    '''
+    RequireNumpy()
+    
+    compactKeys = bytes(rawKeys).translate(None, b" \t\r\n")
+    if len(compactKeys) == 0:
+        return Numpy.array([], dtype="S1"), Numpy.array([], dtype=Numpy.intp)
+        
+    tokens = Numpy.array(compactKeys.split(b","))
+    
+    firstBytes = tokens.view(Numpy.uint8).reshape(len(tokens), tokens.dtype.itemsize)[:, 0]
+    isWord = ((firstBytes >= ord("A")) & (firstBytes <= ord("Z"))) | ((firstBytes >= ord("a")) & (firstBytes <= ord("z")))
+    isInterpolation = Numpy.zeros(len(tokens), dtype=bool)
+    for interpolation in FbxKeyInterpolations:
+        isInterpolation |= tokens == interpolation
+        
+    isStart = ~isWord[:-2] & ~isWord[1:-1] & isInterpolation[2:]
+    return tokens, Numpy.flatnonzero(isStart)
+
+def DecodeKeys(rawKeys, keyCount=None):
+    '''
+    Returns the times (int64 ticks) and values (float64) of the raw value of a Key node
+    '''
+    tokens, starts = SplitKeyRecords(rawKeys)
+    if keyCount is not None and len(starts) != keyCount:
+        raise FbxAsciiError("Expected %d keys, found %d" % (keyCount, len(starts)))
+        
+    return tokens[starts].astype(Numpy.int64), tokens[starts + 1].astype(Numpy.float64)
+
+def ChannelNodes(channelNode, path):
+    '''
+    Yields [path, channelNode] for channelNode and its sub-channels that have keys
+    '''
+    if len(path) > 0:
+        path = path + "/" + channelNode.Value("")
+    else:
+        path = channelNode.Value("")
+        
+    if channelNode.Find("Key") is not None or channelNode.Find("KeyCount") is not None:
+        yield path, channelNode
+        
+    for childNode in channelNode.FindAll("Channel"):
+        for childPath, childChannelNode in ChannelNodes(childNode, path):
+            yield childPath, childChannelNode
+
+def KeyedChannels(takeNode):
+    '''
+    Yields [model, path, channelNode] for every channel with keys in takeNode, in file order
+    '''
+    for modelNode in takeNode.FindAll("Model"):
+        for channelNode in modelNode.FindAll("Channel"):
+            for path, keyedChannelNode in ChannelNodes(channelNode, ""):
+                yield modelNode.Value(""), path, keyedChannelNode
+
+def ChannelCurve(model, path, channelNode):
+    keyNode = channelNode.Find("Key")
+    keyCountNode = channelNode.Find("KeyCount")
+    
+    keyCount = None
+    if keyCountNode is not None:
+        keyCount = keyCountNode.Value()
+        
+    if keyNode is not None:
+        times, values = DecodeKeys(keyNode.RawValue(), keyCount)
+    else:
+        times, values = Numpy.zeros(0, Numpy.int64), Numpy.zeros(0, Numpy.float64)
+        
+    defaultNode = channelNode.Find("Default")
+    default = 0.0
+    if defaultNode is not None:
+        default = defaultNode.Value(0.0)
+        
+    return FbxCurve(model, path, times, values, default, channelNode)
+
+def TakeCurves(takeNode):
+    '''
+    Returns the FbxCurves of every model in takeNode, in file order
+    '''
+    RequireNumpy()
+    
+    return [ChannelCurve(model, path, channelNode) for model, path, channelNode in KeyedChannels(takeNode)]
+
+def FindTakeNode(document, takeName=None):
+    '''
+    Returns the take called takeName, or for a generated per-animation file
+    (takeName None) the take at the range found by the stitcher
+    '''
+    if takeName is not None:
+        takeNode = document.FindTake(takeName)
+        if takeNode is None:
+            raise FbxAsciiError("Take \"%s\" not found in %s" % (takeName, document.Filename))
+            
+        return takeNode
+        
+    # Scanned in the mapped document; readers do not leave a take index next to the file
+    takeRange = ScanTakeRange(document.Data, document.Size)
+    position = FbxSkipPattern.match(document.Data, takeRange.HeaderEnd, takeRange.FooterStart).end()
+    return ParseFbxNode(document, position, takeRange.FooterStart)
+
+def ReadTakeCurves(filename, takeName=None):
+    '''
+    Reads the curves of a take of filename into NumPy arrays, e.g.
+    
+        for curve in ReadTakeCurves("Run.fbx"):
+            print(curve.Name(), curve.Times, curve.Values)
+    '''
+    document = FbxDocument(filename)
+    try:
+        curves = TakeCurves(FindTakeNode(document, takeName))
+    finally:
+        document.Close()
+        
+    for curve in curves:
+        curve.Node = None
+        
+    return curves
+
+def ValueLineEnding(node):
+    '''
+    Returns what ends the value of node before its line break (a carriage return
+    in CRLF files) and the line break itself
+    '''
+    if node.RawValue().endswith(b"\r"):
+        return b"\r", b"\r\n"
+        
+    return b"", b"\n"
+
+def KeyIndent(keyNode):
+    '''
+    Returns the indentation of the key lines of keyNode
+    '''
+    data = keyNode.Document.Data
+    
+    rawKeys = keyNode.RawValue()
+    lineBreak = rawKeys.find(b"\n")
+    if lineBreak >= 0:
+        keys = rawKeys[lineBreak + 1:]
+        return keys[:len(keys) - len(keys.lstrip(b" \t"))]
+        
+    line = data[keyNode.LineStart:keyNode.ValueStart]
+    return line[:len(line) - len(line.lstrip(b" \t"))] + b"    "
+
+def FormatKeys(tokens, starts, first, last, times, indent, lineBreak):
+    '''
+    Returns the keys [first, last) as the value of a Key node, with their times replaced by times
+    '''
+    if last <= first:
+        return b""
+        
+    tokenStart = starts[first]
+    if last < len(starts):
+        tokenEnd = starts[last]
+    else:
+        tokenEnd = len(tokens)
+        
+    keyTokens = tokens[tokenStart:tokenEnd].astype("S%d" % max(tokens.dtype.itemsize, 20))
+    keyStarts = starts[first:last] - tokenStart
+    keyTokens[keyStarts] = Numpy.asarray(times, dtype=Numpy.int64).astype("S20")
+    
+    pieces = keyTokens.tolist()
+    lineStarts = keyStarts[::FbxKeysPerLine].tolist() + [len(pieces)]
+    lines = [b",".join(pieces[lineStarts[i]:lineStarts[i + 1]]) for i in range(len(lineStarts) - 1)]
+    
+    return lineBreak + indent + (b"," + lineBreak + indent).join(lines)
+
+def SplitFbxTakes(sourceFilename, splits, framesPerSecond):
+    '''
+    Cuts the take of sourceFilename, exported once for the whole timeline, into one file per split
+    splits is a list of [filename, startFrame, endFrame]; like the per-animation export (an inclusive
+    cutKey up to startFrame and from endFrame, then a shift by -startFrame) the keys strictly inside
+    (startFrame, endFrame) are kept and moved by -startFrame, and LocalTime and ReferenceTime stay
+    the playback range they were exported with; everything outside the take is copied as is
+    All the files are written in a single pass over the source
+    '''
+    RequireNumpy()
+    
+    document = FbxDocument(sourceFilename)
+    writers = []
+    try:
+        takeNode = FindTakeNode(document)
+        bounds = FramesToTicks([[split[1], split[2]] for split in splits], framesPerSecond).reshape(len(splits), 2)
+        
+        sourceFd = document.file.fileno()
+        for split in splits:
+            writers.append(FbxPatchWriter(sourceFd, split[0]))
+            
+        for model, path, channelNode in KeyedChannels(takeNode):
+            keyNode = channelNode.Find("Key")
+            keyCountNode = channelNode.Find("KeyCount")
+            if keyNode is None or keyCountNode is None:
+                continue
+                
+            tokens, starts = SplitKeyRecords(keyNode.RawValue())
+            times = tokens[starts].astype(Numpy.int64)
+            firsts = Numpy.searchsorted(times, bounds[:, 0], "right")
+            lasts = Numpy.searchsorted(times, bounds[:, 1], "left")
+            
+            valueEnd, lineBreak = ValueLineEnding(keyNode)
+            indent = KeyIndent(keyNode)
+            for splitIndex in range(len(splits)):
+                first = int(firsts[splitIndex])
+                last = int(lasts[splitIndex])
+                
+                keys = FormatKeys(tokens, starts, first, last, times[first:last] - bounds[splitIndex, 0], indent, lineBreak)
+                patches = [[keyCountNode.ValueStart, keyCountNode.ValueEnd, b" %d%s" % (max(last - first, 0), valueEnd)],
+                    [keyNode.ValueStart, keyNode.ValueEnd, b" " + keys + valueEnd]]
+                    
+                for start, end, replacement in sorted(patches):
+                    writers[splitIndex].Patch(start, end, replacement)
+                    
+        for writer in writers:
+            writer.Finish(document.Size)
+    finally:
+        for writer in writers:
+            writer.Close()
+            
+        document.Close()
@@ -0,0 +1,282 @@
+'''
+FBX key reduction
+
+Baking puts a key on every frame of every joint channel. Before a take is stitched,
+the keys that linear interpolation between their neighbours reproduces
+within a tolerance are removed (Ramer-Douglas-Peucker), with separate
+tolerances for translation, rotation and scale channels. The kept keys are
+written as linear keys, so the error bound holds in the engine too.
+
+All the channels of a take are reduced together: each pass finds the worst
+key of every open segment of every channel at once with NumPy, and splits
+the segments that are still out of tolerance, so there are about as many
+passes as the deepest split, not one per key. The first and last key of a
+channel are always kept, so a channel that stays within its tolerance over the
+whole take is left with two; StripStaticChannels collapses those to one key.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import tempfile
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxAscii import *
+    from FbxStitcher import *
+    from FbxCurves import *
+except ImportError:
+    pass
+
+# Largest error allowed per channel kind: translation in scene units, rotation in degrees, scale as a factor
+ReductionTolerances = {"T": 0.01, "R": 0.05, "S": 0.001}
+
+# Channels named after Maya attributes (translateX...) rather than Transform/T/X
+ReductionChannelPrefixes = [["translate", "T"], ["rotate", "R"], ["scale", "S"]]
+
+# Channels of other kinds only lose keys that lie exactly on the line between their neighbours
+ReductionDefaultTolerance = 0.0
+
+def ChannelTolerance(channel, tolerances):
+    '''
+    Returns the tolerance of a channel path such as Transform/R/X (or rotateX), by its T, R or S part
+    '''
+    for part in channel.split("/"):
+        if part in tolerances:
+            return tolerances[part]
+            
+        for prefix, kind in ReductionChannelPrefixes:
+            if part.startswith(prefix) and kind in tolerances:
+                return tolerances[kind]
+                
+    return ReductionDefaultTolerance
+
+def ParseTolerances(text):
+    '''
+    Returns the tolerances of text such as "T=0.01,R=0.05,S=0.001", on top of ReductionTolerances
+    '''
+    tolerances = dict(ReductionTolerances)
+    for item in text.split(","):
+        if len(item.strip()) == 0:
+            continue
+            
+        kind, separator, value = item.partition("=")
+        if len(separator) == 0:
+            raise ValueError("Tolerance %s is not kind=value" % item.strip())
+            
+        tolerances[kind.strip()] = float(value)
+        
+    return tolerances
+
+def ReduceKeyMasks(times, values, offsets, tolerances):
+    '''
+    Returns which keys to keep, for the keys of many channels concatenated in times and values
+    Channel i has the keys offsets[i] to offsets[i + 1] and the tolerance tolerances[i]
+    The first and last key of every channel are always kept
+    '''
+    RequireNumpy()
+    
+    times = Numpy.asarray(times, dtype=Numpy.float64)
+    values = Numpy.asarray(values, dtype=Numpy.float64)
+    offsets = Numpy.asarray(offsets, dtype=Numpy.int64)
+    
+    keep = Numpy.zeros(len(times), dtype=bool)
+    counts = Numpy.diff(offsets)
+    keep[offsets[:-1][counts > 0]] = True
+    keep[offsets[1:][counts > 0] - 1] = True
+    
+    # Open segments, as their first and last key and their channel's tolerance
+    isOpen = counts > 2
+    segmentStarts = offsets[:-1][isOpen]
+    segmentEnds = offsets[1:][isOpen] - 1
+    segmentTolerances = Numpy.asarray(tolerances, dtype=Numpy.float64)[isOpen]
+    
+    while len(segmentStarts) > 0:
+        interiorCounts = segmentEnds - segmentStarts - 1
+        segments = Numpy.repeat(Numpy.arange(len(segmentStarts)), interiorCounts)
+        interiorStarts = Numpy.cumsum(interiorCounts) - interiorCounts
+        keys = segmentStarts[segments] + 1 + Numpy.arange(len(segments)) - interiorStarts[segments]
+        
+        # Distance of every interior key from the line between its segment's ends
+        startTimes, endTimes = times[segmentStarts][segments], times[segmentEnds][segments]
+        startValues, endValues = values[segmentStarts][segments], values[segmentEnds][segments]
+        spans = endTimes - startTimes
+        fractions = Numpy.where(spans > 0, (times[keys] - startTimes) / Numpy.where(spans > 0, spans, 1), 0)
+        errors = Numpy.abs(values[keys] - (startValues + (endValues - startValues) * fractions))
+        
+        worstErrors = Numpy.maximum.reduceat(errors, interiorStarts)
+        # Keys are in segment order, so the first worst key of a segment is where the segment changes
+        worstIndices = Numpy.flatnonzero(errors == worstErrors[segments])
+        worstSegments = segments[worstIndices]
+        isFirst = Numpy.concatenate([[True], worstSegments[1:] != worstSegments[:-1]])
+        worstKeys = keys[worstIndices[isFirst]]
+        
+        split = worstErrors > segmentTolerances
+        keep[worstKeys[split]] = True
+        
+        starts = Numpy.concatenate([segmentStarts[split], worstKeys[split]])
+        ends = Numpy.concatenate([worstKeys[split], segmentEnds[split]])
+        splitTolerances = Numpy.concatenate([segmentTolerances[split], segmentTolerances[split]])
+        
+        isOpen = ends - starts > 1
+        segmentStarts, segmentEnds, segmentTolerances = starts[isOpen], ends[isOpen], splitTolerances[isOpen]
+        
+    return keep
+
+def FormatLinearKeys(timeTokens, valueTokens, indent, lineBreak):
+    '''
+    Returns keys as the value of a Key node, all with linear interpolation
+    '''
+    records = [time + b"," + value + b",L" for time, value in zip(timeTokens, valueTokens)]
+    lines = [b",".join(records[first:first + FbxKeysPerLine]) for first in range(0, len(records), FbxKeysPerLine)]
+    return lineBreak + indent + (b"," + lineBreak + indent).join(lines)
+
+def StaticChannelMask(values, offsets, tolerances):
+    '''
+    Returns which channels vary by no more than their tolerance, for the keys of many channels
+    concatenated as in ReduceKeyMasks; channels without keys are not static
+    '''
+    RequireNumpy()
+    
+    values = Numpy.asarray(values, dtype=Numpy.float64)
+    offsets = Numpy.asarray(offsets, dtype=Numpy.int64)
+    
+    counts = Numpy.diff(offsets)
+    static = Numpy.zeros(len(counts), dtype=bool)
+    if (counts > 0).any():
+        # Empty channels add no keys, so the starts of the others bound their keys
+        starts = offsets[:-1][counts > 0]
+        ranges = Numpy.maximum.reduceat(values, starts) - Numpy.minimum.reduceat(values, starts)
+        static[counts > 0] = ranges <= Numpy.asarray(tolerances, dtype=Numpy.float64)[counts > 0]
+        
+    return static
+
+def RewriteFbxKeys(filename, outputFilename, takeName, tolerances, rewrite):
+    '''
+    Calls rewrite(channels, offsets, times, values) with the keyed channels of a take of filename, as
+    [model, path, channelNode, keyNode, keyCountNode, tokens, starts, tolerance], and their keys concatenated
+    rewrite returns [start, end, replacement] patches, written in place or to outputFilename, and a result
+    Returns the result
+    '''
+    RequireNumpy()
+    
+    if tolerances is None:
+        tolerances = ReductionTolerances
+        
+    if outputFilename is None:
+        outputFilename = filename
+        
+    patches = []
+    document = FbxDocument(filename)
+    try:
+        takeNode = FindTakeNode(document, takeName)
+        
+        channels = []
+        for model, path, channelNode in KeyedChannels(takeNode):
+            keyNode = channelNode.Find("Key")
+            keyCountNode = channelNode.Find("KeyCount")
+            if keyNode is None or keyCountNode is None:
+                continue
+                
+            tokens, starts = SplitKeyRecords(keyNode.RawValue())
+            channels.append([model, path, channelNode, keyNode, keyCountNode, tokens, starts, ChannelTolerance(path, tolerances)])
+            
+        offsets = Numpy.cumsum([0] + [len(channel[6]) for channel in channels])
+        times = Numpy.concatenate([Numpy.zeros(0, Numpy.int64)] + [tokens[starts].astype(Numpy.int64) for model, path, channelNode, keyNode, keyCountNode, tokens, starts, tolerance in channels])
+        values = Numpy.concatenate([Numpy.zeros(0)] + [tokens[starts + 1].astype(Numpy.float64) for model, path, channelNode, keyNode, keyCountNode, tokens, starts, tolerance in channels])
+        patches, result = rewrite(channels, offsets, times, values)
+        
+        if len(patches) > 0:
+            outputDirectory = os.path.dirname(os.path.abspath(outputFilename))
+            temporaryFd, temporaryFilename = tempfile.mkstemp(suffix=".fbx", dir=outputDirectory)
+            os.close(temporaryFd)
+            
+            written = False
+            writer = FbxPatchWriter(document.file.fileno(), temporaryFilename)
+            try:
+                for start, end, replacement in sorted(patches):
+                    writer.Patch(start, end, replacement)
+                    
+                writer.Finish(document.Size)
+                written = True
+            finally:
+                writer.Close()
+                if not written:
+                    os.remove(temporaryFilename)
+    finally:
+        document.Close()
+        
+    # The source is closed first, Windows cannot replace a file that is mapped
+    if len(patches) > 0:
+        ReplaceFile(temporaryFilename, outputFilename)
+        
+    return result
+
+def KeyPatches(keyNode, keyCountNode, keyCount, keys):
+    '''
+    Returns the patches that set the KeyCount and Key values of a channel, keys formatted as by FormatKeys
+    '''
+    valueEnd, lineBreak = ValueLineEnding(keyNode)
+    return [[keyCountNode.ValueStart, keyCountNode.ValueEnd, b" %d%s" % (keyCount, valueEnd)],
+        [keyNode.ValueStart, keyNode.ValueEnd, b" " + keys + valueEnd]]
+
+def ReduceFbxKeys(filename, outputFilename=None, tolerances=None, takeName=None):
+    '''
+    Removes the keys of a take of the FBX ASCII file filename that are within tolerance of the line
+    between the kept keys around them, in place or to outputFilename; tolerances are by channel kind
+    (T, R, S), ReductionTolerances by default, and takeName as in ReadTakeCurves
+    Returns the key count before and after
+    '''
+    def Reduce(channels, offsets, times, values):
+        keep = ReduceKeyMasks(times, values, offsets, [channel[7] for channel in channels])
+        
+        patches = []
+        for channelIndex in range(len(channels)):
+            model, path, channelNode, keyNode, keyCountNode, tokens, starts, tolerance = channels[channelIndex]
+            kept = starts[keep[offsets[channelIndex]:offsets[channelIndex + 1]]]
+            if len(kept) == len(starts):
+                continue
+                
+            lineBreak = ValueLineEnding(keyNode)[1]
+            keys = FormatLinearKeys(tokens[kept].tolist(), tokens[kept + 1].tolist(), KeyIndent(keyNode), lineBreak)
+            patches += KeyPatches(keyNode, keyCountNode, len(kept), keys)
+            
+        return patches, [len(keep), int(keep.sum())]
+        
+    return RewriteFbxKeys(filename, outputFilename, takeName, tolerances, Reduce)
+
+def StripStaticChannels(filename, outputFilename=None, tolerances=None, takeName=None, dropDefaults=True):
+    '''
+    Collapses the channels of a take of filename that stay within tolerance of one value to their
+    first key, in place or to outputFilename; with dropDefaults, a channel whose keys are all within
+    tolerance of its Default loses its keys altogether. Tolerances and takeName are as in ReduceFbxKeys
+    Run on the per-animation files, so a channel is static or not for each animation's range
+    Returns the channel count and the number of static channels
+    '''
+    def Strip(channels, offsets, times, values):
+        static = StaticChannelMask(values, offsets, [channel[7] for channel in channels])
+        
+        patches = []
+        for channelIndex in Numpy.flatnonzero(static):
+            model, path, channelNode, keyNode, keyCountNode, tokens, starts, tolerance = channels[channelIndex]
+            defaultNode = channelNode.Find("Default")
+            channelValues = values[offsets[channelIndex]:offsets[channelIndex + 1]]
+            
+            # Every key, not just the first, has to be within tolerance of the Default the channel falls back to
+            if dropDefaults and defaultNode is not None and Numpy.abs(channelValues - defaultNode.Value(0.0)).max() <= tolerance:
+                patches += KeyPatches(keyNode, keyCountNode, 0, b"")
+            elif len(starts) > 1:
+                lineBreak = ValueLineEnding(keyNode)[1]
+                keys = FormatKeys(tokens, starts, 0, 1, times[offsets[channelIndex]:offsets[channelIndex] + 1], KeyIndent(keyNode), lineBreak)
+                patches += KeyPatches(keyNode, keyCountNode, 1, keys)
+                
+        return patches, [len(channels), int(static.sum())]
+        
+    return RewriteFbxKeys(filename, outputFilename, takeName, tolerances, Strip)
@@ -0,0 +1,142 @@
+'''
+FBX resampling
+
+Baking puts a key on every frame at the scene rate, but many platforms only
+play animations at 15 or 30 fps. The keys of a per-animation file are
+rewritten on a grid of the target rate instead of re-baking in Maya:
+translation, scale and other channels are interpolated linearly, while the
+rotation channels of each model are turned into quaternions, slerped between
+the keys around every new one, and written back as Euler angles next to the
+keys they came from, in the rotate order of the model. Each channel, and each
+model's rotations as one (keys, 3) array, is resampled with NumPy at once.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxCurves import *
+    from FbxReduce import *
+    from AnimationMath import *
+    from AnimationClip import *
+except ImportError:
+    pass
+
+def ResampleTicks(firstTick, lastTick, framesPerSecond):
+    '''
+    Returns the times of the frames at framesPerSecond from firstTick to lastTick, both included
+    even if they fall between frames, so the range and its end poses are kept
+    '''
+    firstFrame, lastFrame = TicksToFrames([firstTick, lastTick], framesPerSecond)
+    ticks = FramesToTicks(Numpy.arange(Numpy.ceil(firstFrame), Numpy.floor(lastFrame) + 1), framesPerSecond)
+    ticks = ticks[(ticks > firstTick) & (ticks < lastTick)]
+    return Numpy.concatenate([[firstTick], ticks, [lastTick]]).astype(Numpy.int64)
+
+def ResampleRotations(times, degrees, ticks, rotateOrder="xyz"):
+    '''
+    Returns the Euler angles (ticks, 3) at ticks of the rotation keys degrees (times, 3), slerped
+    between the keys around each tick
+    '''
+    if len(times) < 2:
+        return Numpy.repeat(degrees[:1], len(ticks), axis=0)
+    
+    indices = Numpy.clip(Numpy.searchsorted(times, ticks, side="right") - 1, 0, len(times) - 2)
+    weights = Numpy.clip((ticks - times[indices]).astype(Numpy.float64) / (times[indices + 1] - times[indices]), 0, 1)
+    
+    quaternions = EulerToQuaternions(degrees, rotateOrder)
+    slerped = SlerpQuaternions(quaternions[indices], quaternions[indices + 1], weights)
+    
+    # Linear interpolation of the angles picks the Euler solution and its turns
+    reference = degrees[indices] + weights[:, None] * (degrees[indices + 1] - degrees[indices])
+    return QuaternionsToEuler(slerped, rotateOrder, reference)
+
+def ReadRotateOrders(document):
+    '''
+    Returns the rotate order of every model of document that has a RotationOrder property
+    '''
+    objectsNode = document.Find("Objects")
+    if objectsNode is None:
+        return {}
+    
+    rotateOrders = {}
+    for modelNode in objectsNode.FindAll("Model"):
+        propertiesNode = modelNode.Find("Properties60")
+        if propertiesNode is None:
+            continue
+        
+        rotationOrderNode = propertiesNode.Find("Property", "RotationOrder")
+        if rotationOrderNode is not None and len(rotationOrderNode.Values()) > 3:
+            rotateOrders[modelNode.Value("")] = FbxRotationOrders[int(rotationOrderNode.Values()[3])]
+    
+    return rotateOrders
+
+def FormatResampledKeys(keyNode, ticks, values):
+    lineBreak = ValueLineEnding(keyNode)[1]
+    return FormatLinearKeys([b"%d" % tick for tick in ticks.tolist()], [b"%.9g" % value for value in values.tolist()],
+        KeyIndent(keyNode), lineBreak)
+
+def ResampleFbxKeys(filename, framesPerSecond, outputFilename=None, takeName=None, rotateOrders=None):
+    '''
+    Replaces the keys of every channel of a take of filename with linear keys on the frames at
+    framesPerSecond between its first key and its last, in place or to outputFilename; rotations are slerped in
+    the rotate order of their model, from rotateOrders (model to order) or else its RotationOrder property, an
+    unkeyed rotation axis of a model taken as its Default. takeName is as in ReadTakeCurves
+    Returns the key count before and after
+    '''
+    def Resample(channels, offsets, times, values):
+        counts = Numpy.diff(offsets)
+        
+        modelRotateOrders = {}
+        if len(channels) > 0:
+            modelRotateOrders = ReadRotateOrders(channels[0][2].Document)
+        modelRotateOrders.update(rotateOrders or {})
+        
+        # The rotation channels of each model are resampled together, by axis
+        rotations = {}
+        resampled = {}
+        for channelIndex in range(len(channels)):
+            model, path = channels[channelIndex][:2]
+            channel = ClipChannel(path)
+            if channel is not None and channel[0] == "R":
+                rotations.setdefault(model, {})[channel[1]] = channelIndex
+            elif counts[channelIndex] > 1:
+                channelTimes = times[offsets[channelIndex]:offsets[channelIndex + 1]]
+                ticks = ResampleTicks(channelTimes[0], channelTimes[-1], framesPerSecond)
+                resampled[channelIndex] = [ticks, Numpy.interp(ticks, channelTimes, values[offsets[channelIndex]:offsets[channelIndex + 1]])]
+        
+        for model, axes in rotations.items():
+            keyTimes = Numpy.unique(Numpy.concatenate([times[offsets[channelIndex]:offsets[channelIndex + 1]] for channelIndex in axes.values()]))
+            if len(keyTimes) < 2:
+                continue
+            
+            degrees = Numpy.zeros((len(keyTimes), 3))
+            for axis, channelIndex in axes.items():
+                if counts[channelIndex] > 0:
+                    degrees[:, axis] = Numpy.interp(keyTimes, times[offsets[channelIndex]:offsets[channelIndex + 1]], values[offsets[channelIndex]:offsets[channelIndex + 1]])
+                else:
+                    defaultNode = channels[channelIndex][2].Find("Default")
+                    degrees[:, axis] = 0.0 if defaultNode is None else defaultNode.Value(0.0)
+            
+            ticks = ResampleTicks(keyTimes[0], keyTimes[-1], framesPerSecond)
+            angles = ResampleRotations(keyTimes, degrees, ticks, modelRotateOrders.get(model, "xyz"))
+            for axis, channelIndex in axes.items():
+                if counts[channelIndex] > 1:
+                    resampled[channelIndex] = [ticks, angles[:, axis]]
+        
+        patches = []
+        keyCount = len(values)
+        for channelIndex, (ticks, channelValues) in resampled.items():
+            model, path, channelNode, keyNode, keyCountNode, tokens, starts, tolerance = channels[channelIndex]
+            patches += KeyPatches(keyNode, keyCountNode, len(ticks), FormatResampledKeys(keyNode, ticks, channelValues))
+            keyCount += len(ticks) - counts[channelIndex]
+        
+        return patches, [len(values), int(keyCount)]
+    
+    return RewriteFbxKeys(filename, outputFilename, takeName, None, Resample)
@@ -0,0 +1,506 @@
+'''
+FBX take stitcher
+
+Stitches the takes of per-animation ASCII FBX files into one master file.
+Every file is streamed line by line through a pipeline of stages, so memory
+use stays the same no matter how large the files are. Only depends on the
+standard library, so it runs from mayapy as well as from plain Python.
+
+The fast mode memory-maps each file to find the byte range of its take and
+copies those ranges straight into the master with copy_file_range/sendfile,
+so the bytes of the takes never pass through Python objects. For files that
+are kept between runs the ranges are remembered in a small sidecar index next
+to each file (useIndex), so unchanged files are not scanned again; files that
+were just written are scanned without one. The scans can be spread across a
+process pool.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import mmap
+import json
+import hashlib
+import warnings
+import multiprocessing
+
+try:
+    from concurrent import futures as Futures
+    from concurrent.futures.process import BrokenProcessPool
+except ImportError:
+    Futures = None
+    BrokenProcessPool = None
+
+FbxDefaultTakeName = "Take 001"
+
+# Size of the chunks used when the platform has no in-kernel file copy
+FbxCopyChunkSize = 1 << 20
+
+# Take index sidecar files
+FbxTakeIndexExtension = ".takeindex"
+FbxTakeIndexVersion = 1
+FbxTakeIndexHashBlockSize = 1 << 16
+
+# Sections of a generated FBX file, in the order they appear
+FbxHeaderSection = 0
+FbxTakeSection = 1
+FbxFooterSection = 2
+
+def FbxBytes(text):
+    '''
+    Returns text as utf-8 encoded bytes
+    '''
+    if isinstance(text, bytes):
+        return text
+        
+    return text.encode("utf-8")
+
+def FbxTakeLine(takeName):
+    '''
+    Returns the (stripped) line that opens the take takeName
+    '''
+    return b"Take: \"" + FbxBytes(takeName) + b"\" {"
+
+class FbxStitchError(Exception):
+    pass
+
+class StitchTake:
+    Name = ""
+    Filename = ""
+    Index = 0
+    Count = 0
+    
+    def __init__(self, name, filename, index, count):
+        self.Name = name
+        self.Filename = filename
+        self.Index = index
+        self.Count = count
+        
+    def IsFirst(self):
+        return self.Index == 0
+        
+    def IsLast(self):
+        return self.Index == self.Count - 1
+
+def ReadFbxLines(filename):
+    '''
+    Yields the lines of filename one at a time, line endings included
+    '''
+    fbxFile = open(filename, "rb")
+    try:
+        for line in fbxFile:
+            yield line
+    finally:
+        fbxFile.close()
+
+def ExtractTake(lines, stitchTake):
+    '''
+    Stage that tags every line with the section it belongs to
+    '''
+    takeLine = FbxTakeLine(FbxDefaultTakeName)
+    takeLevel = None
+    section = FbxHeaderSection
+    
+    for line in lines:
+        strippedLine = line.strip(b" \r\n")
+        lineStartsWith = line[:len(line) - len(line.lstrip(b" "))]
+        
+        if section == FbxHeaderSection and strippedLine == takeLine:
+            section = FbxTakeSection
+            takeLevel = lineStartsWith
+            
+        yield section, line
+        
+        if section == FbxTakeSection and strippedLine == b"}" and lineStartsWith == takeLevel:
+            section = FbxFooterSection
+
+def CaptureHeader(sectionLines, stitchTake):
+    '''
+    Stage that keeps the header of the first file only
+    '''
+    for section, line in sectionLines:
+        if section == FbxHeaderSection and not stitchTake.IsFirst():
+            continue
+            
+        yield section, line
+
+def RenameTake(sectionLines, stitchTake):
+    '''
+    Stage that renames the take to the name of the animation
+    '''
+    renamed = False
+    for section, line in sectionLines:
+        if section == FbxTakeSection and not renamed:
+            line = line.replace(FbxBytes(FbxDefaultTakeName), FbxBytes(stitchTake.Name), 1)
+            renamed = True
+            
+        yield section, line
+
+def CaptureFooter(sectionLines, stitchTake):
+    '''
+    Stage that keeps the footer of the last file only
+    '''
+    for section, line in sectionLines:
+        if section == FbxFooterSection and not stitchTake.IsLast():
+            continue
+            
+        yield section, line
+
+# Stages run in this order; the first one receives the raw lines of the file
+FbxStitchStages = [ExtractTake, CaptureHeader, RenameTake, CaptureFooter]
+
+def StitchFbxTakes(masterFilename, takes, stages=None):
+    '''
+    Stitches takes, a list of [takeName, filename] pairs, into masterFilename
+    The header comes from the first file and the footer from the last one
+    '''
+    if stages is None:
+        stages = FbxStitchStages
+        
+    masterFile = open(masterFilename, "wb")
+    try:
+        for takeIndex in range(len(takes)):
+            stitchTake = StitchTake(takes[takeIndex][0], takes[takeIndex][1], takeIndex, len(takes))
+            
+            stream = ReadFbxLines(stitchTake.Filename)
+            for stage in stages:
+                stream = stage(stream, stitchTake)
+                
+            for section, line in stream:
+                masterFile.write(line)
+    finally:
+        masterFile.close()
+
+class FbxTakeRange:
+    '''
+    Byte offsets of the take in a generated FBX file
+    The header is [0, HeaderEnd), the take header line [HeaderEnd, TakeBodyStart),
+    the rest of the take [TakeBodyStart, FooterStart) and the footer [FooterStart, FileSize)
+    '''
+    HeaderEnd = 0
+    TakeBodyStart = 0
+    FooterStart = 0
+    FileSize = 0
+    
+    def __init__(self, headerEnd, takeBodyStart, footerStart, fileSize):
+        self.HeaderEnd = headerEnd
+        self.TakeBodyStart = takeBodyStart
+        self.FooterStart = footerStart
+        self.FileSize = fileSize
+
+def FindLineEnd(data, position, size):
+    '''
+    Returns the offset just past the line ending after position
+    '''
+    lineEnd = data.find(b"\n", position)
+    if lineEnd < 0:
+        return size
+        
+    return lineEnd + 1
+
+def ScanTakeRange(data, size):
+    '''
+    Finds the take in data (bytes or mmap) the same way ExtractTake does
+    '''
+    takeLine = FbxTakeLine(FbxDefaultTakeName)
+    
+    headerEnd = -1
+    position = data.find(takeLine)
+    while position >= 0:
+        lineStart = data.rfind(b"\n", 0, position) + 1
+        lineEnd = FindLineEnd(data, position, size)
+        
+        if data[lineStart:position].strip(b" ") == b"" and data[position:lineEnd].strip(b" \r\n") == takeLine:
+            headerEnd = lineStart
+            break
+            
+        position = data.find(takeLine, position + len(takeLine))
+        
+    if headerEnd < 0:
+        raise FbxStitchError("Take \"%s\" not found" % FbxDefaultTakeName)
+        
+    takeLevel = data[headerEnd:position]
+    takeBodyStart = FindLineEnd(data, position, size)
+    
+    endTakeLine = b"\n" + takeLevel + b"}"
+    position = data.find(endTakeLine, takeBodyStart - 1)
+    while position >= 0:
+        lineEnd = FindLineEnd(data, position + 1, size)
+        
+        if data[position + len(endTakeLine):lineEnd].strip(b" \r\n") == b"":
+            return FbxTakeRange(headerEnd, takeBodyStart, lineEnd, size)
+            
+        position = data.find(endTakeLine, position + 1)
+        
+    raise FbxStitchError("Take \"%s\" is not closed" % FbxDefaultTakeName)
+
+def FindTakeRange(filename):
+    '''
+    Memory-maps filename and returns the FbxTakeRange of its take
+    '''
+    fbxFile = open(filename, "rb")
+    try:
+        fileSize = os.fstat(fbxFile.fileno()).st_size
+        if fileSize == 0:
+            raise FbxStitchError("%s is empty" % filename)
+            
+        fbxMap = mmap.mmap(fbxFile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return ScanTakeRange(fbxMap, fileSize)
+        finally:
+            fbxMap.close()
+    finally:
+        fbxFile.close()
+
+def TakeIndexFilename(filename):
+    return filename + FbxTakeIndexExtension
+
+def FbxFingerprint(filename):
+    '''
+    Returns the size, mtime and content hash that key the take index of filename
+    The hash covers the first and last blocks of the file, where the FBX header,
+    the take header and the footer live, so it is cheap even for huge files
+    '''
+    fileStat = os.stat(filename)
+    fileSize = fileStat.st_size
+    
+    contentHash = hashlib.sha1()
+    fbxFile = open(filename, "rb")
+    try:
+        contentHash.update(fbxFile.read(FbxTakeIndexHashBlockSize))
+        if fileSize > FbxTakeIndexHashBlockSize:
+            fbxFile.seek(max(FbxTakeIndexHashBlockSize, fileSize - FbxTakeIndexHashBlockSize))
+            contentHash.update(fbxFile.read(FbxTakeIndexHashBlockSize))
+    finally:
+        fbxFile.close()
+        
+    return {"Size": fileSize, "MTime": fileStat.st_mtime, "Hash": contentHash.hexdigest()}
+
+def LoadTakeIndex(filename, fingerprint=None):
+    '''
+    Returns the FbxTakeRange stored next to filename, or None if it is missing or stale
+    '''
+    try:
+        indexFile = open(TakeIndexFilename(filename), "r")
+        try:
+            index = json.load(indexFile)
+        finally:
+            indexFile.close()
+    except (IOError, OSError, ValueError):
+        return None
+        
+    if fingerprint is None:
+        fingerprint = FbxFingerprint(filename)
+        
+    if index.get("Version") != FbxTakeIndexVersion:
+        return None
+        
+    for key in fingerprint:
+        if index.get(key) != fingerprint[key]:
+            return None
+            
+    return FbxTakeRange(index["HeaderEnd"], index["TakeBodyStart"], index["FooterStart"], index["Size"])
+
+def SaveTakeIndex(filename, takeRange, fingerprint=None):
+    '''
+    Writes the take index for filename, quietly giving up if the folder is read-only
+    '''
+    if fingerprint is None:
+        fingerprint = FbxFingerprint(filename)
+        
+    index = {"Version": FbxTakeIndexVersion, "HeaderEnd": takeRange.HeaderEnd,
+        "TakeBodyStart": takeRange.TakeBodyStart, "FooterStart": takeRange.FooterStart}
+    index.update(fingerprint)
+    
+    try:
+        indexFile = open(TakeIndexFilename(filename), "w")
+        try:
+            json.dump(index, indexFile, sort_keys=True)
+        finally:
+            indexFile.close()
+    except (IOError, OSError):
+        pass
+
+def FindTakeRangeIndexed(filename):
+    '''
+    FindTakeRange that reads from and keeps up to date the take index of filename
+    '''
+    fingerprint = FbxFingerprint(filename)
+    
+    takeRange = LoadTakeIndex(filename, fingerprint)
+    if takeRange is None:
+        takeRange = FindTakeRange(filename)
+        SaveTakeIndex(filename, takeRange, fingerprint)
+        
+    return takeRange
+
+def ScanTakeRanges(filenames, useIndex=True, workers=1):
+    '''
+    Returns the FbxTakeRange of every file, in the same order as filenames
+    With more than one worker (None for one per core) the files are scanned on a
+    process pool; if no pool can be started the files are scanned serially, and if the
+    pool breaks they are scanned again serially with a RuntimeWarning
+    '''
+    if useIndex:
+        findTakeRange = FindTakeRangeIndexed
+    else:
+        findTakeRange = FindTakeRange
+        
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+        
+    workers = min(workers, len(filenames))
+    if workers > 1 and Futures is not None:
+        try:
+            executor = Futures.ProcessPoolExecutor(max_workers=workers)
+        except (OSError, NotImplementedError):
+            executor = None
+            
+        if executor is not None:
+            try:
+                chunkSize = max(1, len(filenames) // (workers * 4))
+                return list(executor.map(findTakeRange, filenames, chunksize=chunkSize))
+            except BrokenProcessPool as error:
+                # A warning goes to stderr, or wherever the caller sends it, not into the output on stdout
+                warnings.warn("Take scan process pool failed, scanning serially: %s" % error, RuntimeWarning)
+            finally:
+                executor.shutdown()
+                
+    return [findTakeRange(filename) for filename in filenames]
+
+def WriteAll(destinationFd, data):
+    while len(data) > 0:
+        data = data[os.write(destinationFd, data):]
+
+def CopyFileRange(sourceFd, destinationFd, offset, count):
+    '''
+    Copies count bytes at offset in sourceFd to the current position of destinationFd
+    Prefers copy_file_range, then sendfile, then plain chunked reads
+    '''
+    copyFileRange = getattr(os, "copy_file_range", None)
+    while count > 0 and copyFileRange is not None:
+        try:
+            copied = copyFileRange(sourceFd, destinationFd, count, offset)
+        except OSError:
+            break
+            
+        if copied == 0:
+            break
+            
+        offset += copied
+        count -= copied
+        
+    sendFile = getattr(os, "sendfile", None)
+    while count > 0 and sendFile is not None:
+        try:
+            copied = sendFile(destinationFd, sourceFd, offset, count)
+        except OSError:
+            break
+            
+        if copied == 0:
+            break
+            
+        offset += copied
+        count -= copied
+        
+    if count > 0:
+        os.lseek(sourceFd, offset, os.SEEK_SET)
+        
+    while count > 0:
+        chunk = os.read(sourceFd, min(count, FbxCopyChunkSize))
+        if len(chunk) == 0:
+            raise FbxStitchError("Unexpected end of file while copying")
+            
+        WriteAll(destinationFd, chunk)
+        count -= len(chunk)
+
+def OpenBinary(filename, flags, mode=0o666):
+    return os.open(filename, flags | getattr(os, "O_BINARY", 0), mode)
+
+def ReplaceFile(sourceFilename, destinationFilename):
+    '''
+    Renames sourceFilename over destinationFilename, atomically where the platform allows
+    '''
+    replace = getattr(os, "replace", None)
+    if replace is not None:
+        replace(sourceFilename, destinationFilename)
+        return
+    
+    # Python 2 on Windows cannot rename over an existing file
+    if os.name == "nt" and os.path.exists(destinationFilename):
+        os.remove(destinationFilename)
+    
+    os.rename(sourceFilename, destinationFilename)
+
+class FbxPatchWriter:
+    '''
+    Writes a copy of a source file with some byte ranges replaced
+    Patches must be given in file order; the bytes between them are copied with CopyFileRange
+    '''
+    Filename = ""
+    
+    def __init__(self, sourceFd, filename):
+        self.Filename = filename
+        self.sourceFd = sourceFd
+        self.fd = OpenBinary(filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+        self.position = 0
+        
+    def Patch(self, start, end, replacement):
+        if start < self.position:
+            raise FbxStitchError("Patches must be in file order")
+            
+        CopyFileRange(self.sourceFd, self.fd, self.position, start - self.position)
+        WriteAll(self.fd, replacement)
+        self.position = end
+        
+    def Finish(self, end, sync=False):
+        '''
+        Copies the rest of the source up to end and closes the file, flushed to disk if sync
+        '''
+        CopyFileRange(self.sourceFd, self.fd, self.position, end - self.position)
+        self.position = end
+        if sync:
+            os.fsync(self.fd)
+        
+        self.Close()
+        
+    def Close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+def StitchFbxTakesFast(masterFilename, takes, useIndex=True, workers=1):
+    '''
+    Same output as StitchFbxTakes, but copies byte ranges found with FindTakeRange
+    Only the take header line is read into Python to be renamed
+    The takes are scanned with ScanTakeRanges and written by this process alone
+    '''
+    takeRanges = ScanTakeRanges([takeFilename for takeName, takeFilename in takes], useIndex, workers)
+    
+    masterFd = OpenBinary(masterFilename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    try:
+        for takeIndex in range(len(takes)):
+            takeName, takeFilename = takes[takeIndex]
+            takeRange = takeRanges[takeIndex]
+            
+            sourceFd = OpenBinary(takeFilename, os.O_RDONLY)
+            try:
+                # For the first file, pick from top of file until the take
+                if takeIndex == 0:
+                    CopyFileRange(sourceFd, masterFd, 0, takeRange.HeaderEnd)
+                    
+                # Patch the take header and copy the rest of the take as is
+                os.lseek(sourceFd, takeRange.HeaderEnd, os.SEEK_SET)
+                takeHeader = os.read(sourceFd, takeRange.TakeBodyStart - takeRange.HeaderEnd)
+                WriteAll(masterFd, takeHeader.replace(FbxBytes(FbxDefaultTakeName), FbxBytes(takeName), 1))
+                CopyFileRange(sourceFd, masterFd, takeRange.TakeBodyStart, takeRange.FooterStart - takeRange.TakeBodyStart)
+                
+                # For the last file, pick after the take to the bottom of file
+                if takeIndex == len(takes) - 1:
+                    CopyFileRange(sourceFd, masterFd, takeRange.FooterStart, takeRange.FileSize - takeRange.FooterStart)
+            finally:
+                os.close(sourceFd)
+    finally:
+        os.close(masterFd)
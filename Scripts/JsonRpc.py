@@ -0,0 +1,401 @@
+'''
+JSON-RPC server
+
+A small JSON-RPC 2.0 listener on a local socket, in the spirit of Maya's
+commandPort. Messages are JSON, one per line. A batch (a JSON array of
+requests) is answered with one array, so a client can fetch thousands of
+values in a single round-trip. Connections that call Server.Subscribe are
+pushed notifications (requests without an id) when the served data changes.
+
+Every connection is read on its own thread. All the calls of one request or
+batch run together through the invoke function, which in Maya hands them to
+the main thread, and share one context (e.g. a sequencer loaded once).
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import json
+import socket
+import threading
+
+try:
+    import queue as Queue
+except ImportError:
+    import Queue
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxStitcher import *
+except ImportError:
+    pass
+
+JsonRpcHost = "127.0.0.1"
+
+# Seconds the client waits for a response
+JsonRpcTimeout = 30
+
+# Seconds between checks for Stop while waiting for connections
+JsonRpcAcceptInterval = 0.25
+
+# Error codes of the JSON-RPC 2.0 specification
+JsonRpcParseError = -32700
+JsonRpcInvalidRequest = -32600
+JsonRpcMethodNotFound = -32601
+JsonRpcInvalidParams = -32602
+JsonRpcInternalError = -32603
+
+class JsonRpcError(Exception):
+    '''
+    Raised by methods to answer with a specific error, and by the client for error responses
+    '''
+    Code = JsonRpcInternalError
+    Data = None
+    
+    def __init__(self, code, message, data=None):
+        Exception.__init__(self, message)
+        self.Code = code
+        self.Data = data
+
+def JsonRpcErrorResponse(id, code, message, data=None):
+    error = {"code": code, "message": message}
+    if data is not None:
+        error["data"] = data
+        
+    return {"jsonrpc": "2.0", "id": id, "error": error}
+
+def SendJsonLine(connectionSocket, lock, message):
+    data = FbxBytes(json.dumps(message, separators=(",", ":")) + "\n")
+    with lock:
+        connectionSocket.sendall(data)
+
+class JsonRpcConnection:
+    '''
+    A client socket of a JsonRpcServer and the thread that answers it
+    '''
+    Subscribed = False
+    
+    def __init__(self, server, connectionSocket):
+        self.server = server
+        self.socket = connectionSocket
+        self.lock = threading.Lock()
+        
+        self.thread = threading.Thread(target=self.Run)
+        self.thread.daemon = True
+        
+    def Send(self, message):
+        SendJsonLine(self.socket, self.lock, message)
+        
+    def Close(self):
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except (IOError, OSError, socket.error):
+            pass
+            
+        self.socket.close()
+        
+    def Run(self):
+        reader = self.socket.makefile("rb")
+        try:
+            for line in iter(reader.readline, b""):
+                if len(line.strip()) == 0:
+                    continue
+                    
+                response = self.server.Handle(self, line)
+                if response is not None:
+                    self.Send(response)
+        except (IOError, OSError, socket.error):
+            pass
+        finally:
+            reader.close()
+            self.server.Disconnect(self)
+
+class JsonRpcServer:
+    '''
+    Serves methods over JSON-RPC on host:port, e.g.
+    
+        server = JsonRpcServer({"Add": lambda context, a, b: a + b}, port=7810)
+        server.Start()
+        server.Notify("Changed", {"Count": 3})
+        server.Stop()
+        
+    Methods are called with the context of their request or batch, then the
+    params: a list as arguments, an object as keyword arguments. Port 0 picks
+    a free port, which Port holds after Start
+    '''
+    Host = JsonRpcHost
+    Port = 0
+    Methods = None
+    
+    def __init__(self, methods, host=JsonRpcHost, port=0, context=None, invoke=None):
+        self.Methods = dict(methods)
+        self.Host = host
+        self.Port = port
+        
+        self.context = context
+        self.invoke = invoke
+        self.listenSocket = None
+        self.acceptThread = None
+        self.connections = []
+        self.connectionsLock = threading.Lock()
+        self.running = False
+        
+    def Start(self):
+        self.listenSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listenSocket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listenSocket.bind((self.Host, self.Port))
+        self.listenSocket.listen(5)
+        self.listenSocket.settimeout(JsonRpcAcceptInterval)
+        self.Port = self.listenSocket.getsockname()[1]
+        
+        self.running = True
+        self.acceptThread = threading.Thread(target=self.Accept)
+        self.acceptThread.daemon = True
+        self.acceptThread.start()
+        
+    def Accept(self):
+        while self.running:
+            try:
+                connectionSocket, address = self.listenSocket.accept()
+            except socket.timeout:
+                continue
+            except (IOError, OSError, socket.error):
+                return
+                
+            connectionSocket.settimeout(None)
+            connectionSocket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            connection = JsonRpcConnection(self, connectionSocket)
+            with self.connectionsLock:
+                self.connections.append(connection)
+                
+            connection.thread.start()
+            
+    def Disconnect(self, connection):
+        with self.connectionsLock:
+            if connection in self.connections:
+                self.connections.remove(connection)
+                
+        connection.Close()
+        
+    def Stop(self):
+        '''
+        Stops listening and closes every connection
+        '''
+        if not self.running:
+            return
+            
+        self.running = False
+        self.acceptThread.join()
+        self.listenSocket.close()
+        
+        with self.connectionsLock:
+            connections = list(self.connections)
+            
+        for connection in connections:
+            self.Disconnect(connection)
+            
+    def Notify(self, method, params=None):
+        '''
+        Pushes a notification to every subscribed connection
+        '''
+        message = {"jsonrpc": "2.0", "method": method}
+        if params is not None:
+            message["params"] = params
+            
+        with self.connectionsLock:
+            connections = [connection for connection in self.connections if connection.Subscribed]
+            
+        for connection in connections:
+            try:
+                connection.Send(message)
+            except (IOError, OSError, socket.error):
+                self.Disconnect(connection)
+                
+    def Handle(self, connection, line):
+        '''
+        Answers one line, a request or a batch; returns the response, or None if there is none
+        '''
+        try:
+            message = json.loads(line.decode("utf-8"))
+        except ValueError:
+            return JsonRpcErrorResponse(None, JsonRpcParseError, "Parse error")
+            
+        batch = isinstance(message, list)
+        if not batch:
+            message = [message]
+        elif len(message) == 0:
+            return JsonRpcErrorResponse(None, JsonRpcInvalidRequest, "Empty batch")
+            
+        if self.invoke is None:
+            responses = self.RunBatch(connection, message)
+        else:
+            responses = self.invoke(self.RunBatch, connection, message)
+            
+        # Notifications are not answered, not even inside a batch
+        responses = [response for response in responses if response is not None]
+        if len(responses) == 0:
+            return None
+            
+        if batch:
+            return responses
+            
+        return responses[0]
+        
+    def RunBatch(self, connection, requests):
+        context = None
+        if self.context is not None:
+            context = self.context()
+            
+        return [self.RunRequest(connection, context, request) for request in requests]
+        
+    def RunRequest(self, connection, context, request):
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0" or not isinstance(request.get("method"), (type(u""), str)):
+            return JsonRpcErrorResponse(None, JsonRpcInvalidRequest, "Invalid request")
+            
+        id = request.get("id")
+        try:
+            result = self.Call(connection, context, request["method"], request.get("params", []))
+        except JsonRpcError as error:
+            response = JsonRpcErrorResponse(id, error.Code, str(error), error.Data)
+        except Exception as error:
+            response = JsonRpcErrorResponse(id, JsonRpcInternalError, "%s: %s" % (type(error).__name__, error))
+        else:
+            response = {"jsonrpc": "2.0", "id": id, "result": result}
+            
+        if "id" not in request:
+            return None
+            
+        return response
+        
+    def Call(self, connection, context, method, params):
+        # Subscriptions belong to the connection rather than to the served data
+        if method == "Server.Subscribe":
+            connection.Subscribed = True
+            return True
+            
+        if method == "Server.Unsubscribe":
+            connection.Subscribed = False
+            return True
+            
+        if method == "Server.Methods":
+            return sorted(self.Methods)
+            
+        if method not in self.Methods:
+            raise JsonRpcError(JsonRpcMethodNotFound, "Method not found: %s" % method)
+            
+        if isinstance(params, list):
+            return self.Methods[method](context, *params)
+            
+        if isinstance(params, dict):
+            return self.Methods[method](context, **dict([(str(key), value) for key, value in params.items()]))
+            
+        raise JsonRpcError(JsonRpcInvalidParams, "Params must be a list or an object")
+
+class JsonRpcClient:
+    '''
+    Client of a JsonRpcServer, e.g.
+    
+        client = JsonRpcClient(port=7810)
+        count = client.Call("Sequencer.Count")
+        animations = client.Batch([["Sequencer.Animation", [id]] for id in ids])
+        
+    Calls are made one at a time. Notifications pushed by the server (after
+    Subscribe) are put on Notifications as [method, params]
+    '''
+    Timeout = JsonRpcTimeout
+    Notifications = None
+    
+    def __init__(self, host=JsonRpcHost, port=0, timeout=JsonRpcTimeout):
+        self.Timeout = timeout
+        self.Notifications = Queue.Queue()
+        
+        self.socket = socket.create_connection((host, port), timeout)
+        self.socket.settimeout(None)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.lock = threading.Lock()
+        self.responses = Queue.Queue()
+        self.nextId = 0
+        
+        self.thread = threading.Thread(target=self.Read)
+        self.thread.daemon = True
+        self.thread.start()
+        
+    def Read(self):
+        reader = self.socket.makefile("rb")
+        try:
+            for line in iter(reader.readline, b""):
+                message = json.loads(line.decode("utf-8"))
+                if isinstance(message, dict) and "id" not in message:
+                    self.Notifications.put([message.get("method"), message.get("params")])
+                else:
+                    self.responses.put(message)
+        except (IOError, OSError, ValueError, socket.error):
+            pass
+        finally:
+            reader.close()
+            self.responses.put(None)
+            
+    def Receive(self):
+        try:
+            response = self.responses.get(timeout=self.Timeout)
+        except Queue.Empty:
+            raise JsonRpcError(JsonRpcInternalError, "No response after %d seconds" % self.Timeout)
+            
+        if response is None:
+            raise JsonRpcError(JsonRpcInternalError, "Connection closed")
+            
+        return response
+        
+    def Request(self, method, params):
+        self.nextId += 1
+        return {"jsonrpc": "2.0", "id": self.nextId, "method": method, "params": params}
+        
+    def Result(self, response):
+        if "error" in response:
+            error = response["error"]
+            return JsonRpcError(error.get("code"), error.get("message"), error.get("data"))
+            
+        return response.get("result")
+        
+    def Call(self, method, *params):
+        SendJsonLine(self.socket, self.lock, self.Request(method, list(params)))
+        
+        result = self.Result(self.Receive())
+        if isinstance(result, JsonRpcError):
+            raise result
+            
+        return result
+        
+    def Batch(self, calls):
+        '''
+        Makes [method, params] calls in one round-trip and returns their results in
+        order; a call that failed has its JsonRpcError in place of a result
+        '''
+        if len(calls) == 0:
+            return []
+            
+        requests = [self.Request(method, params if isinstance(params, dict) else list(params)) for method, params in calls]
+        SendJsonLine(self.socket, self.lock, requests)
+        
+        responses = self.Receive()
+        if isinstance(responses, dict):
+            raise self.Result(responses)
+            
+        results = dict([(response.get("id"), self.Result(response)) for response in responses])
+        return [results.get(request["id"]) for request in requests]
+        
+    def Notify(self, method, *params):
+        SendJsonLine(self.socket, self.lock, {"jsonrpc": "2.0", "method": method, "params": list(params)})
+        
+    def Subscribe(self):
+        return self.Call("Server.Subscribe")
+        
+    def Close(self):
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except (IOError, OSError, socket.error):
+            pass
+            
+        self.socket.close()
+        self.thread.join()
@@ -0,0 +1,392 @@
+'''
+Maya ASCII reader
+
+Reads the SequencerData node out of Maya ASCII (.ma) scenes without Maya.
+The file is memory mapped and searched for the createNode line of the node,
+so the rest of the scene is never parsed or held in memory. Only the setAttr
+statements of that one node are decoded into the UniqueId, Ordering and
+Animation%d values written by SequencerUI.Save.
+
+PatchSequencerData rewrites those setAttr statements the same way: every
+other byte of the scene is copied through unchanged into a temporary file
+next to it, which then replaces the scene in one rename.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import re
+import mmap
+import shutil
+import tempfile
+import warnings
+import multiprocessing
+
+try:
+    from concurrent import futures as Futures
+    from concurrent.futures.process import BrokenProcessPool
+except ImportError:
+    Futures = None
+    BrokenProcessPool = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxStitcher import *
+except ImportError:
+    pass
+
+MayaSequencerNodeLine = b'createNode script -n "SequencerData"'
+
+# The node's statements are indented; the next line that is not ends them
+MayaBlockEndPattern = re.compile(br'\n(?=\S)')
+
+# Quoted strings (with escapes), statement ends and bare words
+MayaTokenPattern = re.compile(br'"(?:[^"\\]|\\.)*"|;|[^\s;"]+')
+
+MayaAnimationAttributePattern = re.compile(r'^(Name|StartFrame|EndFrame|Selected)(\d+)$')
+
+MayaAnimationCompoundPattern = re.compile(r'^Animation(\d+)$')
+
+# setAttr flags and how many values each one takes
+MayaSetAttrFlags = {"-type": 1, "-typ": 1, "-k": 1, "-keyable": 1, "-l": 1, "-lock": 1, "-cb": 1, "-channelBox": 1,
+    "-s": 1, "-size": 1, "-av": 0, "-alteredValue": 0, "-c": 0, "-clamp": 0}
+
+MayaEscapes = {"n": "\n", "t": "\t", "r": "\r"}
+
+MayaQuotes = {"\\": "\\\\", "\"": "\\\"", "\n": "\\n", "\t": "\\t", "\r": "\\r"}
+
+class MayaAsciiError(Exception):
+    pass
+
+def UnquoteMelString(token):
+    text = token[1:-1].decode("utf-8")
+    return re.sub(r'\\(.)', lambda match: MayaEscapes.get(match.group(1), match.group(1)), text)
+
+def MelBool(token):
+    return token in [b"yes", b"true", b"on", b"1"]
+
+def QuoteMelString(text):
+    return '"' + "".join([MayaQuotes.get(character, character) for character in text]) + '"'
+
+def FindSequencerBlock(data):
+    '''
+    Returns the start and end of the SequencerData node's statements in data, or None
+    '''
+    position = data.find(MayaSequencerNodeLine)
+    while position >= 0:
+        if position == 0 or data[position - 1:position] == b"\n":
+            match = MayaBlockEndPattern.search(data, position)
+            if match is None:
+                return position, len(data)
+                
+            return position, match.start()
+            
+        position = data.find(MayaSequencerNodeLine, position + 1)
+        
+    return None
+
+def ParseSetAttr(tokens):
+    '''
+    Returns the attribute and values of a setAttr statement's tokens
+    '''
+    index = 1
+    while index < len(tokens) and tokens[index].startswith(b"-"):
+        index += 1 + MayaSetAttrFlags.get(tokens[index].decode("utf-8"), 0)
+        
+    if index >= len(tokens):
+        raise MayaAsciiError("setAttr without an attribute")
+        
+    attribute = UnquoteMelString(tokens[index])
+    
+    # Maya writes -type after the attribute; anything else that is not a flag is data
+    values = []
+    index += 1
+    while index < len(tokens):
+        flag = tokens[index].decode("utf-8")
+        if flag in MayaSetAttrFlags:
+            index += 1 + MayaSetAttrFlags[flag]
+        else:
+            values.append(tokens[index])
+            index += 1
+            
+    return attribute.split(".")[-1], values
+
+def ParseSequencerBlock(block):
+    '''
+    Returns the UniqueId and the animation records (in display order) of a SequencerData block
+    '''
+    uniqueId = 0
+    ordering = []
+    animations = {}
+    
+    statement = []
+    for token in MayaTokenPattern.findall(block):
+        if token != b";":
+            statement.append(token)
+            continue
+            
+        if len(statement) > 0 and statement[0] == b"setAttr":
+            attributeName, values = ParseSetAttr(statement)
+            
+            if attributeName == "UniqueId":
+                uniqueId = int(values[0])
+            elif attributeName == "Ordering":
+                ordering = [int(value) for value in values[1:int(values[0]) + 1]]
+            else:
+                match = MayaAnimationAttributePattern.match(attributeName)
+                if match is not None:
+                    field, animationId = match.group(1), int(match.group(2))
+                    animation = animations.setdefault(animationId, {})
+                    if field == "Name":
+                        animation["Name"] = UnquoteMelString(values[0])
+                    elif field == "Selected":
+                        animation["Selected"] = MelBool(values[0])
+                    else:
+                        animation[field] = int(values[0])
+                        
+        statement = []
+        
+    # Maya leaves out values equal to the attribute default
+    return uniqueId, [{"Id": animationId, "Name": animations.get(animationId, {}).get("Name", ""),
+        "StartFrame": animations.get(animationId, {}).get("StartFrame", 0), "EndFrame": animations.get(animationId, {}).get("EndFrame", 0),
+        "Selected": animations.get(animationId, {}).get("Selected", False)} for animationId in ordering]
+
+def ReadSequencerData(filename):
+    '''
+    Returns [uniqueId, animations] stored in the .ma scene filename, or None if it has no SequencerData
+    '''
+    sceneFile = open(filename, "rb")
+    try:
+        if os.fstat(sceneFile.fileno()).st_size == 0:
+            return None
+            
+        data = mmap.mmap(sceneFile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            blockRange = FindSequencerBlock(data)
+            if blockRange is None:
+                return None
+                
+            return list(ParseSequencerBlock(data[blockRange[0]:blockRange[1]]))
+        finally:
+            data.close()
+    finally:
+        sceneFile.close()
+
+def ReadSequencerAnimations(filename):
+    '''
+    Returns [filename, animations, error] for filename; a scene without SequencerData has no animations
+    '''
+    try:
+        sequencerData = ReadSequencerData(filename)
+    except (IOError, OSError, ValueError, IndexError, MayaAsciiError) as error:
+        return [filename, None, "%s: %s" % (type(error).__name__, error)]
+        
+    if sequencerData is None:
+        return [filename, [], None]
+        
+    return [filename, sequencerData[1], None]
+
+def MapSceneFiles(function, items, workers=None):
+    '''
+    Returns function(item) of every item, in order; with more than one worker (None for
+    one per core) the items are run on a process pool, serially if none starts, and again
+    serially with a RuntimeWarning if it breaks
+    '''
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+        
+    workers = min(workers, len(items))
+    if workers > 1 and Futures is not None:
+        try:
+            executor = Futures.ProcessPoolExecutor(max_workers=workers)
+        except (OSError, NotImplementedError):
+            executor = None
+            
+        if executor is not None:
+            try:
+                chunkSize = max(1, len(items) // (workers * 4))
+                return list(executor.map(function, items, chunksize=chunkSize))
+            except BrokenProcessPool as error:
+                warnings.warn("Scene process pool failed, running serially: %s" % error, RuntimeWarning)
+            finally:
+                executor.shutdown()
+                
+    return [function(item) for item in items]
+
+def ReadSequencerAnimationFiles(filenames, workers=None):
+    '''
+    Returns ReadSequencerAnimations of every file, in order, read on a process pool
+    '''
+    return MapSceneFiles(ReadSequencerAnimations, filenames, workers)
+
+def MayaStatements(block):
+    '''
+    Yields [start, end, tokens] of every statement in block, with start at the newline before it
+    '''
+    statement = []
+    statementStart = 0
+    for match in MayaTokenPattern.finditer(block):
+        token = match.group(0)
+        if token != b";":
+            if len(statement) == 0:
+                statementStart = match.start()
+            
+            statement.append(token)
+            continue
+        
+        if len(statement) > 0:
+            yield [block.rfind(b"\n", 0, statementStart), match.end(), statement]
+        
+        statement = []
+
+def SequencerStatements(block):
+    '''
+    Returns the setAttr statements of a SequencerData block that hold sequencer values, as
+    [start, end] with start at the newline before the statement, and the ids of the animations
+    whose attributes the block adds
+    '''
+    statements = []
+    animationIds = set()
+    for start, end, statement in MayaStatements(block):
+        if statement[0] == b"setAttr":
+            attributeName = ParseSetAttr(statement)[0]
+            if attributeName in ["UniqueId", "Ordering"] or MayaAnimationAttributePattern.match(attributeName) is not None:
+                statements.append([start, end])
+        elif statement[0] == b"addAttr" and b"-ln" in statement:
+            nameIndex = statement.index(b"-ln") + 1
+            if nameIndex < len(statement):
+                match = MayaAnimationCompoundPattern.match(UnquoteMelString(statement[nameIndex]))
+                if match is not None:
+                    animationIds.add(int(match.group(1)))
+        
+    return statements, animationIds
+
+def SequencerSetAttrLines(uniqueId, animations):
+    '''
+    Returns the setAttr statements of the values, as Maya writes them
+    '''
+    lines = ['\tsetAttr ".UniqueId" %d;' % uniqueId,
+        '\tsetAttr ".Ordering" -type "Int32Array" %d %s;' % (len(animations), " ".join([str(animation["Id"]) for animation in animations]))]
+    
+    for animation in animations:
+        attributeName = ".Animations.Animation%d.%%s%d" % (animation["Id"], animation["Id"])
+        lines += ['\tsetAttr "%s" -type "string" %s;' % (attributeName % "Name", QuoteMelString(animation["Name"])),
+            '\tsetAttr "%s" %d;' % (attributeName % "StartFrame", animation["StartFrame"]),
+            '\tsetAttr "%s" %d;' % (attributeName % "EndFrame", animation["EndFrame"]),
+            '\tsetAttr "%s" %s;' % (attributeName % "Selected", "yes" if animation["Selected"] else "no")]
+    
+    return "".join(["\n" + line for line in lines]).encode("utf-8")
+
+def WritePatchedScene(sourceFd, filename, patches, outputFilename=None):
+    '''
+    Writes the scene filename (open as sourceFd) with the [start, end, replacement] patches, given
+    in file order, to a temporary file next to outputFilename (by default filename) that then replaces it
+    '''
+    if outputFilename is None:
+        outputFilename = filename
+    
+    outputDirectory = os.path.dirname(os.path.abspath(outputFilename))
+    temporaryFd, temporaryFilename = tempfile.mkstemp(suffix=".ma", dir=outputDirectory)
+    os.close(temporaryFd)
+    replaced = False
+    try:
+        writer = FbxPatchWriter(sourceFd, temporaryFilename)
+        try:
+            for start, end, replacement in patches:
+                writer.Patch(start, end, replacement)
+            
+            writer.Finish(os.fstat(sourceFd).st_size, sync=True)
+        finally:
+            writer.Close()
+        
+        shutil.copymode(filename, temporaryFilename)
+        ReplaceFile(temporaryFilename, outputFilename)
+        replaced = True
+    finally:
+        if not replaced and os.path.exists(temporaryFilename):
+            os.remove(temporaryFilename)
+
+def PatchSequencerData(filename, patch, outputFilename=None):
+    '''
+    Rewrites the SequencerData values of the .ma scene filename, in place or to outputFilename
+    patch(animations) is given copies of the animation records in display order and returns the
+    new ones; it may rename, re-range, reselect, reorder or drop animations, but not add any
+    Returns True if the scene was written, False if it has no SequencerData or nothing changed
+    '''
+    sourceFd = OpenBinary(filename, os.O_RDONLY)
+    try:
+        if os.fstat(sourceFd).st_size == 0:
+            return False
+        
+        data = mmap.mmap(sourceFd, 0, access=mmap.ACCESS_READ)
+        try:
+            blockRange = FindSequencerBlock(data)
+            if blockRange is None:
+                return False
+            
+            block = data[blockRange[0]:blockRange[1]]
+        finally:
+            data.close()
+        
+        uniqueId, animations = ParseSequencerBlock(block)
+        patchedAnimations = patch([dict(animation) for animation in animations])
+        if patchedAnimations == animations:
+            return False
+        
+        statements, animationIds = SequencerStatements(block)
+        for animation in patchedAnimations:
+            if animation["Id"] not in animationIds:
+                raise MayaAsciiError("Animation %d has no attributes in %s; new animations need Maya" % (animation["Id"], filename))
+        
+        # The old statements are cut out and the new ones go after the node's last statement
+        blockStart = blockRange[0]
+        patches = [[blockStart + start, blockStart + end, b""] for start, end in statements]
+        insertPosition = blockStart + len(block.rstrip())
+        patches.append([insertPosition, insertPosition, SequencerSetAttrLines(uniqueId, patchedAnimations)])
+        WritePatchedScene(sourceFd, filename, patches, outputFilename)
+    finally:
+        os.close(sourceFd)
+    
+    return True
+
+class AnimationPatch:
+    '''
+    A patch for PatchSequencerData that renames animations and sets frame ranges by name, e.g.
+        
+        AnimationPatch(renames={"Run": "Run_Fast"}, ranges={"Idle": [0, 59]})
+    
+    Ranges are looked up by the new name. Being a class, it can be sent to worker processes
+    '''
+    Renames = None
+    Ranges = None
+    
+    def __init__(self, renames=None, ranges=None):
+        self.Renames = dict(renames or {})
+        self.Ranges = dict(ranges or {})
+    
+    def __call__(self, animations):
+        for animation in animations:
+            animation["Name"] = self.Renames.get(animation["Name"], animation["Name"])
+            if animation["Name"] in self.Ranges:
+                animation["StartFrame"], animation["EndFrame"] = [int(frame) for frame in self.Ranges[animation["Name"]]]
+        
+        return animations
+
+def PatchSequencerFile(arguments):
+    '''
+    Returns [filename, patched, error] of PatchSequencerData for a [filename, patch] pair
+    '''
+    filename, patch = arguments
+    try:
+        return [filename, PatchSequencerData(filename, patch), None]
+    except (IOError, OSError, ValueError, IndexError, MayaAsciiError) as error:
+        return [filename, False, "%s: %s" % (type(error).__name__, error)]
+
+def PatchSequencerFiles(filenames, patch, workers=None):
+    '''
+    Returns PatchSequencerFile of every file, in order; patches the files on a process pool,
+    so patch must be picklable (e.g. an AnimationPatch)
+    '''
+    return MapSceneFiles(PatchSequencerFile, [[filename, patch] for filename in filenames], workers)
@@ -0,0 +1,225 @@
+'''
+Maya ASCII curves
+
+Trims the keys of Maya ASCII (.ma) scenes without Maya, the offline
+equivalent of TrimKeys. The time based animCurve nodes (animCurveTA, TL, TT
+and TU) are found in the memory mapped file and only their per key setAttr
+statements (.ktv times and values, .kit/.kot tangent types, .kix/.kiy/.kox/.koy
+tangents, locks...) are decoded. A NumPy mask of the key times drops every
+key outside the animations, the same mask is applied to every per key
+attribute, and the kept keys are renumbered from 0.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import re
+import mmap
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxCurves import *
+    from MayaAscii import *
+except ImportError:
+    pass
+
+MayaCurveNodePattern = re.compile(br'^createNode animCurveT[ALTU] ', re.M)
+
+# A per key attribute with one index or an index range, e.g. ktv[0:24] or kit[3]
+MayaKeyAttributePattern = re.compile(r'^([A-Za-z]+)\[(\d+)(?::(\d+))?\]$')
+
+MayaKeyTimeAttribute = "ktv"
+
+def AnimationIntervals(animations):
+    '''
+    Returns the starts and ends of the union of the frame ranges of animations, sorted and disjoint
+    '''
+    ranges = sorted([[animation["StartFrame"], animation["EndFrame"]] for animation in animations
+        if animation["StartFrame"] <= animation["EndFrame"]])
+    
+    intervals = []
+    for startFrame, endFrame in ranges:
+        if len(intervals) > 0 and startFrame <= intervals[-1][1]:
+            intervals[-1][1] = max(intervals[-1][1], endFrame)
+        else:
+            intervals.append([startFrame, endFrame])
+    
+    return Numpy.array([start for start, end in intervals], dtype=Numpy.float64), Numpy.array([end for start, end in intervals], dtype=Numpy.float64)
+
+def TimesInside(times, starts, ends):
+    '''
+    Returns a mask of the times inside one of the [starts, ends] intervals
+    '''
+    intervalIndices = Numpy.searchsorted(starts, times, side="right") - 1
+    return (intervalIndices >= 0) & (times <= ends[Numpy.maximum(intervalIndices, 0)])
+
+def KeyAttributeLines(name, indices, values):
+    '''
+    Returns the setAttr statements of a per key attribute, one per run of consecutive indices
+    '''
+    runStarts = Numpy.concatenate([[0], Numpy.flatnonzero(Numpy.diff(indices) != 1) + 1, [len(indices)]])
+    
+    lines = []
+    for runIndex in range(len(runStarts) - 1):
+        first, last = runStarts[runIndex], runStarts[runIndex + 1] - 1
+        text = b" ".join(values[first:last + 1].ravel().tolist()).decode("utf-8")
+        
+        if first == last:
+            lines.append('\tsetAttr ".%s[%d]" %s;' % (name, indices[first], text))
+        elif len(runStarts) == 2 and indices[0] == 0:
+            lines.append('\tsetAttr -s %d ".%s[%d:%d]" %s;' % (len(indices), name, indices[first], indices[last], text))
+        else:
+            lines.append('\tsetAttr ".%s[%d:%d]" %s;' % (name, indices[first], indices[last], text))
+    
+    return lines
+
+def ParseKeyAttributes(block):
+    '''
+    Returns the per key attributes of an animCurve block, as {name: [indices, values (keys, values per key)]},
+    their names in file order and the [start, end] of their setAttr statements
+    '''
+    statements = []
+    attributes = {}
+    attributeNames = []
+    for start, end, statement in MayaStatements(block):
+        if statement[0] != b"setAttr":
+            continue
+        
+        attributeName, values = ParseSetAttr(statement)
+        match = MayaKeyAttributePattern.match(attributeName)
+        if match is None:
+            continue
+        
+        name, first = match.group(1), int(match.group(2))
+        last = first if match.group(3) is None else int(match.group(3))
+        count = last - first + 1
+        if count <= 0 or len(values) % count != 0:
+            raise MayaAsciiError("%s has %d values for %d keys" % (attributeName, len(values), count))
+        
+        if name not in attributes:
+            attributes[name] = [[], []]
+            attributeNames.append(name)
+        
+        attributes[name][0].append(Numpy.arange(first, last + 1))
+        attributes[name][1].append(Numpy.array(values).reshape(count, len(values) // count))
+        statements.append([start, end])
+    
+    for name in attributeNames:
+        attributes[name] = [Numpy.concatenate(attributes[name][0]), Numpy.concatenate(attributes[name][1])]
+    
+    return attributes, attributeNames, statements
+
+def TrimCurveBlock(block, starts, ends, trimStart=None, trimEnd=None):
+    '''
+    Returns the [start, end, replacement] patches of an animCurve block that remove its keys outside
+    the [starts, ends] intervals (and inside [trimStart, trimEnd], if given), and the number of keys
+    removed. A curve without a key inside the intervals is left alone; deleting it needs Maya
+    '''
+    attributes, attributeNames, statements = ParseKeyAttributes(block)
+    if MayaKeyTimeAttribute not in attributes:
+        return [], 0
+    
+    keyIndices, keyValues = attributes[MayaKeyTimeAttribute]
+    times = keyValues[:, 0].astype(Numpy.float64)
+    
+    removed = ~TimesInside(times, starts, ends)
+    if trimStart is not None:
+        removed &= times >= trimStart
+    
+    if trimEnd is not None:
+        removed &= times <= trimEnd
+    
+    if not removed.any() or removed.all():
+        return [], 0
+    
+    # Keys without a time (there should be none) are kept
+    keyCount = max([attributes[name][0].max() for name in attributeNames]) + 1
+    keep = Numpy.ones(keyCount, dtype=bool)
+    keep[keyIndices[removed]] = False
+    newIndices = Numpy.cumsum(keep) - 1
+    
+    lines = []
+    for name in attributeNames:
+        indices, values = attributes[name]
+        order = Numpy.argsort(indices, kind="mergesort")
+        indices, values = indices[order], values[order]
+        
+        kept = keep[indices]
+        if kept.any():
+            lines += KeyAttributeLines(name, newIndices[indices[kept]], values[kept])
+    
+    # The first key statement is replaced by all of the new ones, the others are cut out
+    replacement = "".join(["\n" + line for line in lines]).encode("utf-8")
+    patches = [[statements[0][0], statements[0][1], replacement]] + [[start, end, b""] for start, end in statements[1:]]
+    return patches, int(removed.sum())
+
+def TrimMayaAsciiKeys(filename, outputFilename=None, animations=None, trimStart=None, trimEnd=None):
+    '''
+    Removes the keys of the time based animCurve nodes of the .ma scene filename that are outside
+    every animation, in place or to outputFilename; animations are records with a StartFrame and
+    EndFrame, by default the ones of the scene's SequencerData. Key times are in the scene's time unit
+    Returns the number of keys removed; nothing is written if there are none
+    '''
+    RequireNumpy()
+    
+    sourceFd = OpenBinary(filename, os.O_RDONLY)
+    try:
+        if os.fstat(sourceFd).st_size == 0:
+            return 0
+        
+        data = mmap.mmap(sourceFd, 0, access=mmap.ACCESS_READ)
+        try:
+            if animations is None:
+                blockRange = FindSequencerBlock(data)
+                if blockRange is None:
+                    return 0
+                
+                animations = ParseSequencerBlock(data[blockRange[0]:blockRange[1]])[1]
+            
+            # Without animations every key would go
+            if len(animations) == 0:
+                return 0
+            
+            starts, ends = AnimationIntervals(animations)
+            
+            patches = []
+            removedCount = 0
+            for match in MayaCurveNodePattern.finditer(data):
+                blockStart = match.start()
+                blockEnd = MayaBlockEndPattern.search(data, match.end())
+                blockEnd = len(data) if blockEnd is None else blockEnd.start()
+                
+                curvePatches, curveRemovedCount = TrimCurveBlock(data[blockStart:blockEnd], starts, ends, trimStart, trimEnd)
+                patches += [[blockStart + start, blockStart + end, replacement] for start, end, replacement in curvePatches]
+                removedCount += curveRemovedCount
+        finally:
+            data.close()
+        
+        if removedCount > 0:
+            WritePatchedScene(sourceFd, filename, patches, outputFilename)
+    finally:
+        os.close(sourceFd)
+    
+    return removedCount
+
+def TrimMayaAsciiFile(filename):
+    '''
+    Returns [filename, keys removed, error] of TrimMayaAsciiKeys for filename
+    '''
+    try:
+        return [filename, TrimMayaAsciiKeys(filename), None]
+    except (IOError, OSError, ValueError, IndexError, MayaAsciiError) as error:
+        return [filename, 0, "%s: %s" % (type(error).__name__, error)]
+
+def TrimMayaAsciiFiles(filenames, workers=None):
+    '''
+    Returns TrimMayaAsciiFile of every file, in order, trimmed on a process pool
+    '''
+    return MapSceneFiles(TrimMayaAsciiFile, filenames, workers)
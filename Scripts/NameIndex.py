@@ -0,0 +1,95 @@
+'''
+Name index
+
+Finds the names containing a piece of text (case insensitive) without
+scanning them all. Every name is broken into its 1, 2 and 3 character
+grams, each mapped to the ids of the names that contain it. A query of up to
+three characters is a single lookup; a longer one intersects the sets of its
+trigrams, smallest first, and only the few names left are checked in full.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+NameGramLength = 3
+
+def NameGrams(text):
+    '''
+    Returns every 1 to NameGramLength character piece of text
+    '''
+    grams = set()
+    for length in range(1, NameGramLength + 1):
+        for start in range(len(text) - length + 1):
+            grams.add(text[start:start + length])
+    
+    return grams
+
+class NameIndex:
+    '''
+    Animation ids by the text of their names, e.g.
+        
+        index = NameIndex()
+        index.Add(4, "Run_Fast")
+        index.Match("fast")
+    
+    Add, Rename and Remove keep it up to date as names change
+    '''
+    Names = None
+    Grams = None
+    
+    def __init__(self):
+        self.Names = {}
+        self.Grams = {}
+    
+    def Count(self):
+        return len(self.Names)
+    
+    def Add(self, animationId, name):
+        name = (name or "").lower()
+        self.Names[animationId] = name
+        
+        for gram in NameGrams(name):
+            if gram not in self.Grams:
+                self.Grams[gram] = set()
+            
+            self.Grams[gram].add(animationId)
+    
+    def Remove(self, animationId):
+        if animationId not in self.Names:
+            return
+        
+        for gram in NameGrams(self.Names[animationId]):
+            animationIds = self.Grams[gram]
+            animationIds.discard(animationId)
+            if len(animationIds) == 0:
+                del self.Grams[gram]
+        
+        del self.Names[animationId]
+    
+    def Rename(self, animationId, name):
+        self.Remove(animationId)
+        self.Add(animationId, name)
+    
+    def Match(self, text):
+        '''
+        Returns the set of ids whose names contain text, every id for an empty text
+        '''
+        text = text.lower()
+        if len(text) == 0:
+            return set(self.Names)
+        
+        if len(text) <= NameGramLength:
+            return set(self.Grams.get(text, ()))
+        
+        trigramIds = []
+        for start in range(len(text) - NameGramLength + 1):
+            animationIds = self.Grams.get(text[start:start + NameGramLength])
+            if animationIds is None:
+                return set()
+            
+            trigramIds.append(animationIds)
+        
+        trigramIds.sort(key=len)
+        candidates = trigramIds[0].intersection(*trigramIds[1:])
+        return set([animationId for animationId in candidates if text in self.Names[animationId]])
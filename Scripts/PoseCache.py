@@ -0,0 +1,381 @@
+'''
+Pose cache
+
+Baking, playblasts and every export evaluate the same rig over the same
+frames again and again. The local transform channels of every joint on every
+frame of an animation (translate, rotate and scale, a (frames, joints, 9)
+array) are sampled once and stored as a .npy file in a folder next to the
+scene, read back memory mapped so readers share the pages instead of driving
+the timeline.
+
+Each file is named by a hash of what its poses depend on: the joints, the
+animation's frame range, and the keys of their channels in that range and
+the ones just around it. Editing the keys of one animation changes the hash
+of that range only, so the other animations are still found; files no
+longer named by any animation are pruned.
+
+Poses come from a source: SessionPoseSource samples the open scene with a
+PoseSampler, MayaAsciiPoseSource evaluates the animCurves of a .ma scene without
+Maya.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import re
+import json
+import mmap
+import hashlib
+import tempfile
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from FbxStitcher import *
+    from FbxCurves import *
+    from MayaAscii import *
+    from MayaCurves import *
+    from AnimationCurve import *
+    from PoseSampler import *
+except ImportError:
+    pass
+
+# Short names of the channels, and of the compounds that set three of them
+PoseChannelNames = {"tx": 0, "ty": 1, "tz": 2, "rx": 3, "ry": 4, "rz": 5, "sx": 6, "sy": 7, "sz": 8}
+
+PoseCompoundNames = {"t": 0, "translate": 0, "r": 3, "rotate": 3, "s": 6, "scale": 6}
+
+# Folder of the cache, next to the scene
+PoseCacheSuffix = "_Poses"
+
+PoseCacheExtension = ".npy"
+
+# Part of every key; changing how poses are sampled invalidates the old files
+PoseCacheVersion = 1
+
+MayaJointNodePattern = re.compile(br'^createNode joint ', re.M)
+
+MayaConnectionPattern = re.compile(br'^connectAttr (?:-\S+ )*"([^"]+)\.o(?:utput)?" "([^"]+)\.([A-Za-z]+)"', re.M)
+
+class PoseCacheError(Exception):
+    pass
+
+def PoseChannelIndex(attributeName):
+    '''
+    Returns the index in PoseChannels of a channel's long or short name, or None
+    '''
+    if attributeName in PoseChannels:
+        return PoseChannels.index(attributeName)
+    
+    return PoseChannelNames.get(attributeName)
+
+def PoseCacheDirectory(sceneFilename):
+    return os.path.splitext(sceneFilename)[0] + PoseCacheSuffix
+
+def PoseKey(joints, startFrame, endFrame, keyData):
+    '''
+    Returns the hex digest that names the poses of joints over [startFrame, endFrame], keyData
+    being byte strings of everything that drives them
+    '''
+    digest = hashlib.sha1()
+    digest.update(json.dumps([PoseCacheVersion, PoseChannels, list(joints), startFrame, endFrame]).encode("utf-8"))
+    for data in keyData:
+        digest.update(b"%d:" % len(data))
+        digest.update(data)
+    
+    return digest.hexdigest()
+
+class PoseCache:
+    '''
+    Pose arrays stored in directory as .npy files named by their PoseKey, e.g.
+        
+        cache = PoseCache(PoseCacheDirectory("Hero.ma"))
+        poses = cache.Get(key, lambda: source.Sample(frames))
+    
+    Arrays are returned memory mapped and read only
+    '''
+    Directory = ""
+    
+    def __init__(self, directory):
+        self.Directory = directory
+    
+    def Filename(self, key):
+        return os.path.join(self.Directory, key + PoseCacheExtension)
+    
+    def Load(self, key, shape=None):
+        '''
+        Returns the poses stored under key, or None
+        Raises PoseCacheError if they are not of shape, when given
+        '''
+        filename = self.Filename(key)
+        if not os.path.exists(filename):
+            return None
+        
+        # A file cut short (by a crash) is sampled again
+        try:
+            poses = Numpy.load(filename, mmap_mode="r")
+        except (IOError, ValueError):
+            return None
+        
+        if shape is not None and poses.shape != tuple(shape):
+            raise PoseCacheError("Poses of shape %s under %s, expected %s" % (poses.shape, key, tuple(shape)))
+        
+        return poses
+    
+    def Store(self, key, poses):
+        '''
+        Writes poses under key, replacing the file in one rename, and returns them memory mapped
+        '''
+        if not os.path.isdir(self.Directory):
+            os.makedirs(self.Directory)
+        
+        temporaryFd, temporaryFilename = tempfile.mkstemp(suffix=PoseCacheExtension, dir=self.Directory)
+        written = False
+        try:
+            temporaryFile = os.fdopen(temporaryFd, "wb")
+            try:
+                Numpy.save(temporaryFile, Numpy.ascontiguousarray(poses, dtype=Numpy.float64))
+            finally:
+                temporaryFile.close()
+            
+            ReplaceFile(temporaryFilename, self.Filename(key))
+            written = True
+        finally:
+            if not written:
+                os.remove(temporaryFilename)
+        
+        return self.Load(key)
+    
+    def Get(self, key, sample, shape=None):
+        '''
+        Returns the poses stored under key, or stores and returns those sample() returns
+        Raises PoseCacheError if the stored poses are not of shape, when given
+        '''
+        poses = self.Load(key, shape)
+        if poses is None:
+            poses = self.Store(key, sample())
+        
+        return poses
+    
+    def Keys(self):
+        if not os.path.isdir(self.Directory):
+            return []
+        
+        return sorted([os.path.splitext(fileName)[0] for fileName in os.listdir(self.Directory) if fileName.endswith(PoseCacheExtension)])
+    
+    def Prune(self, keys):
+        '''
+        Removes the files of every key but keys, and returns how many were removed
+        '''
+        keptKeys = set(keys)
+        removedKeys = [key for key in self.Keys() if key not in keptKeys]
+        for key in removedKeys:
+            os.remove(self.Filename(key))
+        
+        return len(removedKeys)
+
+def CachePoses(cache, source, ranges, prune=False):
+    '''
+    Returns {name: poses (frames, joints, 9)} of the [name, startFrame, endFrame] ranges, every
+    frame of each from the first to the last, out of cache or sampled by source and stored;
+    with prune, the files of other ranges (and other joints) are removed
+    '''
+    RequireNumpy()
+    
+    poses = {}
+    keys = []
+    for name, startFrame, endFrame in ranges:
+        frames = Numpy.arange(startFrame, endFrame + 1, dtype=Numpy.float64)
+        key = PoseKey(source.Joints, startFrame, endFrame, source.RangeKeyData(startFrame, endFrame))
+        poses[name] = cache.Get(key, lambda: source.Sample(frames), (len(frames), len(source.Joints), len(PoseChannels)))
+        keys.append(key)
+    
+    if prune:
+        cache.Prune(keys)
+    
+    return poses
+
+class SessionPoseSource:
+    '''
+    The joints of the open scene from rootJoint down, sampled with a PoseSampler
+    '''
+    Joints = None
+    Sampler = None
+    
+    def __init__(self, rootJoint, backend=None):
+        self.Sampler = PoseSampler(rootJoint, backend=backend)
+        self.Joints = self.Sampler.Joints
+    
+    def RangeKeyData(self, startFrame, endFrame):
+        '''
+        Yields the keys of every channel in [startFrame, endFrame] and the ones on either side, or
+        its value if it has none, as JSON
+        '''
+        for joint in self.Joints:
+            for channel in PoseChannels:
+                attribute = "%s.%s" % (joint, channel)
+                if not Cmds.keyframe(attribute, q=True, keyframeCount=True):
+                    yield json.dumps([attribute, Cmds.getAttr(attribute)]).encode("utf-8")
+                    continue
+                
+                # findKeyframe wraps around, so a previous key after the start is the last one
+                firstTime = Cmds.findKeyframe(attribute, which="previous", time=(startFrame, startFrame))
+                lastTime = Cmds.findKeyframe(attribute, which="next", time=(endFrame, endFrame))
+                timeRange = (min(firstTime, startFrame), max(lastTime, endFrame))
+                
+                keys = [attribute]
+                for flags in [{"timeChange": True}, {"valueChange": True}]:
+                    keys.append(Cmds.keyframe(attribute, q=True, time=timeRange, **flags))
+                
+                for flags in [{"inTangentType": True}, {"outTangentType": True}, {"inAngle": True}, {"outAngle": True},
+                    {"inWeight": True}, {"outWeight": True}]:
+                    keys.append(Cmds.keyTangent(attribute, q=True, time=timeRange, **flags))
+                
+                yield json.dumps(keys).encode("utf-8")
+    
+    def Sample(self, frames):
+        return self.Sampler.Sample(frames)
+
+def MayaJointBlock(block):
+    '''
+    Returns the name and the static channel values of the statements of a joint node
+    '''
+    createNode = next(MayaStatements(block))[2]
+    name = ""
+    if b"-n" in createNode:
+        name = UnquoteMelString(createNode[createNode.index(b"-n") + 1])
+    
+    values = list(PoseChannelDefaults)
+    for start, end, statement in MayaStatements(block):
+        if statement[0] != b"setAttr":
+            continue
+        
+        attributeName, attributeValues = ParseSetAttr(statement)
+        if attributeName in PoseCompoundNames and len(attributeValues) == 3:
+            first = PoseCompoundNames[attributeName]
+            values[first:first + 3] = [float(value) for value in attributeValues]
+        elif PoseChannelIndex(attributeName) is not None and len(attributeValues) == 1:
+            values[PoseChannelIndex(attributeName)] = float(attributeValues[0])
+    
+    return name, values
+
+def ShortNodeName(name):
+    return name.split("|")[-1]
+
+class MayaAsciiPoseSource:
+    '''
+    The joints of a .ma scene, evaluated from the animCurves connected to their channels (see
+    ReadMayaCurves) without Maya; frames are in the scene's time unit at framesPerSecond. Joints
+    are matched to connections by their short names
+    '''
+    Joints = None
+    StaticValues = None
+    Curves = None
+    
+    def __init__(self, filename, framesPerSecond=24):
+        RequireNumpy()
+        
+        self.Joints = []
+        self.StaticValues = []
+        self.Curves = []
+        
+        sourceFd = OpenBinary(filename, os.O_RDONLY)
+        try:
+            if os.fstat(sourceFd).st_size == 0:
+                return
+            
+            data = mmap.mmap(sourceFd, 0, access=mmap.ACCESS_READ)
+            try:
+                for match in MayaJointNodePattern.finditer(data):
+                    blockEnd = MayaBlockEndPattern.search(data, match.end())
+                    blockEnd = len(data) if blockEnd is None else blockEnd.start()
+                    
+                    name, values = MayaJointBlock(data[match.start():blockEnd])
+                    self.Joints.append(name)
+                    self.StaticValues.append(values)
+                
+                curves = {}
+                for match in MayaCurveNodePattern.finditer(data):
+                    blockEnd = MayaBlockEndPattern.search(data, match.end())
+                    blockEnd = len(data) if blockEnd is None else blockEnd.start()
+                    
+                    name, curve = MayaCurveFromBlock(data[match.start():blockEnd], framesPerSecond)
+                    curves[name] = curve
+                
+                jointIndices = dict([(ShortNodeName(joint), jointIndex) for jointIndex, joint in enumerate(self.Joints)])
+                for match in MayaConnectionPattern.finditer(data):
+                    curveName, nodeName, attributeName = [group.decode("utf-8") for group in match.groups()]
+                    channelIndex = PoseChannelIndex(attributeName)
+                    curveName = ShortNodeName(curveName)
+                    nodeName = ShortNodeName(nodeName)
+                    if channelIndex is not None and nodeName in jointIndices and curveName in curves:
+                        self.Curves.append([jointIndices[nodeName], channelIndex, curveName, curves[curveName]])
+            finally:
+                data.close()
+        finally:
+            os.close(sourceFd)
+        
+        self.StaticValues = Numpy.array(self.StaticValues, dtype=Numpy.float64).reshape(len(self.Joints), len(PoseChannels))
+    
+    def RangeKeyData(self, startFrame, endFrame):
+        '''
+        Yields the static values of the joints, then the keys of every connected curve in
+        [startFrame, endFrame] and the ones on either side (all of them if its infinity repeats them)
+        '''
+        yield self.StaticValues.tobytes()
+        
+        for jointIndex, channelIndex, curveName, curve in self.Curves:
+            first = max(Numpy.searchsorted(curve.Times, startFrame, side="left") - 1, 0)
+            last = Numpy.searchsorted(curve.Times, endFrame, side="right") + 1
+            outside = curve.Count() > 0 and (startFrame < curve.Times[0] or endFrame > curve.Times[-1])
+            if outside and (curve.PreInfinity != "constant" or curve.PostInfinity != "constant"):
+                first, last = 0, curve.Count()
+            
+            arrays = [curve.Times, curve.Values, curve.InTangentTypes, curve.OutTangentTypes, curve.InSlopes, curve.OutSlopes,
+                curve.InWeights, curve.OutWeights]
+            header = json.dumps([jointIndex, channelIndex, curveName, curve.PreInfinity, curve.PostInfinity, curve.IsWeighted()])
+            yield header.encode("utf-8") + b"".join([array[first:last].tobytes() for array in arrays if array is not None])
+    
+    def Sample(self, frames):
+        frames = Numpy.asarray(frames, dtype=Numpy.float64)
+        poses = Numpy.repeat(self.StaticValues[None], len(frames), axis=0)
+        for jointIndex, channelIndex, curveName, curve in self.Curves:
+            if curve.Count() > 0:
+                poses[:, jointIndex, channelIndex] = curve.Evaluate(frames)
+        
+        return poses
+
+def CacheMayaAsciiPoses(filename, framesPerSecond=24, animations=None):
+    '''
+    Returns {animation name: poses} of the joints of the .ma scene filename over the animations
+    of its SequencerData (or animations, records with a Name, StartFrame and EndFrame), cached
+    next to the scene, whose stale files are pruned
+    '''
+    if animations is None:
+        sequencerData = ReadSequencerData(filename)
+        animations = [] if sequencerData is None else sequencerData[1]
+    
+    source = MayaAsciiPoseSource(filename, framesPerSecond)
+    ranges = [[animation["Name"], animation["StartFrame"], animation["EndFrame"]] for animation in animations]
+    return CachePoses(PoseCache(PoseCacheDirectory(filename)), source, ranges, prune=True)
+
+def CacheMayaAsciiFile(filename):
+    '''
+    Returns [filename, animations cached, error] of CacheMayaAsciiPoses for filename
+    '''
+    try:
+        return [filename, len(CacheMayaAsciiPoses(filename)), None]
+    except (IOError, OSError, ValueError, IndexError, MayaAsciiError, PoseCacheError) as error:
+        return [filename, 0, "%s: %s" % (type(error).__name__, error)]
+
+def CacheMayaAsciiFiles(filenames, workers=None):
+    '''
+    Returns CacheMayaAsciiFile of every file, in order, cached on a process pool
+    '''
+    return MapSceneFiles(CacheMayaAsciiFile, filenames, workers)
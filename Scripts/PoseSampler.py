@@ -0,0 +1,168 @@
+'''
+Pose sampler
+
+Querying transforms with Cmds.xform or getAttr costs a command per node,
+attribute and frame, millions of them over a skeleton and a long timeline.
+PoseSampler walks a joint hierarchy once, keeping the plugs of each joint's
+local translate, rotate and scale plugs, and evaluates them at every frame
+through one MDGContext, without moving the timeline. Each compound plug is
+read once per joint and frame as a vector, and the rotations of all the
+joints are turned into degrees at once. Values are written straight into a
+preallocated (frames, joints, 9) NumPy array.
+
+The evaluation goes through a backend: OpenMayaPoseBackend in Maya,
+FakePoseBackend (FakeMaya.py) on the in-memory stand-in.
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+try:
+    import numpy as Numpy
+except ImportError:
+    Numpy = None
+
+# Standalone use; in the combined Sequencer.py these are already defined
+try:
+    from Common import *
+    from FbxCurves import *
+    from FakeMaya import *
+except ImportError:
+    pass
+
+PoseChannels = ["translateX", "translateY", "translateZ", "rotateX", "rotateY", "rotateZ", "scaleX", "scaleY", "scaleZ"]
+
+PoseChannelDefaults = [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 1.0, 1.0, 1.0]
+
+# Channels evaluated as angles, in degrees like getAttr
+PoseAngleChannels = [3, 4, 5]
+
+# The compound plugs of the channels, in the order of PoseChannels
+PoseCompoundPlugs = ["translate", "rotate", "scale"]
+
+class OpenMayaPoseBackend:
+    '''
+    Evaluates the translate, rotate and scale plugs of the transforms found through OpenMaya
+    '''
+    def Walk(self, rootJoint, descendants=True):
+        '''
+        Returns the names, depth first from rootJoint, and the path and compound plugs of rootJoint
+        and (with descendants) the joints below it
+        '''
+        selection = OpenMaya.MSelectionList()
+        selection.add(rootJoint)
+        rootPath = OpenMaya.MDagPath()
+        selection.getDagPath(0, rootPath)
+        
+        names = []
+        handles = []
+        paths = [rootPath]
+        while len(paths) > 0:
+            path = paths.pop()
+            transform = OpenMaya.MFnTransform(path)
+            names.append(path.partialPathName())
+            handles.append([path] + [transform.findPlug(plugName) for plugName in PoseCompoundPlugs])
+            
+            if not descendants:
+                continue
+            
+            # Pushed in reverse so the first child is walked first
+            for childIndex in reversed(range(path.childCount())):
+                child = path.child(childIndex)
+                if child.hasFn(OpenMaya.MFn.kJoint):
+                    childPath = OpenMaya.MDagPath(path)
+                    childPath.push(child)
+                    paths.append(childPath)
+        
+        return names, handles
+    
+    def Valid(self, names, handles):
+        '''
+        Returns whether the walked transforms still exist under their names
+        '''
+        for name, handle in zip(names, handles):
+            if not handle[0].isValid() or handle[0].partialPathName() != name:
+                return False
+        
+        return True
+    
+    def Evaluate(self, handles, frame, poses):
+        '''
+        Writes the channels of every joint at frame, in the current time unit, to the rows of poses
+        '''
+        context = OpenMaya.MDGContext(OpenMaya.MTime(float(frame), OpenMaya.MTime.uiUnit()))
+        for jointIndex in range(len(handles)):
+            for plugIndex in range(len(PoseCompoundPlugs)):
+                plug = handles[jointIndex][plugIndex + 1]
+                dataHandle = plug.asMDataHandle(context)
+                vector = dataHandle.asVector()
+                plug.destructHandle(dataHandle)
+                poses[jointIndex, 3 * plugIndex:3 * plugIndex + 3] = [vector.x, vector.y, vector.z]
+        
+        # The rotate plugs hold radians
+        poses[:, PoseAngleChannels] = Numpy.degrees(poses[:, PoseAngleChannels])
+
+def DefaultPoseBackend():
+    '''
+    Returns the backend of the current Cmds: OpenMaya in Maya, FakePoseBackend on FakeCmds
+    '''
+    if OpenMaya is None or isinstance(Cmds, FakeCmds):
+        return FakePoseBackend(Cmds)
+    
+    return OpenMayaPoseBackend()
+
+class PoseSampler:
+    '''
+    The local channels of a joint hierarchy (see PoseChannels), sampled over many frames at once, e.g.
+        
+        sampler = PoseSampler("Hips")
+        poses = sampler.Sample(range(0, 121))
+        poses[12, sampler.Joints.index("Head")]
+    '''
+    Joints = None
+    Backend = None
+    Handles = None
+    
+    def __init__(self, rootJoint, descendants=True, backend=None):
+        RequireNumpy()
+        
+        self.Backend = backend or DefaultPoseBackend()
+        self.Joints, self.Handles = self.Backend.Walk(rootJoint, descendants)
+    
+    def Valid(self):
+        '''
+        Returns whether the joints still exist under the names they were walked with
+        '''
+        return self.Backend.Valid(self.Joints, self.Handles)
+    
+    def Sample(self, frames, poses=None):
+        '''
+        Returns the channels of the joints at every frame as a (frames, joints, 9) array, poses if given
+        '''
+        shape = (len(frames), len(self.Joints), len(PoseChannels))
+        if poses is None:
+            poses = Numpy.empty(shape)
+        elif poses.shape != shape:
+            raise ValueError("Poses of shape %s for %d frames of %d joints" % (poses.shape, shape[0], shape[1]))
+        
+        for frameIndex in range(len(frames)):
+            self.Backend.Evaluate(self.Handles, frames[frameIndex], poses[frameIndex])
+        
+        return poses
+
+# The single transform samplers of SampleTransform, by node name
+TransformSamplers = {}
+
+def SampleTransform(nodeName):
+    '''
+    Returns the local translate, rotate and scale of nodeName at the current time
+    The sampler of nodeName is walked once and reused while the node is there
+    '''
+    sampler = TransformSamplers.get(nodeName)
+    if sampler is None or not sampler.Valid():
+        sampler = PoseSampler(nodeName, descendants=False)
+        TransformSamplers[nodeName] = sampler
+    
+    pose = sampler.Sample([Cmds.currentTime(query=True)])[0, 0]
+    return pose[0:3].tolist(), pose[3:6].tolist(), pose[6:9].tolist()
@@ -12,6 +12,12 @@ from functools import partial as Partial
 
 SequencerVersion = "1.8.0"
 
+# Port of the JSON-RPC server pipeline tools read the sequencer from
+SequencerServerPort = 7810
+
+# Rows the filter shows or hides at once, the rest follow when Maya is idle, so typing stays responsive
+FilterRowsPerStep = 200
+
 class Animation:
     Id = -1
     Name = ""
@@ -32,18 +38,24 @@ class AnimationUI:
     EndFrameTextField = None
     SelectedCheckBox = None
     SetButton = None
+    RowLayout = None
+    Visible = True
     
     Animation = None
     SequencerUI = None
     
-    def __init__(self, sequencerUI, animation):
+    def __init__(self, sequencerUI, animation, rowLayout=None):
+        self.RowLayout = rowLayout
         self.Create(sequencerUI, animation)
         
     def Name_Changed(self, extraArg=None):
-        self.Animation.Name = Cmds.textField(self.NameTextField, q=True, text=True)
+        self.SequencerUI.sequencer.RenameAnimation(self.Animation.Id, Cmds.textField(self.NameTextField, q=True, text=True))
         self.SequencerUI.Save()
         self.SequencerUI.Update()
         
+        # The new name may no longer (or now) match the filter
+        self.SequencerUI.Filter_Changed()
+        
     def StartFrame_Changed(self, extraArg=None):
         self.Animation.StartFrame = int(Cmds.textField(self.StartFrameTextField, q=True, text=True))
         self.SequencerUI.Save()
@@ -74,6 +86,13 @@ class AnimationUI:
         self.EndFrameTextField = Cmds.textField(text=str(animation.EndFrame), cc=self.EndFrame_Changed)
         self.SetButton = Cmds.button(label='Set', c=self.Set_Clicked)
         
+    def SetVisible(self, visible):
+        if self.RowLayout is None or visible == self.Visible:
+            return
+        
+        Cmds.rowLayout(self.RowLayout, e=True, visible=visible)
+        self.Visible = visible
+    
     def Destroy(self):
         Cmds.deleteUI(self.SelectedCheckBox)
         Cmds.deleteUI(self.NameTextField)
@@ -83,8 +102,14 @@ class AnimationUI:
 class Sequencer:
     UniqueId = 0 # Stores the top unique id 
     
-    Animations = {} # Stores the animations keyed by a unique id
-    Ordering = [] # Stores the order in which the animations are to be displayed by the UI
+    Animations = None # Stores the animations keyed by a unique id
+    Ordering = None # Stores the order in which the animations are to be displayed by the UI
+    
+    def __init__(self):
+        # Per instance, so that sequencers do not share their animations
+        self.Animations = {}
+        self.Ordering = []
+        self.nameIndex = None
     
     def GetUniqueId(self):
         self.UniqueId = self.UniqueId + 1
@@ -92,7 +117,7 @@ class Sequencer:
     
     def Count(self):
         if not len(self.Animations) == len(self.Ordering):
-            print "Warning: Animations dictionary and Ordering list do not have same number of elements"
+            print("Warning: Animations dictionary and Ordering list do not have same number of elements")
         
         return len(self.Animations)
         
@@ -115,10 +140,24 @@ class Sequencer:
                 
         return endFrame
         
+    def NameIndex(self):
+        '''
+        Returns the index of the animation names, built on first use and kept up to date after
+        '''
+        if self.nameIndex is None:
+            self.nameIndex = NameIndex()
+            for animation in self.Animations.values():
+                self.nameIndex.Add(animation.Id, animation.Name)
+        
+        return self.nameIndex
+    
     def AddAnimationWithId(self, animation):
         self.Animations[animation.Id] = animation
         self.Ordering.append(animation.Id)
         
+        if self.nameIndex is not None:
+            self.nameIndex.Add(animation.Id, animation.Name)
+    
     def AddAnimation(self, animation):
         # Check if it exists perhaps?
         animation.Id = self.GetUniqueId()
@@ -128,6 +167,266 @@ class Sequencer:
         del self.Animations[animationId]
         self.Ordering.remove(animationId)
         
+        if self.nameIndex is not None:
+            self.nameIndex.Remove(animationId)
+    
+    def RenameAnimation(self, animationId, name):
+        self.Animations[animationId].Name = name
+        
+        if self.nameIndex is not None:
+            self.nameIndex.Rename(animationId, name)
+
+def AttributeName(baseNode, attributeName):
+    return "%s.%s" % (baseNode, attributeName)
+
+def LoadSequencer(sequencerNode="SequencerData"):
+    '''
+    Returns a Sequencer populated from the maya node sequencerNode
+    '''
+    Attr = AttributeName
+    
+    sequencer = Sequencer()
+    
+    if not Cmds.objExists(sequencerNode):
+        return sequencer
+        
+    sequencer.UniqueId = Cmds.getAttr(Attr(sequencerNode, 'UniqueId'))
+    ordering = Cmds.getAttr(Attr(sequencerNode, 'Ordering'))
+    
+    if ordering is None or len(ordering) == 0:
+        return sequencer
+    
+    try:
+        for orderId in range(len(ordering)):
+            animationId = ordering[orderId]
+            parentAttribute = Attr(sequencerNode, 'Animation%d' % animationId)
+            
+            name = Cmds.getAttr(Attr(parentAttribute, "Name%d" % animationId))
+            startFrame = Cmds.getAttr(Attr(parentAttribute, "StartFrame%d" % animationId))
+            endFrame = Cmds.getAttr(Attr(parentAttribute, "EndFrame%d" % animationId))
+            selected = Cmds.getAttr(Attr(parentAttribute, "Selected%d" % animationId))
+            
+            animation = Animation(name, startFrame, endFrame, selected, animationId)
+            sequencer.AddAnimationWithId(animation)
+    except TypeError:
+        print("There seems to be an error loading sequencer data, reseting Sequencer")
+        Cmds.delete(sequencerNode)
+        
+    return sequencer
+
+def LoadSequencerFile(sceneFilename):
+    '''
+    Returns a Sequencer read from the .ma scene sceneFilename without opening it in Maya
+    '''
+    sequencer = Sequencer()
+    
+    sequencerData = ReadSequencerData(sceneFilename)
+    if sequencerData is None:
+        return sequencer
+    
+    sequencer.UniqueId = sequencerData[0]
+    for record in sequencerData[1]:
+        sequencer.AddAnimationWithId(Animation(record["Name"], record["StartFrame"], record["EndFrame"], record["Selected"], record["Id"]))
+    
+    return sequencer
+
+def TrimSequencerKeys(sequencer, selection, trimStart, trimEnd):
+    '''
+    Cuts the keys below selection in [trimStart, trimEnd] that are outside every animation of sequencer
+    '''
+    trimRegions = [0] * (trimEnd + 1)
+    for animation in sequencer.Animations.values():
+        trimRegions[animation.StartFrame:animation.EndFrame + 1] = [1] * (animation.EndFrame - animation.StartFrame + 1)
+    
+    i = 0
+    while i < len(trimRegions):
+        tStart = FindIndexOf(trimRegions, 0, i, trimEnd)
+        tEnd = FindIndexOf(trimRegions, 1, tStart, trimEnd) - 1
+        
+        if tEnd < tStart:
+            break
+        
+        Cmds.cutKey(selection, animation='keysOrObjects', option='keys', clear=True, hierarchy='below', time=(tStart,tEnd))
+        
+        i = tEnd + 1
+        i = i + 1
+
+def GenerateSequencerFbx(sequencer, directoryName, prefixText, fileName, singleExport=False, binaryFbx=False, exportAnimations=None, reduceTolerances=None, staticTolerances=None, framesPerSecond=None, scanWorkers=1):
+    '''
+    Exports the selected animations of sequencer into directoryName, one file each, and
+    stitches them into the master fileName.fbx
+    exportAnimations, if given, exports the [animation, fbxFilename] files instead of this session
+    framesPerSecond, if given, resamples the keys of every animation file to that rate (see ResampleFbxKeys)
+    staticTolerances, if given, strips the channels that stay within those tolerances (see StripStaticChannels)
+    reduceTolerances, if given, removes the keys within those tolerances (see ReduceFbxKeys) before stitching
+    scanWorkers processes scan the animation files for stitching (None for one per core); keep 1 in a Maya
+    session, where a process pool would launch Maya itself
+    Returns the filenames of the animation files followed by the master
+    '''
+    generatedAnimationFiles = []
+    
+    # Either cut and export every animation (here or on the farm), or export the timeline once and split it afterwards
+    farmExport = exportAnimations is not None and not singleExport
+    createFiles = not singleExport and not farmExport
+    for animationId in sequencer.Ordering:
+        animation = sequencer.Animations[animationId]
+        if animation.Selected == True:
+            negativeStartFrame = -animation.StartFrame
+            
+            if createFiles == True:
+                Cmds.select(all=True)
+                Cmds.cutKey(time=(sequencer.StartFrame() - 10, animation.StartFrame))
+                Cmds.cutKey(time=(animation.EndFrame, sequencer.EndFrame() + 10))
+                Cmds.keyframe(edit=True, relative=True, timeChange=negativeStartFrame, time=(animation.StartFrame, animation.EndFrame))
+            
+            fbxFilename = "%s/%s%s.fbx" % (directoryName, prefixText, animation.Name)
+            generatedAnimationFiles.append([animation, fbxFilename])
+            
+            if createFiles == True:
+                melCode = 'FBXExport -f "%s"' % fbxFilename
+                Mel.eval(melCode)
+            
+                Cmds.undo()
+                Cmds.undo()
+                Cmds.undo()
+                Cmds.undo()
+        
+    if farmExport:
+        exportAnimations(generatedAnimationFiles)
+    
+    if singleExport:
+        timelineFilename = "%s/%s%s_Timeline.fbx" % (directoryName, prefixText, fileName)
+        Mel.eval('FBXExport -f "%s"' % timelineFilename)
+        
+        splits = [[generatedFilename, generatedAnimation.StartFrame, generatedAnimation.EndFrame] for generatedAnimation, generatedFilename in generatedAnimationFiles]
+        try:
+            SplitFbxTakes(timelineFilename, splits, GetFramesPerSecond())
+        finally:
+            os.remove(timelineFilename)
+    
+    if framesPerSecond is not None:
+        for generatedAnimation, generatedFilename in generatedAnimationFiles:
+            ResampleFbxKeys(generatedFilename, framesPerSecond)
+    
+    # Per animation file, so a channel only has to be static over its own animation
+    if staticTolerances is not None:
+        for generatedAnimation, generatedFilename in generatedAnimationFiles:
+            StripStaticChannels(generatedFilename, tolerances=staticTolerances)
+    
+    if reduceTolerances is not None:
+        for generatedAnimation, generatedFilename in generatedAnimationFiles:
+            ReduceFbxKeys(generatedFilename, tolerances=reduceTolerances)
+    
+    # Open each of these files and stitch them
+    masterFilename = "%s/%s%s.fbx" % (directoryName, prefixText, fileName)
+    takes = [[generatedAnimation.Name, generatedFilename] for generatedAnimation, generatedFilename in generatedAnimationFiles]
+    
+    # A binary master is converted from a stitched ASCII one
+    stitchFilename = masterFilename
+    if binaryFbx:
+        stitchFilename = "%s/%s%s_Ascii.fbx" % (directoryName, prefixText, fileName)
+    
+    # The animation files were just written, an index next to them would never be read again
+    StitchFbxTakesFast(stitchFilename, takes, useIndex=False, workers=scanWorkers)
+    
+    if binaryFbx:
+        ConvertFbxToBinary(stitchFilename, masterFilename)
+        os.remove(stitchFilename)
+    
+    return [generatedFilename for generatedAnimation, generatedFilename in generatedAnimationFiles] + [masterFilename]
+
+def WriteSequencerCsv(sequencer, exportFile, playblastLinks=None):
+    '''
+    Writes the selected animations of sequencer as CSV to exportFile
+    With playblastLinks (animation id to movie filename) a playblast column is added
+    '''
+    if playblastLinks is None:
+        exportFile.write("%s,%s,%s\n" % ('Animation Name', 'Start Frame', 'End Frame'))
+    else:
+        exportFile.write("%s,%s,%s,%s\n" % ('Animation Name', 'Start Frame', 'End Frame', 'Playblast'))
+    
+    for animation in sequencer.Animations.values():
+        if animation.Selected == True:
+            if playblastLinks is None:
+                exportFile.write("%s,%d,%d\n" % (animation.Name, animation.StartFrame, animation.EndFrame))
+            elif animation.Id in playblastLinks:
+                exportFile.write("%s,%d,%d,\"=HYPERLINK(\"\"%s\"\", \"\"[open]\"\")\"\n" % (animation.Name, animation.StartFrame, animation.EndFrame, playblastLinks[animation.Id]))
+            else:
+                exportFile.write("%s,%d,%d,n/a\n" % (animation.Name, animation.StartFrame, animation.EndFrame))
+
+def AnimationRecord(animation):
+    return {"Id": animation.Id, "Name": animation.Name, "StartFrame": animation.StartFrame, "EndFrame": animation.EndFrame,
+        "Selected": animation.Selected}
+
+def RpcAnimations(sequencer, ids=None, selectedOnly=False):
+    '''
+    Returns the animations in display order, only those in ids if given
+    '''
+    animationIds = sequencer.Ordering
+    if ids is not None:
+        wantedIds = set(ids)
+        animationIds = [animationId for animationId in animationIds if animationId in wantedIds]
+    
+    animations = [sequencer.Animations[animationId] for animationId in animationIds]
+    return [AnimationRecord(animation) for animation in animations if animation.Selected or not selectedOnly]
+
+def RpcAnimation(sequencer, id):
+    if id not in sequencer.Animations:
+        raise JsonRpcError(JsonRpcInvalidParams, "No animation with id %s" % id)
+    
+    return AnimationRecord(sequencer.Animations[id])
+
+def RpcFind(sequencer, name):
+    return [AnimationRecord(sequencer.Animations[animationId]) for animationId in sequencer.Ordering
+        if sequencer.Animations[animationId].Name == name]
+
+SequencerRpcMethods = {
+    "Sequencer.Count": lambda sequencer: sequencer.Count(),
+    "Sequencer.Range": lambda sequencer: [sequencer.StartFrame(), sequencer.EndFrame()],
+    "Sequencer.Animations": RpcAnimations,
+    "Sequencer.Animation": RpcAnimation,
+    "Sequencer.Find": RpcFind,
+}
+
+SequencerServerInstance = None
+
+def StartSequencerServer(port=SequencerServerPort):
+    '''
+    Serves the sequencer of the open scene over JSON-RPC on localhost:port, e.g.
+        
+        client = JsonRpcClient(port=SequencerServerPort)
+        animations = client.Call("Sequencer.Animations")
+    
+    Every request or batch loads SequencerData once, on the main thread
+    '''
+    global SequencerServerInstance
+    StopSequencerServer()
+    
+    invoke = None
+    try:
+        import maya.utils
+        invoke = maya.utils.executeInMainThreadWithResult
+    except ImportError:
+        pass
+    
+    SequencerServerInstance = JsonRpcServer(SequencerRpcMethods, port=port, context=LoadSequencer, invoke=invoke)
+    SequencerServerInstance.Start()
+    return SequencerServerInstance
+
+def StopSequencerServer():
+    global SequencerServerInstance
+    if SequencerServerInstance is not None:
+        SequencerServerInstance.Stop()
+        SequencerServerInstance = None
+
+def NotifySequencerChanged(sequencer):
+    '''
+    Tells the subscribed clients that the animations were saved
+    '''
+    if SequencerServerInstance is not None:
+        SequencerServerInstance.Notify("Sequencer.Changed", {"Count": sequencer.Count(), "StartFrame": sequencer.StartFrame(),
+            "EndFrame": sequencer.EndFrame()})
+
 class SequencerUI:
     progressBar = ""
     windowName = ""
@@ -142,10 +441,21 @@ class SequencerUI:
     height = 0
     sequencer = None
     IncludePlayblastLinkCheckBox = None
+    SingleExportCheckBox = None
+    BinaryFbxCheckBox = None
+    ReduceKeysCheckBox = None
+    StripStaticCheckBox = None
+    FarmCheckBox = None
+    ServerCheckBox = None
     
-    AnimationUIs = {}
+    AnimationUIs = None
     
     def __init__(self):
+        self.AnimationUIs = {}
+        self.visibleIds = set()
+        self.filterIds = set()
+        self.pendingFilterIds = []
+        self.filterDeferred = False
         self.progressBar = Mel.eval('$tmp = $gMainProgressBar');
         self.windowName = "SequencerWindow"
         self.windowLayout = "SequencerLayout"
@@ -155,6 +465,8 @@ class SequencerUI:
         self.startFrameTextBox = "SequencerStartFrameTextBox"
         self.endFrameTextBox = "SequencerEndFrameTextBox"
         self.prefixTextBox = "SequencerPrefixTextBox"
+        self.filterTextBox = "SequencerFilterTextBox"
+        self.rateTextBox = "SequencerRateTextBox"
         
         self.windowTitle = "Sequencer " + SequencerVersion
         self.width = 400
@@ -163,49 +475,13 @@ class SequencerUI:
         self.Load()
         
     def AttributeName(self, baseNode, attributeName):
-        return "%s.%s" % (baseNode, attributeName)
+        return AttributeName(baseNode, attributeName)
         
     def Load(self):
         '''
         Populate sequencer class from maya nodes
         '''
-        Attr = self.AttributeName
-        
-        self.sequencer = Sequencer()
-        
-        '''
-        self.sequencer.AddAnimation(Animation("Idle", 1, 30))
-        self.sequencer.AddAnimation(Animation("Run", 61, 90))
-        self.sequencer.AddAnimation(Animation("Walk", 31, 60))
-        
-        return
-        '''
-        
-        sequencerNode = "SequencerData"
-        if not Cmds.objExists(sequencerNode):
-            return
-            
-        self.sequencer.UniqueId = Cmds.getAttr(Attr(sequencerNode, 'UniqueId'))
-        ordering = Cmds.getAttr(Attr(sequencerNode, 'Ordering'))
-        
-        if ordering is None or len(ordering) == 0:
-            return
-        
-        try:
-            for orderId in range(len(ordering)):
-                animationId = ordering[orderId]
-                parentAttribute = Attr(sequencerNode, 'Animation%d' % animationId)
-                
-                name = Cmds.getAttr(Attr(parentAttribute, "Name%d" % animationId))
-                startFrame = Cmds.getAttr(Attr(parentAttribute, "StartFrame%d" % animationId))
-                endFrame = Cmds.getAttr(Attr(parentAttribute, "EndFrame%d" % animationId))
-                selected = Cmds.getAttr(Attr(parentAttribute, "Selected%d" % animationId))
-                
-                animation = Animation(name, startFrame, endFrame, selected, animationId)
-                self.sequencer.AddAnimationWithId(animation)
-        except TypeError:
-            print "There seems to be an error loading sequencer data, reseting Sequencer"
-            Cmds.delete(sequencerNode)
+        self.sequencer = LoadSequencer()
         
     def Save(self):
         '''
@@ -227,6 +503,7 @@ class SequencerUI:
         Cmds.setAttr(Attr(sequencerNode, 'Ordering'), self.sequencer.Ordering, type='Int32Array')
         
         if self.sequencer.Count() == 0:
+            NotifySequencerChanged(self.sequencer)
             return
             
         Cmds.addAttr(sequencerNode, longName='Animations', attributeType='compound', numberOfChildren=self.sequencer.Count())
@@ -251,14 +528,16 @@ class SequencerUI:
         if len(selection) > 0:
             Cmds.select(selection)
         
+        NotifySequencerChanged(self.sequencer)
+
     def CreateAnimationEntry(self, animation):
         '''
         Create the UI entry for the animation
         '''
         Cmds.setParent(self.animationsLayout)
-        Cmds.rowLayout(numberOfColumns = 5, columnWidth5 = [35, 185, 50, 50, 35], columnAttach=[1, 'left', 8])
+        rowLayout = Cmds.rowLayout(numberOfColumns = 5, columnWidth5 = [35, 185, 50, 50, 35], columnAttach=[1, 'left', 8])
         
-        self.AnimationUIs[animation.Id] = AnimationUI(self, animation)
+        self.AnimationUIs[animation.Id] = AnimationUI(self, animation, rowLayout)
         
     def Refresh(self, extraArg=None):
         '''
@@ -300,13 +579,18 @@ class SequencerUI:
         
         # Add back based on order
         
-        #print self.sequencer.Ordering
+        #print(self.sequencer.Ordering)
         #return
         
         for orderId in range(len(self.sequencer.Ordering)):
             animationId = self.sequencer.Ordering[orderId]
             self.CreateAnimationEntry(self.sequencer.Animations[animationId])
             
+        # The new rows are all shown, hide the ones the filter leaves out
+        self.visibleIds = set(self.AnimationUIs)
+        self.pendingFilterIds = []
+        self.Filter_Changed()
+        
         # Update
         self.Update()
         
@@ -318,6 +602,47 @@ class SequencerUI:
         Cmds.textField(self.startFrameTextBox, e=True, text=str(self.sequencer.StartFrame()))
         Cmds.textField(self.endFrameTextBox, e=True, text=str(self.sequencer.EndFrame()))
         
+    def Filter_Changed(self, extraArg=None):
+        '''
+        Shows only the animations whose names contain the filter text; only rows that change are touched
+        '''
+        filterText = ""
+        if Cmds.textField(self.filterTextBox, q=True, exists=True):
+            filterText = Cmds.textField(self.filterTextBox, q=True, text=True)
+        
+        self.filterIds = self.sequencer.NameIndex().Match(filterText)
+        self.filterIds.intersection_update(self.AnimationUIs)
+        
+        # Top rows first; rows still pending from the last keystroke are compared again
+        changedIds = self.filterIds.symmetric_difference(self.visibleIds)
+        self.pendingFilterIds = [animationId for animationId in self.sequencer.Ordering if animationId in changedIds]
+        self.pendingFilterIds.reverse()
+        self.ApplyFilter()
+    
+    def ApplyFilter(self):
+        '''
+        Shows or hides the next FilterRowsPerStep pending rows and defers the rest to when Maya is idle
+        '''
+        for step in range(min(FilterRowsPerStep, len(self.pendingFilterIds))):
+            animationId = self.pendingFilterIds.pop()
+            if animationId not in self.AnimationUIs:
+                continue
+            
+            visible = animationId in self.filterIds
+            self.AnimationUIs[animationId].SetVisible(visible)
+            if visible:
+                self.visibleIds.add(animationId)
+            else:
+                self.visibleIds.discard(animationId)
+        
+        if len(self.pendingFilterIds) > 0 and not self.filterDeferred:
+            self.filterDeferred = True
+            Cmds.evalDeferred(self.ApplyDeferredFilter, lowestPriority=True)
+    
+    def ApplyDeferredFilter(self):
+        self.filterDeferred = False
+        self.ApplyFilter()
+    
     def MoveUp(self, extraArg=None):
         '''
         Moves a given entry (or a collection of entries) up
@@ -460,42 +785,36 @@ class SequencerUI:
             
             playblastPrefix = self.InputBox("Enter prefix (if any)")
         
+        playblastLinks = None
+        if includePlayblastLink:
+            playblastLinks = {}
+            for animation in self.sequencer.Animations.values():
+                playblastLink = "%s.avi" % self.GetPlayblastMovieFilename(playblastFolder, playblastPrefix, animation)
+                if os.path.isfile(playblastLink):
+                    playblastLinks[animation.Id] = playblastLink
+        
         now = datetime.datetime.now()
         exportFilename = "%s/Export %d%d%d-%d%d%d.csv" % (directoryName, now.year, now.month, now.day, now.hour, now.minute, now.second)
         exportFile = open(exportFilename, "w")
-        
-        if not includePlayblastLink:
-            exportFile.write("%s,%s,%s\n" % ('Animation Name', 'Start Frame', 'End Frame'))
-        else:
-            exportFile.write("%s,%s,%s,%s\n" % ('Animation Name', 'Start Frame', 'End Frame', 'Playblast'))
-        
-        for animation in self.sequencer.Animations.values():
-            if animation.Selected == True:
-                if not includePlayblastLink:
-                    exportFile.write("%s,%d,%d\n" % (animation.Name, animation.StartFrame, animation.EndFrame))
-                else:
-                    playblastLink = "%s.avi" % self.GetPlayblastMovieFilename(playblastFolder, playblastPrefix, animation)
-                    if os.path.isfile(playblastLink):
-                        exportFile.write("%s,%d,%d,\"=HYPERLINK(\"\"%s\"\", \"\"[open]\"\")\"\n" % (animation.Name, animation.StartFrame, animation.EndFrame, playblastLink))
-                    else:
-                        exportFile.write("%s,%d,%d,n/a\n" % (animation.Name, animation.StartFrame, animation.EndFrame))
-        
+        self.WriteCsv(exportFile, playblastLinks)
         exportFile.close()
         
         choice = Cmds.confirmDialog(title='Export Complete!', message='Do you want to open the file %s now?' % (exportFilename), button=['Yes','No'], defaultButton='Yes', cancelButton='No', dismissString='No')
         if choice == 'Yes':
             os.startfile(exportFilename)
         
+    def WriteCsv(self, exportFile, playblastLinks=None):
+        '''
+        Writes the selected animations as CSV to exportFile, see WriteSequencerCsv
+        '''
+        WriteSequencerCsv(self.sequencer, exportFile, playblastLinks)
+        
     def GeneratePlayblast(self, extraArg=None):
         prefixText = Cmds.textField(self.prefixTextBox, q=True, text=True)
         if not IsNoneOrEmpty(prefixText):
             prefixText = "%s_" % prefixText
             
         cameraName = 'persp'
-        blackThick = 1
-        horizontalResolution = 320
-        verticalResolution = 240
-        scalePercentage = 100
         
         if not Cmds.objExists(cameraName):
             self.MessageBox('Playblast generation requires a camera named %s.' % (cameraName), 'Playblast pre-requisite error')
@@ -513,22 +832,39 @@ class SequencerUI:
             self.MessageBox('Please select animations to blast!')
             return
             
-        self.StartProgressBar('Generating Playblast', selectedCount)
+        if self.GeneratePlayblastFiles(directoryName, prefixText) is None:
+            self.MessageBox('Playblast generation canceled by the user')
+            return
+            
+        self.MessageBox('Playblast generation complete!')
+
+    def GeneratePlayblastFiles(self, directoryName, prefixText):
+        '''
+        Blasts the selected animations into directoryName
+        Returns a list of [animation, movieFilename], or None if canceled by the user
+        '''
+        blackThick = 1
+        horizontalResolution = 320
+        verticalResolution = 240
+        scalePercentage = 100
+        
+        generatedMovieFiles = []
+        self.StartProgressBar('Generating Playblast', self.CountSelected())
         for animation in self.sequencer.Animations.values():
             if self.IsProgressBarCanceled():
                 self.EndProgressBar()
-                self.MessageBox('Playblast generation canceled by the user')
-                return
-                
+                return None
+            
             if animation.Selected == True:
                 self.SetPlaybackRange(animation.StartFrame, animation.EndFrame)
                 
                 movieFilename = self.GetPlayblastMovieFilename(directoryName, prefixText, animation)
-                Cmds.playblast(format='movie', filename=movieFilename, clearCache=True, viewer=False, showOrnaments=True, fp=4, percent=scalePercentage, compression='none', widthHeight=(horizontalResolution, verticalResolution), fo=True)
+                movieFilename = Cmds.playblast(format='movie', filename=movieFilename, clearCache=True, viewer=False, showOrnaments=True, fp=4, percent=scalePercentage, compression='none', widthHeight=(horizontalResolution, verticalResolution), fo=True)
+                generatedMovieFiles.append([animation, movieFilename])
                 self.StepProgressBar(1)
         
         self.EndProgressBar()
-        self.MessageBox('Playblast generation complete!')
+        return generatedMovieFiles
 
     def GetPlayblastMovieFilename(self, directoryName, prefixText, animation):
         assert(directoryName)
@@ -573,22 +909,7 @@ class SequencerUI:
         if trimStart < 0:
             self.MessageBox('Trim can start only from 0. Please ensure start frame is valid.', 'Trim keys pre-requisite error')
             
-        trimRegions = [0] * (trimEnd + 1)
-        for animation in self.sequencer.Animations.values():
-            trimRegions[animation.StartFrame:animation.EndFrame + 1] = [1] * (animation.EndFrame - animation.StartFrame + 1)
-        
-        i = 0
-        while i < len(trimRegions):
-            tStart = FindIndexOf(trimRegions, 0, i, trimEnd)
-            tEnd = FindIndexOf(trimRegions, 1, tStart, trimEnd) - 1
-            
-            if tEnd < tStart:
-                break
-            
-            Cmds.cutKey(selection, animation='keysOrObjects', option='keys', clear=True, hierarchy='below', time=(tStart,tEnd))
-            
-            i = tEnd + 1
-            i = i + 1
+        TrimSequencerKeys(self.sequencer, selection, trimStart, trimEnd)
             
         self.MessageBox('Trim complete!')
         
@@ -600,102 +921,189 @@ class SequencerUI:
         mayaFile = Cmds.file(q=True, sn=True)
         directoryName = os.path.dirname(mayaFile)
         fileName = os.path.splitext(os.path.basename(mayaFile))[0]
-        generatedAnimationFiles = []
         
-        createFiles = True
-        for animation in self.sequencer.Animations.values():
-            if animation.Selected == True:
-                negativeStartFrame = -animation.StartFrame
-                
-                if createFiles == True:
-                    Cmds.select(all=True)
-                    Cmds.cutKey(time=(self.sequencer.StartFrame() - 10, animation.StartFrame))
-                    Cmds.cutKey(time=(animation.EndFrame, self.sequencer.EndFrame() + 10))
-                    Cmds.keyframe(edit=True, relative=True, timeChange=negativeStartFrame, time=(animation.StartFrame, animation.EndFrame))
-                
-                fbxFilename = "%s/%s%s.fbx" % (directoryName, prefixText, animation.Name)
-                generatedAnimationFiles.append([animation, fbxFilename])
-                
-                if createFiles == True:
-                    melCode = 'FBXExport -f "%s"' % fbxFilename
-                    Mel.eval(melCode)
-                
-                    Cmds.undo()
-                    Cmds.undo()
-                    Cmds.undo()
-                    Cmds.undo()
-            
         # Make sure at least some files were selected
-        if len(generatedAnimationFiles) == 0:
+        if self.CountSelected() == 0:
             self.MessageBox('Please select at least one animation to export')
             return
         
-        # Ready the progress bar
-        #self.StartProgressBar('Generating FBX', len(generatedAnimationFiles))
+        if not self.IsRateValid():
+            self.MessageBox('The rate should be a number of frames per second, or blank for the scene rate')
+            return
         
-        # Open each of these files and stitch them
-        masterFilename = "%s/%s%s.fbx" % (directoryName, prefixText, fileName)
-        masterFile = open(masterFilename, "w")
-        for animationFileIndex in range(len(generatedAnimationFiles)):
-            '''
-            if self.IsProgressBarCanceled():
-                self.EndProgressBar()
-                self.MessageBox('FBX generation canceled by user!')
-                return
-            '''
-                
-            generatedAnimationFile = generatedAnimationFiles[animationFileIndex]
-            generatedAnimation = generatedAnimationFile[0]
-            generatedFilename = generatedAnimationFile[1]
-            generatedFile = open(generatedFilename, "r")
-            
-            preTake = True
-            inTake = False
-            postTake = False
-            
-            takeString = "Take: \"Take 001\" {"
-            endTakeString = "}"
-            takeLevel = "    "
+        try:
+            self.GenerateFbxFiles(directoryName, prefixText, fileName)
+        except (FbxAsciiError, FbxStitchError, FarmError) as error:
+            self.MessageBox('FBX generation failed: %s' % error)
+            return
+        
+        self.MessageBox('FBX generation complete!')
+    
+    def ExportFrameRate(self):
+        '''
+        Returns the frame rate of the Rate field, or None when it is blank for the scene rate
+        Raises ValueError if it is not a positive number
+        '''
+        rateText = Cmds.textField(self.rateTextBox, q=True, text=True)
+        if IsNoneOrEmpty(rateText) or IsNoneOrEmpty(rateText.strip()):
+            return None
+        
+        framesPerSecond = float(rateText)
+        if not framesPerSecond > 0:
+            raise ValueError("Frame rate %s is not positive" % rateText)
+        
+        return framesPerSecond
+    
+    def IsRateValid(self):
+        try:
+            self.ExportFrameRate()
+        except ValueError:
+            return False
+        
+        return True
+    
+    def GenerateFbxFiles(self, directoryName, prefixText, fileName):
+        '''
+        Runs GenerateSequencerFbx with the options of the FBX row
+        '''
+        singleExport = Cmds.checkBox(self.SingleExportCheckBox, q=True, value=True)
+        binaryFbx = Cmds.checkBox(self.BinaryFbxCheckBox, q=True, value=True)
+        
+        reduceTolerances = None
+        if Cmds.checkBox(self.ReduceKeysCheckBox, q=True, value=True):
+            reduceTolerances = ReductionTolerances
+        
+        staticTolerances = None
+        if Cmds.checkBox(self.StripStaticCheckBox, q=True, value=True):
+            staticTolerances = ReductionTolerances
+        
+        framesPerSecond = self.ExportFrameRate()
+        
+        exportAnimations = None
+        if Cmds.checkBox(self.FarmCheckBox, q=True, value=True):
+            exportAnimations = self.ExportFbxOnFarm
             
-            for currentLine in generatedFile:
-                strippedLine = currentLine.strip(" \r\n")
+        return GenerateSequencerFbx(self.sequencer, directoryName, prefixText, fileName, singleExport, binaryFbx, exportAnimations, reduceTolerances, staticTolerances, framesPerSecond)
+        
+    def ExportFbxOnFarm(self, generatedAnimationFiles):
+        '''
+        Exports the [animation, fbxFilename] files on mayapy workers that each load the saved scene
+        '''
+        if Cmds.file(q=True, modified=True):
+            raise FarmError('please save the Maya file first, the farm exports the saved scene')
+        
+        waitingPayloads = []
+        for animation, fbxFilename in generatedAnimationFiles:
+            waitingPayloads.append({"Name": animation.Name, "StartFrame": animation.StartFrame, "EndFrame": animation.EndFrame,
+                "TimelineStart": self.sequencer.StartFrame() - 10, "TimelineEnd": self.sequencer.EndFrame() + 10, "Filename": fbxFilename})
+        
+        workerCommand, workerEnvironment = MayaFarmCommand(Cmds.file(q=True, sn=True))
+        farm = ExportFarm(workerCommand, environment=workerEnvironment)
+        
+        # Feed the farm and poll its results so the progress bar stays live
+        canceled = False
+        failedJobs = []
+        submittedCount = 0
+        finishedCount = 0
+        self.StartProgressBar('Generating FBX', len(waitingPayloads))
+        try:
+            while len(waitingPayloads) > 0 or finishedCount < submittedCount:
+                while len(waitingPayloads) > 0 and not farm.IsFull():
+                    farm.Submit("fbx", waitingPayloads.pop(0))
+                    submittedCount += 1
                 
-                if not IsNoneOrEmpty(strippedLine):
-                    splitLine = currentLine.split(strippedLine)
-                else:
-                    splitLine = [''] * 2
-                    
-                lineStartsWith = splitLine[0]
-                lineEndsWith = splitLine[1]
+                if not canceled and self.IsProgressBarCanceled():
+                    canceled = True
+                    farm.Cancel()
+                    waitingPayloads = []
                 
-                if strippedLine == takeString:
-                    inTake = True
-                    preTake = False
-                    takeLevel = lineStartsWith
-                    currentLine = currentLine.replace("Take 001", generatedAnimation.Name)
-                    
-                # For the first file, pick from top of file until the take also
-                if animationFileIndex == 0 and preTake == True:
-                    masterFile.write(currentLine)
-                    
-                # For all other files, just cut the take and paste it in
-                if inTake == True:
-                    masterFile.write(currentLine)
-                    
-                # For the last file, pick after the take to the bottom of file
-                if animationFileIndex == (len(generatedAnimationFiles) - 1) and postTake == True:
-                    masterFile.write(currentLine)
-                    
-                if inTake == True and strippedLine == endTakeString and lineStartsWith == takeLevel:
-                    inTake = False
-                    postTake = True
+                try:
+                    job = farm.Results.get(timeout=0.1)
+                except Queue.Empty:
+                    continue
                 
-            #self.StepProgressBar(1)
-            
-        masterFile.close()
+                finishedCount += 1
+                self.StepProgressBar(1)
+                if not job.Succeeded():
+                    failedJobs.append(job)
+        finally:
+            farm.Close()
+            self.EndProgressBar()
         
-        self.MessageBox('FBX generation complete!')
+        if canceled:
+            raise FarmError('canceled by the user')
+        
+        if len(failedJobs) > 0:
+            raise FarmError(', '.join(['%s (%s)' % (job.Payload["Name"], job.Error) for job in failedJobs]))
+
+    def GenerateBundle(self, extraArg=None):
+        '''
+        Exports the FBX files, playblasts and CSV of the selected animations into one zip file
+        All FBX files, then all playblasts, are first written to a temporary staging folder; each
+        file is then compressed into the bundle and deleted, and the staging folder is removed at
+        the end, so only the bundle is written next to the scene
+        '''
+        prefixText = Cmds.textField(self.prefixTextBox, q=True, text=True)
+        if not IsNoneOrEmpty(prefixText):
+            prefixText = "%s_" % prefixText
+        
+        mayaFile = Cmds.file(q=True, sn=True)
+        directoryName = os.path.dirname(mayaFile)
+        if not directoryName:
+            self.MessageBox('Please save Maya file before exporting.')
+            return
         
+        if self.CountSelected() == 0:
+            self.MessageBox('Please select animations to export!')
+            return
+        
+        if not self.IsRateValid():
+            self.MessageBox('The rate should be a number of frames per second, or blank for the scene rate')
+            return
+        
+        fileName = os.path.splitext(os.path.basename(mayaFile))[0]
+        now = datetime.datetime.now()
+        bundleFilename = "%s/%s%s Export %d%d%d-%d%d%d.zip" % (directoryName, prefixText, fileName, now.year, now.month, now.day, now.hour, now.minute, now.second)
+        
+        stagingDirectory = tempfile.mkdtemp(prefix='Sequencer')
+        bundle = ExportBundle(bundleFilename)
+        completed = False
+        try:
+            for generatedFilename in self.GenerateFbxFiles(stagingDirectory, prefixText, fileName):
+                bundle.AddFile(os.path.basename(generatedFilename), generatedFilename, remove=True)
+            
+            playblastLinks = None
+            if Cmds.objExists('persp'):
+                self.PlayblastDisplayEnable(False)
+                generatedMovieFiles = self.GeneratePlayblastFiles(stagingDirectory, prefixText)
+                if generatedMovieFiles is None:
+                    self.MessageBox('Bundle export canceled by the user')
+                    return
+                
+                # Links are relative, next to the CSV inside the bundle
+                playblastLinks = {}
+                for generatedAnimation, movieFilename in generatedMovieFiles:
+                    movieName = "Playblasts/%s" % os.path.basename(movieFilename)
+                    bundle.AddFile(movieName, movieFilename, remove=True)
+                    playblastLinks[generatedAnimation.Id] = movieName
+            
+            csvEntry = bundle.OpenEntry("%s%s.csv" % (prefixText, fileName))
+            self.WriteCsv(csvEntry, playblastLinks)
+            csvEntry.close()
+            completed = True
+        except (FbxAsciiError, FbxStitchError, FarmError) as error:
+            self.MessageBox('Bundle export failed: %s' % error)
+            return
+        finally:
+            # A canceled or failed export leaves no bundle behind
+            if completed:
+                bundle.Close()
+            else:
+                bundle.Abort()
+            shutil.rmtree(stagingDirectory, ignore_errors=True)
+        
+        self.MessageBox('Bundle export complete!\n%s' % bundleFilename)
+
     def Create(self):
         '''
         Creates the window
@@ -718,6 +1126,11 @@ class SequencerUI:
         Cmds.button(label='Move Down', c=Partial(self.MoveDown))
         Cmds.button(label='Refresh', backgroundColor=[0.6, 0.6, 0.9], c=Partial(self.Refresh))
         
+        Cmds.setParent('..')
+        Cmds.rowLayout(numberOfColumns = 2, columnWidth2=[45, 290], columnAlign2=['left', 'left'])
+        Cmds.text(label=' Filter')
+        Cmds.textField(self.filterTextBox, width = 288, textChangedCommand=self.Filter_Changed)
+        
         self.CreateSeparator()
         
         # Tool controls
@@ -727,6 +1140,11 @@ class SequencerUI:
         Cmds.text(label=' Prefix')
         Cmds.textField(self.prefixTextBox, width = 288)
         
+        Cmds.setParent('..')
+        Cmds.rowLayout(numberOfColumns = 2, columnWidth2=[45, 290], columnAlign2=['left', 'left'])
+        Cmds.text(label=' Rate')
+        Cmds.textField(self.rateTextBox, width = 288)
+        
         Cmds.setParent('..')
         Cmds.rowLayout(numberOfColumns = 2, columnWidth2=[200, 48], columnAlign2=['left', 'left'])
         Cmds.text(label=' To import from MoveLister')
@@ -744,10 +1162,26 @@ class SequencerUI:
         self.IncludePlayblastLinkCheckBox = Cmds.checkBox(label='playblast link')
         
         Cmds.setParent('..')
-        Cmds.rowLayout(numberOfColumns = 2, columnWidth2=[200, 48], columnAlign2=['left', 'left'])
+        Cmds.rowLayout(numberOfColumns = 7, columnWidth=[(1, 200), (2, 90), (3, 90), (4, 55), (5, 48), (6, 90), (7, 90)], columnAlign=[(column, 'left') for column in range(1, 8)])
         Cmds.text(label=' To generate animation-aware FBX')
         Cmds.button(label='Generate FBX', c=Partial(self.GenerateFbx), backgroundColor=[0.9, 0.9, 0.8])
+        self.SingleExportCheckBox = Cmds.checkBox(label='single export')
+        self.BinaryFbxCheckBox = Cmds.checkBox(label='binary')
+        self.FarmCheckBox = Cmds.checkBox(label='farm')
+        self.ReduceKeysCheckBox = Cmds.checkBox(label='reduce keys')
+        self.StripStaticCheckBox = Cmds.checkBox(label='strip static')
         
+        Cmds.setParent('..')
+        Cmds.rowLayout(numberOfColumns = 2, columnWidth2=[200, 48], columnAlign2=['left', 'left'])
+        Cmds.text(label=' To export FBX, playblasts and CSV as one zip')
+        Cmds.button(label='Export Bundle', c=Partial(self.GenerateBundle), backgroundColor=[0.9, 0.9, 0.8])
+
+        Cmds.setParent('..')
+        Cmds.rowLayout(numberOfColumns = 2, columnWidth2=[200, 120], columnAlign2=['left', 'left'])
+        Cmds.text(label=' To serve animations to pipeline tools')
+        self.ServerCheckBox = Cmds.checkBox(label='server on %d' % SequencerServerPort, value=SequencerServerInstance is not None,
+            cc=self.Server_Changed)
+
         self.CreateSeparator()
         
         # Skyrigger controls
@@ -778,6 +1212,17 @@ class SequencerUI:
         
         self.Refresh()
         
+    def Server_Changed(self, extraArg=None):
+        if not Cmds.checkBox(self.ServerCheckBox, q=True, value=True):
+            StopSequencerServer()
+            return
+        
+        try:
+            StartSequencerServer()
+        except (IOError, OSError) as error:
+            Cmds.checkBox(self.ServerCheckBox, e=True, value=False)
+            self.MessageBox('Could not start the server on port %d:\n%s' % (SequencerServerPort, error))
+    
     def CreateSeparator(self, parent=None, separatorStyle='double'):
         '''
         Creates a separator
@@ -795,3 +1240,371 @@ def Run():
     sequencerUI = SequencerUI()
     sequencerUI.Create()
     sequencerUI.Show()
+
+def MayaFarmCommand(sceneFilename):
+    '''
+    Returns the command and environment of a mayapy farm worker for sceneFilename
+    '''
+    mayapy = os.path.join(os.environ.get("MAYA_LOCATION", ""), "bin", "mayapy")
+    workerCode = "import maya.standalone; maya.standalone.initialize(); import Sequencer; Sequencer.RunMayaExportWorker(%r)" % sceneFilename
+    
+    # Make sure the worker imports this same Sequencer.py
+    environment = dict(os.environ)
+    pythonPath = [os.path.dirname(os.path.abspath(__file__))]
+    if environment.get("PYTHONPATH"):
+        pythonPath.append(environment["PYTHONPATH"])
+    
+    environment["PYTHONPATH"] = os.pathsep.join(pythonPath)
+    return [mayapy, "-c", workerCode], environment
+
+def ExportAnimationFbx(payload):
+    '''
+    Farm job: moves the keys of one animation to start at frame 0 and exports them, like GenerateFbx does
+    '''
+    Cmds.undoInfo(openChunk=True)
+    try:
+        Cmds.select(all=True)
+        Cmds.cutKey(time=(payload["TimelineStart"], payload["StartFrame"]))
+        Cmds.cutKey(time=(payload["EndFrame"], payload["TimelineEnd"]))
+        Cmds.keyframe(edit=True, relative=True, timeChange=-payload["StartFrame"], time=(payload["StartFrame"], payload["EndFrame"]))
+        Mel.eval('FBXExport -f "%s"' % payload["Filename"])
+    finally:
+        Cmds.undoInfo(closeChunk=True)
+        Cmds.undo()
+    
+    return payload["Filename"]
+
+def RunMayaExportWorker(sceneFilename):
+    '''
+    Entry point of the mayapy farm workers: loads sceneFilename and runs export jobs until stdin closes
+    '''
+    PrepareFbxExport()
+    Cmds.file(sceneFilename, open=True, force=True)
+    Cmds.undoInfo(state=True, infinity=True)
+    
+    RunExportWorker({"fbx": ExportAnimationFbx})
+
+class BatchError(Exception):
+    pass
+
+BatchPipelineSteps = ["bake", "trim", "poses", "fbx", "clips", "csv"]
+
+def PrepareFbxExport():
+    '''
+    Loads the FBX plugin of a headless session and sets the mode the stitcher works on
+    '''
+    Cmds.loadPlugin('fbxmaya', quiet=True)
+    Mel.eval('FBXExportInAscii -v true')
+    Mel.eval('FBXExportFileVersion -v FBX200611')
+
+def FindRootJoint():
+    '''
+    Returns the topmost joint of the scene, or None
+    '''
+    for joint in Cmds.ls(type='joint') or []:
+        parents = Cmds.listRelatives(joint, parent=True)
+        if not parents or not Cmds.nodeType(parents[0]) == 'joint':
+            return joint
+    
+    return None
+
+def ProcessScene(payload):
+    '''
+    Batch job: opens a scene and runs the pipeline steps on its sequencer
+    Returns the animation count, the files written and the seconds each step took
+    '''
+    timings = {}
+    stepStart = time.time()
+    Cmds.file(payload["Scene"], open=True, force=True)
+    sequencer = LoadSequencer()
+    timings["open"] = round(time.time() - stepStart, 3)
+    
+    if payload.get("All"):
+        for animation in sequencer.Animations.values():
+            animation.Selected = True
+    
+    directoryName = payload.get("Output") or os.path.dirname(payload["Scene"])
+    fileName = os.path.splitext(os.path.basename(payload["Scene"]))[0]
+    prefixText = payload.get("Prefix", "")
+    if not IsNoneOrEmpty(prefixText):
+        prefixText = "%s_" % prefixText
+    
+    generatedFiles = []
+    animationFbxFiles = None
+    for step in payload["Pipeline"]:
+        stepStart = time.time()
+        
+        if step in ["bake", "trim", "poses"]:
+            rootJoint = FindRootJoint()
+            if rootJoint is None:
+                raise BatchError("No joint to %s in %s" % (step, payload["Scene"]))
+        
+        if step == "bake":
+            Cmds.select(rootJoint)
+            Bake(sequencer.StartFrame(), sequencer.EndFrame())
+        elif step == "trim":
+            TrimSequencerKeys(sequencer, [rootJoint], sequencer.StartFrame(), sequencer.EndFrame())
+        elif step == "poses":
+            ranges = [[animation.Name, animation.StartFrame, animation.EndFrame] for animation in sequencer.Animations.values()]
+            poses = CachePoses(PoseCache(PoseCacheDirectory(payload["Scene"])), SessionPoseSource(rootJoint), ranges, prune=True)
+            generatedFiles += [poses[name].filename for name in sorted(poses)]
+        elif step == "fbx" and sequencer.Count() > 0:
+            fbxFiles = GenerateSequencerFbx(sequencer, directoryName, prefixText, fileName, payload.get("SingleExport", False), payload.get("Binary", False),
+                reduceTolerances=payload.get("Reduce"), staticTolerances=payload.get("StripStatic"),
+                framesPerSecond=payload.get("FramesPerSecond"), scanWorkers=payload.get("ScanWorkers", 1))
+            animationFbxFiles = fbxFiles[:-1]
+            generatedFiles += fbxFiles
+        elif step == "clips":
+            if animationFbxFiles is None:
+                raise BatchError("The clips step needs the fbx step before it")
+            
+            for fbxFilename in animationFbxFiles:
+                # The fbx step already resampled the keys to this rate
+                generatedFiles.append(EncodeFbxClip(fbxFilename, payload.get("FramesPerSecond") or GetFramesPerSecond())[0])
+        elif step == "csv":
+            csvFilename = "%s/%s%s.csv" % (directoryName, prefixText, fileName)
+            csvFile = open(csvFilename, "w")
+            WriteSequencerCsv(sequencer, csvFile)
+            csvFile.close()
+            generatedFiles.append(csvFilename)
+        
+        timings[step] = round(time.time() - stepStart, 3)
+    
+    if payload.get("Save"):
+        Cmds.file(save=True, force=True)
+    
+    animationList = [AnimationRecord(sequencer.Animations[animationId]) for animationId in sequencer.Ordering]
+    return {"Animations": sequencer.Count(), "AnimationList": animationList, "Files": generatedFiles, "Timings": timings}
+
+def RunBatchWorker():
+    '''
+    Entry point of the batch workers (Sequencer.py --worker); outside mayapy it runs on FakeMaya
+    FakeCmds.file(open=True) does not read the scene, so on FakeMaya every scene is processed as an
+    empty scene: no SequencerData, no animations and nothing exported. Run the workers with mayapy
+    for real scenes; the offline .ma commands (--patch, --trim-offline, --cache-poses) need no Maya
+    '''
+    try:
+        import maya.standalone
+        maya.standalone.initialize()
+    except ImportError:
+        warnings.warn("maya.standalone is not available, the batch worker runs on FakeMaya and opens every scene empty",
+            RuntimeWarning)
+    
+    PrepareFbxExport()
+    RunExportWorker({"scene": ProcessScene})
+
+def WriteSummary(summary, summaryFilename=None):
+    summaryText = json.dumps(summary, indent=4, sort_keys=True)
+    if summaryFilename:
+        summaryFile = open(summaryFilename, "w")
+        summaryFile.write(summaryText)
+        summaryFile.close()
+    else:
+        print(summaryText)
+
+def RunOfflineScenes(arguments, mapFunction, resultKey):
+    '''
+    Runs mapFunction(sceneFilenames, workers) over the .ma scenes under the directory, without Maya, and
+    writes the summary, with the scenes whose result is not empty under resultKey
+    mapFunction returns [sceneFilename, result, error] for every scene; the exit code is 1 if any failed
+    '''
+    startTime = time.time()
+    sceneFilenames = [sceneFilename for sceneFilename in FindScenes(arguments.directory, arguments.pattern or SceneFilePatterns)
+        if sceneFilename.lower().endswith(".ma")]
+    results = mapFunction(sceneFilenames, arguments.workers)
+    
+    failedScenes = [[sceneFilename, error] for sceneFilename, result, error in results if error is not None]
+    summary = {"Directory": arguments.directory, "Scenes": len(results), "Failed": failedScenes,
+        resultKey: dict([(sceneFilename, result) for sceneFilename, result, error in results if result]),
+        "Seconds": round(time.time() - startTime, 3)}
+    WriteSummary(summary, arguments.summary)
+    
+    if len(failedScenes) > 0:
+        return 1
+    
+    return 0
+
+def PatchScenes(arguments):
+    '''
+    Applies the --patch file to the .ma scenes under the directory, e.g. a patch file of
+        
+        {"Renames": {"Run": "Run_Fast"}, "Ranges": {"Idle": [0, 59]}}
+    '''
+    patchFile = open(arguments.patch, "r")
+    try:
+        patchData = json.load(patchFile)
+    finally:
+        patchFile.close()
+    
+    animationPatch = AnimationPatch(patchData.get("Renames"), patchData.get("Ranges"))
+    return RunOfflineScenes(arguments, lambda sceneFilenames, workers: PatchSequencerFiles(sceneFilenames, animationPatch, workers), "Patched")
+
+def TrimScenes(arguments):
+    '''
+    Cuts the keys outside every animation from the time based animCurves of the .ma scenes under the directory
+    '''
+    return RunOfflineScenes(arguments, TrimMayaAsciiFiles, "Trimmed")
+
+def CachePoseScenes(arguments):
+    '''
+    Caches the poses of the joints of the .ma scenes under the directory over each of their animations, without Maya
+    '''
+    return RunOfflineScenes(arguments, CacheMayaAsciiFiles, "Cached")
+
+def Main(argv=None):
+    '''
+    Batch command line: runs a pipeline over every scene under a directory on a pool of workers, e.g.
+        
+        mayapy Sequencer.py Characters --pipeline bake,trim,fbx --workers 8 --summary Summary.json
+    
+    Prints (or writes) a JSON summary with the result and timings of every scene
+    '''
+    parser = argparse.ArgumentParser(description="Runs a Sequencer pipeline over every scene under a directory")
+    parser.add_argument("directory", nargs="?", help="directory searched for scenes")
+    parser.add_argument("--pipeline", help="comma separated steps out of %s, run in order; fbx by default, none with --index" % ",".join(BatchPipelineSteps))
+    parser.add_argument("--pattern", action="append", help="scene file pattern, *.ma and *.mb by default")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes, one per core by default")
+    parser.add_argument("--scan-workers", type=int, default=None, help="processes each worker scans its animation files on before stitching, the cores left per worker by default")
+    parser.add_argument("--timeout", type=float, default=FarmJobTimeout, help="seconds a scene may take")
+    parser.add_argument("--retries", type=int, default=FarmRetries, help="extra attempts for a failed scene")
+    parser.add_argument("--output", help="directory for the exported files, next to each scene by default")
+    parser.add_argument("--prefix", default="", help="prefix of the exported files")
+    parser.add_argument("--all", action="store_true", help="export every animation, not only the selected ones")
+    parser.add_argument("--single-export", action="store_true", help="export the timeline once and split it")
+    parser.add_argument("--binary", action="store_true", help="write the stitched master as binary FBX 6.1 (the same node tree, not FBX 7)")
+    parser.add_argument("--fps", type=float, help="frame rate the exported keys and clips are resampled to, the scene rate by default")
+    parser.add_argument("--reduce", nargs="?", const="", help="remove the baked keys within tolerance before stitching, e.g. T=0.01,R=0.05,S=0.001")
+    parser.add_argument("--strip-static", nargs="?", const="", help="collapse the channels that stay within tolerance to one key before stitching, same format as --reduce")
+    parser.add_argument("--save", action="store_true", help="save the scenes after the pipeline")
+    parser.add_argument("--summary", help="file the JSON summary is written to instead of stdout")
+    parser.add_argument("--index", help="animation index database; only the scenes changed since it was updated are run")
+    parser.add_argument("--patch", help="JSON file of Renames and Ranges by animation name, applied to the .ma scenes without Maya")
+    parser.add_argument("--trim-offline", action="store_true", help="cut the keys outside every animation from the .ma scenes without Maya")
+    parser.add_argument("--cache-poses", action="store_true", help="cache the joint poses of every animation of the .ma scenes without Maya")
+    parser.add_argument("--worker-command", help="command of the worker processes, this script by default")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    arguments = parser.parse_args(argv)
+    
+    if arguments.worker:
+        RunBatchWorker()
+        return 0
+    
+    if arguments.directory is None:
+        parser.error("a directory is required")
+    
+    if arguments.patch:
+        return PatchScenes(arguments)
+    
+    if arguments.trim_offline:
+        return TrimScenes(arguments)
+    
+    if arguments.cache_poses:
+        return CachePoseScenes(arguments)
+    
+    pipelineText = arguments.pipeline
+    if pipelineText is None:
+        pipelineText = "" if arguments.index else "fbx"
+    
+    pipeline = [step.strip() for step in pipelineText.split(",") if step.strip()]
+    for step in pipeline:
+        if step not in BatchPipelineSteps:
+            parser.error("unknown pipeline step %s" % step)
+    
+    if arguments.worker_command:
+        workerCommand = shlex.split(arguments.worker_command)
+    else:
+        workerCommand = [sys.executable, os.path.abspath(__file__), "--worker"]
+    
+    reduceTolerances = None
+    if arguments.reduce is not None:
+        try:
+            reduceTolerances = ParseTolerances(arguments.reduce)
+        except ValueError as error:
+            parser.error(str(error))
+    
+    if arguments.fps is not None and not arguments.fps > 0:
+        parser.error("the frame rate should be positive")
+    
+    staticTolerances = None
+    if arguments.strip_static is not None:
+        try:
+            staticTolerances = ParseTolerances(arguments.strip_static)
+        except ValueError as error:
+            parser.error(str(error))
+    
+    workers = arguments.workers
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    
+    # The scene workers already run in parallel, so each scans on its share of the cores
+    scanWorkers = arguments.scan_workers
+    if scanWorkers is None:
+        scanWorkers = max(1, multiprocessing.cpu_count() // workers)
+    
+    jobs = []
+    def RunScenes(sceneFilenames):
+        payloads = [{"Scene": sceneFilename, "Pipeline": pipeline, "Output": arguments.output, "Prefix": arguments.prefix,
+            "All": arguments.all, "SingleExport": arguments.single_export, "Binary": arguments.binary, "Reduce": reduceTolerances, "StripStatic": staticTolerances, "FramesPerSecond": arguments.fps, "Save": arguments.save,
+            "ScanWorkers": scanWorkers}
+            for sceneFilename in sceneFilenames]
+        
+        farm = ExportFarm(workerCommand, workers=max(1, min(workers, len(payloads))), jobTimeout=arguments.timeout, retries=arguments.retries)
+        try:
+            sceneJobs = farm.Map("scene", payloads)
+        finally:
+            farm.Close()
+        
+        # Every job goes into the summary, but only this call's scenes are returned
+        jobs.extend(sceneJobs)
+        return [[job.Payload["Scene"], (job.Result or {}).get("AnimationList"), job.Error] for job in sceneJobs]
+    
+    def ReadScenes(sceneFilenames):
+        # Without pipeline steps .ma scenes are read offline, only the others need Maya
+        if len(pipeline) > 0:
+            return RunScenes(sceneFilenames)
+        
+        asciiScenes = [sceneFilename for sceneFilename in sceneFilenames if sceneFilename.lower().endswith(".ma")]
+        otherScenes = [sceneFilename for sceneFilename in sceneFilenames if not sceneFilename.lower().endswith(".ma")]
+        
+        results = ReadSequencerAnimationFiles(asciiScenes, workers)
+        if len(otherScenes) > 0:
+            results += RunScenes(otherScenes)
+        
+        return results
+    
+    startTime = time.time()
+    patterns = arguments.pattern or SceneFilePatterns
+    indexSummary = None
+    if arguments.index:
+        index = AnimationIndex(arguments.index)
+        try:
+            indexSummary = index.Update(arguments.directory, ReadScenes, patterns)
+        finally:
+            index.Close()
+    else:
+        RunScenes(FindScenes(arguments.directory, patterns))
+    
+    scenes = []
+    for job in jobs:
+        scene = {"Scene": job.Payload["Scene"], "Succeeded": job.Succeeded(), "Attempts": job.Attempts, "Error": job.Error}
+        if job.Result is not None:
+            scene.update(job.Result)
+            del scene["AnimationList"]
+        
+        scenes.append(scene)
+    
+    failedCount = len([job for job in jobs if not job.Succeeded()])
+    summary = {"Directory": arguments.directory, "Pipeline": pipeline, "Workers": workers, "Failed": failedCount,
+        "Seconds": round(time.time() - startTime, 3), "Scenes": scenes}
+    if indexSummary is not None:
+        summary["Index"] = indexSummary
+    
+    WriteSummary(summary, arguments.summary)
+    
+    if failedCount > 0:
+        return 1
+    
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(Main())
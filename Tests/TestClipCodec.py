@@ -0,0 +1,123 @@
+'''
+Clip codec tests
+
+Encodes AnimationClips and checks that every decoded track is within its
+error budget, that constant tracks take no bits, and that budgets that cannot
+be met raise ClipCodecError. Run against the combined Out/Sequencer.py:
+
+    python -m unittest discover -s Tests -p "Test*.py"
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Out"))
+
+import Sequencer as S
+
+def TestClip(frameCount=60, jointCount=8):
+    Numpy = S.Numpy
+    frames = Numpy.arange(frameCount)[:, None]
+    joints = Numpy.arange(jointCount)
+    
+    translations = Numpy.zeros((frameCount, jointCount, 3))
+    translations[..., 0] = Numpy.sin(frames * 0.1 + joints) * 30
+    translations[..., 1] = Numpy.cos(frames * 0.05) * 5
+    translations[..., 2] = 2.5
+    
+    # Joint0 does not rotate
+    degrees = Numpy.zeros((frameCount, jointCount, 3))
+    degrees[..., 0] = Numpy.sin(frames * 0.07 + joints) * 170
+    degrees[..., 1] = Numpy.cos(frames * 0.03) * 80
+    degrees[..., 2] = frames * 3.0
+    degrees[:, 0] = 12.0
+    
+    scales = Numpy.ones((frameCount, jointCount, 3))
+    scales[:, 1, 0] = 1 + frames[:, 0] * 0.01
+    
+    rotations = S.ContinuousQuaternions(S.EulerToQuaternions(degrees))
+    return S.AnimationClip("Run", ["Joint%d" % joint for joint in joints], translations, rotations, scales, 30)
+
+@unittest.skipIf(S.Numpy is None, "NumPy is not installed")
+class ClipCodecTests(unittest.TestCase):
+    def assertWithinBudgets(self, decoded, clip, errors):
+        self.assertLessEqual(S.Numpy.abs(decoded.Translations - clip.Translations).max(), errors["T"] + 1e-12)
+        self.assertLessEqual(S.QuaternionAngles(decoded.Rotations, clip.Rotations).max(), errors["R"] + 1e-9)
+        self.assertLessEqual(S.Numpy.abs(decoded.Scales - clip.Scales).max(), errors["S"] + 1e-12)
+    
+    def testRoundTrip(self):
+        clip = TestClip()
+        data = S.EncodeClip(clip).Bytes()
+        decoded = S.DecodeClip(S.ParseEncodedClip(data))
+        
+        self.assertEqual(decoded.Name, "Run")
+        self.assertEqual(decoded.Joints, clip.Joints)
+        self.assertEqual(decoded.FramesPerSecond, 30)
+        self.assertEqual(decoded.Translations.shape, clip.Translations.shape)
+        self.assertWithinBudgets(decoded, clip, S.ClipErrors)
+        self.assertLess(len(data), clip.FrameCount() * clip.JointCount() * S.ClipRawJointSize / 2)
+    
+    def testErrors(self):
+        clip = TestClip()
+        errors = {"T": 0.05, "R": 0.5, "S": 0.01}
+        small = S.EncodeClip(clip, errors)
+        self.assertWithinBudgets(S.DecodeClip(small), clip, errors)
+        self.assertLess(len(small.Bytes()), len(S.EncodeClip(clip).Bytes()))
+    
+    def testConstantTracks(self):
+        clip = TestClip()
+        tracks = S.EncodeClip(clip).Header["Tracks"]
+        
+        self.assertEqual(tracks[0]["R"]["Bits"], 0)
+        self.assertEqual(tracks[0]["T"]["Bits"][2], 0)
+        self.assertEqual(tracks[0]["S"]["Bits"], [0, 0, 0])
+        self.assertGreater(tracks[1]["S"]["Bits"][0], 0)
+    
+    def testFile(self):
+        directory = tempfile.mkdtemp(prefix="SequencerTest")
+        try:
+            clip = TestClip()
+            filename = os.path.join(directory, "Run" + S.ClipExtension)
+            S.WriteClipFile(filename, S.EncodeClip(clip))
+            self.assertWithinBudgets(S.ReadClipFile(filename), clip, S.ClipErrors)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    
+    def testBudgetErrors(self):
+        self.assertEqual(S.FixedPointBits(1.0, 1.0), 0)
+        self.assertEqual(S.FixedPointBits(100.0, 0.001), 16)
+        
+        # 24 bits cannot hold a range of 1e5 within 0.001
+        with self.assertRaises(S.ClipCodecError):
+            S.FixedPointBits(1e5, 0.001)
+        
+        frameCount = 50
+        translations = S.Numpy.zeros((frameCount, 1, 3))
+        translations[:, 0, 0] = S.Numpy.linspace(0, 1e5, frameCount)
+        rotations = S.Numpy.zeros((frameCount, 1, 4))
+        rotations[..., 3] = 1
+        clip = S.AnimationClip("Far", ["Hips"], translations, rotations, S.Numpy.ones((frameCount, 1, 3)), 30)
+        with self.assertRaises(S.ClipCodecError) as raised:
+            S.EncodeClip(clip)
+        self.assertTrue(str(raised.exception).startswith("Hips: "))
+        
+        decoded = S.DecodeClip(S.EncodeClip(clip, {"T": 0.01}))
+        self.assertLessEqual(S.Numpy.abs(decoded.Translations - translations).max(), 0.01)
+        
+        # No rotation bits meet a budget below the smallest-three precision
+        with self.assertRaises(S.ClipCodecError):
+            S.EncodeClip(TestClip(), {"R": 1e-6})
+    
+    def testBadData(self):
+        with self.assertRaises(S.ClipCodecError):
+            S.ParseEncodedClip(b"nope" * 5)
+
+if __name__ == "__main__":
+    unittest.main()
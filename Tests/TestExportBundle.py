@@ -0,0 +1,96 @@
+'''
+Export bundle tests
+
+Writes ExportBundles and reads them back with zipfile: the entries and their
+contents, the manifest, files removed once added, and an aborted bundle
+leaving nothing behind. Run against the combined Out/Sequencer.py:
+
+    python -m unittest discover -s Tests -p "Test*.py"
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import sys
+import json
+import random
+import shutil
+import zipfile
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Out"))
+
+import Sequencer as S
+
+def WriteFile(filename, data):
+    dataFile = open(filename, "wb")
+    dataFile.write(data)
+    dataFile.close()
+
+class ExportBundleTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="SequencerTest")
+        self.filename = os.path.join(self.directory, "Export.zip")
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def testBundle(self):
+        # Larger than a chunk and not very compressible, so it is compressed on several threads
+        generator = random.Random(5)
+        fbxData = b"".join([b"%d," % generator.randint(0, 1000) for index in range(500000)])
+        fbxFilename = os.path.join(self.directory, "Run.fbx")
+        WriteFile(fbxFilename, fbxData)
+        self.assertGreater(len(fbxData), S.BundleChunkSize)
+        
+        bundle = S.ExportBundle(self.filename, workers=3)
+        bundle.AddFile("Run.fbx", fbxFilename, remove=True)
+        bundle.AddBytes("Playblasts/Run.avi", b"")
+        csvEntry = bundle.OpenEntry("Export.csv")
+        csvEntry.write("Animation Name,Start Frame,End Frame\n")
+        csvEntry.write(u"Run,0,30\n")
+        csvEntry.close()
+        
+        self.assertFalse(os.path.exists(self.filename))
+        bundle.Close()
+        
+        self.assertFalse(os.path.exists(fbxFilename))
+        self.assertEqual(os.listdir(self.directory), ["Export.zip"])
+        
+        archive = zipfile.ZipFile(self.filename)
+        try:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.namelist(), ["Run.fbx", "Playblasts/Run.avi", "Export.csv", S.BundleManifestName])
+            self.assertEqual(archive.read("Run.fbx"), fbxData)
+            self.assertEqual(archive.read("Playblasts/Run.avi"), b"")
+            self.assertEqual(archive.read("Export.csv"), b"Animation Name,Start Frame,End Frame\nRun,0,30\n")
+            
+            manifest = json.loads(archive.read(S.BundleManifestName).decode("utf-8"))
+            self.assertEqual([[entry["Name"], entry["Size"]] for entry in manifest["Entries"]],
+                [["Run.fbx", len(fbxData)], ["Playblasts/Run.avi", 0], ["Export.csv", 46]])
+        finally:
+            archive.close()
+    
+    def testAbort(self):
+        bundle = S.ExportBundle(self.filename, workers=1)
+        bundle.AddBytes("Run.fbx", b"; FBX 6.1.0 project file\n")
+        bundle.Abort()
+        bundle.Abort()
+        
+        self.assertEqual(os.listdir(self.directory), [])
+    
+    def testPartialName(self):
+        bundle = S.ExportBundle(self.filename, workers=1)
+        try:
+            bundle.AddBytes("Run.fbx", b"; FBX 6.1.0 project file\n")
+            self.assertEqual(os.listdir(self.directory), ["Export.zip" + S.BundlePartialSuffix])
+        finally:
+            bundle.Close()
+        
+        self.assertEqual(os.listdir(self.directory), ["Export.zip"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+'''
+Export farm tests
+
+Runs jobs on worker processes that answer with RunExportWorker: results in
+payload order, errors, a worker that dies being replaced and its job retried,
+and a hung job timing out. Run against the combined Out/Sequencer.py:
+
+    python -m unittest discover -s Tests -p "Test*.py"
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+OutDirectory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Out")
+sys.path.insert(0, OutDirectory)
+
+import Sequencer as S
+
+# Seconds a test job may take
+TestJobTimeout = 10
+
+WorkerScript = '''
+import os
+import sys
+import time
+sys.path.insert(0, %r)
+import Sequencer as S
+
+def Crash(payload):
+    # Dies unless the marker file is there, which it leaves for the retry
+    if not os.path.exists(payload):
+        open(payload, "w").close()
+        os._exit(3)
+    return "Recovered"
+
+S.RunExportWorker({"Echo": lambda payload: payload, "Fail": lambda payload: 1 // payload, "Crash": Crash,
+    "Sleep": time.sleep})
+''' % os.path.abspath(OutDirectory)
+
+class ExportFarmTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="SequencerTest")
+        
+        # A hung worker is killed right away
+        self.stopTimeout = S.FarmStopTimeout
+        S.FarmStopTimeout = 0.1
+    
+    def tearDown(self):
+        S.FarmStopTimeout = self.stopTimeout
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def Farm(self, **flags):
+        return S.ExportFarm([sys.executable, "-c", WorkerScript], readyTimeout=60, **flags)
+    
+    def testMap(self):
+        farm = self.Farm(workers=3, jobTimeout=TestJobTimeout)
+        try:
+            payloads = [{"Animation": index} for index in range(10)]
+            jobs = farm.Map("Echo", payloads)
+        finally:
+            farm.Close()
+        
+        self.assertEqual([job.Result for job in jobs], payloads)
+        self.assertTrue(all([job.Succeeded() and job.Attempts == 1 for job in jobs]))
+    
+    def testError(self):
+        farm = self.Farm(workers=1, jobTimeout=TestJobTimeout, retries=2)
+        try:
+            failed, succeeded = farm.Map("Fail", [0, 1])
+        finally:
+            farm.Close()
+        
+        # The worker survives a failing job, which is retried and fails again
+        self.assertFalse(failed.Succeeded())
+        self.assertEqual(failed.Attempts, 3)
+        self.assertTrue(failed.Error.startswith("ZeroDivisionError: "))
+        self.assertEqual(succeeded.Result, 1)
+    
+    def testRetry(self):
+        farm = self.Farm(workers=1, jobTimeout=TestJobTimeout, retries=1)
+        try:
+            crashed = farm.Submit("Crash", os.path.join(self.directory, "Marker"))
+            echoed = farm.Submit("Echo", "Echo")
+        finally:
+            farm.Close()
+        
+        self.assertTrue(crashed.Succeeded())
+        self.assertEqual(crashed.Result, "Recovered")
+        self.assertEqual(crashed.Attempts, 2)
+        self.assertEqual([echoed.Result, echoed.Attempts], ["Echo", 1])
+    
+    def testNoRetries(self):
+        farm = self.Farm(workers=1, jobTimeout=TestJobTimeout, retries=0)
+        try:
+            crashed = farm.Map("Crash", [os.path.join(self.directory, "Marker")])[0]
+        finally:
+            farm.Close()
+        
+        self.assertFalse(crashed.Succeeded())
+        self.assertEqual(crashed.Attempts, 1)
+        self.assertIn("exited with code 3", crashed.Error)
+    
+    def testTimeout(self):
+        farm = self.Farm(workers=1, jobTimeout=TestJobTimeout, retries=1)
+        try:
+            hung = farm.Submit("Sleep", 60, timeout=0.5)
+            slept = farm.Submit("Sleep", 0)
+        finally:
+            farm.Close()
+        
+        self.assertFalse(hung.Succeeded())
+        self.assertEqual(hung.Attempts, 2)
+        self.assertIn("timed out", hung.Error)
+        
+        # A fresh worker takes the next job
+        self.assertTrue(slept.Succeeded())
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,175 @@
+'''
+FBX key tests
+
+Rewrites the keys of FBX files exported on FakeMaya: splitting one timeline
+export into the per-animation files, reducing keys within tolerance,
+stripping static channels and resampling to another frame rate in the rotate
+order of each joint. Run against the combined Out/Sequencer.py:
+
+    python -m unittest discover -s Tests -p "Test*.py"
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Out"))
+
+import Sequencer as S
+
+def ReadBytes(filename):
+    fbxFile = open(filename, "rb")
+    try:
+        return fbxFile.read()
+    finally:
+        fbxFile.close()
+
+def ChannelCurves(filename):
+    return dict([(curve.Channel, curve) for curve in S.ReadTakeCurves(filename)])
+
+@unittest.skipIf(S.Numpy is None, "NumPy is not installed")
+class FbxKeyTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="SequencerTest")
+        self.cmds = S.UseFakeMaya()
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def Filename(self, name):
+        return os.path.join(self.directory, name)
+    
+    def ExportScene(self, frames, name="Scene.fbx"):
+        self.cmds.playbackOptions(minTime=frames[0], maxTime=frames[-1])
+        filename = self.Filename(name)
+        self.cmds.ExportFbx(filename)
+        return filename
+    
+    def testSingleExport(self):
+        # The same scene exported per animation, then once and split
+        outputs = []
+        for singleExport in [False, True]:
+            self.cmds = S.UseFakeMaya()
+            self.cmds.createNode('joint', name='Root')
+            self.cmds.createNode('joint', name='Arm', parent='Root')
+            self.cmds.playbackOptions(minTime=0, maxTime=60)
+            for frame in range(0, 61):
+                self.cmds.setKeyframe('Root.translateX', time=frame, value=frame * 0.5)
+                self.cmds.setKeyframe('Arm.rotateZ', time=frame, value=(frame % 7) * 3.0)
+            
+            sequencer = S.Sequencer()
+            sequencer.AddAnimation(S.Animation("Idle", 0, 20, True))
+            sequencer.AddAnimation(S.Animation("Run", 25, 60, True))
+            
+            directoryName = self.Filename("Single" if singleExport else "PerAnimation")
+            os.makedirs(directoryName)
+            generatedFiles = S.GenerateSequencerFbx(sequencer, directoryName, "", "Hero", singleExport=singleExport)
+            
+            self.assertEqual(sorted(os.listdir(directoryName)), ["Hero.fbx", "Idle.fbx", "Run.fbx"])
+            outputs.append([ReadBytes(filename) for filename in generatedFiles])
+        
+        self.assertEqual(outputs[0], outputs[1])
+    
+    def testSplit(self):
+        self.cmds.createNode('joint', name='Root')
+        for frame in range(0, 31):
+            self.cmds.setKeyframe('Root.translateX', time=frame, value=float(frame))
+        source = self.ExportScene([0, 30])
+        
+        S.SplitFbxTakes(source, [[self.Filename("A.fbx"), 0, 10], [self.Filename("B.fbx"), 20, 30]], 24)
+        
+        # Keys strictly inside the range, moved to start at 0
+        ticksPerFrame = S.FbxTicksPerSecond // 24
+        for name, startFrame, endFrame in [["A.fbx", 0, 10], ["B.fbx", 20, 30]]:
+            curve = ChannelCurves(self.Filename(name))["translateX"]
+            self.assertEqual(list(curve.Times), [(frame - startFrame) * ticksPerFrame for frame in range(startFrame + 1, endFrame)])
+            self.assertEqual(list(curve.Values), [float(frame) for frame in range(startFrame + 1, endFrame)])
+    
+    def testReduce(self):
+        self.cmds.createNode('joint', name='Root')
+        for frame in range(0, 41):
+            self.cmds.setKeyframe('Root.translateX', time=frame, value=frame * 0.25)
+            self.cmds.setKeyframe('Root.translateY', time=frame, value=[0.0, 10.0][frame >= 20])
+            self.cmds.setKeyframe('Root.rotateY', time=frame, value=frame * 2.0 + [0.0, 0.04][frame % 2])
+        filename = self.ExportScene([0, 40])
+        before = ChannelCurves(filename)
+        
+        self.assertEqual(S.ReduceFbxKeys(filename, self.Filename("Reduced.fbx")), [123, 8])
+        after = ChannelCurves(self.Filename("Reduced.fbx"))
+        
+        # A line keeps its ends, a step its corners, and noise under the tolerance goes
+        self.assertEqual(after["translateX"].Count(), 2)
+        self.assertEqual(after["translateY"].Count(), 4)
+        self.assertEqual(after["rotateY"].Count(), 2)
+        for channel, tolerance in [["translateX", 0.01], ["translateY", 0.01], ["rotateY", 0.05]]:
+            values = S.Numpy.interp(before[channel].Times, after[channel].Times, after[channel].Values)
+            self.assertLessEqual(S.Numpy.abs(values - before[channel].Values).max(), tolerance)
+        
+        # A tighter rotation tolerance keeps the noise
+        S.ReduceFbxKeys(filename, self.Filename("Tight.fbx"), S.ParseTolerances("R=0.01"))
+        self.assertEqual(ChannelCurves(self.Filename("Tight.fbx"))["rotateY"].Count(), 41)
+    
+    def testStrip(self):
+        self.cmds.createNode('joint', name='Root')
+        for frame in range(0, 11):
+            self.cmds.setKeyframe('Root.translateX', time=frame, value=float(frame))
+            self.cmds.setKeyframe('Root.translateY', time=frame, value=2.0 + [0.0, 0.005][frame % 2])
+            self.cmds.setKeyframe('Root.translateZ', time=frame, value=0.0)
+        filename = self.ExportScene([0, 10])
+        
+        self.assertEqual(S.StripStaticChannels(filename, self.Filename("Stripped.fbx")), [3, 2])
+        curves = ChannelCurves(self.Filename("Stripped.fbx"))
+        self.assertEqual(curves["translateX"].Count(), 11)
+        self.assertEqual(list(curves["translateY"].Values), [2.0])
+        self.assertEqual(curves["translateZ"].Count(), 0)
+        
+        # Without dropDefaults a channel at its Default keeps its first key
+        S.StripStaticChannels(filename, self.Filename("Kept.fbx"), dropDefaults=False)
+        self.assertEqual(list(ChannelCurves(self.Filename("Kept.fbx"))["translateZ"].Values), [0.0])
+    
+    def testResample(self):
+        self.cmds.createNode('joint', name='Root')
+        for frame in range(0, 25):
+            self.cmds.setKeyframe('Root.translateX', time=frame, value=frame * frame * 0.1)
+        filename = self.ExportScene([0, 24])
+        before = ChannelCurves(filename)["translateX"]
+        
+        self.assertEqual(S.ResampleFbxKeys(filename, 12, self.Filename("Resampled.fbx")), [25, 13])
+        after = ChannelCurves(self.Filename("Resampled.fbx"))["translateX"]
+        self.assertEqual(list(after.Times), list(before.Times[::2]))
+        self.assertTrue(S.Numpy.allclose(after.Values, before.Values[::2]))
+    
+    def testResampleRotateOrder(self):
+        self.cmds.createNode('joint', name='Arm')
+        self.cmds.setAttr('Arm.rotateOrder', S.RotateOrders.index("zyx"))
+        for frame in [0, 10]:
+            self.cmds.setKeyframe('Arm.rotateX', time=frame, value=frame * 9.0)
+            self.cmds.setKeyframe('Arm.rotateY', time=frame, value=frame * 6.0)
+            self.cmds.setKeyframe('Arm.rotateZ', time=frame, value=frame * -4.0)
+        filename = self.ExportScene([0, 10])
+        
+        # The RotationOrder of the model is used unless rotateOrders says otherwise
+        outputs = {}
+        for name, rotateOrders in [["Property", None], ["Zyx", {"Model::Arm": "zyx"}], ["Xyz", {"Model::Arm": "xyz"}]]:
+            S.ResampleFbxKeys(filename, 24, self.Filename(name + ".fbx"), rotateOrders=rotateOrders)
+            curves = ChannelCurves(self.Filename(name + ".fbx"))
+            outputs[name] = S.Numpy.array([curves["rotate" + axis].Values for axis in "XYZ"]).T
+        
+        self.assertEqual(len(outputs["Property"]), 11)
+        self.assertTrue(S.Numpy.allclose(outputs["Property"], outputs["Zyx"]))
+        self.assertFalse(S.Numpy.allclose(outputs["Property"], outputs["Xyz"], atol=0.1))
+        
+        # Every resampled pose lies on the slerp between the two keys, in the joint's order
+        keys = S.EulerToQuaternions(S.Numpy.array([[0.0, 0.0, 0.0], [90.0, 60.0, -40.0]]), "zyx")
+        expected = S.SlerpQuaternions(S.Numpy.repeat(keys[:1], 11, axis=0), S.Numpy.repeat(keys[1:], 11, axis=0), S.Numpy.arange(11) / 10.0)
+        angles = S.QuaternionAngles(S.EulerToQuaternions(outputs["Property"], "zyx"), expected)
+        self.assertLess(angles.max(), 1e-4)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+'''
+FBX stitcher tests
+
+Exports a scene with three animations on FakeMaya and checks the master FBX:
+the takes in order under their animation names, the streaming and the byte
+range stitchers writing the same file, and the take index sidecars being
+rebuilt when their FBX file changes. Run against the combined Out/Sequencer.py:
+
+    python -m unittest discover -s Tests -p "Test*.py"
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import re
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Out"))
+
+import Sequencer as S
+
+TestAnimations = [["Idle", 0, 20], ["Run", 25, 60], ["Walk", 70, 90]]
+
+def ReadBytes(filename):
+    fbxFile = open(filename, "rb")
+    try:
+        return fbxFile.read()
+    finally:
+        fbxFile.close()
+
+def TakeNames(filename):
+    return [name.decode("utf-8") for name in re.findall(br'\n\s*Take: "([^"]*)" \{', ReadBytes(filename))]
+
+class FbxStitcherTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="SequencerTest")
+        
+        self.cmds = S.UseFakeMaya()
+        self.cmds.createNode('joint', name='Root')
+        self.cmds.createNode('joint', name='Arm', parent='Root')
+        self.cmds.playbackOptions(minTime=0, maxTime=90)
+        for frame in range(0, 91):
+            self.cmds.setKeyframe('Root.translateX', time=frame, value=frame * 0.5)
+            self.cmds.setKeyframe('Arm.rotateZ', time=frame, value=(frame % 7) * 3.0)
+        
+        self.sequencer = S.Sequencer()
+        for name, startFrame, endFrame in TestAnimations:
+            self.sequencer.AddAnimation(S.Animation(name, startFrame, endFrame, True))
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def Export(self, **flags):
+        generatedFiles = S.GenerateSequencerFbx(self.sequencer, self.directory, "", "Hero", **flags)
+        return generatedFiles[:-1], generatedFiles[-1]
+    
+    def testMasterTakes(self):
+        animationFiles, masterFilename = self.Export()
+        
+        self.assertEqual([os.path.basename(filename) for filename in animationFiles], ["Idle.fbx", "Run.fbx", "Walk.fbx"])
+        self.assertEqual(TakeNames(masterFilename), [name for name, startFrame, endFrame in TestAnimations])
+        
+        # Every take of the master holds the keys of its animation file
+        for animationFilename in animationFiles:
+            takeName = os.path.splitext(os.path.basename(animationFilename))[0]
+            expected = S.ReadTakeCurves(animationFilename)
+            curves = S.ReadTakeCurves(masterFilename, takeName)
+            self.assertEqual([curve.Channel for curve in curves], [curve.Channel for curve in expected])
+            for curve, expectedCurve in zip(curves, expected):
+                self.assertEqual(list(curve.Times), list(expectedCurve.Times))
+                self.assertEqual(list(curve.Values), list(expectedCurve.Values))
+    
+    def testFastMatchesStreaming(self):
+        animationFiles, masterFilename = self.Export()
+        takes = [[name, filename] for (name, startFrame, endFrame), filename in zip(TestAnimations, animationFiles)]
+        
+        streamedFilename = os.path.join(self.directory, "Streamed.fbx")
+        S.StitchFbxTakes(streamedFilename, takes)
+        expected = ReadBytes(streamedFilename)
+        self.assertEqual(ReadBytes(masterFilename), expected)
+        
+        for useIndex, workers in [[False, 1], [True, 1], [True, 2]]:
+            fastFilename = os.path.join(self.directory, "Fast.fbx")
+            S.StitchFbxTakesFast(fastFilename, takes, useIndex, workers)
+            self.assertEqual(ReadBytes(fastFilename), expected)
+    
+    def testScanWorkers(self):
+        masterFilename = self.Export(scanWorkers=1)[1]
+        serial = ReadBytes(masterFilename)
+        
+        masterFilename = self.Export(scanWorkers=3)[1]
+        self.assertEqual(ReadBytes(masterFilename), serial)
+    
+    def testMissingTake(self):
+        filename = os.path.join(self.directory, "Empty.fbx")
+        emptyFile = open(filename, "wb")
+        emptyFile.write(b"; FBX 6.1.0 project file\n")
+        emptyFile.close()
+        
+        with self.assertRaises(S.FbxStitchError):
+            S.StitchFbxTakesFast(os.path.join(self.directory, "Master.fbx"), [["Idle", filename]], useIndex=False)
+    
+    def testNoTakeIndexForExports(self):
+        self.Export()
+        self.assertEqual([filename for filename in os.listdir(self.directory) if filename.endswith(S.FbxTakeIndexExtension)], [])
+    
+    def testTakeIndex(self):
+        filename = self.Export()[0][0]
+        
+        takeRange = S.FindTakeRangeIndexed(filename)
+        self.assertTrue(os.path.exists(S.TakeIndexFilename(filename)))
+        
+        indexedRange = S.LoadTakeIndex(filename)
+        self.assertEqual(vars(indexedRange), vars(takeRange))
+        self.assertEqual(vars(indexedRange), vars(S.FindTakeRange(filename)))
+    
+    def testTakeIndexInvalidation(self):
+        # A whole second, which every file system keeps exactly
+        modifiedTime = 1400000000
+        filename = self.Export()[0][0]
+        os.utime(filename, (modifiedTime, modifiedTime))
+        S.FindTakeRangeIndexed(filename)
+        self.assertIsNotNone(S.LoadTakeIndex(filename))
+        
+        # Same size and modification time, but a different take header
+        data = ReadBytes(filename)
+        fbxFile = open(filename, "wb")
+        fbxFile.write(data.replace(b'LocalTime: ', b'LocalTime:_', 1))
+        fbxFile.close()
+        os.utime(filename, (modifiedTime, modifiedTime))
+        self.assertIsNone(S.LoadTakeIndex(filename))
+        
+        # A longer file
+        fbxFile = open(filename, "wb")
+        fbxFile.write(b"; Comment\n" + data)
+        fbxFile.close()
+        self.assertIsNone(S.LoadTakeIndex(filename))
+        
+        # The stale index is replaced by one of the new file
+        takeRange = S.FindTakeRangeIndexed(filename)
+        self.assertEqual(takeRange.HeaderEnd, S.FindTakeRange(filename).HeaderEnd)
+        self.assertEqual(vars(S.LoadTakeIndex(filename)), vars(takeRange))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+'''
+JSON-RPC tests
+
+Round-trips calls, batches and notifications between a JsonRpcClient and a
+JsonRpcServer on a local port, and the Sequencer methods on FakeMaya. Run
+against the combined Out/Sequencer.py:
+
+    python -m unittest discover -s Tests -p "Test*.py"
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Out"))
+
+import Sequencer as S
+
+# Seconds a test waits for a response or notification
+TestTimeout = 5
+
+def Divide(context, a, b):
+    if b == 0:
+        raise S.JsonRpcError(S.JsonRpcInvalidParams, "Division by zero", [a, b])
+    
+    return a / float(b)
+
+def Append(context, value):
+    context.append(value)
+    return list(context)
+
+TestMethods = {
+    "Add": lambda context, a, b: a + b,
+    "Divide": Divide,
+    "Append": Append,
+    "Fail": lambda context: {}["missing"],
+}
+
+class JsonRpcTests(unittest.TestCase):
+    def setUp(self):
+        self.server = S.JsonRpcServer(TestMethods, context=list)
+        self.server.Start()
+        self.client = S.JsonRpcClient(port=self.server.Port, timeout=TestTimeout)
+    
+    def tearDown(self):
+        self.client.Close()
+        self.server.Stop()
+    
+    def testCall(self):
+        self.assertNotEqual(self.server.Port, 0)
+        self.assertEqual(self.client.Call("Add", 2, 3), 5)
+        self.assertEqual(self.client.Call("Divide", 1, 4), 0.25)
+        self.assertEqual(self.client.Call("Server.Methods"), sorted(TestMethods))
+    
+    def testCallErrors(self):
+        with self.assertRaises(S.JsonRpcError) as raised:
+            self.client.Call("Divide", 1, 0)
+        self.assertEqual(raised.exception.Code, S.JsonRpcInvalidParams)
+        self.assertEqual(raised.exception.Data, [1, 0])
+        
+        with self.assertRaises(S.JsonRpcError) as raised:
+            self.client.Call("Missing")
+        self.assertEqual(raised.exception.Code, S.JsonRpcMethodNotFound)
+        
+        with self.assertRaises(S.JsonRpcError) as raised:
+            self.client.Call("Fail")
+        self.assertEqual(raised.exception.Code, S.JsonRpcInternalError)
+        
+        # The connection still answers after errors
+        self.assertEqual(self.client.Call("Add", 1, 1), 2)
+    
+    def testBatch(self):
+        results = self.client.Batch([["Add", [index, index]] for index in range(1000)])
+        self.assertEqual(results, [index * 2 for index in range(1000)])
+        
+        results = self.client.Batch([["Add", {"a": 1, "b": 2}], ["Divide", [1, 0]], ["Missing", []], ["Divide", [3, 2]]])
+        self.assertEqual(results[0], 3)
+        self.assertIsInstance(results[1], S.JsonRpcError)
+        self.assertEqual(results[1].Code, S.JsonRpcInvalidParams)
+        self.assertEqual(results[2].Code, S.JsonRpcMethodNotFound)
+        self.assertEqual(results[3], 1.5)
+        
+        self.assertEqual(self.client.Batch([]), [])
+    
+    def testBatchSharesContext(self):
+        self.assertEqual(self.client.Batch([["Append", [1]], ["Append", [2]]]), [[1], [1, 2]])
+        self.assertEqual(self.client.Call("Append", 3), [3])
+    
+    def testNotifications(self):
+        self.assertTrue(self.client.Subscribe())
+        
+        # Only subscribed connections are notified
+        other = S.JsonRpcClient(port=self.server.Port, timeout=TestTimeout)
+        try:
+            self.server.Notify("Changed", {"Count": 3})
+            self.server.Notify("Cleared")
+            self.assertEqual(self.client.Notifications.get(timeout=TestTimeout), ["Changed", {"Count": 3}])
+            self.assertEqual(self.client.Notifications.get(timeout=TestTimeout), ["Cleared", None])
+            
+            self.assertEqual(other.Call("Add", 1, 2), 3)
+            self.assertTrue(other.Notifications.empty())
+        finally:
+            other.Close()
+    
+    def testClientNotify(self):
+        # Notifications are not answered, so the next response is that of the call
+        self.client.Notify("Append", 1)
+        self.client.Notify("Missing")
+        self.assertEqual(self.client.Call("Add", 1, 2), 3)
+        self.assertEqual(self.client.Batch([["Add", [2, 2]]]), [4])
+
+class SequencerServerTests(unittest.TestCase):
+    def setUp(self):
+        self.cmds = S.UseFakeMaya()
+        self.cmds.createNode('joint', name='Joint_Root')
+        
+        self.ui = S.SequencerUI()
+        self.ui.Create()
+        for name, startFrame, endFrame in [("Idle", 0, 29), ("Run", 40, 69), ("Walk", 80, 109)]:
+            self.ui.sequencer.AddAnimation(S.Animation(name, startFrame, endFrame, name != "Run"))
+        self.ui.Save()
+        
+        self.server = S.StartSequencerServer(port=0)
+        self.client = S.JsonRpcClient(port=self.server.Port, timeout=TestTimeout)
+    
+    def tearDown(self):
+        self.client.Close()
+        S.StopSequencerServer()
+    
+    def testMethods(self):
+        self.assertEqual(self.client.Call("Sequencer.Count"), 3)
+        self.assertEqual(self.client.Call("Sequencer.Range"), [0, 109])
+        self.assertEqual([animation["Name"] for animation in self.client.Call("Sequencer.Animations")], ["Idle", "Run", "Walk"])
+        self.assertEqual([animation["Name"] for animation in self.client.Call("Sequencer.Animations", None, True)], ["Idle", "Walk"])
+        
+        run = self.client.Call("Sequencer.Find", "Run")[0]
+        self.assertEqual([run["StartFrame"], run["EndFrame"], run["Selected"]], [40, 69, False])
+        
+        ids = [animation["Id"] for animation in self.client.Call("Sequencer.Animations")]
+        results = self.client.Batch([["Sequencer.Animation", [id]] for id in ids] + [["Sequencer.Animation", [-1]]])
+        self.assertEqual([result["Name"] for result in results[:3]], ["Idle", "Run", "Walk"])
+        self.assertEqual(results[3].Code, S.JsonRpcInvalidParams)
+    
+    def testChangedNotification(self):
+        self.client.Subscribe()
+        self.ui.sequencer.AddAnimation(S.Animation("Jump", 120, 139))
+        self.ui.Save()
+        
+        self.assertEqual(self.client.Notifications.get(timeout=TestTimeout),
+            ["Sequencer.Changed", {"Count": 4, "StartFrame": 0, "EndFrame": 139}])
+        self.assertEqual(self.client.Call("Sequencer.Count"), 4)
+
+if __name__ == "__main__":
+    unittest.main()
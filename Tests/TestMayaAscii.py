@@ -0,0 +1,174 @@
+'''
+Maya ASCII tests
+
+Reads, patches and trims a small .ma scene without Maya: the SequencerData
+animations, renames and new ranges written back with every other byte of the
+scene unchanged, and the keys outside the animations removed from the
+animCurve nodes. Run against the combined Out/Sequencer.py:
+
+    python -m unittest discover -s Tests -p "Test*.py"
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Out"))
+
+import Sequencer as S
+
+# Run (40 to 45) comes first; Idle starts at 10 and its EndFrame of 0 is left out, as Maya leaves out defaults
+TestScene = b'''//Maya ASCII 2016 scene
+//Name: Hero.ma
+requires maya "2016";
+currentUnit -l centimeter -a degree -t film;
+createNode joint -n "Root";
+\tsetAttr ".t" -type "double3" 1 2 3 ;
+createNode animCurveTL -n "Root_translateX";
+\tsetAttr ".tan" 18;
+\tsetAttr ".wgt" no;
+\tsetAttr -s 6 ".ktv[0:5]"  0 0 10 1 20 2 30 3 40 4 50 5;
+\tsetAttr ".kit[1]"  1;
+\tsetAttr -s 6 ".kix[0:5]"  0.5 0.5 0.5 0.5 0.5 0.5;
+createNode animCurveUL -n "Driven";
+\tsetAttr -s 2 ".ktv[0:1]"  -100 0 900 1;
+createNode script -n "SequencerData";
+\taddAttr -ci true -sn "UniqueId" -ln "UniqueId" -at "long";
+\taddAttr -ci true -sn "Ordering" -ln "Ordering" -dt "Int32Array";
+\taddAttr -ci true -sn "Animations" -ln "Animations" -nc 2 -at "compound";
+\taddAttr -ci true -sn "Animation0" -ln "Animation0" -at "compound" -p "Animations" -nc 4;
+\taddAttr -ci true -sn "Name0" -ln "Name0" -dt "string" -p "Animation0";
+\taddAttr -ci true -sn "StartFrame0" -ln "StartFrame0" -at "long" -p "Animation0";
+\taddAttr -ci true -sn "EndFrame0" -ln "EndFrame0" -at "long" -p "Animation0";
+\taddAttr -ci true -sn "Selected0" -ln "Selected0" -min 0 -max 1 -at "bool" -p "Animation0";
+\taddAttr -ci true -sn "Animation1" -ln "Animation1" -at "compound" -p "Animations" -nc 4;
+\taddAttr -ci true -sn "Name1" -ln "Name1" -dt "string" -p "Animation1";
+\taddAttr -ci true -sn "StartFrame1" -ln "StartFrame1" -at "long" -p "Animation1";
+\taddAttr -ci true -sn "EndFrame1" -ln "EndFrame1" -at "long" -p "Animation1";
+\taddAttr -ci true -sn "Selected1" -ln "Selected1" -min 0 -max 1 -at "bool" -p "Animation1";
+\tsetAttr ".UniqueId" 2;
+\tsetAttr ".Ordering" -type "Int32Array" 2 1 0 ;
+\tsetAttr ".Animations.Animation0.Name0" -type "string" "Idle \\"A\\"";
+\tsetAttr ".Animations.Animation0.StartFrame0" 10;
+\tsetAttr ".Animations.Animation0.Selected0" yes;
+\tsetAttr ".Animations.Animation1.Name1" -type "string" "Run";
+\tsetAttr ".Animations.Animation1.StartFrame1" 40;
+\tsetAttr -k on ".Animations.Animation1.EndFrame1" 45;
+select -ne :time1;
+// End of Hero.ma
+'''
+
+TestAnimations = [{"Id": 1, "Name": "Run", "StartFrame": 40, "EndFrame": 45, "Selected": False},
+    {"Id": 0, "Name": "Idle \"A\"", "StartFrame": 10, "EndFrame": 0, "Selected": True}]
+
+def ReadBytes(filename):
+    sceneFile = open(filename, "rb")
+    try:
+        return sceneFile.read()
+    finally:
+        sceneFile.close()
+
+def WriteBytes(filename, data):
+    sceneFile = open(filename, "wb")
+    sceneFile.write(data)
+    sceneFile.close()
+
+class MayaAsciiTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="SequencerTest")
+        self.filename = os.path.join(self.directory, "Hero.ma")
+        WriteBytes(self.filename, TestScene)
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def testRead(self):
+        self.assertEqual(S.ReadSequencerData(self.filename), [2, TestAnimations])
+        
+        noSequencerFilename = os.path.join(self.directory, "Empty.ma")
+        WriteBytes(noSequencerFilename, b'//Maya ASCII 2016 scene\nrequires maya "2016";\n')
+        self.assertIsNone(S.ReadSequencerData(noSequencerFilename))
+        self.assertEqual(S.ReadSequencerAnimationFiles([self.filename, noSequencerFilename], workers=1),
+            [[self.filename, TestAnimations, None], [noSequencerFilename, [], None]])
+    
+    def testPatch(self):
+        patch = S.AnimationPatch(renames={"Run": "Run_Fast"}, ranges={"Run_Fast": [38, 50], "Idle \"A\"": [10, 20]})
+        self.assertTrue(S.PatchSequencerData(self.filename, patch))
+        
+        expected = [{"Id": 1, "Name": "Run_Fast", "StartFrame": 38, "EndFrame": 50, "Selected": False},
+            {"Id": 0, "Name": "Idle \"A\"", "StartFrame": 10, "EndFrame": 20, "Selected": True}]
+        self.assertEqual(S.ReadSequencerData(self.filename), [2, expected])
+        
+        # Only the node's setAttr statements changed
+        data = ReadBytes(self.filename)
+        sequencerStart = TestScene.index(b'\tsetAttr ".UniqueId"')
+        self.assertEqual(data[:sequencerStart], TestScene[:sequencerStart])
+        self.assertTrue(data.endswith(b'select -ne :time1;\n// End of Hero.ma\n'))
+        
+        # Nothing to change, nothing written
+        self.assertFalse(S.PatchSequencerData(self.filename, patch))
+        self.assertEqual(ReadBytes(self.filename), data)
+        self.assertEqual(os.listdir(self.directory), ["Hero.ma"])
+    
+    def testPatchReorder(self):
+        outputFilename = os.path.join(self.directory, "Reordered.ma")
+        self.assertTrue(S.PatchSequencerData(self.filename, lambda animations: animations[::-1], outputFilename))
+        self.assertEqual(S.ReadSequencerData(outputFilename), [2, TestAnimations[::-1]])
+        self.assertEqual(ReadBytes(self.filename), TestScene)
+    
+    def testPatchNewAnimation(self):
+        def AddAnimation(animations):
+            return animations + [{"Id": 7, "Name": "Walk", "StartFrame": 0, "EndFrame": 10, "Selected": True}]
+        
+        with self.assertRaises(S.MayaAsciiError):
+            S.PatchSequencerData(self.filename, AddAnimation)
+        self.assertEqual(ReadBytes(self.filename), TestScene)
+        
+        self.assertEqual(S.PatchSequencerFiles([self.filename], AddAnimation, workers=1)[0][1:],
+            [False, "MayaAsciiError: Animation 7 has no attributes in %s; new animations need Maya" % self.filename])
+    
+    def testPatchFiles(self):
+        filenames = [self.filename, os.path.join(self.directory, "Copy.ma")]
+        WriteBytes(filenames[1], TestScene)
+        
+        results = S.PatchSequencerFiles(filenames, S.AnimationPatch(renames={"Run": "Sprint"}), workers=2)
+        self.assertEqual(results, [[filename, True, None] for filename in filenames])
+        for filename in filenames:
+            self.assertEqual(S.ReadSequencerData(filename)[1][0]["Name"], "Sprint")
+    
+    @unittest.skipIf(S.Numpy is None, "NumPy is not installed")
+    def testTrim(self):
+        # Keys at 0, 30 and 50 are outside both animations, Idle taken as 10 to 20
+        S.PatchSequencerData(self.filename, S.AnimationPatch(ranges={"Idle \"A\"": [10, 20]}))
+        self.assertEqual(S.TrimMayaAsciiKeys(self.filename), 3)
+        
+        data = ReadBytes(self.filename)
+        self.assertIn(b'\tsetAttr ".wgt" no;\n\tsetAttr -s 3 ".ktv[0:2]" 10 1 20 2 40 4;\n\tsetAttr ".kit[0]" 1;\n'
+            b'\tsetAttr -s 3 ".kix[0:2]" 0.5 0.5 0.5;\ncreateNode animCurveUL', data)
+        
+        # Curves driven by something else than time are left alone
+        self.assertIn(b'\tsetAttr -s 2 ".ktv[0:1]"  -100 0 900 1;\n', data)
+        
+        self.assertEqual(S.TrimMayaAsciiKeys(self.filename), 0)
+        self.assertEqual(ReadBytes(self.filename), data)
+    
+    @unittest.skipIf(S.Numpy is None, "NumPy is not installed")
+    def testTrimRange(self):
+        animations = [{"StartFrame": 0, "EndFrame": 5}]
+        outputFilename = os.path.join(self.directory, "Trimmed.ma")
+        
+        # Only the keys after the animation, and not past 40
+        self.assertEqual(S.TrimMayaAsciiKeys(self.filename, outputFilename, animations, trimStart=6, trimEnd=40), 4)
+        self.assertIn(b'".ktv[0:1]" 0 0 50 5;', ReadBytes(outputFilename))
+        
+        # As stored, Idle ends before it starts, so only Run's key at 40 is kept
+        self.assertEqual(S.TrimMayaAsciiFiles([self.filename], workers=1), [[self.filename, 5, None]])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+'''
+NameIndex tests
+
+Matches pieces of animation names, case insensitive, through a NameIndex and
+through the index a Sequencer keeps up to date as animations are added,
+renamed and removed, against a plain scan of the names. Run against the
+combined Out/Sequencer.py:
+
+    python -m unittest discover -s Tests -p "Test*.py"
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import sys
+import random
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Out"))
+
+import Sequencer as S
+
+TestNames = {1: "Run_Fast", 2: "Run_Slow", 3: "Walk", 4: "Idle_Breathe", 5: "RUN_Turn", 6: ""}
+
+def ScanNames(names, text):
+    return set([animationId for animationId, name in names.items() if text.lower() in name.lower()])
+
+class NameIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.index = S.NameIndex()
+        for animationId, name in TestNames.items():
+            self.index.Add(animationId, name)
+    
+    def testMatch(self):
+        self.assertEqual(self.index.Count(), 6)
+        self.assertEqual(self.index.Match("run"), set([1, 2, 5]))
+        self.assertEqual(self.index.Match("Run_"), set([1, 2, 5]))
+        self.assertEqual(self.index.Match("_fast"), set([1]))
+        self.assertEqual(self.index.Match("a"), set([1, 3, 4]))
+        self.assertEqual(self.index.Match("Breathe"), set([4]))
+        self.assertEqual(self.index.Match("Run_Walk"), set())
+        self.assertEqual(self.index.Match("x"), set())
+        self.assertEqual(self.index.Match(""), set(TestNames))
+    
+    def testLongQuery(self):
+        # Longer than a trigram, the names with every trigram of the text are checked in full
+        self.assertEqual(self.index.Match("un_fa"), set([1]))
+        self.assertEqual(self.index.Match("un_sl"), set([2]))
+        self.assertEqual(self.index.Match("un_t"), set([5]))
+        
+        # Both trigrams of "abcd" are in the name, but not next to each other
+        self.index.Add(7, "abc_bcd")
+        self.assertEqual(self.index.Match("abcd"), set())
+        self.assertEqual(self.index.Match("c_bc"), set([7]))
+    
+    def testUpdates(self):
+        self.index.Rename(1, "Sprint")
+        self.index.Remove(3)
+        self.index.Remove(42)
+        
+        self.assertEqual(self.index.Count(), 5)
+        self.assertEqual(self.index.Match("run"), set([2, 5]))
+        self.assertEqual(self.index.Match("print"), set([1]))
+        self.assertEqual(self.index.Match("walk"), set())
+        
+        # Grams no name uses any more are dropped
+        self.assertNotIn("wal", self.index.Grams)
+    
+    def testMatchesScan(self):
+        generator = random.Random(3)
+        names = dict([(animationId, "".join([generator.choice("abcAB_") for index in range(generator.randint(0, 9))]))
+            for animationId in range(300)])
+        
+        index = S.NameIndex()
+        for animationId, name in names.items():
+            index.Add(animationId, name)
+        
+        for text in ["a", "B", "ab", "a_b", "abca", "b_a_b", "aaaa", "c_", "zz"]:
+            self.assertEqual(index.Match(text), ScanNames(names, text))
+    
+    def testSequencer(self):
+        sequencer = S.Sequencer()
+        for name in ["Run_Fast", "Walk", "Idle"]:
+            sequencer.AddAnimation(S.Animation(name, 0, 10, True))
+        
+        self.assertEqual(sequencer.NameIndex().Match("a"), set([0, 1]))
+        
+        sequencer.AddAnimation(S.Animation("Jump", 10, 20, True))
+        sequencer.RenameAnimation(2, "Idle_Look")
+        sequencer.RemoveAnimation(0)
+        
+        names = dict([(animationId, animation.Name) for animationId, animation in sequencer.Animations.items()])
+        for text in ["a", "u", "look", "idle_", "run", ""]:
+            self.assertEqual(sequencer.NameIndex().Match(text), ScanNames(names, text))
+
+if __name__ == "__main__":
+    unittest.main()
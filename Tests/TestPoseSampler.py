@@ -0,0 +1,104 @@
+'''
+PoseSampler tests
+
+Samples joint hierarchies on FakeMaya and compares every channel with getAttr
+at the same frame. Run against the combined Out/Sequencer.py:
+
+    python -m unittest discover -s Tests -p "Test*.py"
+
+(c) 2009 - 2015 Greymind Inc.
+    Balakrishnan (Balki) Ranganathan (balki_live_com)
+    All Rights Reserved.
+'''
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Out"))
+
+import Sequencer as S
+
+def GetAttrPoses(cmds, joints, frames):
+    return [[[cmds.getAttr("%s.%s" % (joint, channel), time=frame) for channel in S.PoseChannels] for joint in joints]
+        for frame in frames]
+
+@unittest.skipIf(S.Numpy is None, "NumPy is not installed")
+class PoseSamplerTests(unittest.TestCase):
+    def setUp(self):
+        self.cmds = S.UseFakeMaya()
+        self.cmds.createNode('joint', name='Root')
+        self.cmds.createNode('joint', name='Spine', parent='Root')
+        self.cmds.createNode('transform', name='Prop', parent='Root')
+        self.cmds.createNode('joint', name='Head', parent='Spine')
+        self.cmds.createNode('joint', name='Arm', parent='Spine')
+        
+        self.cmds.setKeyframe('Root.translateX', time=0, value=0)
+        self.cmds.setKeyframe('Root.translateX', time=20, value=10)
+        self.cmds.setKeyframe('Root.rotateX', time=0, value=0)
+        self.cmds.setKeyframe('Root.rotateX', time=20, value=45)
+        self.cmds.setKeyframe('Head.translateY', time=0, value=1)
+        self.cmds.setKeyframe('Head.translateY', time=10, value=3)
+        self.cmds.setKeyframe('Arm.rotateZ', time=5, value=-30)
+        self.cmds.setKeyframe('Arm.rotateZ', time=15, value=60)
+        self.cmds.setAttr('Arm.scaleX', 2)
+    
+    def testJoints(self):
+        # Depth first, joints only
+        self.assertEqual(S.PoseSampler('Root').Joints, ['Root', 'Spine', 'Head', 'Arm'])
+        self.assertEqual(S.PoseSampler('Spine').Joints, ['Spine', 'Head', 'Arm'])
+        self.assertEqual(S.PoseSampler('Spine', descendants=False).Joints, ['Spine'])
+    
+    def testMatchesGetAttr(self):
+        sampler = S.PoseSampler('Root')
+        frames = S.Numpy.arange(-5, 26, 0.5)
+        poses = sampler.Sample(frames)
+        
+        self.assertEqual(poses.shape, (len(frames), 4, 9))
+        self.assertTrue(S.Numpy.allclose(poses, GetAttrPoses(self.cmds, sampler.Joints, frames)))
+        self.assertAlmostEqual(poses[list(frames).index(10), 0, 3], 22.5)
+    
+    def testPreallocatedPoses(self):
+        sampler = S.PoseSampler('Root')
+        frames = list(range(0, 21))
+        buffer = S.Numpy.zeros((len(frames), 4, 9))
+        
+        poses = sampler.Sample(frames, buffer)
+        self.assertIs(poses, buffer)
+        self.assertTrue(S.Numpy.allclose(poses, GetAttrPoses(self.cmds, sampler.Joints, frames)))
+    
+    def testShapeMismatch(self):
+        sampler = S.PoseSampler('Root')
+        with self.assertRaises(ValueError):
+            sampler.Sample(range(0, 21), S.Numpy.zeros((3, 4, 9)))
+        with self.assertRaises(ValueError):
+            sampler.Sample(range(0, 21), S.Numpy.zeros((21, 3, 9)))
+    
+    def testSampleTransform(self):
+        self.cmds.currentTime(10)
+        translation, rotation, scale = S.SampleTransform('Arm')
+        self.assertEqual(translation, [self.cmds.getAttr('Arm.%s' % channel) for channel in S.PoseChannels[0:3]])
+        self.assertEqual(rotation, [self.cmds.getAttr('Arm.%s' % channel) for channel in S.PoseChannels[3:6]])
+        self.assertEqual(scale, [2.0, 1.0, 1.0])
+
+    def testSampleTransformReusesSampler(self):
+        S.SampleTransform('Arm')
+        sampler = S.TransformSamplers['Arm']
+        S.SampleTransform('Arm')
+        self.assertIs(S.TransformSamplers['Arm'], sampler)
+        
+        # A new node under the same name is walked again
+        self.cmds.delete('Arm')
+        self.cmds.createNode('joint', name='Arm', parent='Spine')
+        self.cmds.setAttr('Arm.translateZ', 4)
+        self.assertFalse(sampler.Valid())
+        self.assertEqual(S.SampleTransform('Arm')[0], [0.0, 0.0, 4.0])
+        self.assertIsNot(S.TransformSamplers['Arm'], sampler)
+        
+        # As is the same name on another FakeCmds
+        self.cmds = S.UseFakeMaya()
+        self.cmds.createNode('joint', name='Arm')
+        self.assertEqual(S.SampleTransform('Arm')[2], [1.0, 1.0, 1.0])
+
+if __name__ == "__main__":
+    unittest.main()
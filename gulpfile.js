@@ -12,7 +12,7 @@ gulp.task('Clean', function (cb) {
 });
 
 gulp.task('Build', ['Clean'], function () {
-	gulp.src(['./Scripts/Common.py', './Scripts/Sequencer.py'])
+	gulp.src(['./Scripts/Common.py', './Scripts/FbxAscii.py', './Scripts/FbxStitcher.py', './Scripts/FbxCurves.py', './Scripts/FbxReduce.py', './Scripts/AnimationMath.py', './Scripts/AnimationClip.py', './Scripts/FbxResample.py', './Scripts/ClipCodec.py', './Scripts/FbxBinary.py', './Scripts/ExportBundle.py', './Scripts/ExportFarm.py', './Scripts/JsonRpc.py', './Scripts/AnimationIndex.py', './Scripts/NameIndex.py', './Scripts/MayaAscii.py', './Scripts/MayaCurves.py', './Scripts/AnimationCurve.py', './Scripts/PoseSampler.py', './Scripts/PoseCache.py', './Scripts/FakeMaya.py', './Scripts/Sequencer.py'])
 		.pipe(concat('Sequencer.py'))
 		.pipe(gulp.dest('./Out/'))
 		.pipe(gulpif(function () {